@@ -0,0 +1,105 @@
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from typing import Dict
+
+from telegram import Bot
+from telegram.ext import PersistenceInput, PicklePersistence
+
+from utils.persistence import SQLitePersistence
+
+
+CONVERSATION = "main"
+
+# Те же данные, что сохраняет SQLitePersistence
+STORE_DATA = PersistenceInput(bot_data=False, callback_data=False)
+
+
+def profile(user_id: int, round_number: int = 0) -> Dict[str, object]:
+    """Данные пользователя того же размера, что у настоящего бота"""
+    return {"first_name": f"Игрок{user_id}", "last_name": "Тестовый", "awaiting_scenario": bool(round_number % 2)}
+
+
+async def _cycle(persistence, changed: int, round_number: int):
+    """Один цикл update_persistence: данные и состояние диалога для changed пользователей"""
+    await asyncio.gather(*(
+        coroutine
+        for user_id in range(changed)
+        for coroutine in (
+            persistence.update_user_data(user_id, profile(user_id, round_number)),
+            persistence.update_conversation(CONVERSATION, (user_id, user_id), 1 + round_number % 2),
+        )
+    ))
+
+
+async def measure_cycle(users: int = 100_000, changed: int = 20) -> Dict[str, float]:
+    """
+    Сравнивает цикл сохранения SQLitePersistence и PicklePersistence
+    
+    Args:
+        users: Число пользователей в хранилище
+        changed: Сколько из них изменились за цикл
+    
+    Returns:
+        Dict[str, float]: Время цикла sqlite и pickle (запись файла на каждое изменение, как по умолчанию
+            в PTB), время одной полной перезаписи pickle_full, загрузка sqlite_load и число строк sqlite_rows
+    """
+    result = {}
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "state.sqlite3")
+        persistence = SQLitePersistence(path)
+        await asyncio.gather(*(persistence.update_user_data(user_id, profile(user_id)) for user_id in range(users)))
+        await persistence.flush()
+        
+        persistence = SQLitePersistence(path)
+        started = time.perf_counter()
+        await persistence.get_user_data()
+        await persistence.get_conversations(CONVERSATION)
+        result["sqlite_load"] = time.perf_counter() - started
+        
+        started = time.perf_counter()
+        await _cycle(persistence, changed, 1)
+        await persistence._writer
+        result["sqlite"] = time.perf_counter() - started
+        result["sqlite_rows"] = persistence.rows_written
+        await persistence.flush()
+        
+        bot = Bot("123456:benchmark")
+        filepath = os.path.join(directory, "state.pickle")
+        pickle_persistence = PicklePersistence(filepath, STORE_DATA, on_flush=True)
+        pickle_persistence.set_bot(bot)
+        await pickle_persistence.get_conversations(CONVERSATION)
+        for user_id in range(users):
+            await pickle_persistence.update_user_data(user_id, profile(user_id))
+        started = time.perf_counter()
+        await pickle_persistence.flush()
+        result["pickle_full"] = time.perf_counter() - started
+        
+        pickle_persistence = PicklePersistence(filepath, STORE_DATA, on_flush=False)
+        pickle_persistence.set_bot(bot)
+        await pickle_persistence.get_user_data()
+        await pickle_persistence.get_conversations(CONVERSATION)
+        started = time.perf_counter()
+        await _cycle(pickle_persistence, changed, 1)
+        result["pickle"] = time.perf_counter() - started
+    return result
+
+
+def main():
+    """Точка входа: python -m benchmarks.persistence [--users 100000] [--changed 20]"""
+    parser = argparse.ArgumentParser(description="Стоимость цикла сохранения состояния: SQLite против pickle")
+    parser.add_argument("--users", type=int, default=100_000, help="Число пользователей в хранилище")
+    parser.add_argument("--changed", type=int, default=20, help="Сколько пользователей изменились за цикл")
+    args = parser.parse_args()
+    
+    result = asyncio.run(measure_cycle(args.users, args.changed))
+    print(f"Пользователей: {args.users}, изменилось за цикл: {args.changed}")
+    print(f"  SQLite: цикл {result['sqlite'] * 1000:.1f} мс ({result['sqlite_rows']} строк одной транзакцией), загрузка {result['sqlite_load'] * 1000:.0f} мс")
+    print(f"  Pickle: цикл {result['pickle'] * 1000:.1f} мс (файл перезаписывается на каждое изменение)")
+    print(f"  Pickle: одна полная перезапись {result['pickle_full'] * 1000:.1f} мс")
+
+
+if __name__ == "__main__":
+    main()
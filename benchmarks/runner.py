@@ -0,0 +1,337 @@
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import timeit
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+DEFAULT_THRESHOLD = 0.25
+# Бенчмарки быстрее микросекунды заметно колеблются от раскладки памяти и кэшей
+# даже при неизменном коде, поэтому для них допуск шире
+MICRO_BENCHMARK_NS = 1000
+MICRO_THRESHOLD = 0.5
+CALIBRATION_TIME = 0.01
+
+
+@dataclass
+class Benchmark:
+    """Микро-бенчмарк: функция без аргументов и допустимое замедление относительно базовой линии"""
+    name: str
+    func: Callable[[], Any]
+    threshold: Optional[float] = None
+
+
+@dataclass
+class BenchmarkResult:
+    """Результат измерения одного бенчмарка"""
+    name: str
+    median_ns: float
+    min_ns: float
+    loops: int
+    repeats: int
+    calibration_ns: float = 0.0
+    ratio: float = 0.0
+    
+    @property
+    def relative(self) -> float:
+        """Время в единицах калибровочной нагрузки: медиана по раундам, если она измерена"""
+        if self.ratio:
+            return self.ratio
+        return self.min_ns / self.calibration_ns if self.calibration_ns else self.min_ns
+
+
+@dataclass
+class Regression:
+    """Бенчмарк, замедлившийся сильнее допустимого"""
+    name: str
+    baseline_ns: float
+    current_ns: float
+    change: float
+    threshold: float
+
+
+def _calibration_workload():
+    names = {index: f"Игрок {index}" for index in range(50)}
+    return "\n".join(name for index, name in names.items() if index % 2)
+
+
+def _autorange(timer: timeit.Timer, min_time: float) -> int:
+    loops = 1
+    while True:
+        if timer.timeit(loops) >= min_time:
+            return loops
+        loops *= 2
+
+
+def _best_ns(timer: timeit.Timer, repeat: int, loops: int) -> float:
+    return min(timer.repeat(repeat, loops)) / loops * 1e9
+
+
+def measure(benchmark: Benchmark, repeat: int = 5, min_time: float = 0.05) -> BenchmarkResult:
+    """
+    Измеряет время одного вызова функции
+    
+    Args:
+        benchmark: Бенчмарк
+        repeat: Число повторов серии
+        min_time: Минимальная длительность серии в секундах; число вызовов в серии подбирается автоматически
+    
+    Returns:
+        BenchmarkResult: Медианное и минимальное время одного вызова
+    """
+    timer = timeit.Timer(benchmark.func)
+    loops = _autorange(timer, min_time)
+    
+    samples = [elapsed / loops * 1e9 for elapsed in timer.repeat(repeat, loops)]
+    return BenchmarkResult(benchmark.name, statistics.median(samples), min(samples), loops, repeat)
+
+
+def measure_relative(benchmark: Benchmark, rounds: int = 3, repeat: int = 3, min_time: float = 0.05) -> BenchmarkResult:
+    """
+    Измеряет бенчмарк раундами, чередуя его с калибровочной нагрузкой
+    
+    В каждом раунде калибровка измеряется до и после серии бенчмарка, и
+    время бенчмарка делится на среднее из двух; итоговое отношение — медиана
+    по раундам. Так кратковременное замедление машины (частота процессора,
+    соседние процессы) сокращается в отношении, а единичный выброс не
+    попадает в результат.
+    
+    Args:
+        benchmark: Бенчмарк
+        rounds: Число раундов
+        repeat: Число серий бенчмарка и калибровки в раунде; берется минимальное время
+        min_time: Минимальная длительность серии бенчмарка в секундах
+    
+    Returns:
+        BenchmarkResult: Медианное и минимальное время по раундам, медианы калибровки и отношения
+    """
+    timer = timeit.Timer(benchmark.func)
+    loops = _autorange(timer, min_time)
+    calibration = timeit.Timer(_calibration_workload)
+    calibration_loops = _autorange(calibration, CALIBRATION_TIME)
+    
+    samples, calibrations, ratios = [], [], []
+    for _ in range(rounds):
+        before = _best_ns(calibration, repeat, calibration_loops)
+        elapsed = _best_ns(timer, repeat, loops)
+        after = _best_ns(calibration, repeat, calibration_loops)
+        samples.append(elapsed)
+        calibrations.append((before + after) / 2)
+        ratios.append(elapsed / calibrations[-1])
+    return BenchmarkResult(
+        benchmark.name,
+        statistics.median(samples),
+        min(samples),
+        loops,
+        rounds,
+        statistics.median(calibrations),
+        statistics.median(ratios),
+    )
+
+
+def _commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_suite(benchmarks: List[Benchmark], pattern: Optional[str] = None, rounds: int = 3, repeat: int = 3, min_time: float = 0.05) -> Dict[str, Any]:
+    """
+    Прогоняет набор бенчмарков
+    
+    Args:
+        benchmarks: Бенчмарки
+        pattern: Подстрока для отбора бенчмарков по имени
+        rounds: Число раундов, чередующихся с калибровкой
+        repeat: Число серий в раунде
+        min_time: Минимальная длительность серии в секундах
+    
+    Returns:
+        Dict[str, Any]: Метаданные прогона и результаты по именам
+    """
+    selected = [benchmark for benchmark in benchmarks if not pattern or pattern in benchmark.name]
+    results = {}
+    for benchmark in selected:
+        results[benchmark.name] = asdict(measure_relative(benchmark, rounds, repeat, min_time))
+    return {
+        "meta": {
+            "commit": _commit(),
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "implementation": platform.python_implementation(),
+            "machine": platform.machine(),
+        },
+        "results": results,
+    }
+
+
+def _run_selected(names: List[str], rounds: int, repeat: int, min_time: float) -> Dict[str, Any]:
+    from benchmarks.suite import build_suite
+    
+    return run_suite([benchmark for benchmark in build_suite() if benchmark.name in names], None, rounds, repeat, min_time)
+
+
+def merge_runs(runs: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Объединяет несколько прогонов: медиана по каждому бенчмарку
+    
+    Args:
+        runs: Результаты run_suite с одинаковым набором бенчмарков
+    
+    Returns:
+        Dict[str, Any]: Результат в формате run_suite; минимальное время — минимум по прогонам
+    """
+    results = {}
+    for name in runs[0]["results"]:
+        samples = [run["results"][name] for run in runs]
+        merged = dict(samples[0])
+        for key in ("median_ns", "calibration_ns", "ratio"):
+            merged[key] = statistics.median(sample[key] for sample in samples)
+        merged["min_ns"] = min(sample["min_ns"] for sample in samples)
+        merged["repeats"] = sum(sample["repeats"] for sample in samples)
+        results[name] = merged
+    return {"meta": {**runs[0]["meta"], "runs": len(runs)}, "results": results}
+
+
+def run_processes(names: List[str], runs: int = 3, rounds: int = 3, repeat: int = 3, min_time: float = 0.05) -> Dict[str, Any]:
+    """
+    Прогоняет бенчмарки по очереди в нескольких новых процессах и объединяет результаты
+    
+    Раскладка памяти складывается на весь процесс, и отдельные бенчмарки
+    в одном процессе стабильно быстрее, а в другом медленнее на десятки
+    процентов; медиана по процессам убирает это смещение.
+    
+    Args:
+        names: Имена бенчмарков из build_suite
+        runs: Число процессов
+        rounds: Число раундов в каждом процессе
+        repeat: Число серий в раунде
+        min_time: Минимальная длительность серии в секундах
+    
+    Returns:
+        Dict[str, Any]: Объединенный результат в формате run_suite
+    """
+    context = multiprocessing.get_context("spawn")
+    results = []
+    for _ in range(runs):
+        with ProcessPoolExecutor(1, mp_context=context) as pool:
+            results.append(pool.submit(_run_selected, names, rounds, repeat, min_time).result())
+    return merge_runs(results)
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], benchmarks: List[Benchmark], default_threshold: float = DEFAULT_THRESHOLD) -> List[Regression]:
+    """
+    Сравнивает прогон с базовой линией
+    
+    Сравниваются медианные по раундам отношения к калибровке; бенчмарки,
+    которых нет в базовой линии, пропускаются. Порог берется из бенчмарка,
+    а если он не задан — MICRO_THRESHOLD для бенчмарков быстрее
+    MICRO_BENCHMARK_NS в базовой линии и default_threshold для остальных.
+    
+    Args:
+        current: Результат run_suite
+        baseline: Сохраненная базовая линия
+        benchmarks: Бенчмарки с индивидуальными порогами
+        default_threshold: Допустимое замедление, если у бенчмарка нет своего порога
+    
+    Returns:
+        List[Regression]: Бенчмарки, замедлившиеся сильнее порога
+    """
+    thresholds = {benchmark.name: benchmark.threshold for benchmark in benchmarks}
+    
+    regressions = []
+    for name, result in current["results"].items():
+        if name not in baseline["results"]:
+            continue
+        baseline_ns = baseline["results"][name]["min_ns"]
+        change = _relative_change(result, baseline["results"][name])
+        current_ns = baseline_ns * (1 + change)
+        threshold = thresholds.get(name) or (MICRO_THRESHOLD if baseline_ns < MICRO_BENCHMARK_NS else default_threshold)
+        if change > threshold:
+            regressions.append(Regression(name, baseline_ns, current_ns, change, threshold))
+    return regressions
+
+
+def _relative_change(current: Dict[str, Any], baseline: Dict[str, Any]) -> float:
+    return BenchmarkResult(**current).relative / BenchmarkResult(**baseline).relative - 1
+
+
+def format_report(current: Dict[str, Any], baseline: Optional[Dict[str, Any]]) -> str:
+    """Таблица результатов с нормированным изменением относительно базовой линии"""
+    width = max((len(name) for name in current["results"]), default=10)
+    lines = [f"{'benchmark':<{width}}  {'median':>12}  {'min':>12}  {'baseline':>12}  {'change':>8}"]
+    for name, result in current["results"].items():
+        line = f"{name:<{width}}  {result['median_ns']:>10.0f}ns  {result['min_ns']:>10.0f}ns"
+        if baseline and name in baseline["results"]:
+            baseline_ns = baseline["results"][name]["min_ns"]
+            line += f"  {baseline_ns:>10.0f}ns  {_relative_change(result, baseline['results'][name]):>+7.1%}"
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def main():
+    """Точка входа: python -m benchmarks.runner [--save] [--filter lobby]"""
+    from benchmarks.suite import build_suite
+    
+    parser = argparse.ArgumentParser(description="Микро-бенчмарки моделей, валидаторов, промптов и отрисовки лобби")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Файл базовой линии")
+    parser.add_argument("--save", action="store_true", help="Сохранить результаты как новую базовую линию")
+    parser.add_argument("--output", help="Сохранить результаты прогона в файл")
+    parser.add_argument("--filter", help="Запускать только бенчмарки, имя которых содержит подстроку")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="Допустимое замедление, доля")
+    parser.add_argument("--runs", type=int, default=3, help="Число процессов, по которым берется медиана")
+    parser.add_argument("--rounds", type=int, default=3, help="Число раундов в процессе, чередующихся с калибровкой")
+    parser.add_argument("--repeat", type=int, default=3, help="Число серий в раунде")
+    parser.add_argument("--min-time", type=float, default=0.05)
+    parser.add_argument("--confirm", type=int, default=2, help="Сколько раз перемерить регрессию, прежде чем ее сообщить")
+    args = parser.parse_args()
+    
+    logging.basicConfig(level=logging.WARNING)
+    
+    benchmarks = build_suite()
+    names = [benchmark.name for benchmark in benchmarks if not args.filter or args.filter in benchmark.name]
+    current = run_processes(names, args.runs, args.rounds, args.repeat, args.min_time)
+    
+    baseline = None
+    if os.path.exists(args.baseline) and not args.save:
+        with open(args.baseline, "r", encoding="utf-8") as file:
+            baseline = json.load(file)
+    
+    print(format_report(current, baseline))
+    
+    for path in filter(None, [args.output, args.baseline if args.save else None]):
+        with open(path, "w", encoding="utf-8") as file:
+            json.dump(current, file, ensure_ascii=False, indent=2)
+        print(f"Результаты сохранены в {path}")
+    
+    if baseline:
+        regressions = compare(current, baseline, benchmarks, args.threshold)
+        for _ in range(args.confirm):
+            if not regressions:
+                break
+            # Регрессией считается только замедление, которое повторяется в каждом перемере
+            rerun = run_processes([regression.name for regression in regressions], args.runs, args.rounds, args.repeat, args.min_time)
+            regressions = compare(rerun, baseline, benchmarks, args.threshold)
+        for regression in regressions:
+            print(f"РЕГРЕССИЯ {regression.name}: {regression.change:+.1%} (порог {regression.threshold:.0%})")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
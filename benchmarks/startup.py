@@ -0,0 +1,123 @@
+import argparse
+import asyncio
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+from typing import Dict, List
+
+from loadtest.fake_bot_api import FakeBotAPI
+
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Бюджет времени импорта main в секундах; тест падает, если импорт стал медленнее
+IMPORT_TIME_BUDGET = 1.5
+
+# Модули, которые не должны загружаться при старте, пока соответствующий бэкенд не выбран
+HEAVY_MODULES = ("google.generativeai", "grpc", "google.ai.generativelanguage")
+
+IMPORTTIME_PATTERN = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)$")
+
+
+def import_times(module: str = "main") -> Dict[str, float]:
+    """
+    Измеряет время импорта модуля в отдельном интерпретаторе через -X importtime
+    
+    Args:
+        module: Импортируемый модуль
+    
+    Returns:
+        Dict[str, float]: Накопленное время импорта каждого модуля верхнего уровня в секундах
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=PROJECT_ROOT, capture_output=True, text=True, check=True,
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_PATTERN.match(line)
+        if match:
+            times[match.group(4)] = int(match.group(2)) / 1e6
+    return times
+
+
+def loaded_modules(code: str) -> List[str]:
+    """Модули, загруженные после выполнения кода в отдельном интерпретаторе"""
+    result = subprocess.run(
+        [sys.executable, "-c", f"{code}\nimport json, sys\nprint(json.dumps(sorted(sys.modules)))"],
+        cwd=PROJECT_ROOT, capture_output=True, text=True, check=True,
+    )
+    return json.loads(result.stdout.splitlines()[-1])
+
+
+async def measure_startup(timeout: float = 30.0) -> float:
+    """
+    Запускает main.py против заглушки Bot API и измеряет время до первого getUpdates
+    
+    Args:
+        timeout: Максимальное время ожидания
+    
+    Returns:
+        float: Секунды от запуска процесса до первого запроса getUpdates
+    """
+    api = FakeBotAPI()
+    await api.start()
+    env = dict(
+        os.environ,
+        BOT_TOKEN=api.token,
+        TELEGRAM_API_BASE_URL=api.base_url,
+        AI_SERVICE_TYPE="mock",
+        METRICS_PORT="0",
+        LOG_LEVEL="WARNING",
+    )
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "main.py"], cwd=PROJECT_ROOT, env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        while not api.method_counts["getUpdates"]:
+            if process.poll() is not None:
+                raise RuntimeError(f"main.py завершился с кодом {process.returncode} до первого getUpdates")
+            if time.perf_counter() - started > timeout:
+                raise TimeoutError(f"Нет getUpdates за {timeout} с")
+            await asyncio.sleep(0.005)
+        return time.perf_counter() - started
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+        await api.stop()
+
+
+def main():
+    """Точка входа: python -m benchmarks.startup [--runs 5]"""
+    parser = argparse.ArgumentParser(description="Время старта бота: импорт main и время до первого getUpdates")
+    parser.add_argument("--runs", type=int, default=5, help="Количество запусков процесса")
+    args = parser.parse_args()
+    
+    times = import_times()
+    top = sorted(((name, seconds) for name, seconds in times.items() if "." not in name and name not in ("main", "site")), key=lambda item: item[1], reverse=True)
+    print(f"Импорт main: {times['main'] * 1000:.0f} мс (бюджет {IMPORT_TIME_BUDGET * 1000:.0f} мс)")
+    for name, seconds in top[:8]:
+        print(f"  {name:<28} {seconds * 1000:8.1f} мс")
+    
+    startups = [asyncio.run(measure_startup()) for _ in range(args.runs)]
+    print(
+        f"До первого getUpdates: медиана {statistics.median(startups) * 1000:.0f} мс, "
+        f"мин. {min(startups) * 1000:.0f} мс, макс. {max(startups) * 1000:.0f} мс ({args.runs} запусков)"
+    )
+    
+    if times["main"] > IMPORT_TIME_BUDGET:
+        print("Импорт main превышает бюджет")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+from typing import Dict, List
+
+from handlers.command_handlers import render_lobby_status
+from models import Player, Lobby, GameState, GameMode
+from services.ai.mock_service import MockAIService, MockBehavior
+from utils.helpers import validate_name, validate_scenario, validate_action
+from benchmarks.runner import Benchmark
+
+
+PLAYER_COUNTS = [1, 5, 10, 50]
+
+SCENARIO = (
+    "Вы оказались на заброшенной космической станции, где отказала система жизнеобеспечения. "
+    "До прибытия спасательного корабля осталось три часа, а кислорода хватит только на половину экипажа. "
+    "Где-то в отсеках бродит сбежавший из лаборатории робот-уборщик, который считает людей мусором."
+)
+
+ACTION = "Надеваю скафандр, иду в реакторный отсек и пытаюсь перезапустить систему вручную, пока остальные отвлекают робота."
+
+
+def make_players(count: int, with_actions: int = 0) -> Dict[int, Player]:
+    """Игроки с одинаковыми по длине именами; первые with_actions уже отправили действие"""
+    players = {}
+    for index in range(count):
+        player = Player(user_id=1000 + index, first_name="Игрок", last_name=f"Номер{index:03d}", is_captain=index == 0)
+        if index < with_actions:
+            player.action = ACTION
+        players[player.user_id] = player
+    return players
+
+
+def make_lobby(count: int, with_actions: int = 0, state: GameState = GameState.WAITING_FOR_ACTIONS) -> Lobby:
+    """Лобби с заданным числом игроков"""
+    lobby = Lobby(id="bench123", scenario=SCENARIO, game_state=state)
+    for player in make_players(count, with_actions).values():
+        lobby.add_player(player)
+    return lobby
+
+
+def lobby_benchmarks() -> List[Benchmark]:
+    benchmarks = []
+    for count in PLAYER_COUNTS:
+        half = count // 2
+        
+        lobby = make_lobby(count - 1)
+        newcomer = Player(user_id=1, first_name="Новый", last_name="Игрок")
+        
+        def add_remove(lobby=lobby, newcomer=newcomer):
+            lobby.add_player(newcomer)
+            lobby.remove_player(newcomer.user_id)
+        
+        full = make_lobby(count, with_actions=count)
+        partial = make_lobby(count, with_actions=half)
+        
+        def reset(lobby=make_lobby(count, with_actions=count)):
+            lobby.reset_actions()
+        
+        benchmarks += [
+            Benchmark(f"lobby.add_remove_player[{count}]", add_remove),
+            Benchmark(f"lobby.all_players_submitted_actions[{count}]", full.all_players_submitted_actions),
+            Benchmark(f"lobby.get_players_with_actions[{count}]", partial.get_players_with_actions),
+            Benchmark(f"lobby.get_players_without_actions[{count}]", partial.get_players_without_actions),
+            Benchmark(f"lobby.reset_actions[{count}]", reset),
+        ]
+    return benchmarks
+
+
+def validator_benchmarks() -> List[Benchmark]:
+    long_scenario = (SCENARIO * 2)[:500]
+    return [
+        Benchmark("validate_name[valid]", lambda: validate_name("Иван Иванов")),
+        Benchmark("validate_name[invalid]", lambda: validate_name("Иван 123")),
+        Benchmark("validate_scenario[typical]", lambda: validate_scenario(SCENARIO)),
+        Benchmark("validate_scenario[max_length]", lambda: validate_scenario(long_scenario)),
+        Benchmark("validate_action[valid]", lambda: validate_action(ACTION)),
+        Benchmark("validate_action[invalid]", lambda: validate_action(ACTION + " <script>")),
+    ]
+
+
+def prompt_benchmarks() -> List[Benchmark]:
+    service = MockAIService(MockBehavior(latency="fixed:0"))
+    benchmarks = []
+    for count in PLAYER_COUNTS:
+        players = make_players(count, with_actions=count)
+        benchmarks += [
+            Benchmark(f"prompt.competitive[{count}]", lambda players=players: service._build_competitive_prompt(SCENARIO, players)),
+            Benchmark(f"prompt.cooperative[{count}]", lambda players=players: service._build_cooperative_prompt(SCENARIO, players)),
+            Benchmark(
+                f"fallback.competitive[{count}]",
+                lambda players=players: service._generate_fallback_response(SCENARIO, players, GameMode.EVERY_MAN_FOR_HIMSELF),
+            ),
+            Benchmark(
+                f"fallback.cooperative[{count}]",
+                lambda players=players: service._generate_fallback_response(SCENARIO, players, GameMode.BROTHERHOOD),
+            ),
+        ]
+    return benchmarks
+
+
+def render_benchmarks() -> List[Benchmark]:
+    benchmarks = []
+    for count in PLAYER_COUNTS:
+        waiting = make_lobby(count, state=GameState.WAITING_FOR_PLAYERS)
+        acting = make_lobby(count, with_actions=count // 2)
+        benchmarks += [
+            Benchmark(f"render_lobby_status.waiting_for_players[{count}]", lambda lobby=waiting: render_lobby_status(lobby)),
+            Benchmark(f"render_lobby_status.waiting_for_actions[{count}]", lambda lobby=acting: render_lobby_status(lobby)),
+        ]
+    return benchmarks
+
+
+def build_suite() -> List[Benchmark]:
+    """
+    Все бенчмарки кода, который выполняется на каждом обновлении
+    
+    Returns:
+        List[Benchmark]: Бенчмарки моделей, валидаторов, промптов, резервного ответа и отрисовки лобби
+    """
+    return lobby_benchmarks() + validator_benchmarks() + prompt_benchmarks() + render_benchmarks()
@@ -4,10 +4,129 @@ from dotenv import load_dotenv
 load_dotenv()
 
 BOT_TOKEN = os.getenv("BOT_TOKEN")
+TELEGRAM_API_BASE_URL = os.getenv("TELEGRAM_API_BASE_URL", "")
+
+BOT_MODE = os.getenv("BOT_MODE", "polling")
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8443"))
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "telegram")
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")
+WEBHOOK_SECRET_TOKEN = os.getenv("WEBHOOK_SECRET_TOKEN", "")
+UPDATE_CONCURRENCY = int(os.getenv("UPDATE_CONCURRENCY", "32"))
+INBOUND_RATE_PER_SECOND = float(os.getenv("INBOUND_RATE_PER_SECOND", "1"))
+INBOUND_BURST = float(os.getenv("INBOUND_BURST", "8"))
+
+TELEGRAM_POOL_SIZE = int(os.getenv("TELEGRAM_POOL_SIZE", "64"))
+TELEGRAM_GET_UPDATES_POOL_SIZE = int(os.getenv("TELEGRAM_GET_UPDATES_POOL_SIZE", "1"))
+TELEGRAM_HTTP_VERSION = os.getenv("TELEGRAM_HTTP_VERSION", "1.1")
+TELEGRAM_CONNECT_TIMEOUT = float(os.getenv("TELEGRAM_CONNECT_TIMEOUT", "5"))
+TELEGRAM_READ_TIMEOUT = float(os.getenv("TELEGRAM_READ_TIMEOUT", "10"))
+TELEGRAM_POOL_TIMEOUT = float(os.getenv("TELEGRAM_POOL_TIMEOUT", "5"))
+TELEGRAM_WARM_CONNECTIONS = int(os.getenv("TELEGRAM_WARM_CONNECTIONS", "4"))
+AI_HTTP_POOL_SIZE = int(os.getenv("AI_HTTP_POOL_SIZE", "16"))
+AI_HTTP_VERSION = os.getenv("AI_HTTP_VERSION", "1.1")
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "60"))
+
+SHARD_WORKERS = int(os.getenv("SHARD_WORKERS", "0")) or os.cpu_count() or 1
+SHARD_INDEX = int(os.getenv("SHARD_INDEX", "0"))
+SHARD_BASE_PORT = int(os.getenv("SHARD_BASE_PORT", "9200"))
+SHARD_STORE = os.getenv("SHARD_STORE", os.path.join("data", "shards.sqlite3"))
+PERSISTENCE_FILE = os.getenv("PERSISTENCE_FILE", os.path.join("data", "state.sqlite3"))
+PERSISTENCE_FLUSH_INTERVAL = float(os.getenv("PERSISTENCE_FLUSH_INTERVAL", "5"))
+LOBBY_IDLE_SECONDS = float(os.getenv("LOBBY_IDLE_SECONDS", "600"))
+LOBBY_TIERING_INTERVAL = float(os.getenv("LOBBY_TIERING_INTERVAL", "60"))
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+GEMINI_API_KEYS = [key.strip() for key in os.getenv("GEMINI_API_KEYS", GEMINI_API_KEY or "").split(",") if key.strip()]
+GEMINI_POOL_MODELS = [name.strip() for name in os.getenv("GEMINI_POOL_MODELS", "gemini-2.0-flash-lite").split(",") if name.strip()]
+GEMINI_RPM_LIMIT = float(os.getenv("GEMINI_RPM_LIMIT", "30"))
+GEMINI_TPM_LIMIT = float(os.getenv("GEMINI_TPM_LIMIT", "1000000"))
+GEMINI_KEY_COOLDOWN = float(os.getenv("GEMINI_KEY_COOLDOWN", "60"))
+GEMINI_TRANSPORT = os.getenv("GEMINI_TRANSPORT", "")
+GEMINI_API_ENDPOINT = os.getenv("GEMINI_API_ENDPOINT", "")
+GEMINI_REST_MODEL = os.getenv("GEMINI_REST_MODEL", "gemini-2.0-flash-lite")
+GEMINI_REST_STREAM = os.getenv("GEMINI_REST_STREAM", "true").lower() in ("1", "true", "yes")
+GEMINI_REST_TIMEOUT = float(os.getenv("GEMINI_REST_TIMEOUT", "60"))
+
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL", "http://localhost:8080/v1")
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
+OPENAI_MODEL = os.getenv("OPENAI_MODEL", "local-model")
+OPENAI_FAST_MODEL = os.getenv("OPENAI_FAST_MODEL", "")
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "60"))
+
+ROUTER_BACKENDS = [name.strip() for name in os.getenv("ROUTER_BACKENDS", "gemini,openai").split(",") if name.strip()]
+ROUTER_STATS_WINDOW = int(os.getenv("ROUTER_STATS_WINDOW", "50"))
+ROUTER_ERROR_PENALTY = float(os.getenv("ROUTER_ERROR_PENALTY", "4"))
+ROUTER_EXPLORATION = float(os.getenv("ROUTER_EXPLORATION", "0.05"))
 
 AI_SERVICE_TYPE = os.getenv("AI_SERVICE_TYPE", "gemini")
 
+MOCK_LATENCY = os.getenv("MOCK_LATENCY", "fixed:0.5")
+MOCK_STREAM_CHUNKS_PER_SECOND = float(os.getenv("MOCK_STREAM_CHUNKS_PER_SECOND", "50"))
+MOCK_STREAM_CHUNK_SIZE = int(os.getenv("MOCK_STREAM_CHUNK_SIZE", "64"))
+MOCK_ERROR_RATE = float(os.getenv("MOCK_ERROR_RATE", "0"))
+MOCK_ERROR_STATUS = int(os.getenv("MOCK_ERROR_STATUS", "503"))
+MOCK_SEED = int(os.getenv("MOCK_SEED")) if os.getenv("MOCK_SEED") else None
+
+AI_RETRY_MAX_ATTEMPTS = int(os.getenv("AI_RETRY_MAX_ATTEMPTS", "3"))
+AI_RETRY_BASE_DELAY = float(os.getenv("AI_RETRY_BASE_DELAY", "0.5"))
+AI_RETRY_MAX_DELAY = float(os.getenv("AI_RETRY_MAX_DELAY", "8"))
+AI_BREAKER_FAILURE_THRESHOLD = int(os.getenv("AI_BREAKER_FAILURE_THRESHOLD", "5"))
+AI_BREAKER_RESET_TIMEOUT = float(os.getenv("AI_BREAKER_RESET_TIMEOUT", "30"))
+
+ROUND_TIME_BUDGET = float(os.getenv("ROUND_TIME_BUDGET", "60"))
+AI_MIN_CALL_BUDGET = float(os.getenv("AI_MIN_CALL_BUDGET", "3"))
+AI_REDUCED_OUTPUT_BUDGET = float(os.getenv("AI_REDUCED_OUTPUT_BUDGET", "20"))
+AI_REDUCED_MAX_OUTPUT_TOKENS = int(os.getenv("AI_REDUCED_MAX_OUTPUT_TOKENS", "1024"))
+AI_MAX_OUTPUT_TOKENS = int(os.getenv("AI_MAX_OUTPUT_TOKENS", "4096"))
+AI_MIN_OUTPUT_TOKENS = int(os.getenv("AI_MIN_OUTPUT_TOKENS", "384"))
+AI_SCENARIO_ENRICHMENT = os.getenv("AI_SCENARIO_ENRICHMENT", "false").lower() in ("1", "true", "yes")
+AI_ENRICHMENT_MAX_OUTPUT_TOKENS = int(os.getenv("AI_ENRICHMENT_MAX_OUTPUT_TOKENS", "768"))
+AI_ENRICHMENT_MAX_WAIT = float(os.getenv("AI_ENRICHMENT_MAX_WAIT", "5"))
+AI_OUTPUT_TOKENS_BASE = int(os.getenv("AI_OUTPUT_TOKENS_BASE", "1024"))
+AI_OUTPUT_TOKENS_PER_PLAYER = int(os.getenv("AI_OUTPUT_TOKENS_PER_PLAYER", "384"))
+AI_BUSY_QUEUE_DEPTH = int(os.getenv("AI_BUSY_QUEUE_DEPTH", "2"))
+AI_OVERLOAD_QUEUE_DEPTH = int(os.getenv("AI_OVERLOAD_QUEUE_DEPTH", "8"))
+AI_BUSY_OUTPUT_FACTOR = float(os.getenv("AI_BUSY_OUTPUT_FACTOR", "0.6"))
+AI_OVERLOAD_OUTPUT_FACTOR = float(os.getenv("AI_OVERLOAD_OUTPUT_FACTOR", "0.35"))
+GEMINI_FAST_MODEL = os.getenv("GEMINI_FAST_MODEL", "")
+DELIVERY_MIN_TIMEOUT = float(os.getenv("DELIVERY_MIN_TIMEOUT", "5"))
+AI_DEADLINE_GRACE = float(os.getenv("AI_DEADLINE_GRACE", "1"))
+
+AI_MAX_CONCURRENT_EVALUATIONS = int(os.getenv("AI_MAX_CONCURRENT_EVALUATIONS", "4"))
+AI_INITIAL_SERVICE_TIME = float(os.getenv("AI_INITIAL_SERVICE_TIME", "10"))
+
+AI_LOBBY_ROUNDS_PER_MINUTE = float(os.getenv("AI_LOBBY_ROUNDS_PER_MINUTE", "3"))
+AI_LOBBY_TOKENS_PER_HOUR = float(os.getenv("AI_LOBBY_TOKENS_PER_HOUR", "150000"))
+AI_USER_ROUNDS_PER_MINUTE = float(os.getenv("AI_USER_ROUNDS_PER_MINUTE", "4"))
+AI_USER_TOKENS_PER_HOUR = float(os.getenv("AI_USER_TOKENS_PER_HOUR", "200000"))
+
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9101"))
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")
+LOG_SAMPLING = os.getenv("LOG_SAMPLING", "httpx=0.1")
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+LOG_PLAYER_TEXT = os.getenv("LOG_PLAYER_TEXT", "false").lower() in ("1", "true", "yes")
+
+HEALTH_HOST = os.getenv("HEALTH_HOST", "127.0.0.1")
+HEALTH_PORT = int(os.getenv("HEALTH_PORT", "8088"))
+HEALTH_LIVENESS_TIMEOUT = float(os.getenv("HEALTH_LIVENESS_TIMEOUT", "5"))
+
+LOOP_LAG_THRESHOLD = float(os.getenv("LOOP_LAG_THRESHOLD", "0.25"))
+LOOP_LAG_INTERVAL = float(os.getenv("LOOP_LAG_INTERVAL", "0.05"))
+
+ADMIN_IDS = {int(user_id) for user_id in os.getenv("ADMIN_IDS", "").split(",") if user_id.strip()}
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_SAMPLE_INTERVAL = float(os.getenv("PROFILE_SAMPLE_INTERVAL", "0.005"))
+PROFILE_TOP_N = int(os.getenv("PROFILE_TOP_N", "15"))
+
+TRACING_EXPORTER = os.getenv("TRACING_EXPORTER", "none")
+TRACING_FILE = os.getenv("TRACING_FILE", os.path.join("traces", "spans.jsonl"))
+TRACING_OTLP_ENDPOINT = os.getenv("TRACING_OTLP_ENDPOINT", "http://localhost:4318/v1/traces")
+TRACING_SERVICE_NAME = os.getenv("TRACING_SERVICE_NAME", "survival-bot")
+TRACING_SAMPLE_RATE = float(os.getenv("TRACING_SAMPLE_RATE", "1.0"))
+
 MIN_PLAYERS = 1
 MAX_PLAYERS = 10
 MAX_NAME_LENGTH = 30
@@ -1,8 +1,18 @@
+import logging
+import math
+
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes, ConversationHandler
 
 from models import Player, Lobby, GameState, GameMode, user_states, lobbies, user_to_lobby
+from services.budget import BudgetRejection, round_budgets
+from services.enrichment import scenario_enricher
 from utils.helpers import generate_lobby_id, validate_name, get_random_scenario, validate_scenario
+from utils.metrics import AI_FALLBACKS, record_send_failure
+from utils.structured_logging import player_text
+from utils.tracing import current_span, start_span
+
+logger = logging.getLogger(__name__)
 
 
 
@@ -29,8 +39,9 @@ async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> i
         "Для начала, пожалуйста, введите своё имя и фамилию:"
     )
     
-    
-    user_states[user_id] = {}
+    # Профиль — это context.user_data, чтобы его сохраняла persistence вместе с состоянием диалога
+    context.user_data.clear()
+    user_states[user_id] = context.user_data
     
     return ENTER_FULL_NAME
 
@@ -302,7 +313,8 @@ async def join_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> in
     
     
     if user_id not in user_states or 'first_name' not in user_states[user_id]:
-        user_states[user_id] = {}
+        context.user_data.clear()
+        user_states[user_id] = context.user_data
         await update.message.reply_text(
             "Для присоединения к лобби, сначала введите свое полное имя (имя и фамилию):"
         )
@@ -447,9 +459,16 @@ async def start_game_command(update: Update, context: ContextTypes.DEFAULT_TYPE)
     return IN_LOBBY
 
 
-async def send_lobby_info(update: Update, context: ContextTypes.DEFAULT_TYPE, lobby: Lobby):
-    """Отправляет информацию о лобби"""
+def render_lobby_status(lobby: Lobby) -> str:
+    """
+    Формирует текст с информацией о лобби
     
+    Args:
+        lobby: Лобби
+        
+    Returns:
+        str: Текст в формате Markdown: ID, статус, режим, игроки, сценарий и отправленные действия
+    """
     players_info = []
     for player in lobby.players.values():
         captain_mark = "👑 " if player.is_captain else ""
@@ -458,29 +477,6 @@ async def send_lobby_info(update: Update, context: ContextTypes.DEFAULT_TYPE, lo
     players_list = "\n".join(players_info)
     
     
-    keyboard = []
-    
-    
-    if lobby.game_state == GameState.WAITING_FOR_PLAYERS:
-        keyboard.append([
-            InlineKeyboardButton("Пригласить игроков", switch_inline_query=f"{lobby.id}")
-        ])
-    
-    
-    user_id = update.effective_user.id
-    if user_id in lobby.players and lobby.players[user_id].is_captain and lobby.game_state == GameState.WAITING_FOR_PLAYERS:
-        keyboard.append([
-            InlineKeyboardButton("Начать игру", callback_data="start_game")
-        ])
-    
-    
-    keyboard.append([
-        InlineKeyboardButton("Покинуть лобби", callback_data="leave_lobby")
-    ])
-    
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    
-    
     if lobby.game_state == GameState.WAITING_FOR_PLAYERS:
         status_text = "Ожидание игроков"
     elif lobby.game_state == GameState.WAITING_FOR_SCENARIO:
@@ -514,6 +510,36 @@ async def send_lobby_info(update: Update, context: ContextTypes.DEFAULT_TYPE, lo
         message += f"\n\nОжидаем действия от:\n"
         message += "\n".join(waiting) if waiting else "Все отправили свои действия"
     
+    return message
+
+
+async def send_lobby_info(update: Update, context: ContextTypes.DEFAULT_TYPE, lobby: Lobby):
+    """Отправляет информацию о лобби"""
+    
+    keyboard = []
+    
+    
+    if lobby.game_state == GameState.WAITING_FOR_PLAYERS:
+        keyboard.append([
+            InlineKeyboardButton("Пригласить игроков", switch_inline_query=f"{lobby.id}")
+        ])
+    
+    
+    user_id = update.effective_user.id
+    if user_id in lobby.players and lobby.players[user_id].is_captain and lobby.game_state == GameState.WAITING_FOR_PLAYERS:
+        keyboard.append([
+            InlineKeyboardButton("Начать игру", callback_data="start_game")
+        ])
+    
+    
+    keyboard.append([
+        InlineKeyboardButton("Покинуть лобби", callback_data="leave_lobby")
+    ])
+    
+    reply_markup = InlineKeyboardMarkup(keyboard)
+    
+    message = render_lobby_status(lobby)
+    
     sent_message = await update.message.reply_text(
         message,
         parse_mode='Markdown',
@@ -528,49 +554,10 @@ async def send_lobby_info(update: Update, context: ContextTypes.DEFAULT_TYPE, lo
 async def broadcast_lobby_update(context: ContextTypes.DEFAULT_TYPE, lobby: Lobby):
     """Обновляет информацию о лобби для всех игроков"""
     
-    players_info = []
-    for player in lobby.players.values():
-        captain_mark = "👑 " if player.is_captain else ""
-        players_info.append(f"{captain_mark}{player.first_name} {player.last_name}")
-    
-    players_list = "\n".join(players_info)
-    
-    
-    if lobby.game_state == GameState.WAITING_FOR_PLAYERS:
-        status_text = "Ожидание игроков"
-    elif lobby.game_state == GameState.WAITING_FOR_SCENARIO:
-        status_text = "Ожидание выбора сценария капитаном"
-    elif lobby.game_state == GameState.WAITING_FOR_ACTIONS:
-        status_text = "Ожидание действий игроков"
-    elif lobby.game_state == GameState.PROCESSING_RESULTS:
-        status_text = "Обработка результатов"
-    else:
-        status_text = "Игра окончена"
-    
-    message = (
-        f"🎮 ЛОББИ ID: `{lobby.id}`\n\n"
-        f"Статус: {status_text}\n"
-        f"Режим: {lobby.game_mode.value}\n\n"
-        f"Игроки ({len(lobby.players)}):\n{players_list}"
-    )
-    
-    
-    if lobby.scenario and lobby.game_state in [GameState.WAITING_FOR_ACTIONS, GameState.PROCESSING_RESULTS]:
-        message += f"\n\nСценарий:\n{lobby.scenario}"
-    
+    message = render_lobby_status(lobby)
     
-    if lobby.game_state == GameState.WAITING_FOR_ACTIONS:
-        submitted = [f"{p.first_name} {p.last_name}" for p in lobby.get_players_with_actions().values()]
-        waiting = [f"{p.first_name} {p.last_name}" for p in lobby.get_players_without_actions().values()]
-        
-        message += f"\n\nОтправили действия ({len(submitted)}/{len(lobby.players)}):\n"
-        message += "\n".join(submitted) if submitted else "Никто пока не отправил"
-        
-        message += f"\n\nОжидаем действия от:\n"
-        message += "\n".join(waiting) if waiting else "Все отправили свои действия"
-    
-    
-    for user_id in lobby.players:
+    # Копия списка: пока идет рассылка, обновления других игроков могут изменить состав лобби
+    for user_id in list(lobby.players):
         
         keyboard = []
         
@@ -601,7 +588,8 @@ async def broadcast_lobby_update(context: ContextTypes.DEFAULT_TYPE, lobby: Lobb
                 reply_markup=reply_markup
             )
         except Exception as e:
-            print(f"Ошибка при отправке обновления игроку {user_id}: {e}")
+            record_send_failure(e)
+            logger.error(f"Ошибка при отправке обновления игроку {user_id}: {e}")
 
 
 async def leave_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
@@ -694,6 +682,25 @@ async def start_game_callback(update: Update, context: ContextTypes.DEFAULT_TYPE
     return IN_LOBBY
 
 
+BUDGET_REJECTION_REASONS = {
+    ("lobby", "rounds"): "Лобби запускает раунды слишком часто: не больше {limit} в минуту",
+    ("user", "rounds"): "Вы запускаете раунды слишком часто: не больше {limit} в минуту",
+    ("lobby", "tokens"): "Лобби исчерпало лимит генерации на час",
+    ("user", "tokens"): "Вы исчерпали лимит генерации на час",
+}
+
+
+def budget_rejection_text(rejection: BudgetRejection) -> str:
+    """Объяснение капитану, почему раунд пока нельзя начать"""
+    if rejection.retry_after < 120:
+        wait = f"{math.ceil(rejection.retry_after)} с"
+    else:
+        wait = f"{math.ceil(rejection.retry_after / 60)} мин"
+    
+    reason = BUDGET_REJECTION_REASONS[(rejection.scope, rejection.kind)].format(limit=int(rejection.limit))
+    return f"{reason}. Новый раунд можно начать через {wait}. Лимиты делят AI-сервис поровну между всеми лобби."
+
+
 async def enter_scenario_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Обработчик кнопки 'Ввести свой сценарий'"""
     query = update.callback_query
@@ -719,6 +726,12 @@ async def enter_scenario_callback(update: Update, context: ContextTypes.DEFAULT_
         return IN_LOBBY
     
     
+    rejection = round_budgets.check(lobby_id, user_id)
+    if rejection:
+        await query.message.reply_text(budget_rejection_text(rejection))
+        return IN_LOBBY
+    
+    
     user_states[user_id]['awaiting_scenario'] = True
     
     await query.message.reply_text(
@@ -753,6 +766,12 @@ async def random_scenario_callback(update: Update, context: ContextTypes.DEFAULT
         return IN_LOBBY
     
     
+    rejection = round_budgets.try_start_round(lobby_id, user_id)
+    if rejection:
+        await query.message.reply_text(budget_rejection_text(rejection))
+        return IN_LOBBY
+    
+    
     scenario = get_random_scenario()
     
     
@@ -761,6 +780,7 @@ async def random_scenario_callback(update: Update, context: ContextTypes.DEFAULT
     
     
     lobby.reset_actions()
+    scenario_enricher.start(lobby)
     
     await query.message.reply_text(
         f"Выбран случайный сценарий!\n\n{scenario}\n\nИгроки могут теперь отправлять свои действия."
@@ -770,7 +790,7 @@ async def random_scenario_callback(update: Update, context: ContextTypes.DEFAULT
     await broadcast_lobby_update(context, lobby)
     
     
-    for player_id in lobby.players:
+    for player_id in list(lobby.players):
         if player_id != user_id:  
             try:
                 await context.bot.send_message(
@@ -778,7 +798,8 @@ async def random_scenario_callback(update: Update, context: ContextTypes.DEFAULT
                     text=f"Новый сценарий от капитана:\n\n{scenario}\n\nОпишите ваши действия:"
                 )
             except Exception as e:
-                print(f"Ошибка при отправке сценария игроку {player_id}: {e}")
+                record_send_failure(e)
+                logger.error(f"Ошибка при отправке сценария игроку {player_id}: {e}")
     
     return IN_LOBBY
 
@@ -804,6 +825,13 @@ async def message_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
             return IN_LOBBY
         
         
+        # Сценарий остается ожидаемым, чтобы капитан мог отправить его позже
+        rejection = round_budgets.try_start_round(lobby_id, user_id)
+        if rejection:
+            await update.message.reply_text(budget_rejection_text(rejection))
+            return IN_LOBBY
+        
+        
         lobby.scenario = message_text
         lobby.game_state = GameState.WAITING_FOR_ACTIONS
         
@@ -812,6 +840,7 @@ async def message_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         
         
         lobby.reset_actions()
+        scenario_enricher.start(lobby)
         
         await update.message.reply_text(
             f"Сценарий принят!\n\n{message_text}\n\nИгроки могут теперь отправлять свои действия."
@@ -821,7 +850,7 @@ async def message_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         await broadcast_lobby_update(context, lobby)
         
         
-        for player_id in lobby.players:
+        for player_id in list(lobby.players):
             if player_id != user_id:  
                 try:
                     await context.bot.send_message(
@@ -829,7 +858,8 @@ async def message_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
                         text=f"Новый сценарий от капитана:\n\n{message_text}\n\nОпишите ваши действия:"
                     )
                 except Exception as e:
-                    print(f"Ошибка при отправке сценария игроку {player_id}: {e}")
+                    record_send_failure(e)
+                    logger.error(f"Ошибка при отправке сценария игроку {player_id}: {e}")
         
         return IN_LOBBY
     
@@ -854,15 +884,12 @@ async def message_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         await broadcast_lobby_update(context, lobby)
         
         
-        if lobby.all_players_submitted_actions():
-            
+        # Действия игроков обрабатываются параллельно, раунд запускает только первый заметивший
+        if lobby.all_players_submitted_actions() and lobby.game_state == GameState.WAITING_FOR_ACTIONS:
             lobby.game_state = GameState.PROCESSING_RESULTS
             
-            
-            await broadcast_lobby_update(context, lobby)
-            
-            
-            await process_game_results(context, lobby)
+            # Раунд идет в фоне: обработчик не держит очередь игрока и слот обработки обновлений на весь бюджет раунда
+            context.application.create_task(run_round(context, lobby), update=update)
         
         return IN_LOBBY
     
@@ -870,44 +897,124 @@ async def message_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     return IN_LOBBY
 
 
+async def adopted_message_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """Текст пользователя, чей диалог начат в другом процессе (многопроцессный режим)"""
+    user_id = update.effective_user.id
+    
+    if user_id in user_to_lobby:
+        return await message_handler(update, context)
+    
+    if 'first_name' in user_states.get(user_id, {}):
+        return await wait_for_lobby_id(update, context)
+    
+    return ConversationHandler.END
+
+
+async def run_round(context: ContextTypes.DEFAULT_TYPE, lobby: Lobby):
+    """Раунд лобби: рассылка статуса обработки и обработка результатов"""
+    round_attributes = {"lobby.id": lobby.id, "lobby.players": len(lobby.players), "game.mode": lobby.game_mode.name}
+    with start_span("round", round_attributes):
+        
+        with start_span("round.broadcast_processing"):
+            await broadcast_lobby_update(context, lobby)
+        
+        
+        await process_game_results(context, lobby)
+
+
 async def process_game_results(context: ContextTypes.DEFAULT_TYPE, lobby: Lobby):
     """Обрабатывает результаты игры"""
-    from services.ai.gemini_service import GeminiService
-    import logging
+    from services.ai_service_factory import AIServiceFactory
+    from services.admission import admission_controller
+    from config import ROUND_TIME_BUDGET, DELIVERY_MIN_TIMEOUT, AI_DEADLINE_GRACE
+    from utils.deadline import Deadline
+    import asyncio
     import re
     
-    logger = logging.getLogger(__name__)
+    deadline = Deadline(ROUND_TIME_BUDGET)
+    logger.info(f"Раунд лобби {lobby.id}: бюджет времени {deadline.remaining():.1f}с")
     
+    processing_text = "Обработка результатов... Пожалуйста, подождите."
+    status_messages = {}
+    was_queued = False
     
-    for player_id in lobby.players:
-        try:
-            await context.bot.send_message(
-                chat_id=player_id,
-                text="Обработка результатов... Пожалуйста, подождите."
-            )
-        except Exception as e:
-            logger.error(f"Ошибка при отправке сообщения игроку {player_id}: {e}")
+    with start_span("round.status_messages", {"lobby.players": len(lobby.players)}):
+        for player_id in list(lobby.players):
+            try:
+                status_messages[player_id] = await asyncio.wait_for(
+                    context.bot.send_message(
+                        chat_id=player_id,
+                        text=processing_text
+                    ),
+                    timeout=deadline.timeout(DELIVERY_MIN_TIMEOUT)
+                )
+            except Exception as e:
+                record_send_failure(e)
+                logger.error(f"Ошибка при отправке сообщения игроку {player_id}: {e}")
+    
+    async def update_status_messages(text: str):
+        for player_id, status_message in status_messages.items():
+            try:
+                await status_message.edit_text(text)
+            except Exception as e:
+                record_send_failure(e)
+                logger.error(f"Ошибка при обновлении статуса игроку {player_id}: {e}")
+    
+    async def on_queue_update(position: int, eta: float):
+        nonlocal was_queued
+        was_queued = True
+        await update_status_messages(
+            f"Сейчас завершается много игр. Ваше лобби в очереди на обработку: место {position}, "
+            f"ожидание около {math.ceil(eta)} с."
+        )
     
     try:
         
-        gemini_service = GeminiService()
-        logger.info(f"Gemini сервис создан. API ключ установлен: {bool(gemini_service.model)}")
+        with start_span("round.ai_service_init"):
+            ai_service = AIServiceFactory.get_service()
+        logger.info(f"AI сервис получен: {type(ai_service).__name__}")
         
         
-        logger.info(f"Сценарий: {lobby.scenario}")
+        logger.debug("Сценарий: %s", player_text(lobby.scenario))
         
         
         for player_id, player in lobby.players.items():
-            logger.info(f"Игрок {player.first_name} {player.last_name}, действие: {player.action}")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Игрок %s, действие: %s", player_id, player_text(player.action))
             if player.action is None:
                 logger.error(f"У игрока {player.first_name} {player.last_name} нет действия")
                 raise ValueError(f"У игрока {player.first_name} {player.last_name} нет действия")
         
         
+        # Завязка готовится в фоне с момента выбора сценария; если она не успела, история строится одним запросом
+        with start_span("round.enrichment_wait"):
+            setting = await scenario_enricher.setting_for_round(lobby, timeout=deadline.remaining())
+        current_span().set_attribute("round.setting_ready", setting is not None)
+        
         logger.info("Отправляем запрос к Gemini API...")
         try:
-            narrative = await gemini_service.evaluate_survival(lobby.scenario, lobby.players, lobby.game_mode)
-            logger.info(f"Получен ответ от Gemini API. Длина нарратива: {len(narrative)},")
+            try:
+                async with admission_controller.admit(lobby.id, on_queue_update, timeout=deadline.remaining()) as waited:
+                    logger.info(f"Лобби {lobby.id} допущено к обработке через {waited:.1f}с, осталось бюджета: {deadline.remaining():.1f}с")
+                    current_span().set_attribute("round.queue_wait_s", round(waited, 3))
+                    if was_queued:
+                        await update_status_messages(processing_text)
+                    result = await asyncio.wait_for(
+                        ai_service.evaluate_survival(lobby.scenario, lobby.players, lobby.game_mode, deadline=deadline, setting=setting),
+                        # Запас сверху, чтобы раньше сработала обработка срока внутри сервиса, а не отмена снаружи
+                        timeout=deadline.remaining() + AI_DEADLINE_GRACE
+                    )
+            except asyncio.TimeoutError:
+                logger.warning(f"Сервис не уложился в бюджет раунда, используем резервный ответ (осталось {deadline.remaining():.1f}с)")
+                AI_FALLBACKS.labels("round_timeout").inc()
+                current_span().set_attribute("ai.fallback_reason", "round_timeout")
+                result = ai_service.fallback_response(lobby.scenario, lobby.players, lobby.game_mode)
+            # Резервный ответ строится локально и токенов не тратит
+            if result.generated:
+                captain = lobby.get_captain()
+                round_budgets.record_tokens(lobby.id, captain.user_id if captain else None, result.tokens_used)
+            narrative = result.narrative
+            logger.info(f"Получен ответ от Gemini API. Длина нарратива: {len(narrative)}, осталось бюджета: {deadline.remaining():.1f}с")
         except Exception as api_error:
             logger.error(f"Ошибка Gemini API: {api_error}")
             raise api_error
@@ -918,15 +1025,24 @@ async def process_game_results(context: ContextTypes.DEFAULT_TYPE, lobby: Lobby)
             return re.sub(f'([{re.escape(escape_chars)}])', r'\\\1', text)
         
         
-        for player_id in lobby.players:
-            try:
-                
-                await context.bot.send_message(
-                    chat_id=player_id,
-                    text=f"{narrative}"
-                )
-            except Exception as e:
-                logger.error(f"Ошибка при отправке результатов игроку {player_id}: {e}")
+        logger.info(f"Доставка результатов {len(lobby.players)} игрокам, осталось бюджета: {deadline.remaining():.1f}с")
+        with start_span("round.delivery", {"lobby.players": len(lobby.players), "narrative.size": len(narrative)}) as delivery_span:
+            failures = 0
+            for player_id in list(lobby.players):
+                try:
+                    
+                    await asyncio.wait_for(
+                        context.bot.send_message(
+                            chat_id=player_id,
+                            text=f"{narrative}"
+                        ),
+                        timeout=deadline.timeout(DELIVERY_MIN_TIMEOUT)
+                    )
+                except Exception as e:
+                    failures += 1
+                    record_send_failure(e)
+                    logger.error(f"Ошибка при отправке результатов игроку {player_id}: {e}")
+            delivery_span.set_attribute("delivery.failures", failures)
         
         
         lobby.game_state = GameState.WAITING_FOR_SCENARIO
@@ -949,6 +1065,7 @@ async def process_game_results(context: ContextTypes.DEFAULT_TYPE, lobby: Lobby)
                     reply_markup=reply_markup
                 )
             except Exception as e:
+                record_send_failure(e)
                 logger.error(f"Ошибка при отправке запроса на новый сценарий капитану {captain.user_id}: {e}")
         
         
@@ -961,13 +1078,14 @@ async def process_game_results(context: ContextTypes.DEFAULT_TYPE, lobby: Lobby)
         lobby.game_state = GameState.WAITING_FOR_SCENARIO
         
         
-        for player_id in lobby.players:
+        for player_id in list(lobby.players):
             try:
                 await context.bot.send_message(
                     chat_id=player_id,
                     text=f"Произошла ошибка при обработке результатов. Пожалуйста, попробуйте еще раз.\n{str(e)}"
                 )
             except Exception as e:
+                record_send_failure(e)
                 logger.error(f"Ошибка при отправке сообщения об ошибке игроку {player_id}: {e}")
         
         
@@ -1072,4 +1190,41 @@ async def game_mode_callback(update: Update, context: ContextTypes.DEFAULT_TYPE)
     
     await broadcast_lobby_update(context, lobby)
     
-    return IN_LOBBY
\ No newline at end of file
+    return IN_LOBBY
+
+
+PROFILE_USAGE = (
+    "/profile cpu — запустить или остановить CPU-профилирование\n"
+    "/profile mem — снимок памяти и сравнение с предыдущим\n"
+    "/profile mem off — выключить отслеживание памяти\n"
+    "/profile lobbies — память по лобби"
+)
+
+
+async def profile_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Обработчик команды /profile (только для администраторов)"""
+    from config import ADMIN_IDS
+    
+    user_id = update.effective_user.id
+    if user_id not in ADMIN_IDS:
+        return
+    
+    profiler = context.bot_data.get("profiler")
+    if profiler is None:
+        await update.message.reply_text("Профилировщик не настроен.")
+        return
+    
+    args = [arg.lower() for arg in (context.args or [])]
+    if args[:1] == ["cpu"]:
+        text = await profiler.toggle_cpu()
+    elif args[:2] == ["mem", "off"]:
+        text = await profiler.stop_memory()
+    elif args[:1] == ["mem"]:
+        text = await profiler.memory_snapshot()
+    elif args[:1] == ["lobbies"]:
+        text = await profiler.lobby_report()
+    else:
+        text = PROFILE_USAGE
+    
+    logger.info(f"Администратор {user_id} выполнил /profile {' '.join(args)}")
+    await update.message.reply_text(text[:4000])
\ No newline at end of file
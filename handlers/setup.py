@@ -22,49 +22,79 @@ from handlers.command_handlers import (
     random_scenario_callback,
     game_mode_callback,
     message_handler,
+    adopted_message_handler,
+    profile_command,
     ENTER_FULL_NAME,
     WAITING_FOR_LOBBY_OR_CREATE,
     IN_LOBBY
 )
+from config import PROFILE_DIR, PROFILE_SAMPLE_INTERVAL, PROFILE_TOP_N
+from models import GameState, lobbies
+from utils.metrics import register_game_gauges, track_handler
+from utils.profiling import Profiler
 
 
-def setup_handlers(application: Application):
-    """Настраивает обработчики команд и сообщений"""
+def setup_handlers(application: Application, sharded: bool = False):
+    """
+    Настраивает обработчики команд и сообщений
+    
+    Args:
+        application: Приложение PTB
+        sharded: Рабочий процесс многопроцессного режима; добавляются обработчики для игроков,
+            чье лобби или профиль перенесены с другого процесса вместе с состоянием, но без состояния диалога
+    """
+    
+    register_game_gauges(lobbies, list(GameState))
+    application.bot_data["profiler"] = Profiler(PROFILE_DIR, lobbies, PROFILE_TOP_N, PROFILE_SAMPLE_INTERVAL)
     
     
     conv_handler = ConversationHandler(
         entry_points=[
-            CommandHandler("start", start_command),
-            CommandHandler("join", join_command),
+            CommandHandler("start", track_handler(start_command)),
+            CommandHandler("join", track_handler(join_command)),
         ],
         states={
-            ENTER_FULL_NAME: [MessageHandler(filters.TEXT & ~filters.COMMAND, enter_full_name)],
+            ENTER_FULL_NAME: [MessageHandler(filters.TEXT & ~filters.COMMAND, track_handler(enter_full_name))],
             WAITING_FOR_LOBBY_OR_CREATE: [
-                MessageHandler(filters.TEXT & ~filters.COMMAND, wait_for_lobby_id),
-                CallbackQueryHandler(create_new_lobby_callback, pattern="^create_new_lobby$"),
+                MessageHandler(filters.TEXT & ~filters.COMMAND, track_handler(wait_for_lobby_id)),
+                CallbackQueryHandler(track_handler(create_new_lobby_callback), pattern="^create_new_lobby$"),
             ],
             IN_LOBBY: [
-                CommandHandler("lobby", lobby_command),
-                CommandHandler("leave", leave_command),
-                CommandHandler("startgame", start_game_command),
-                MessageHandler(filters.TEXT & ~filters.COMMAND, message_handler),
-                CallbackQueryHandler(leave_callback, pattern="^leave_lobby$"),
-                CallbackQueryHandler(start_game_callback, pattern="^start_game$"),
-                CallbackQueryHandler(enter_scenario_callback, pattern="^enter_scenario$"),
-                CallbackQueryHandler(random_scenario_callback, pattern="^random_scenario$"),
-                CallbackQueryHandler(game_mode_callback, pattern="^mode_(every_man|brotherhood)$"),
+                CommandHandler("lobby", track_handler(lobby_command)),
+                CommandHandler("leave", track_handler(leave_command)),
+                CommandHandler("startgame", track_handler(start_game_command)),
+                MessageHandler(filters.TEXT & ~filters.COMMAND, track_handler(message_handler)),
+                CallbackQueryHandler(track_handler(leave_callback), pattern="^leave_lobby$"),
+                CallbackQueryHandler(track_handler(start_game_callback), pattern="^start_game$"),
+                CallbackQueryHandler(track_handler(enter_scenario_callback), pattern="^enter_scenario$"),
+                CallbackQueryHandler(track_handler(random_scenario_callback), pattern="^random_scenario$"),
+                CallbackQueryHandler(track_handler(game_mode_callback), pattern="^mode_(every_man|brotherhood)$"),
             ],
         },
-        fallbacks=[CommandHandler("start", start_command)],
+        fallbacks=[CommandHandler("start", track_handler(start_command))],
         per_chat=True,  
-        per_message=False  
+        per_message=False,
+        name="main",
+        persistent=application.persistence is not None
     )
     
     
     application.add_handler(conv_handler)
     
     
-    application.add_handler(CommandHandler("lobby", lobby_command))
-    application.add_handler(CommandHandler("leave", leave_command))
+    application.add_handler(CommandHandler("lobby", track_handler(lobby_command)))
+    application.add_handler(CommandHandler("leave", track_handler(leave_command)))
+    application.add_handler(CommandHandler("profile", track_handler(profile_command)))
+    
+    if sharded:
+        # Срабатывают, только если у ConversationHandler нет диалога с пользователем в этом процессе
+        application.add_handler(CommandHandler("startgame", track_handler(start_game_command)))
+        application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, track_handler(adopted_message_handler)))
+        application.add_handler(CallbackQueryHandler(track_handler(create_new_lobby_callback), pattern="^create_new_lobby$"))
+        application.add_handler(CallbackQueryHandler(track_handler(leave_callback), pattern="^leave_lobby$"))
+        application.add_handler(CallbackQueryHandler(track_handler(start_game_callback), pattern="^start_game$"))
+        application.add_handler(CallbackQueryHandler(track_handler(enter_scenario_callback), pattern="^enter_scenario$"))
+        application.add_handler(CallbackQueryHandler(track_handler(random_scenario_callback), pattern="^random_scenario$"))
+        application.add_handler(CallbackQueryHandler(track_handler(game_mode_callback), pattern="^mode_(every_man|brotherhood)$"))
     
     return application
\ No newline at end of file
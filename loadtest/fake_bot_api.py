@@ -0,0 +1,320 @@
+import asyncio
+import json
+import random
+import time
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl
+
+import httpx
+
+from services.ai.mock_service import LatencyDistribution
+from utils.http_server import HTTPServer, Request, Response
+from utils.update_processing import KeyedLock
+from utils.webhook import SECRET_HEADER
+
+
+BOT_USER = {
+    "id": 100000001,
+    "is_bot": True,
+    "first_name": "Против ИИ",
+    "username": "againstai_loadtest_bot",
+    "can_join_groups": False,
+    "can_read_all_group_messages": False,
+    "supports_inline_queries": False,
+}
+
+
+@dataclass
+class SentMessage:
+    """Сообщение, отправленное или отредактированное ботом"""
+    method: str
+    chat_id: int
+    message_id: int
+    text: str
+    reply_markup: Optional[Dict[str, Any]] = None
+    timestamp: float = field(default_factory=time.monotonic)
+    
+    def callback_data(self) -> List[str]:
+        """Значения callback_data всех кнопок сообщения"""
+        if not self.reply_markup:
+            return []
+        return [
+            button["callback_data"]
+            for row in self.reply_markup.get("inline_keyboard", [])
+            for button in row
+            if "callback_data" in button
+        ]
+
+
+class FakeBotAPI:
+    """
+    Локальная заглушка Telegram Bot API для нагрузочного тестирования
+    
+    Поддерживает getMe, getUpdates (long polling), setWebhook/deleteWebhook, sendMessage,
+    editMessageText и answerCallbackQuery; остальные методы отвечают True. Входящие обновления
+    создаются методами push_message и push_callback и отдаются через getUpdates или, если задан
+    вебхук, отправляются на него (по порядку для каждого пользователя), исходящие сообщения
+    складываются в ящики по chat_id.
+    """
+    
+    def __init__(self, token: str = "123456:loadtest", latency: str = "fixed:0", seed: Optional[int] = None, host: str = "127.0.0.1", port: int = 0, max_connections: int = 40):
+        """
+        Args:
+            token: Токен, который должен использовать бот
+            latency: Задержка ответа API в формате LatencyDistribution
+            seed: Зерно генератора задержек
+            host: Адрес для прослушивания
+            port: Порт, 0 означает любой свободный
+            max_connections: Сколько запросов к вебхуку отправляется одновременно, как max_connections в setWebhook
+        """
+        self.token = token
+        self.latency = LatencyDistribution(latency, random.Random(seed))
+        self.http = HTTPServer(host, port)
+        self.http.route("*", "/bot/{token}/{method}", self._handle)
+        
+        self.inboxes: Dict[int, List[SentMessage]] = defaultdict(list)
+        self.method_counts: Counter = Counter()
+        self.outbound: List[Tuple[float, str]] = []
+        
+        self._updates: List[Dict[str, Any]] = []
+        self._next_update_id = 1
+        self._next_message_id = 1
+        self._next_callback_id = 1
+        self._updates_available: Optional[asyncio.Event] = None
+        self._waiters: Dict[int, asyncio.Event] = {}
+        
+        self.webhook_url = ""
+        self._webhook_secret = ""
+        self._webhook_client: Optional[httpx.AsyncClient] = None
+        self._delivery_slots: Optional[asyncio.Semaphore] = None
+        self._delivery_order = KeyedLock()
+        self._deliveries: set = set()
+        self.max_connections = max_connections
+    
+    @property
+    def url(self) -> str:
+        """Базовый URL заглушки"""
+        return self.http.url
+    
+    @property
+    def updates_pushed(self) -> int:
+        """Число созданных входящих обновлений"""
+        return self._next_update_id - 1
+    
+    @property
+    def base_url(self) -> str:
+        """Значение для ApplicationBuilder.base_url; токен становится отдельным сегментом пути"""
+        return f"{self.http.url}/bot/"
+    
+    async def start(self):
+        """Запускает сервер"""
+        self._updates_available = asyncio.Event()
+        self._delivery_slots = asyncio.Semaphore(self.max_connections)
+        self._webhook_client = httpx.AsyncClient(timeout=30)
+        await self.http.start()
+    
+    async def stop(self):
+        """Останавливает сервер"""
+        for task in list(self._deliveries):
+            task.cancel()
+        await asyncio.gather(*self._deliveries, return_exceptions=True)
+        await self._webhook_client.aclose()
+        await self.http.stop()
+    
+    @staticmethod
+    def _user(user_id: int, first_name: str) -> Dict[str, Any]:
+        return {"id": user_id, "is_bot": False, "first_name": first_name, "language_code": "ru"}
+    
+    @staticmethod
+    def _chat(chat_id: int) -> Dict[str, Any]:
+        return {"id": chat_id, "type": "private"}
+    
+    def _message_json(self, message: SentMessage) -> Dict[str, Any]:
+        data = {
+            "message_id": message.message_id,
+            "date": int(time.time()),
+            "chat": self._chat(message.chat_id),
+            "from": BOT_USER,
+            "text": message.text,
+        }
+        if message.reply_markup:
+            data["reply_markup"] = message.reply_markup
+        return data
+    
+    def _push_update(self, update: Dict[str, Any]):
+        update["update_id"] = self._next_update_id
+        self._next_update_id += 1
+        if self.webhook_url:
+            sender = next(iter(update.values()))["from"]["id"]
+            task = asyncio.create_task(self._post_update(sender, update))
+            self._deliveries.add(task)
+            task.add_done_callback(self._deliveries.discard)
+            return
+        self._updates.append(update)
+        self._updates_available.set()
+    
+    async def _post_update(self, sender: int, update: Dict[str, Any], attempts: int = 5):
+        # Задачи стартуют в порядке создания, а hold() встает в очередь блокировки без ожидания,
+        # поэтому обновления одного пользователя доставляются по порядку
+        async with self._delivery_order.hold(sender), self._delivery_slots:
+            headers = {SECRET_HEADER: self._webhook_secret} if self._webhook_secret else {}
+            for attempt in range(attempts):
+                try:
+                    response = await self._webhook_client.post(self.webhook_url, json=update, headers=headers)
+                    if response.status_code == 200:
+                        return
+                except httpx.HTTPError:
+                    pass
+                await asyncio.sleep(0.1 * (attempt + 1))
+    
+    def push_message(self, user_id: int, first_name: str, text: str):
+        """
+        Добавляет входящее текстовое сообщение от пользователя
+        
+        Args:
+            user_id: ID пользователя, он же ID личного чата
+            first_name: Имя пользователя в Telegram
+            text: Текст; команды получают сущность bot_command
+        """
+        message = {
+            "message_id": self._next_message_id,
+            "date": int(time.time()),
+            "chat": self._chat(user_id),
+            "from": self._user(user_id, first_name),
+            "text": text,
+        }
+        self._next_message_id += 1
+        if text.startswith("/"):
+            message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+        self._push_update({"message": message})
+    
+    def push_callback(self, user_id: int, first_name: str, message: SentMessage, data: str):
+        """
+        Добавляет нажатие inline-кнопки
+        
+        Args:
+            user_id: ID пользователя
+            first_name: Имя пользователя в Telegram
+            message: Сообщение бота с кнопкой
+            data: callback_data кнопки
+        """
+        self._push_update({"callback_query": {
+            "id": str(self._next_callback_id),
+            "from": self._user(user_id, first_name),
+            "chat_instance": str(user_id),
+            "message": self._message_json(message),
+            "data": data,
+        }})
+        self._next_callback_id += 1
+    
+    async def wait_for(self, chat_id: int, predicate: Callable[[SentMessage], bool], start: int = 0, timeout: float = 30) -> Tuple[int, SentMessage]:
+        """
+        Ждет сообщение бота в чате, удовлетворяющее условию
+        
+        Args:
+            chat_id: ID чата
+            predicate: Условие для сообщения
+            start: Индекс в ящике, с которого начинается поиск
+            timeout: Максимальное время ожидания в секундах
+        
+        Returns:
+            Tuple[int, SentMessage]: Индекс найденного сообщения и само сообщение
+        
+        Raises:
+            asyncio.TimeoutError: Если сообщение не пришло вовремя
+        """
+        loop = asyncio.get_running_loop()
+        expires_at = loop.time() + timeout
+        index = start
+        while True:
+            inbox = self.inboxes[chat_id]
+            while index < len(inbox):
+                if predicate(inbox[index]):
+                    return index, inbox[index]
+                index += 1
+            
+            remaining = expires_at - loop.time()
+            if remaining <= 0:
+                raise asyncio.TimeoutError(f"No matching message in chat {chat_id}")
+            event = self._waiters.setdefault(chat_id, asyncio.Event())
+            try:
+                await asyncio.wait_for(event.wait(), remaining)
+            except asyncio.TimeoutError:
+                pass
+    
+    def _deliver(self, message: SentMessage):
+        self.inboxes[message.chat_id].append(message)
+        self.outbound.append((message.timestamp, message.method))
+        event = self._waiters.pop(message.chat_id, None)
+        if event:
+            event.set()
+    
+    @staticmethod
+    def _parameters(request: Request) -> Dict[str, Any]:
+        params = dict(request.query)
+        content_type = request.headers.get("content-type", "")
+        if content_type.startswith("application/json"):
+            params.update(request.json() or {})
+        elif request.body:
+            params.update(parse_qsl(request.body.decode("utf-8"), keep_blank_values=True))
+        
+        markup = params.get("reply_markup")
+        if isinstance(markup, str):
+            params["reply_markup"] = json.loads(markup)
+        return params
+    
+    async def _handle(self, request: Request) -> Response:
+        if request.params["token"] != self.token:
+            return Response.json({"ok": False, "error_code": 401, "description": "Unauthorized"}, status=401)
+        
+        method = request.params["method"]
+        params = self._parameters(request)
+        self.method_counts[method] += 1
+        
+        if method == "getUpdates":
+            if self.webhook_url:
+                return Response.json({"ok": False, "error_code": 409, "description": "Conflict: can't use getUpdates method while webhook is active"}, status=409)
+            return Response.json({"ok": True, "result": await self._get_updates(params)})
+        if method == "setWebhook":
+            self.webhook_url = params.get("url", "")
+            self._webhook_secret = params.get("secret_token", "")
+            return Response.json({"ok": True, "result": True})
+        if method == "deleteWebhook":
+            self.webhook_url = ""
+            return Response.json({"ok": True, "result": True})
+        
+        delay = self.latency.sample()
+        if delay:
+            await asyncio.sleep(delay)
+        
+        if method == "getMe":
+            result = BOT_USER
+        elif method == "sendMessage":
+            message = SentMessage(method, int(params["chat_id"]), self._next_message_id, params.get("text", ""), params.get("reply_markup"))
+            self._next_message_id += 1
+            self._deliver(message)
+            result = self._message_json(message)
+        elif method == "editMessageText":
+            message = SentMessage(method, int(params["chat_id"]), int(params["message_id"]), params.get("text", ""), params.get("reply_markup"))
+            self._deliver(message)
+            result = self._message_json(message)
+        else:
+            result = True
+        
+        return Response.json({"ok": True, "result": result})
+    
+    async def _get_updates(self, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+        offset = int(params.get("offset") or 0)
+        limit = int(params.get("limit") or 100)
+        timeout = float(params.get("timeout") or 0)
+        
+        self._updates = [update for update in self._updates if update["update_id"] >= offset]
+        if not self._updates and timeout > 0:
+            self._updates_available.clear()
+            try:
+                await asyncio.wait_for(self._updates_available.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return self._updates[:limit]
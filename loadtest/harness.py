@@ -0,0 +1,500 @@
+import argparse
+import asyncio
+import logging
+import math
+import os
+import random
+import re
+import secrets
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Callable, Dict, List, Optional, Sequence
+
+import httpx
+from telegram.ext import Application
+
+from config import UPDATE_CONCURRENCY
+from handlers import command_handlers
+from handlers.setup import setup_handlers
+from loadtest.fake_bot_api import FakeBotAPI, SentMessage
+from services.ai.mock_service import LatencyDistribution, MockAIService, MockBehavior
+from services.ai_service_factory import AIServiceFactory
+from services.budget import RoundBudgets
+from utils.sharding import OwnershipStore
+from utils.transport import build_telegram_requests
+from utils.update_processing import PerUserUpdateProcessor
+from utils.webhook import SECRET_HEADER
+
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+NARRATIVE_MARKERS = ("ВЫЖИЛИ", "ПОГИБЛИ", "AI сервис недоступен")
+FALLBACK_MARKER = "AI сервис недоступен"
+ERROR_MARKER = "Произошла ошибка при обработке результатов"
+
+NAME_LETTERS = "абвгдежзик"
+
+ACTIONS = [
+    "Ищу выход и помогаю остальным",
+    "Прячусь в подвале и жду помощи",
+    "Строю укрытие из подручных материалов",
+    "Бегу к ближайшей дороге",
+    "Зову на помощь и подаю сигналы",
+]
+
+
+def percentile(values: Sequence[float], q: float) -> float:
+    """
+    Перцентиль по методу ближайшего ранга
+    
+    Args:
+        values: Значения
+        q: Перцентиль от 0 до 100
+    
+    Returns:
+        float: Значение перцентиля или nan для пустой выборки
+    """
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    rank = max(1, math.ceil(q / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+@dataclass
+class LoadTestConfig:
+    """Параметры нагрузочного прогона"""
+    users: int = 100
+    lobby_size: int = 4
+    lobby_rate: float = 2.0
+    rounds: int = 1
+    think_time: str = "uniform:0.5:2"
+    brotherhood_share: float = 0.5
+    ai_latency: str = "lognormal:0:0.5"
+    ai_chunks_per_second: float = 0
+    ai_error_rate: float = 0
+    api_latency: str = "fixed:0"
+    step_timeout: float = 120
+    concurrent_updates: int = UPDATE_CONCURRENCY
+    workers: int = 0
+    shard_base_port: int = 9300
+    lag_interval: float = 0.05
+    seed: Optional[int] = None
+
+
+@dataclass
+class LoadTestReport:
+    """Результаты нагрузочного прогона"""
+    duration: float = 0.0
+    lobbies_started: int = 0
+    lobbies_failed: int = 0
+    rounds_completed: int = 0
+    fallback_rounds: int = 0
+    error_rounds: int = 0
+    round_latencies: List[float] = field(default_factory=list)
+    delivery_latencies: List[float] = field(default_factory=list)
+    loop_lags: List[float] = field(default_factory=list)
+    method_counts: Counter = field(default_factory=Counter)
+    outbound_per_second: List[int] = field(default_factory=list)
+    updates: int = 0
+    lobbies_per_worker: Dict[int, int] = field(default_factory=dict)
+    cpu_seconds_per_worker: Dict[int, float] = field(default_factory=dict)
+    
+    @property
+    def updates_per_second(self) -> float:
+        """Пропускная способность: входящие обновления в секунду"""
+        return self.updates / self.duration if self.duration else 0.0
+    
+    def summary(self) -> str:
+        """Текстовый отчет"""
+        def stats(values: List[float]) -> str:
+            return (
+                f"p50={percentile(values, 50):.3f}с p95={percentile(values, 95):.3f}с "
+                f"p99={percentile(values, 99):.3f}с max={max(values, default=float('nan')):.3f}с (n={len(values)})"
+            )
+        
+        outbound = self.method_counts["sendMessage"] + self.method_counts["editMessageText"]
+        lines = [
+            f"Длительность: {self.duration:.1f}с",
+            f"Лобби: {self.lobbies_started} запущено, {self.lobbies_failed} с ошибкой",
+            f"Раунды: {self.rounds_completed} завершено, {self.fallback_rounds} с резервным ответом, {self.error_rounds} с ошибкой",
+            f"Последнее действие -> история у всех игроков: {stats(self.round_latencies)}",
+            f"Последнее действие -> история у игрока: {stats(self.delivery_latencies)}",
+            f"Задержка цикла событий: {stats(self.loop_lags)}",
+            f"Исходящие сообщения: {outbound} ({outbound / self.duration if self.duration else 0:.1f}/с в среднем, "
+            f"{max(self.outbound_per_second, default=0)}/с в пике)",
+            f"Входящие обновления: {self.updates} ({self.updates_per_second:.1f}/с)",
+        ]
+        if self.lobbies_per_worker:
+            lines.append("Лобби по процессам: " + ", ".join(f"{worker}: {count}" for worker, count in sorted(self.lobbies_per_worker.items())))
+        if self.cpu_seconds_per_worker:
+            lines.append("Процессорное время по процессам: " + ", ".join(f"{worker}: {seconds:.2f}с" for worker, seconds in sorted(self.cpu_seconds_per_worker.items())))
+        for method, count in sorted(self.method_counts.items()):
+            lines.append(f"  {method}: {count}")
+        return "\n".join(lines)
+
+
+class LoopLagMonitor:
+    """Измеряет задержку цикла событий как опоздание периодического таймера"""
+    
+    def __init__(self, interval: float = 0.05):
+        self.interval = interval
+        self.samples: List[float] = []
+        self._task: Optional[asyncio.Task] = None
+    
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            self.samples.append(max(0.0, loop.time() - expected))
+    
+    def start(self):
+        """Запускает измерение в текущем цикле событий"""
+        self._task = asyncio.create_task(self._run())
+    
+    async def stop(self):
+        """Останавливает измерение"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+
+class VirtualUser:
+    """Виртуальный игрок, который общается с ботом через заглушку API"""
+    
+    def __init__(self, api: FakeBotAPI, user_id: int, timeout: float):
+        self.api = api
+        self.user_id = user_id
+        self.timeout = timeout
+        self.first_name = "Игрок"
+        self.last_name = "".join(NAME_LETTERS[int(digit)] for digit in str(user_id)).capitalize()
+        self.cursor = 0
+    
+    @property
+    def full_name(self) -> str:
+        return f"{self.first_name} {self.last_name}"
+    
+    def send(self, text: str):
+        """Отправляет боту текст"""
+        self.api.push_message(self.user_id, self.first_name, text)
+    
+    def press(self, message: SentMessage, data: str):
+        """Нажимает кнопку под сообщением бота"""
+        self.api.push_callback(self.user_id, self.first_name, message, data)
+    
+    async def expect(self, predicate: Callable[[SentMessage], bool]) -> SentMessage:
+        """Ждет следующее подходящее сообщение бота и сдвигает курсор за него"""
+        index, message = await self.api.wait_for(self.user_id, predicate, self.cursor, self.timeout)
+        self.cursor = index + 1
+        return message
+    
+    async def expect_text(self, fragment: str) -> SentMessage:
+        """Ждет сообщение, содержащее фрагмент текста"""
+        return await self.expect(lambda message: fragment in message.text)
+    
+    async def expect_button(self, data: str) -> SentMessage:
+        """Ждет сообщение с кнопкой"""
+        return await self.expect(lambda message: data in message.callback_data())
+
+
+class VirtualLobby:
+    """Сценарий одного лобби: создание, вход игроков, выбор сценария и раунды"""
+    
+    def __init__(self, api: FakeBotAPI, users: List[VirtualUser], config: LoadTestConfig, rng: random.Random, report: LoadTestReport):
+        self.api = api
+        self.users = users
+        self.config = config
+        self.rng = rng
+        self.report = report
+        self.think_time = LatencyDistribution(config.think_time, rng)
+    
+    async def think(self):
+        await asyncio.sleep(self.think_time.sample())
+    
+    async def run(self):
+        captain, *guests = self.users
+        
+        captain.send("/start")
+        await captain.expect_text("введите своё имя")
+        await self.think()
+        captain.send(captain.full_name)
+        message = await captain.expect_button("create_new_lobby")
+        captain.press(message, "create_new_lobby")
+        message = await captain.expect_text("ID лобби:")
+        lobby_id = re.search(r"ID лобби: `([^`]+)`", message.text).group(1)
+        
+        mode = "mode_brotherhood" if self.rng.random() < self.config.brotherhood_share else "mode_every_man"
+        captain.press(message, mode)
+        await captain.expect(lambda sent: sent.method == "editMessageText" and "Выбран режим" in sent.text)
+        
+        await asyncio.gather(*(self.join(guest, lobby_id) for guest in guests))
+        
+        message = await captain.expect(lambda sent: "start_game" in sent.callback_data() and f"Игроки ({len(self.users)})" in sent.text)
+        await self.think()
+        captain.press(message, "start_game")
+        message = await captain.expect_button("random_scenario")
+        
+        for _ in range(self.config.rounds):
+            captain.press(message, "random_scenario")
+            await captain.expect_text("Выбран случайный сценарий")
+            await self.play_round(captain, guests)
+            message = await captain.expect_text("Раунд завершен")
+    
+    async def join(self, guest: VirtualUser, lobby_id: str):
+        await self.think()
+        guest.send(f"/join {lobby_id}")
+        await guest.expect_text("введите свое полное имя")
+        await self.think()
+        guest.send(guest.full_name)
+        await guest.expect_text("Вы присоединились к лобби")
+    
+    async def play_round(self, captain: VirtualUser, guests: List[VirtualUser]):
+        submitted: Dict[int, float] = {}
+        delivered: Dict[int, SentMessage] = {}
+        
+        async def act(user: VirtualUser):
+            if user is not captain:
+                await user.expect_text("Новый сценарий от капитана")
+            await self.think()
+            submitted[user.user_id] = time.monotonic()
+            user.send(self.rng.choice(ACTIONS))
+            delivered[user.user_id] = await user.expect(
+                lambda sent: sent.method == "sendMessage" and (any(marker in sent.text for marker in NARRATIVE_MARKERS) or ERROR_MARKER in sent.text)
+            )
+        
+        await asyncio.gather(*(act(user) for user in [captain, *guests]))
+        
+        last_action = max(submitted.values())
+        latencies = [message.timestamp - last_action for message in delivered.values()]
+        self.report.delivery_latencies.extend(latencies)
+        self.report.round_latencies.append(max(latencies))
+        self.report.rounds_completed += 1
+        
+        texts = [message.text for message in delivered.values()]
+        if any(ERROR_MARKER in text for text in texts):
+            self.report.error_rounds += 1
+        elif any(FALLBACK_MARKER in text for text in texts):
+            self.report.fallback_rounds += 1
+
+
+@asynccontextmanager
+async def in_process_bot(api: FakeBotAPI, config: LoadTestConfig) -> AsyncIterator[None]:
+    """Бот из setup_handlers в текущем цикле событий, опрашивающий заглушку через getUpdates"""
+    previous_service = AIServiceFactory._instance
+    AIServiceFactory._instance = MockAIService(MockBehavior(
+        latency=config.ai_latency,
+        chunks_per_second=config.ai_chunks_per_second,
+        error_rate=config.ai_error_rate,
+        seed=config.seed,
+    ))
+    # Виртуальные игроки отвечают без пауз и играют раунды подряд, входные лимиты и лимиты раундов здесь не нужны:
+    # процессор обновлений создается без FloodControl
+    previous_budgets = command_handlers.round_budgets
+    command_handlers.round_budgets = RoundBudgets(0, 0, 0, 0)
+    
+    request, get_updates_request = build_telegram_requests()
+    builder = Application.builder().token(api.token).base_url(api.base_url).request(request).get_updates_request(get_updates_request)
+    if config.concurrent_updates > 1:
+        builder = builder.concurrent_updates(PerUserUpdateProcessor(config.concurrent_updates))
+    application = builder.build()
+    setup_handlers(application)
+    
+    try:
+        async with application:
+            await application.updater.start_polling(poll_interval=0, timeout=1)
+            await application.start()
+            yield
+            await application.updater.stop()
+            await application.stop()
+    finally:
+        AIServiceFactory._instance = previous_service
+        command_handlers.round_budgets = previous_budgets
+
+
+async def worker_cpu_seconds(client: httpx.AsyncClient) -> Dict[int, float]:
+    """Процессорное время рабочих процессов по данным /shard/status маршрутизатора"""
+    response = await client.get("/shard/status")
+    response.raise_for_status()
+    return {status["worker"]: status["cpu_seconds"] for status in response.json()["workers"] if status["cpu_seconds"] is not None}
+
+
+def free_port() -> int:
+    """Свободный TCP-порт на localhost"""
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+
+
+@asynccontextmanager
+async def sharded_bot(api: FakeBotAPI, config: LoadTestConfig, report: LoadTestReport, timeout: float = 60) -> AsyncIterator[None]:
+    """main.py в многопроцессном режиме (BOT_MODE=sharded); заглушка доставляет обновления на вебхук маршрутизатора"""
+    with tempfile.TemporaryDirectory() as directory:
+        store_path = os.path.join(directory, "shards.sqlite3")
+        port = free_port()
+        secret_token = secrets.token_urlsafe(16)
+        env = dict(
+            os.environ,
+            BOT_TOKEN=api.token,
+            TELEGRAM_API_BASE_URL=api.base_url,
+            BOT_MODE="sharded",
+            SHARD_WORKERS=str(config.workers),
+            SHARD_BASE_PORT=str(config.shard_base_port),
+            SHARD_STORE=store_path,
+            WEBHOOK_HOST="127.0.0.1",
+            WEBHOOK_PORT=str(port),
+            WEBHOOK_URL=f"http://127.0.0.1:{port}/telegram",
+            WEBHOOK_PATH="telegram",
+            WEBHOOK_SECRET_TOKEN=secret_token,
+            UPDATE_CONCURRENCY=str(config.concurrent_updates),
+            AI_SERVICE_TYPE="mock",
+            MOCK_LATENCY=config.ai_latency,
+            MOCK_STREAM_CHUNKS_PER_SECOND=str(config.ai_chunks_per_second),
+            MOCK_ERROR_RATE=str(config.ai_error_rate),
+            AI_LOBBY_ROUNDS_PER_MINUTE="0",
+            AI_LOBBY_TOKENS_PER_HOUR="0",
+            AI_USER_ROUNDS_PER_MINUTE="0",
+            AI_USER_TOKENS_PER_HOUR="0",
+            INBOUND_RATE_PER_SECOND="0",
+            METRICS_PORT="0",
+            HEALTH_PORT="0",
+            LOOP_LAG_THRESHOLD="0",
+            LOG_LEVEL="WARNING",
+        )
+        if config.seed is not None:
+            env["MOCK_SEED"] = str(config.seed)
+        
+        process = subprocess.Popen([sys.executable, "main.py"], cwd=PROJECT_ROOT, env=env)
+        try:
+            expires_at = time.monotonic() + timeout
+            while not api.webhook_url:
+                if process.poll() is not None:
+                    raise RuntimeError(f"main.py завершился с кодом {process.returncode} до регистрации вебхука")
+                if time.monotonic() > expires_at:
+                    raise TimeoutError(f"Маршрутизатор не зарегистрировал вебхук за {timeout} с")
+                await asyncio.sleep(0.05)
+            async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", headers={SECRET_HEADER: secret_token}) as client:
+                started = await worker_cpu_seconds(client)
+                yield
+                finished = await worker_cpu_seconds(client)
+            report.cpu_seconds_per_worker = {worker: finished[worker] - started[worker] for worker in finished if worker in started}
+            store = OwnershipStore(store_path)
+            report.lobbies_per_worker = store.lobby_counts()
+            store.close()
+        finally:
+            process.terminate()
+            try:
+                await asyncio.to_thread(process.wait, 30)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+
+async def run_load_test(config: LoadTestConfig) -> LoadTestReport:
+    """
+    Запускает настоящий бот (setup_handlers) против заглушки Bot API и мок-сервиса AI
+    
+    При config.workers > 0 бот запускается отдельными процессами в многопроцессном режиме;
+    задержка цикла событий тогда измеряется только для процесса нагрузки.
+    
+    Args:
+        config: Параметры прогона
+    
+    Returns:
+        LoadTestReport: Задержки раундов, исходящие сообщения и задержка цикла событий
+    """
+    logger = logging.getLogger(__name__)
+    rng = random.Random(config.seed)
+    report = LoadTestReport()
+    
+    api = FakeBotAPI(latency=config.api_latency, seed=config.seed)
+    await api.start()
+    
+    bot = sharded_bot(api, config, report) if config.workers > 0 else in_process_bot(api, config)
+    monitor = LoopLagMonitor(config.lag_interval)
+    
+    try:
+        async with bot:
+            started = time.monotonic()
+            first_update = api.updates_pushed
+            monitor.start()
+            
+            lobby_count = math.ceil(config.users / config.lobby_size)
+            next_user_id = 10_000_000
+            
+            async def launch(index: int, users: List[VirtualUser]):
+                await asyncio.sleep(index / config.lobby_rate if config.lobby_rate > 0 else 0)
+                report.lobbies_started += 1
+                try:
+                    await VirtualLobby(api, users, config, random.Random(rng.random()), report).run()
+                except Exception as e:
+                    report.lobbies_failed += 1
+                    logger.warning(f"Лобби {index} не завершило сценарий: {e!r}")
+            
+            tasks = []
+            for index in range(lobby_count):
+                size = min(config.lobby_size, config.users - index * config.lobby_size)
+                users = [VirtualUser(api, next_user_id + offset, config.step_timeout) for offset in range(size)]
+                next_user_id += size
+                tasks.append(launch(index, users))
+            
+            await asyncio.gather(*tasks)
+            
+            await monitor.stop()
+            report.duration = time.monotonic() - started
+            report.updates = api.updates_pushed - first_update
+    finally:
+        await api.stop()
+    
+    report.loop_lags = monitor.samples
+    report.method_counts = Counter(api.method_counts)
+    
+    buckets = Counter(int(timestamp - started) for timestamp, _ in api.outbound)
+    report.outbound_per_second = [buckets[second] for second in range(int(report.duration) + 1)]
+    
+    return report
+
+
+def main():
+    """Точка входа: python -m loadtest.harness --users 1000 --lobby-size 5"""
+    defaults = LoadTestConfig()
+    parser = argparse.ArgumentParser(description="Нагрузочный прогон бота против заглушки Telegram Bot API")
+    parser.add_argument("--users", type=int, default=defaults.users, help="Число виртуальных игроков")
+    parser.add_argument("--lobby-size", type=int, default=defaults.lobby_size, help="Игроков в лобби")
+    parser.add_argument("--lobby-rate", type=float, default=defaults.lobby_rate, help="Новых лобби в секунду")
+    parser.add_argument("--rounds", type=int, default=defaults.rounds, help="Раундов в каждом лобби")
+    parser.add_argument("--think-time", default=defaults.think_time, help="Пауза игрока перед действием (формат MOCK_LATENCY)")
+    parser.add_argument("--brotherhood-share", type=float, default=defaults.brotherhood_share, help="Доля лобби в кооперативном режиме")
+    parser.add_argument("--ai-latency", default=defaults.ai_latency, help="Задержка мок-сервиса AI")
+    parser.add_argument("--ai-chunks-per-second", type=float, default=defaults.ai_chunks_per_second, help="Скорость потоковой выдачи мок-сервиса")
+    parser.add_argument("--ai-error-rate", type=float, default=defaults.ai_error_rate, help="Доля ошибок мок-сервиса")
+    parser.add_argument("--api-latency", default=defaults.api_latency, help="Задержка ответов заглушки Bot API")
+    parser.add_argument("--step-timeout", type=float, default=defaults.step_timeout, help="Сколько ждать ответа бота на каждом шаге, секунды")
+    parser.add_argument("--concurrent-updates", type=int, default=defaults.concurrent_updates, help="Сколько обновлений обрабатывается параллельно (1 — последовательно)")
+    parser.add_argument("--workers", type=int, default=defaults.workers, help="Рабочих процессов бота (0 — бот в процессе нагрузки)")
+    parser.add_argument("--shard-base-port", type=int, default=defaults.shard_base_port, help="Порт первого рабочего процесса")
+    parser.add_argument("--seed", type=int, default=defaults.seed)
+    parser.add_argument("--verbose", action="store_true", help="Подробные логи бота")
+    args = parser.parse_args()
+    
+    logging.basicConfig(
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        level=logging.INFO if args.verbose else logging.WARNING
+    )
+    
+    config = LoadTestConfig(**{name: value for name, value in vars(args).items() if name != "verbose"})
+    report = asyncio.run(run_load_test(config))
+    print(report.summary())
+
+
+if __name__ == "__main__":
+    main()
@@ -1,27 +1,152 @@
+import asyncio
 import logging
 from telegram.ext import Application
 
-from config import BOT_TOKEN
+from config import (
+    BOT_TOKEN, TELEGRAM_API_BASE_URL, METRICS_HOST, METRICS_PORT,
+    BOT_MODE, WEBHOOK_HOST, WEBHOOK_PORT, WEBHOOK_PATH, WEBHOOK_URL, WEBHOOK_SECRET_TOKEN, UPDATE_CONCURRENCY,
+    SHARD_WORKERS, SHARD_INDEX, SHARD_BASE_PORT, SHARD_STORE, PERSISTENCE_FILE, PERSISTENCE_FLUSH_INTERVAL,
+    HEALTH_HOST, HEALTH_PORT, HEALTH_LIVENESS_TIMEOUT,
+    LOG_LEVEL, LOG_FORMAT, LOG_SAMPLING, LOG_QUEUE_SIZE, LOG_PLAYER_TEXT,
+    LOOP_LAG_THRESHOLD, LOOP_LAG_INTERVAL, LOBBY_IDLE_SECONDS, LOBBY_TIERING_INTERVAL, TELEGRAM_WARM_CONNECTIONS,
+    TRACING_EXPORTER, TRACING_FILE, TRACING_OTLP_ENDPOINT, TRACING_SERVICE_NAME, TRACING_SAMPLE_RATE
+)
 from handlers.setup import setup_handlers
+from models import lobbies, user_states
+from services.ai_service_factory import AIServiceFactory
+from services.enrichment import scenario_enricher
+from utils.flood_control import FloodControl
+from utils.health import HealthServer
+from utils.loop_watchdog import LoopWatchdog
+from utils.metrics import start_metrics_server
+from utils.persistence import SQLitePersistence
+from utils.profiling import install_signal_handlers
+from utils.shard_router import run_sharded
+from utils.sharding import OwnershipStore, ShardWorker
+from utils.structured_logging import configure_logging, parse_sampling
+from utils.tracing import configure_tracing, tracer
+from utils.transport import build_telegram_requests, check_http_versions, warm_up_telegram
+from utils.update_processing import PerUserUpdateProcessor
+from utils.webhook import require_secret, run_webhook
 
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO
-)
 logger = logging.getLogger(__name__)
 
+async def warm_up_ai_service():
+    """Создает AI-сервис до первого раунда, не блокируя цикл событий"""
+    try:
+        service = await AIServiceFactory.warm_up()
+        logger.info(f"AI сервис готов: {type(service).__name__}")
+    except Exception as e:
+        logger.error(f"Не удалось инициализировать AI сервис: {e}", exc_info=True)
+
+async def demote_idle_lobbies():
+    """Периодически переводит неактивные лобби в холодный уровень"""
+    while True:
+        await asyncio.sleep(LOBBY_TIERING_INTERVAL)
+        demoted = lobbies.demote_idle(LOBBY_IDLE_SECONDS)
+        if demoted:
+            logger.info(f"В холодный уровень переведено лобби: {demoted}, всего в памяти {lobbies.hot_count()} из {len(lobbies)}")
+
+async def on_startup(application: Application):
+    """Запускает служебные HTTP-эндпоинты в цикле событий бота"""
+    if application.persistence:
+        # Профили, восстановленные persistence, — те же объекты, что и context.user_data
+        user_states.update(application.user_data)
+    configure_tracing(TRACING_EXPORTER, TRACING_FILE, TRACING_OTLP_ENDPOINT, TRACING_SERVICE_NAME, TRACING_SAMPLE_RATE)
+    if METRICS_PORT > 0:
+        application.bot_data["metrics_server"] = await start_metrics_server(METRICS_HOST, METRICS_PORT)
+        logger.info(f"Метрики доступны на http://{METRICS_HOST}:{METRICS_PORT}/metrics")
+    if LOOP_LAG_THRESHOLD > 0:
+        watchdog = LoopWatchdog(LOOP_LAG_THRESHOLD, LOOP_LAG_INTERVAL)
+        watchdog.start()
+        application.bot_data["loop_watchdog"] = watchdog
+    if install_signal_handlers(asyncio.get_running_loop(), application.bot_data["profiler"]):
+        logger.info("Профилирование по сигналам: SIGUSR1 — CPU, SIGUSR2 — память")
+    application.bot_data["ai_warm_up"] = asyncio.create_task(warm_up_ai_service())
+    if TELEGRAM_WARM_CONNECTIONS > 0:
+        application.bot_data["telegram_warm_up"] = asyncio.create_task(warm_up_telegram(application.bot, TELEGRAM_WARM_CONNECTIONS))
+    if LOBBY_IDLE_SECONDS > 0:
+        application.bot_data["lobby_tiering"] = asyncio.create_task(demote_idle_lobbies())
+    if HEALTH_PORT > 0:
+        checks = {
+            "telegram": lambda: bool(application.bot_data.get("webhook_server")) or (application.updater is not None and application.updater.running),
+            "ai_backend": AIServiceFactory.is_ready,
+        }
+        health_server = HealthServer(asyncio.get_running_loop(), HEALTH_HOST, HEALTH_PORT, checks, HEALTH_LIVENESS_TIMEOUT)
+        health_server.start()
+        application.bot_data["health_server"] = health_server
+        logger.info(f"Проверки состояния: http://{HEALTH_HOST}:{HEALTH_PORT}/livez и /readyz")
+
+async def on_shutdown(application: Application):
+    """Останавливает служебные HTTP-эндпоинты"""
+    tiering = application.bot_data.pop("lobby_tiering", None)
+    if tiering:
+        tiering.cancel()
+    await scenario_enricher.shutdown()
+    server = application.bot_data.pop("metrics_server", None)
+    if server:
+        await server.stop()
+    watchdog = application.bot_data.pop("loop_watchdog", None)
+    if watchdog:
+        await watchdog.stop()
+    health_server = application.bot_data.pop("health_server", None)
+    if health_server:
+        health_server.stop()
+    tracer.shutdown()
+
 def main():
     """Основная функция запуска бота"""
     
     if not BOT_TOKEN:
         logger.error("Токен бота не найден. Убедитесь, что он указан в переменных окружения или в .env файле.")
         return
-    application = Application.builder().token(BOT_TOKEN).build()
-    setup_handlers(application)
-    logger.info("Запуск бота")
-    application.run_polling(close_loop=False)
+    check_http_versions()
+    require_secret(BOT_MODE, WEBHOOK_SECRET_TOKEN)
+    if BOT_MODE == "sharded":
+        logger.info(f"Запуск маршрутизатора и {SHARD_WORKERS} рабочих процессов")
+        asyncio.run(run_sharded(
+            BOT_TOKEN, TELEGRAM_API_BASE_URL, SHARD_WORKERS, SHARD_BASE_PORT, SHARD_STORE,
+            WEBHOOK_HOST, WEBHOOK_PORT, WEBHOOK_PATH, WEBHOOK_URL, WEBHOOK_SECRET_TOKEN,
+        ))
+        return
+    request, get_updates_request = build_telegram_requests()
+    builder = (
+        Application.builder()
+        .token(BOT_TOKEN)
+        .request(request)
+        .get_updates_request(get_updates_request)
+        .concurrent_updates(PerUserUpdateProcessor(UPDATE_CONCURRENCY, FloodControl()))
+        .post_init(on_startup)
+        .post_shutdown(on_shutdown)
+    )
+    if TELEGRAM_API_BASE_URL:
+        builder = builder.base_url(TELEGRAM_API_BASE_URL)
+    if PERSISTENCE_FILE and BOT_MODE != "worker":
+        # В многопроцессном режиме пользователи переходят между процессами, и локальный файл устарел бы
+        builder = builder.persistence(SQLitePersistence(PERSISTENCE_FILE, PERSISTENCE_FLUSH_INTERVAL))
+    application = builder.build()
+    setup_handlers(application, sharded=BOT_MODE == "worker")
+    if BOT_MODE == "worker":
+        store = OwnershipStore(SHARD_STORE)
+        worker = ShardWorker(application, store, SHARD_INDEX)
+        worker.start()
+        logger.info(f"Запуск рабочего процесса {SHARD_INDEX}")
+        asyncio.run(run_webhook(application, WEBHOOK_HOST, WEBHOOK_PORT, WEBHOOK_PATH, "", WEBHOOK_SECRET_TOKEN, setup_server=worker.attach))
+    elif BOT_MODE == "webhook":
+        logger.info("Запуск бота в режиме вебхука")
+        asyncio.run(run_webhook(application, WEBHOOK_HOST, WEBHOOK_PORT, WEBHOOK_PATH, WEBHOOK_URL, WEBHOOK_SECRET_TOKEN))
+    else:
+        logger.info("Запуск бота")
+        application.run_polling(close_loop=False)
 
 if __name__ == '__main__':
+    log_listener = configure_logging(
+        LOG_LEVEL,
+        json_format=LOG_FORMAT == "json",
+        sampling=parse_sampling(LOG_SAMPLING),
+        redact_player_text=not LOG_PLAYER_TEXT,
+        queue_size=LOG_QUEUE_SIZE,
+    )
     try:
         main()
     except KeyboardInterrupt:
@@ -29,4 +154,5 @@ if __name__ == '__main__':
     except Exception as e:
         logger.error(f"Произошла ошибка: {e}")
     finally:
-        logger.info("Бот остановлен.")
\ No newline at end of file
+        logger.info("Бот остановлен.")
+        log_listener.stop()
\ No newline at end of file
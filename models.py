@@ -1,6 +1,9 @@
-from dataclasses import dataclass, field
+import json
+import time
+import zlib
+from dataclasses import asdict, dataclass, field
 from enum import Enum
-from typing import Dict, List, Optional
+from typing import Any, Callable, Dict, Iterator, List, Optional
 
 
 class GameMode(Enum):
@@ -38,6 +41,8 @@ class Lobby:
     game_mode: GameMode = GameMode.EVERY_MAN_FOR_HIMSELF
     game_state: GameState = GameState.WAITING_FOR_PLAYERS
     scenario: Optional[str] = None
+    # Завязка истории, подготовленная AI-сервисом по сценарию, пока игроки пишут действия
+    setting: Optional[str] = None
     captain_id: Optional[int] = None
     message_id: Optional[int] = None
     chat_id: Optional[int] = None
@@ -94,11 +99,207 @@ class Lobby:
     def get_players_without_actions(self) -> Dict[int, Player]:
         """Получить игроков, которые еще не отправили действия"""
         return {uid: player for uid, player in self.players.items() if player.action is None}
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """Сериализовать лобби в JSON-совместимый словарь"""
+        data = asdict(self)
+        data["players"] = [asdict(player) for player in self.players.values()]
+        data["game_mode"] = self.game_mode.name
+        data["game_state"] = self.game_state.name
+        return data
+    
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Lobby":
+        """Восстановить лобби из словаря to_dict"""
+        data = dict(data)
+        players = [Player(**player) for player in data.pop("players")]
+        data["game_mode"] = GameMode[data["game_mode"]]
+        data["game_state"] = GameState[data["game_state"]]
+        return cls(players={player.user_id: player for player in players}, **data)
+
 
+class ObservedDict(dict):
+    """Словарь, который сообщает подписчикам о добавлении и удалении ключей"""
+    
+    # Нужен для многопроцессного режима: владение лобби и членство игроков
+    # зеркалируются в общее хранилище без изменений в обработчиках
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._listeners: List[Callable[[Any, Any], None]] = []
+    
+    def subscribe(self, listener: Callable[[Any, Any], None]):
+        """
+        Подписаться на изменения
+        
+        Args:
+            listener: Вызывается с (ключ, значение) при записи и с (ключ, None) при удалении
+        """
+        self._listeners.append(listener)
+    
+    def unsubscribe(self, listener: Callable[[Any, Any], None]):
+        """Отписаться от изменений"""
+        self._listeners.remove(listener)
+    
+    def _notify(self, key: Any, value: Any):
+        for listener in self._listeners:
+            listener(key, value)
+    
+    def __setitem__(self, key: Any, value: Any):
+        super().__setitem__(key, value)
+        self._notify(key, value)
+    
+    def __delitem__(self, key: Any):
+        super().__delitem__(key)
+        self._notify(key, None)
+    
+    def pop(self, key: Any, *default: Any) -> Any:
+        present = key in self
+        value = super().pop(key, *default)
+        if present:
+            self._notify(key, None)
+        return value
+    
+    def detach(self, key: Any) -> Any:
+        """Удалить ключ без уведомления подписчиков (например, при переносе на другой процесс)"""
+        return super().pop(key, None)
+    
+    def attach(self, key: Any, value: Any):
+        """Записать значение без уведомления подписчиков"""
+        super().__setitem__(key, value)
+
+
+@dataclass
+class ColdLobby:
+    """Лобби в холодном уровне: сжатый JSON и сводка для метрик"""
+    data: bytes
+    game_state: GameState
+    players: int
+
+
+class LobbyRegistry(ObservedDict):
+    """Реестр лобби, который держит давно неактивные лобби в сжатом виде"""
+    
+    # Обращение по ключу (lobbies[id], get) восстанавливает лобби из холодного уровня,
+    # а in, len и перебор ключей учитывают оба уровня. values() и items() проходят только
+    # по горячим лобби, чтобы метрики и отчеты не разворачивали холодные.
+    # Перенос между уровнями не уведомляет подписчиков: лобби продолжает существовать.
+    
+    def __init__(self, *args, clock: Callable[[], float] = time.monotonic, **kwargs):
+        self._clock = clock
+        self._cold: Dict[str, ColdLobby] = {}
+        self._last_access: Dict[str, float] = {}
+        self.on_rehydrate: Optional[Callable[[str, float], None]] = None
+        super().__init__(*args, **kwargs)
+    
+    def __getitem__(self, key: str) -> Lobby:
+        lobby = super().__getitem__(key)
+        self._last_access[key] = self._clock()
+        return lobby
+    
+    def __missing__(self, key: str) -> Lobby:
+        if key not in self._cold:
+            raise KeyError(key)
+        return self._rehydrate(key)
+    
+    def get(self, key: str, default: Any = None) -> Any:
+        try:
+            return self[key]
+        except KeyError:
+            return default
+    
+    def __contains__(self, key: Any) -> bool:
+        return super().__contains__(key) or key in self._cold
+    
+    def __len__(self) -> int:
+        return super().__len__() + len(self._cold)
+    
+    def __iter__(self) -> Iterator[str]:
+        yield from list(super().keys())
+        yield from list(self._cold)
+    
+    def keys(self) -> List[str]:
+        return list(self)
+    
+    def __setitem__(self, key: str, value: Lobby):
+        self._cold.pop(key, None)
+        self._last_access[key] = self._clock()
+        super().__setitem__(key, value)
+    
+    def __delitem__(self, key: str):
+        self._last_access.pop(key, None)
+        if self._cold.pop(key, None) is not None:
+            self._notify(key, None)
+            return
+        super().__delitem__(key)
+    
+    def pop(self, key: str, *default: Any) -> Any:
+        if key in self._cold:
+            self._rehydrate(key)
+        self._last_access.pop(key, None)
+        return super().pop(key, *default)
+    
+    def detach(self, key: str) -> Any:
+        if key in self._cold:
+            self._rehydrate(key)
+        self._last_access.pop(key, None)
+        return super().detach(key)
+    
+    def attach(self, key: str, value: Lobby):
+        self._cold.pop(key, None)
+        self._last_access[key] = self._clock()
+        super().attach(key, value)
+    
+    def clear(self):
+        self._cold.clear()
+        self._last_access.clear()
+        super().clear()
+    
+    def hot_count(self) -> int:
+        """Число лобби в памяти в виде объектов"""
+        return super().__len__()
+    
+    def cold_values(self) -> List[ColdLobby]:
+        """Сводки лобби холодного уровня"""
+        return list(self._cold.values())
+    
+    def demote_idle(self, idle_seconds: float) -> int:
+        """
+        Переводит в холодный уровень лобби, к которым не обращались дольше idle_seconds
+        
+        Лобби с раундом в обработке не переводятся: на них ссылается задача раунда.
+        
+        Args:
+            idle_seconds: Порог неактивности в секундах
+        
+        Returns:
+            int: Число переведенных лобби
+        """
+        threshold = self._clock() - idle_seconds
+        demoted = 0
+        for key, lobby in list(super().items()):
+            if self._last_access.get(key, threshold) > threshold or lobby.game_state == GameState.PROCESSING_RESULTS:
+                continue
+            data = zlib.compress(json.dumps(lobby.to_dict(), ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+            self._cold[key] = ColdLobby(data, lobby.game_state, len(lobby.players))
+            self._last_access.pop(key, None)
+            dict.pop(self, key)
+            demoted += 1
+        return demoted
+    
+    def _rehydrate(self, key: str) -> Lobby:
+        started = time.perf_counter()
+        cold = self._cold.pop(key)
+        lobby = Lobby.from_dict(json.loads(zlib.decompress(cold.data)))
+        dict.__setitem__(self, key, lobby)
+        self._last_access[key] = self._clock()
+        if self.on_rehydrate:
+            self.on_rehydrate(key, time.perf_counter() - started)
+        return lobby
 
 
-lobbies: Dict[str, Lobby] = {}
+lobbies: Dict[str, Lobby] = LobbyRegistry()
 
-user_to_lobby: Dict[int, str] = {}
+user_to_lobby: Dict[int, str] = ObservedDict()
 
 user_states: Dict[int, Dict[str, any]] = {}
\ No newline at end of file
@@ -4,6 +4,8 @@ import unittest
 import logging
 import subprocess
 import time
+import urllib.error
+import urllib.request
 
 
 logging.basicConfig(
@@ -27,27 +29,44 @@ def run_tests():
     
     return result.wasSuccessful()
 
-def run_bot(timeout=5):
+def wait_until_ready(process, url, timeout):
+    """Опрашивает /readyz, пока бот не станет готов, не завершится или не истечет таймаут"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            return False
+        try:
+            with urllib.request.urlopen(url, timeout=1) as response:
+                if response.status == 200:
+                    return True
+        except (urllib.error.URLError, OSError):
+            pass
+        time.sleep(0.2)
+    return False
+
+def run_bot(timeout=60):
     """Запуск бота в отдельном процессе для проверки"""
-    logger.info(f"Запуск бота в отдельном процессе на {timeout} секунд для проверки...")
+    host = os.environ.get('HEALTH_HOST', '127.0.0.1')
+    port = os.environ.get('HEALTH_PORT', '8088')
+    url = f"http://{host}:{port}/readyz"
+    logger.info(f"Запуск бота в отдельном процессе, ожидание готовности на {url} (не дольше {timeout} секунд)...")
     
     
     process = subprocess.Popen([sys.executable, 'main.py'])
-    
-    
-    logger.info(f"Ожидание {timeout} секунд...")
-    time.sleep(timeout)
+    started = time.monotonic()
+    ready = wait_until_ready(process, url, timeout)
     
     
     logger.info("Завершение процесса бота...")
     if process.poll() is None:
         process.terminate()
-        process.wait(timeout=2)
-        logger.info("Бот успешно запущен и остановлен!")
+        process.wait(timeout=10)
+    
+    if ready:
+        logger.info(f"Бот готов через {time.monotonic() - started:.1f} с и успешно остановлен!")
         return True
-    else:
-        logger.error("Бот завершился преждевременно!")
-        return False
+    logger.error("Бот не стал готов: завершился преждевременно или не ответил вовремя!")
+    return False
 
 def main():
     """Основная функция для тестирования и запуска бота"""
@@ -56,7 +75,7 @@ def main():
         with open('.env', 'r') as f:
             for line in f:
                 line = line.strip()
-                if not line or line.startswith('
+                if not line or line.startswith('#'):
                     continue
                 key, value = line.split('=', 1)
                 os.environ[key] = value
@@ -0,0 +1,210 @@
+import asyncio
+import logging
+import math
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import AsyncIterator, Awaitable, Callable, Deque, List, Optional, Set
+
+from config import AI_MAX_CONCURRENT_EVALUATIONS, AI_INITIAL_SERVICE_TIME
+
+
+QueueUpdateCallback = Callable[[int, float], Awaitable[None]]
+
+
+@dataclass
+class _Waiter:
+    """A queued evaluation request"""
+    lobby_id: str
+    future: asyncio.Future
+    on_update: Optional[QueueUpdateCallback] = None
+    last_position: int = 0
+    update_task: Optional[asyncio.Task] = None
+
+
+class AdmissionController:
+    """Global concurrency cap for AI evaluations with round-robin queueing across lobbies"""
+    
+    def __init__(self, max_concurrent: int = AI_MAX_CONCURRENT_EVALUATIONS, initial_service_time: float = AI_INITIAL_SERVICE_TIME, smoothing: float = 0.2):
+        self.max_concurrent = max(1, max_concurrent)
+        self.avg_service_time = initial_service_time
+        self.smoothing = smoothing
+        self.active = 0
+        self._queues: "OrderedDict[str, Deque[_Waiter]]" = OrderedDict()
+        self._update_tasks: Set[asyncio.Task] = set()
+        self.logger = logging.getLogger(__name__)
+    
+    @property
+    def saturated(self) -> bool:
+        """Whether a new evaluation would have to wait for a slot"""
+        return self.active >= self.max_concurrent or bool(self._queues)
+    
+    @property
+    def queue_depth(self) -> int:
+        """Number of evaluations waiting for a slot"""
+        return sum(len(queue) for queue in self._queues.values())
+    
+    def estimate_wait(self, position: int) -> float:
+        """
+        Estimates the wait for a queue position
+        
+        Args:
+            position: 1-based position in the service order
+        
+        Returns:
+            float: Expected wait in seconds
+        """
+        return math.ceil(position / self.max_concurrent) * self.avg_service_time
+    
+    def service_order(self) -> List[_Waiter]:
+        """Returns waiters in the order they will be admitted"""
+        order = []
+        queues = [list(queue) for queue in self._queues.values()]
+        depth = max((len(queue) for queue in queues), default=0)
+        for index in range(depth):
+            for queue in queues:
+                if index < len(queue):
+                    order.append(queue[index])
+        return order
+    
+    @asynccontextmanager
+    async def admit(self, lobby_id: str, on_update: Optional[QueueUpdateCallback] = None, timeout: Optional[float] = None) -> AsyncIterator[float]:
+        """
+        Waits for an evaluation slot
+        
+        Args:
+            lobby_id: Lobby requesting the evaluation
+            on_update: Coroutine called with (position, eta) whenever the queue position changes
+            timeout: Maximum time to wait in the queue
+        
+        Yields:
+            float: Time spent in the queue, seconds
+        
+        Raises:
+            asyncio.TimeoutError: If no slot was granted within the timeout
+        """
+        queued_at = time.monotonic()
+        
+        if self.active < self.max_concurrent and not self._queues:
+            self.active += 1
+        else:
+            waiter = _Waiter(lobby_id, asyncio.get_running_loop().create_future(), on_update)
+            self._queues.setdefault(lobby_id, deque()).append(waiter)
+            self.logger.info(f"Lobby {lobby_id} queued for evaluation, queue depth: {self.queue_depth}")
+            self._notify_positions()
+            
+            try:
+                await asyncio.wait_for(asyncio.shield(waiter.future), timeout)
+            except BaseException:
+                self._cancel_update(waiter)
+                if waiter.future.done() and not waiter.future.cancelled():
+                    self._release()
+                else:
+                    waiter.future.cancel()
+                    self._remove(waiter)
+                    self._notify_positions()
+                raise
+            
+            # A late "position N" edit must not land over the caller's own status message
+            update = self._cancel_update(waiter)
+            if update is not None:
+                try:
+                    await asyncio.wait([update])
+                except BaseException:
+                    self._release()
+                    raise
+        
+        waited = time.monotonic() - queued_at
+        started = time.monotonic()
+        try:
+            yield waited
+        finally:
+            elapsed = time.monotonic() - started
+            self.avg_service_time += self.smoothing * (elapsed - self.avg_service_time)
+            self._release()
+    
+    @asynccontextmanager
+    async def try_admit(self) -> AsyncIterator[bool]:
+        """
+        Takes a free evaluation slot without queueing
+        
+        For optional work such as scenario enrichment: it never waits, never
+        shifts the queue positions shown to waiting lobbies and does not
+        affect the service-time estimate used for their ETA.
+        
+        Yields:
+            bool: Whether a slot was taken; the caller skips the work otherwise
+        """
+        if self.saturated:
+            yield False
+            return
+        self.active += 1
+        try:
+            yield True
+        finally:
+            self._release()
+    
+    def _remove(self, waiter: _Waiter):
+        queue = self._queues.get(waiter.lobby_id)
+        if queue is None:
+            return
+        try:
+            queue.remove(waiter)
+        except ValueError:
+            pass
+        if not queue:
+            del self._queues[waiter.lobby_id]
+    
+    def _release(self):
+        self.active -= 1
+        
+        while self._queues and self.active < self.max_concurrent:
+            lobby_id, queue = next(iter(self._queues.items()))
+            waiter = queue.popleft()
+            if queue:
+                self._queues.move_to_end(lobby_id)
+            else:
+                del self._queues[lobby_id]
+            
+            if waiter.future.done():
+                continue
+            waiter.future.set_result(True)
+            self.active += 1
+        
+        self._notify_positions()
+    
+    def _notify_positions(self):
+        for index, waiter in enumerate(self.service_order()):
+            position = index + 1
+            if position == waiter.last_position or waiter.on_update is None:
+                continue
+            waiter.last_position = position
+            # An edit still in flight carries an older position
+            self._cancel_update(waiter)
+            task = asyncio.get_running_loop().create_task(self._send_update(waiter, position, self.estimate_wait(position)))
+            waiter.update_task = task
+            self._update_tasks.add(task)
+            task.add_done_callback(self._update_tasks.discard)
+    
+    def _cancel_update(self, waiter: _Waiter) -> Optional[asyncio.Task]:
+        """
+        Cancels the waiter's pending position update
+        
+        Returns:
+            Optional[asyncio.Task]: The cancelled update, to await until it has stopped, or None
+        """
+        task, waiter.update_task = waiter.update_task, None
+        if task is None or task.done():
+            return None
+        task.cancel()
+        return task
+    
+    async def _send_update(self, waiter: _Waiter, position: int, eta: float):
+        try:
+            await waiter.on_update(position, eta)
+        except Exception as e:
+            self.logger.error(f"Error sending queue update to lobby {waiter.lobby_id}: {e}")
+
+
+admission_controller = AdmissionController()
@@ -0,0 +1,231 @@
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+import httpx
+
+from config import (
+    GEMINI_API_KEYS, GEMINI_POOL_MODELS, GEMINI_FAST_MODEL,
+    GEMINI_RPM_LIMIT, GEMINI_TPM_LIMIT, GEMINI_KEY_COOLDOWN,
+    GEMINI_API_ENDPOINT, GEMINI_REST_TIMEOUT
+)
+from services.ai.base_service import BaseAIService, GenerationPath
+from services.ai.gemini_rest_service import DEFAULT_ENDPOINT, GeminiRESTModel, model_id
+from services.ai.gemini_service import GeminiService
+from services.ai.resilience import CircuitBreaker, RetryElsewhereError, RetryPolicy, call_with_retry, error_status_code
+from utils.deadline import Deadline
+from utils.rate_limit import TokenBucket
+from utils.transport import ai_http_client
+
+
+class PoolExhaustedError(Exception):
+    """Raised when every key in the pool is throttled or cooling down"""
+    
+    # A local quota miss is neither retried nor counted by the circuit breaker:
+    # the round falls back at once instead of opening the breaker for healthy keys
+
+
+class KeyThrottledError(RetryElsewhereError):
+    """Raised when the API throttled one pool entry; the retry picks another entry"""
+
+
+@dataclass
+class PoolEntry:
+    """A single (API key, model) pair with its own quotas"""
+    key_id: str
+    model_name: str
+    model: Any
+    rpm_limit: float = GEMINI_RPM_LIMIT
+    tpm_limit: float = GEMINI_TPM_LIMIT
+    clock: Callable[[], float] = time.monotonic
+    cooldown_until: float = 0.0
+    in_flight: int = 0
+    requests: int = 0
+    throttled: int = 0
+    rpm_bucket: TokenBucket = field(init=False)
+    tpm_bucket: TokenBucket = field(init=False)
+    
+    def __post_init__(self):
+        self.rpm_bucket = TokenBucket.per_minute(self.rpm_limit, self.clock)
+        self.tpm_bucket = TokenBucket.per_minute(self.tpm_limit, self.clock)
+    
+    def is_cooling_down(self) -> bool:
+        """Checks whether the key is benched after a 429"""
+        return self.clock() < self.cooldown_until
+    
+    def can_serve(self, tokens: int) -> bool:
+        """Checks whether the entry has quota for one request of the given size"""
+        return not self.is_cooling_down() and self.rpm_bucket.can_consume(1) and self.tpm_bucket.can_consume(tokens)
+    
+    def load(self) -> float:
+        """Load used by the balancer: the most utilized quota plus requests in flight"""
+        return max(self.rpm_bucket.utilization(), self.tpm_bucket.utilization()) + self.in_flight
+    
+    def cool_down(self, seconds: float):
+        """Benches the key after the API reported it as throttled"""
+        self.throttled += 1
+        self.cooldown_until = self.clock() + seconds
+    
+    def utilization(self) -> Dict[str, Any]:
+        """Returns a utilization snapshot of the entry"""
+        return {
+            "key": self.key_id,
+            "model": self.model_name,
+            "rpm_utilization": round(self.rpm_bucket.utilization(), 3),
+            "tpm_utilization": round(self.tpm_bucket.utilization(), 3),
+            "in_flight": self.in_flight,
+            "requests": self.requests,
+            "throttled": self.throttled,
+            "cooling_down": self.is_cooling_down(),
+        }
+
+
+def mask_key(api_key: str) -> str:
+    """Masks an API key for logs and utilization reports"""
+    return f"...{api_key[-4:]}" if len(api_key) > 4 else "***"
+
+
+class GeminiPoolService(GeminiService):
+    """Gemini service that balances requests over a pool of API keys and models"""
+    
+    # Fast-model entries are kept apart: full-length rounds never spend their
+    # quota, and the reduced path only falls back to the main entries when
+    # every fast entry is out of quota
+    
+    def __init__(
+        self,
+        entries: Optional[List[PoolEntry]] = None,
+        cooldown: float = GEMINI_KEY_COOLDOWN,
+        fast_entries: Optional[List[PoolEntry]] = None,
+        endpoint: str = GEMINI_API_ENDPOINT,
+        timeout: float = GEMINI_REST_TIMEOUT,
+    ):
+        BaseAIService.__init__(self)
+        
+        self.retry_policy = RetryPolicy()
+        self.circuit_breaker = CircuitBreaker("gemini_pool")
+        self.model = None
+        self.fast_model = None
+        self.cooldown = cooldown
+        self.endpoint = (endpoint or DEFAULT_ENDPOINT).rstrip("/")
+        self.timeout = timeout
+        self._client: Optional[httpx.AsyncClient] = None
+        self._client_loop: Optional[asyncio.AbstractEventLoop] = None
+        
+        if entries is not None:
+            self.entries = entries
+            self.fast_entries = fast_entries or []
+            return
+        
+        models = [model_id(name) for name in GEMINI_POOL_MODELS]
+        self.entries = self._build_entries(models)
+        fast_model = model_id(GEMINI_FAST_MODEL) if GEMINI_FAST_MODEL else ""
+        self.fast_entries = self._build_entries([fast_model]) if fast_model and fast_model not in models else []
+        
+        self.logger.info(f"Gemini pool created with {len(self.entries)} entries and {len(self.fast_entries)} fast-model entries")
+        if not self.entries:
+            self.logger.warning("Gemini pool is empty, using fallback mode")
+    
+    def _build_entries(self, model_names: List[str]) -> List[PoolEntry]:
+        """Creates one entry per configured key for each model"""
+        return [
+            PoolEntry(key_id=mask_key(api_key), model_name=model_name, model=GeminiRESTModel(api_key, model_name, self._get_client))
+            for api_key in GEMINI_API_KEYS
+            for model_name in model_names
+        ]
+    
+    def _get_client(self) -> httpx.AsyncClient:
+        """Returns the HTTP client shared by all entries, bound to the running event loop"""
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._client_loop is not loop:
+            self._client = ai_http_client("gemini_pool", self.endpoint, timeout=self.timeout)
+            self._client_loop = loop
+        return self._client
+    
+    def _is_available(self) -> bool:
+        """Checks whether the pool has at least one entry"""
+        return bool(self.entries)
+    
+    def _acquire(self, tokens: int, reduced: bool = False) -> PoolEntry:
+        """
+        Picks the least loaded entry that has quota and reserves it
+        
+        Args:
+            tokens: Tokens to reserve (prompt plus maximum output)
+            reduced: Reduced generation path; fast-model entries are tried first
+        
+        Returns:
+            PoolEntry: Reserved entry
+        
+        Raises:
+            PoolExhaustedError: If no entry can serve the request
+        """
+        candidates = []
+        if reduced:
+            candidates = [entry for entry in self.fast_entries if entry.can_serve(tokens)]
+        if not candidates:
+            candidates = [entry for entry in self.entries if entry.can_serve(tokens)]
+        
+        if not candidates:
+            raise PoolExhaustedError("All Gemini pool entries are throttled or out of quota")
+        
+        entry = min(candidates, key=lambda candidate: candidate.load())
+        entry.rpm_bucket.try_consume(1)
+        entry.tpm_bucket.try_consume(tokens)
+        entry.in_flight += 1
+        entry.requests += 1
+        return entry
+    
+    async def _call_entry(self, prompt: str, generation_config: Dict[str, Any], path: GenerationPath) -> Any:
+        """Performs one attempt on the least loaded entry"""
+        reserved = self.estimate_tokens(prompt) + generation_config["max_output_tokens"]
+        entry = self._acquire(reserved, reduced=path == GenerationPath.REDUCED)
+        
+        try:
+            response = await entry.model.generate_content_async(prompt, generation_config=generation_config)
+        except Exception as e:
+            if error_status_code(e) == 429 or type(e).__name__ == "ResourceExhausted":
+                self.logger.warning(f"Key {entry.key_id} ({entry.model_name}) throttled, cooling down for {self.cooldown:.0f}s")
+                entry.cool_down(self.cooldown)
+                raise KeyThrottledError(f"Key {entry.key_id} ({entry.model_name}) throttled") from e
+            raise
+        finally:
+            entry.in_flight -= 1
+        
+        used = self.estimate_tokens(prompt) + self.estimate_tokens(self._extract_text(response)) if response else 0
+        entry.tpm_bucket.refund(max(0, reserved - used))
+        self.logger.debug(f"Pool request served by {entry.key_id} ({entry.model_name})")
+        return response
+    
+    async def _generate(self, prompt: str, generation_config: Dict[str, Any], path: GenerationPath, deadline: Optional[Deadline]) -> Any:
+        """
+        Calls the pool with retries; each retry may land on another key
+        
+        Args:
+            prompt: Prompt text
+            generation_config: Generation parameters
+            path: Generation path chosen for the remaining budget
+            deadline: Round deadline
+        
+        Returns:
+            Any: SDK response
+        """
+        response = await call_with_retry(
+            lambda: self._call_entry(prompt, generation_config, path),
+            self.retry_policy,
+            self.circuit_breaker,
+            self.logger,
+            deadline,
+        )
+        self.logger.debug(f"Gemini pool utilization: {self.utilization()}")
+        return response
+    
+    def utilization(self) -> List[Dict[str, Any]]:
+        """
+        Reports per-key utilization
+        
+        Returns:
+            List[Dict[str, Any]]: One snapshot per pool entry
+        """
+        return [entry.utilization() for entry in self.entries + self.fast_entries]
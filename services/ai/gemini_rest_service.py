@@ -0,0 +1,232 @@
+import asyncio
+import json
+import time
+from typing import Any, AsyncIterator, Callable, Dict, Optional
+
+import httpx
+
+from config import (
+    GEMINI_API_KEY, GEMINI_API_ENDPOINT, GEMINI_FAST_MODEL,
+    GEMINI_REST_MODEL, GEMINI_REST_STREAM, GEMINI_REST_TIMEOUT
+)
+from models import Player, GameMode
+from services.ai.base_service import BaseAIService, GenerationPath, SurvivalResult
+from services.ai.resilience import CircuitBreaker, RetryPolicy, call_with_retry
+from utils.deadline import Deadline
+from utils.metrics import AI_TIME_TO_FIRST_TOKEN
+from utils.transport import ai_http_client
+
+
+DEFAULT_ENDPOINT = "https://generativelanguage.googleapis.com"
+
+
+def model_id(name: str) -> str:
+    """Strips the "models/" prefix that the SDK uses in model names"""
+    return name[len("models/"):] if name.startswith("models/") else name
+
+
+def _response_text(payload: Dict[str, Any]) -> str:
+    """
+    Extracts text from a generateContent response or a single stream event
+    
+    Args:
+        payload: Decoded GenerateContentResponse
+    
+    Returns:
+        str: Concatenated text parts of the first candidate
+    """
+    candidates = payload.get("candidates") or []
+    if not candidates:
+        return ""
+    parts = (candidates[0].get("content") or {}).get("parts") or []
+    return "".join(part.get("text", "") for part in parts)
+
+
+class GeminiRESTModel:
+    """One Gemini model called with its own API key through a shared HTTP client"""
+    
+    # Used by GeminiPoolService: the key travels in the request header, so all
+    # keys share one connection pool and no SDK client internals are touched
+    
+    def __init__(self, api_key: str, model_name: str, client: Callable[[], httpx.AsyncClient]):
+        """
+        Args:
+            api_key: API key of this pool entry
+            model_name: Model name, with or without the "models/" prefix
+            client: Returns the HTTP client bound to the running event loop
+        """
+        self.api_key = api_key
+        self.model_name = model_id(model_name)
+        self._client = client
+    
+    async def generate_content_async(self, prompt: str, generation_config: Dict[str, Any]) -> str:
+        """
+        Calls generateContent once, without retries
+        
+        Args:
+            prompt: Prompt text
+            generation_config: Generation parameters in the SDK's snake_case form
+        
+        Returns:
+            str: Response text
+        
+        Raises:
+            httpx.HTTPStatusError: If the API rejected the request (429 when the key is throttled)
+        """
+        response = await self._client().post(
+            f"/v1beta/models/{self.model_name}:generateContent",
+            json=GeminiRESTService._request_body(prompt, generation_config),
+            headers={"x-goog-api-key": self.api_key},
+        )
+        response.raise_for_status()
+        return _response_text(response.json())
+
+
+class GeminiRESTService(BaseAIService):
+    """Gemini backend that calls the REST API directly through the shared pooled HTTP client"""
+    
+    def __init__(
+        self,
+        api_key: Optional[str] = GEMINI_API_KEY,
+        model_name: str = GEMINI_REST_MODEL,
+        fast_model_name: str = GEMINI_FAST_MODEL,
+        endpoint: str = GEMINI_API_ENDPOINT,
+        timeout: float = GEMINI_REST_TIMEOUT,
+        stream: bool = GEMINI_REST_STREAM,
+    ):
+        super().__init__()
+        
+        self.api_key = api_key
+        self.model_name = model_id(model_name)
+        self.fast_model_name = model_id(fast_model_name) if fast_model_name else ""
+        # A custom endpoint (such as the local stand-in) may not need a key
+        self.custom_endpoint = bool(endpoint)
+        self.endpoint = (endpoint or DEFAULT_ENDPOINT).rstrip("/")
+        self.timeout = timeout
+        self.streams_output = stream
+        self.retry_policy = RetryPolicy()
+        self.circuit_breaker = CircuitBreaker("gemini_rest")
+        self._client: Optional[httpx.AsyncClient] = None
+        self._client_loop: Optional[asyncio.AbstractEventLoop] = None
+        
+        self.logger.info(f"Using Gemini REST backend {self.endpoint}, model: {self.model_name}, streaming: {stream}")
+    
+    def _get_client(self) -> httpx.AsyncClient:
+        """Returns an HTTP client bound to the running event loop"""
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._client_loop is not loop:
+            headers = {"x-goog-api-key": self.api_key} if self.api_key else {}
+            self._client = ai_http_client("gemini", self.endpoint, headers, self.timeout)
+            self._client_loop = loop
+        return self._client
+    
+    def _is_available(self) -> bool:
+        """Checks whether the API can be called at all"""
+        return bool(self.api_key) or self.custom_endpoint
+    
+    async def warm_up_connections(self):
+        """Opens a connection to the API by fetching the model description"""
+        if not self._is_available():
+            return
+        try:
+            await self._get_client().get(f"/v1beta/models/{self.model_name}")
+        except httpx.HTTPError as e:
+            self.logger.warning(f"Connection warm-up to {self.endpoint} failed: {e!r}")
+    
+    async def evaluate_survival(self, scenario: str, players: Dict[int, Player], game_mode: GameMode, deadline: Optional[Deadline] = None, setting: Optional[str] = None) -> SurvivalResult:
+        """
+        Evaluates player survival chances and generates a story
+        
+        Args:
+            scenario: Game scenario
+            players: Dictionary of players
+            game_mode: Current game mode
+            deadline: Round deadline
+            setting: Enriched scenario built in advance
+        
+        Returns:
+            SurvivalResult: Story, survivors, whether the model generated it and the tokens it consumed
+        """
+        return await self._evaluate_with_generation(scenario, players, game_mode, deadline, setting)
+    
+    @staticmethod
+    def _request_body(prompt: str, generation_config: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Builds a GenerateContentRequest
+        
+        Args:
+            prompt: Prompt text
+            generation_config: Generation parameters in the SDK's snake_case form
+        
+        Returns:
+            Dict[str, Any]: JSON request body
+        """
+        return {
+            "contents": [{"role": "user", "parts": [{"text": prompt}]}],
+            "generationConfig": {
+                "temperature": generation_config["temperature"],
+                "topP": generation_config["top_p"],
+                "topK": generation_config["top_k"],
+                "maxOutputTokens": generation_config["max_output_tokens"],
+            },
+        }
+    
+    async def stream_text(self, model_name: str, body: Dict[str, Any]) -> AsyncIterator[str]:
+        """
+        Streams text chunks from streamGenerateContent with server-sent events
+        
+        Args:
+            model_name: Model ID without the "models/" prefix
+            body: GenerateContentRequest
+        
+        Yields:
+            str: Text chunks in order
+        """
+        started = time.perf_counter()
+        first = True
+        url = f"/v1beta/models/{model_name}:streamGenerateContent"
+        async with self._get_client().stream("POST", url, params={"alt": "sse"}, json=body) as response:
+            if response.is_error:
+                await response.aread()
+                response.raise_for_status()
+            async for line in response.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                text = _response_text(json.loads(line[len("data:"):]))
+                if not text:
+                    continue
+                if first:
+                    AI_TIME_TO_FIRST_TOKEN.labels(type(self).__name__).observe(time.perf_counter() - started)
+                    first = False
+                yield text
+    
+    async def generate_text(self, prompt: str, generation_config: Dict[str, Any], path: GenerationPath, deadline: Optional[Deadline] = None) -> str:
+        """
+        Generates raw text without the local fallback
+        
+        Args:
+            prompt: Prompt text
+            generation_config: Generation parameters
+            path: Generation path chosen for the remaining budget
+            deadline: Round deadline
+        
+        Returns:
+            str: Response text
+        """
+        model_name = self.model_name
+        if path == GenerationPath.REDUCED and self.fast_model_name:
+            model_name = self.fast_model_name
+        body = self._request_body(prompt, generation_config)
+        
+        async def attempt() -> str:
+            if self.streams_output:
+                text = "".join([chunk async for chunk in self.stream_text(model_name, body)])
+            else:
+                response = await self._get_client().post(f"/v1beta/models/{model_name}:generateContent", json=body)
+                response.raise_for_status()
+                text = _response_text(response.json())
+            if not text:
+                raise ValueError("API returned empty response")
+            return text
+        
+        return await call_with_retry(attempt, self.retry_policy, self.circuit_breaker, self.logger, deadline)
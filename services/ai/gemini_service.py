@@ -1,21 +1,34 @@
 import google.generativeai as genai
+import asyncio
 import logging
-from typing import Dict, List, Tuple
+from typing import Any, Dict, Optional
 
-from config import GEMINI_API_KEY
+from config import GEMINI_API_KEY, GEMINI_FAST_MODEL, GEMINI_TRANSPORT, GEMINI_API_ENDPOINT
 from models import Player, GameMode
-from services.ai.base_service import BaseAIService
+from services.ai.base_service import BaseAIService, GenerationPath, SurvivalResult
+from services.ai.resilience import CircuitBreaker, RetryPolicy, call_with_retry
+from utils.deadline import Deadline
 
 
 class GeminiService(BaseAIService):
     """Gemini API service implementation"""
     
-    def __init__(self):
+    def __init__(self, model: Optional[Any] = None):
         super().__init__()
         
+        self.retry_policy = RetryPolicy()
+        self.circuit_breaker = CircuitBreaker("gemini")
+        self.fast_model = None
+        self.transport = GEMINI_TRANSPORT or None
+        
+        if model is not None:
+            self.model = model
+            return
+        
         try:
             
-            genai.configure(api_key=GEMINI_API_KEY)
+            client_options = {"api_endpoint": GEMINI_API_ENDPOINT} if GEMINI_API_ENDPOINT else None
+            genai.configure(api_key=GEMINI_API_KEY, transport=self.transport, client_options=client_options)
             
             
             available_models = [model.name for model in genai.list_models()]
@@ -48,13 +61,17 @@ class GeminiService(BaseAIService):
             self.model = genai.GenerativeModel(model_name)
             self.logger.info(f"Using model: {model_name}")
             
+            if GEMINI_FAST_MODEL:
+                self.fast_model = genai.GenerativeModel(GEMINI_FAST_MODEL)
+                self.logger.info(f"Using fast model for tight budgets: {GEMINI_FAST_MODEL}")
+            
         except Exception as e:
             self.logger.error(f"Error initializing GeminiService: {e}", exc_info=True)
             
             self.model = None
             self.logger.warning("Using fallback mode without API access")
     
-    async def evaluate_survival(self, scenario: str, players: Dict[int, Player], game_mode: GameMode) -> Tuple[str, List[int]]:
+    async def evaluate_survival(self, scenario: str, players: Dict[int, Player], game_mode: GameMode, deadline: Optional[Deadline] = None, setting: Optional[str] = None) -> SurvivalResult:
         """
         Evaluates player survival chances and generates a story
         
@@ -62,64 +79,91 @@ class GeminiService(BaseAIService):
             scenario: Game scenario
             players: Dictionary of players
             game_mode: Current game mode
+            deadline: Round deadline
+            setting: Enriched scenario built in advance
             
         Returns:
-            Tuple[str, List[int]]: Story narrative and list of survived player IDs
+            SurvivalResult: Story, survivors, whether the model generated it and the tokens it consumed
         """
+        return await self._evaluate_with_generation(scenario, players, game_mode, deadline, setting)
+    
+    def _is_available(self) -> bool:
+        """Checks whether the API can be called at all"""
+        return self.model is not None
+    
+    async def generate_text(self, prompt: str, generation_config: Dict[str, Any], path: GenerationPath, deadline: Optional[Deadline] = None) -> str:
+        """
+        Generates raw text without the local fallback
         
-        if game_mode == GameMode.BROTHERHOOD:
-            prompt = self._build_cooperative_prompt(scenario, players)
-        else:
-            prompt = self._build_competitive_prompt(scenario, players)
+        Args:
+            prompt: Prompt text
+            generation_config: Generation parameters
+            path: Generation path chosen for the remaining budget
+            deadline: Round deadline
             
-        self.logger.info(f"Prompt created, length: {len(prompt)}")
+        Returns:
+            str: Response text
+        """
+        response = await self._generate(prompt, generation_config, path, deadline)
+        if not response:
+            raise ValueError("API returned empty response")
+        return self._extract_text(response)
+    
+    async def _generate(self, prompt: str, generation_config: Dict[str, Any], path: GenerationPath, deadline: Optional[Deadline]) -> Any:
+        """
+        Calls the model with retries and the circuit breaker
         
+        Args:
+            prompt: Prompt text
+            generation_config: Generation parameters
+            path: Generation path chosen for the remaining budget
+            deadline: Round deadline
+            
+        Returns:
+            Any: SDK response
+        """
+        model = self.model
+        if path == GenerationPath.REDUCED and self.fast_model:
+            model = self.fast_model
         
-        if not self.model:
-            self.logger.warning("API unavailable, using fallback mode")
-            return self._generate_fallback_response(scenario, players, game_mode)
+        if self.transport == "rest":
+            # The SDK only has a synchronous REST client, so run it off the event loop
+            def operation():
+                return asyncio.to_thread(model.generate_content, prompt, generation_config=generation_config)
+        else:
+            def operation():
+                return model.generate_content_async(prompt, generation_config=generation_config)
         
-        try:
-            
-            generation_config = {
-                "temperature": 0.7,
-                "top_p": 0.95,
-                "top_k": 40,
-                "max_output_tokens": 4096,
-            }
-            
-            
-            response = await self.model.generate_content_async(
-                prompt,
-                generation_config=generation_config
-            )
-            
-            
-            if not response:
-                self.logger.error("API returned empty response")
-                return self._generate_fallback_response(scenario, players, game_mode)
-            
-            
-            if hasattr(response, 'text'):
-                response_text = response.text
-            elif hasattr(response, 'parts'):
-                parts = []
-                for part in response.parts:
-                    if hasattr(part, 'text'):
-                        parts.append(part.text)
-                    else:
-                        parts.append(str(part))
-                response_text = ''.join(parts)
-            else:
-                
-                response_text = str(response)
-            
-            self.logger.info(f"Received response from API, length: {len(response_text)}")
-            
-            return response_text
+        return await call_with_retry(
+            operation,
+            self.retry_policy,
+            self.circuit_breaker,
+            self.logger,
+            deadline,
+        )
+    
+    @staticmethod
+    def _extract_text(response: Any) -> str:
+        """
+        Extracts plain text from an SDK response
         
-        except Exception as e:
-            self.logger.error(f"Error accessing Gemini API: {e}", exc_info=True)
+        Args:
+            response: Response returned by generate_content_async
             
-            return self._generate_fallback_response(scenario, players, game_mode)
+        Returns:
+            str: Concatenated response text
+        """
+        if hasattr(response, 'text'):
+            return response.text
+        
+        if hasattr(response, 'parts'):
+            parts = []
+            for part in response.parts:
+                if hasattr(part, 'text'):
+                    parts.append(part.text)
+                else:
+                    parts.append(str(part))
+            return ''.join(parts)
+        
+        return str(response)
     
\ No newline at end of file
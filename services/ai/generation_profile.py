@@ -0,0 +1,111 @@
+import logging
+from dataclasses import dataclass
+from enum import Enum
+from typing import Any, Callable, Dict
+
+from config import (
+    AI_MAX_OUTPUT_TOKENS, AI_MIN_OUTPUT_TOKENS, AI_OUTPUT_TOKENS_BASE, AI_OUTPUT_TOKENS_PER_PLAYER,
+    AI_BUSY_QUEUE_DEPTH, AI_OVERLOAD_QUEUE_DEPTH, AI_BUSY_OUTPUT_FACTOR, AI_OVERLOAD_OUTPUT_FACTOR,
+)
+from models import GameMode
+from services.admission import admission_controller
+
+
+# A cooperative story judges the group as a whole, so each extra player adds less text
+COOPERATIVE_PLAYER_FACTOR = 0.5
+
+# Russian prose takes roughly three tokens per word
+TOKENS_PER_WORD = 3
+
+
+class LoadLevel(Enum):
+    """System load derived from the AI admission queue"""
+    NORMAL = "normal"
+    BUSY = "busy"
+    OVERLOADED = "overloaded"
+
+
+@dataclass(frozen=True)
+class GenerationProfile:
+    """Generation parameters chosen for one round"""
+    load: LoadLevel
+    max_output_tokens: int
+    fast_model: bool = False
+    temperature: float = 0.7
+    top_p: float = 0.95
+    top_k: int = 40
+    
+    def generation_config(self) -> Dict[str, Any]:
+        """Returns the sampling parameters in the format of BaseAIService._generation_config"""
+        return {
+            "temperature": self.temperature,
+            "top_p": self.top_p,
+            "top_k": self.top_k,
+            "max_output_tokens": self.max_output_tokens,
+        }
+    
+    def length_hint(self) -> str:
+        """Prompt instruction that keeps the story within the output limit so the verdict line is not cut off"""
+        return (
+            f"ОГРАНИЧЕНИЕ ДЛИНЫ: не более {self.max_output_tokens // TOKENS_PER_WORD} слов. "
+            "Строку с итогом (ВЫЖИЛИ/ПОГИБЛИ) обязательно допиши до конца."
+        )
+
+
+class GenerationProfiler:
+    """Sizes the output by lobby size and game mode and shrinks it while evaluations queue up"""
+    
+    def __init__(
+        self,
+        queue_depth: Callable[[], int],
+        busy_queue_depth: int = AI_BUSY_QUEUE_DEPTH,
+        overload_queue_depth: int = AI_OVERLOAD_QUEUE_DEPTH,
+        busy_factor: float = AI_BUSY_OUTPUT_FACTOR,
+        overload_factor: float = AI_OVERLOAD_OUTPUT_FACTOR,
+    ):
+        self.queue_depth = queue_depth
+        self.busy_queue_depth = busy_queue_depth
+        self.overload_queue_depth = overload_queue_depth
+        self.factors = {
+            LoadLevel.NORMAL: 1.0,
+            LoadLevel.BUSY: busy_factor,
+            LoadLevel.OVERLOADED: overload_factor,
+        }
+        self.logger = logging.getLogger(__name__)
+    
+    def load_level(self) -> LoadLevel:
+        """Classifies the current number of evaluations waiting for a slot"""
+        depth = self.queue_depth()
+        if depth >= self.overload_queue_depth:
+            return LoadLevel.OVERLOADED
+        if depth >= self.busy_queue_depth:
+            return LoadLevel.BUSY
+        return LoadLevel.NORMAL
+    
+    def select(self, players_count: int, game_mode: GameMode) -> GenerationProfile:
+        """
+        Chooses generation parameters for a round
+        
+        Args:
+            players_count: Number of players in the lobby
+            game_mode: Current game mode
+        
+        Returns:
+            GenerationProfile: Output limit and model tier; an overloaded system
+                switches to the fast model so queued rounds drain sooner
+        """
+        per_player = AI_OUTPUT_TOKENS_PER_PLAYER
+        if game_mode == GameMode.BROTHERHOOD:
+            per_player *= COOPERATIVE_PLAYER_FACTOR
+        tokens = min(AI_MAX_OUTPUT_TOKENS, AI_OUTPUT_TOKENS_BASE + per_player * max(1, players_count))
+        
+        load = self.load_level()
+        tokens = max(AI_MIN_OUTPUT_TOKENS, int(tokens * self.factors[load]))
+        profile = GenerationProfile(load, tokens, fast_model=load == LoadLevel.OVERLOADED)
+        
+        if load != LoadLevel.NORMAL:
+            self.logger.info(f"Load {load.value}, generation limited to {tokens} tokens")
+        return profile
+
+
+generation_profiler = GenerationProfiler(lambda: admission_controller.queue_depth)
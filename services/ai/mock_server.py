@@ -0,0 +1,232 @@
+import argparse
+import asyncio
+import json
+import logging
+import time
+from typing import Any, AsyncIterator, Dict, Optional
+
+from services.ai.mock_service import MockBackendError, MockBehavior
+from utils.http_server import HTTPServer, Request, Response, StreamingResponse
+
+
+MOCK_MODELS = ["gemini-2.0-flash-lite", "gemini-2.0-flash"]
+
+GOOGLE_STATUS_NAMES = {
+    400: "INVALID_ARGUMENT", 403: "PERMISSION_DENIED", 404: "NOT_FOUND", 429: "RESOURCE_EXHAUSTED",
+    500: "INTERNAL", 503: "UNAVAILABLE", 504: "DEADLINE_EXCEEDED",
+}
+
+
+class MockAIServer:
+    """
+    Local HTTP stand-in for the Gemini REST API and OpenAI-compatible chat completions
+    
+    Responses are produced by MockBehavior, so latency, streaming rate, injected errors
+    and survivor verdicts match MockAIService.
+    """
+    
+    def __init__(self, behavior: Optional[MockBehavior] = None, host: str = "127.0.0.1", port: int = 0):
+        self.behavior = behavior or MockBehavior()
+        self.http = HTTPServer(host, port)
+        self.requests = 0
+        self.logger = logging.getLogger(__name__)
+        
+        self.http.route("GET", "/v1beta/models", self._list_models)
+        self.http.route("GET", "/v1beta/models/{model}", self._get_model)
+        self.http.route("POST", "/v1beta/models/{target}", self._gemini_generate)
+        self.http.route("POST", "/v1/chat/completions", self._chat_completions)
+    
+    @property
+    def url(self) -> str:
+        """Base URL of the running server"""
+        return self.http.url
+    
+    async def start(self):
+        """Starts listening; the actual port is available through url"""
+        await self.http.start()
+    
+    async def stop(self):
+        """Stops the server"""
+        await self.http.stop()
+    
+    @staticmethod
+    def _model_info(name: str) -> Dict[str, Any]:
+        return {
+            "name": f"models/{name}",
+            "baseModelId": name,
+            "version": "mock",
+            "displayName": f"Mock {name}",
+            "inputTokenLimit": 1048576,
+            "outputTokenLimit": 8192,
+            "supportedGenerationMethods": ["generateContent", "countTokens"],
+        }
+    
+    async def _list_models(self, request: Request) -> Response:
+        return Response.json({"models": [self._model_info(name) for name in MOCK_MODELS]})
+    
+    async def _get_model(self, request: Request) -> Response:
+        name = request.params["model"]
+        if name not in MOCK_MODELS:
+            return self._google_error(404, f"Model {name} not found")
+        return Response.json(self._model_info(name))
+    
+    @staticmethod
+    def _google_error(status: int, message: str) -> Response:
+        return Response.json(
+            {"error": {"code": status, "message": message, "status": GOOGLE_STATUS_NAMES.get(status, "UNKNOWN")}},
+            status=status,
+        )
+    
+    @staticmethod
+    def _openai_error(status: int, message: str) -> Response:
+        return Response.json({"error": {"message": message, "type": "mock_error", "code": status}}, status=status)
+    
+    @staticmethod
+    def _gemini_chunk(text: str, finished: bool) -> Dict[str, Any]:
+        candidate = {"content": {"parts": [{"text": text}], "role": "model"}, "index": 0}
+        if finished:
+            candidate["finishReason"] = "STOP"
+        return {"candidates": [candidate]}
+    
+    async def _open_stream(self, prompt: str, max_output_tokens: int) -> AsyncIterator[str]:
+        """
+        Starts a mock stream and waits for its first chunk so injected errors become HTTP statuses
+        
+        Args:
+            prompt: Prompt text
+            max_output_tokens: Output limit
+        
+        Returns:
+            AsyncIterator[str]: Chunks including the already received first one
+        
+        Raises:
+            MockBackendError: When an error is injected
+        """
+        self.requests += 1
+        chunks = self.behavior.stream(prompt, max_output_tokens)
+        first = await chunks.__anext__()
+        
+        async def replay() -> AsyncIterator[str]:
+            yield first
+            async for chunk in chunks:
+                yield chunk
+        
+        return replay()
+    
+    async def _gemini_generate(self, request: Request) -> Response:
+        model, _, method = request.params["target"].partition(":")
+        if model not in MOCK_MODELS:
+            return self._google_error(404, f"Model {model} not found")
+        if method not in ("generateContent", "streamGenerateContent"):
+            return self._google_error(400, f"Unsupported method {method}")
+        
+        body = request.json() or {}
+        prompt = "".join(
+            part.get("text", "")
+            for content in body.get("contents", [])
+            for part in content.get("parts", [])
+        )
+        config = body.get("generationConfig") or body.get("generation_config") or {}
+        max_output_tokens = int(config.get("maxOutputTokens") or config.get("max_output_tokens") or 4096)
+        
+        try:
+            chunks = await self._open_stream(prompt, max_output_tokens)
+        except MockBackendError as e:
+            return self._google_error(e.code, str(e))
+        
+        if method == "generateContent":
+            text = "".join([chunk async for chunk in chunks])
+            return Response.json(self._gemini_chunk(text, finished=True))
+        
+        if request.query.get("alt") == "sse":
+            async def events() -> AsyncIterator[bytes]:
+                async for chunk in chunks:
+                    yield f"data: {json.dumps(self._gemini_chunk(chunk, False), ensure_ascii=False)}\r\n\r\n".encode("utf-8")
+                yield f"data: {json.dumps(self._gemini_chunk('', True))}\r\n\r\n".encode("utf-8")
+            
+            return StreamingResponse(events())
+        
+        async def array() -> AsyncIterator[bytes]:
+            # Without alt=sse the API streams a JSON array of responses
+            yield b"["
+            async for chunk in chunks:
+                yield (json.dumps(self._gemini_chunk(chunk, False), ensure_ascii=False) + ",\r\n").encode("utf-8")
+            yield (json.dumps(self._gemini_chunk("", True)) + "]").encode("utf-8")
+        
+        return StreamingResponse(array(), content_type="application/json")
+    
+    async def _chat_completions(self, request: Request) -> Response:
+        body = request.json() or {}
+        model = body.get("model", "mock")
+        prompt = "\n".join(str(message.get("content", "")) for message in body.get("messages", []))
+        max_output_tokens = int(body.get("max_tokens") or 4096)
+        created = int(time.time())
+        
+        try:
+            chunks = await self._open_stream(prompt, max_output_tokens)
+        except MockBackendError as e:
+            return self._openai_error(e.code, str(e))
+        
+        if not body.get("stream"):
+            text = "".join([chunk async for chunk in chunks])
+            return Response.json({
+                "id": f"chatcmpl-mock-{self.requests}",
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(text) // 4, "total_tokens": (len(prompt) + len(text)) // 4},
+            })
+        
+        async def events() -> AsyncIterator[bytes]:
+            base = {"id": f"chatcmpl-mock-{self.requests}", "object": "chat.completion.chunk", "created": created, "model": model}
+            async for chunk in chunks:
+                payload = dict(base, choices=[{"index": 0, "delta": {"content": chunk}, "finish_reason": None}])
+                yield f"data: {json.dumps(payload, ensure_ascii=False)}\n\n".encode("utf-8")
+            payload = dict(base, choices=[{"index": 0, "delta": {}, "finish_reason": "stop"}])
+            yield f"data: {json.dumps(payload)}\n\ndata: [DONE]\n\n".encode("utf-8")
+        
+        return StreamingResponse(events())
+
+
+async def serve(server: MockAIServer):
+    """Runs the mock server until cancelled"""
+    await server.start()
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.stop()
+
+
+def main():
+    """Command line entry point: python -m services.ai.mock_server --port 8081"""
+    defaults = MockBehavior()
+    parser = argparse.ArgumentParser(description="Local Gemini/OpenAI-compatible stand-in for load testing")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency", default=defaults.latency, help="fixed:S, uniform:MIN:MAX, normal:MEAN:STD, lognormal:MU:SIGMA or exponential:MEAN")
+    parser.add_argument("--chunks-per-second", type=float, default=defaults.chunks_per_second)
+    parser.add_argument("--chunk-size", type=int, default=defaults.chunk_size)
+    parser.add_argument("--error-rate", type=float, default=defaults.error_rate)
+    parser.add_argument("--error-status", type=int, default=defaults.error_status)
+    parser.add_argument("--seed", type=int, default=defaults.seed)
+    args = parser.parse_args()
+    
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    behavior = MockBehavior(
+        latency=args.latency,
+        chunks_per_second=args.chunks_per_second,
+        chunk_size=args.chunk_size,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        seed=args.seed,
+    )
+    
+    try:
+        asyncio.run(serve(MockAIServer(behavior, args.host, args.port)))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,231 @@
+import asyncio
+import hashlib
+import random
+import re
+import time
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Dict, Optional
+
+from config import (
+    MOCK_LATENCY, MOCK_STREAM_CHUNKS_PER_SECOND, MOCK_STREAM_CHUNK_SIZE,
+    MOCK_ERROR_RATE, MOCK_ERROR_STATUS, MOCK_SEED
+)
+from models import Player, GameMode
+from services.ai.base_service import ENRICHMENT_MARKER, BaseAIService, GenerationPath, SurvivalResult
+from services.ai.resilience import CircuitBreaker, RetryPolicy, call_with_retry
+from utils.deadline import Deadline
+from utils.metrics import AI_TIME_TO_FIRST_TOKEN
+
+
+PLAYER_PATTERN = re.compile(r"Name: (?P<name>[^\n]+)\n\s*Action: (?P<action>[^\n]*)")
+COOPERATIVE_MARKER = "кооперативной игре"
+
+
+class MockBackendError(Exception):
+    """Injected backend failure carrying an HTTP status code"""
+    
+    def __init__(self, code: int):
+        super().__init__(f"Injected mock error {code}")
+        self.code = code
+
+
+class LatencyDistribution:
+    """
+    Latency distribution parsed from a spec string
+    
+    Supported specs: "fixed:S", "uniform:MIN:MAX", "normal:MEAN:STD",
+    "lognormal:MU:SIGMA" and "exponential:MEAN"; all values in seconds.
+    """
+    
+    def __init__(self, spec: str, rng: random.Random):
+        self.spec = spec
+        self.rng = rng
+        kind, *params = spec.split(":")
+        self.kind = kind.strip().lower()
+        self.params = [float(param) for param in params]
+        
+        expected = {"fixed": 1, "uniform": 2, "normal": 2, "lognormal": 2, "exponential": 1}
+        if self.kind not in expected or len(self.params) != expected[self.kind]:
+            raise ValueError(f"Invalid latency spec: {spec!r}")
+    
+    def sample(self) -> float:
+        """Draws one latency value, never negative"""
+        if self.kind == "fixed":
+            value = self.params[0]
+        elif self.kind == "uniform":
+            value = self.rng.uniform(*self.params)
+        elif self.kind == "normal":
+            value = self.rng.gauss(*self.params)
+        elif self.kind == "lognormal":
+            value = self.rng.lognormvariate(*self.params)
+        else:
+            value = self.rng.expovariate(1 / self.params[0]) if self.params[0] > 0 else 0.0
+        return max(0.0, value)
+
+
+@dataclass
+class MockBehavior:
+    """Latency, streaming and failure behavior shared by the mock service and the mock HTTP server"""
+    latency: str = MOCK_LATENCY
+    chunks_per_second: float = MOCK_STREAM_CHUNKS_PER_SECOND
+    chunk_size: int = MOCK_STREAM_CHUNK_SIZE
+    error_rate: float = MOCK_ERROR_RATE
+    error_status: int = MOCK_ERROR_STATUS
+    seed: Optional[int] = MOCK_SEED
+    rng: random.Random = field(init=False, repr=False)
+    
+    def __post_init__(self):
+        self.rng = random.Random(self.seed)
+        self.latency_distribution = LatencyDistribution(self.latency, self.rng)
+    
+    @staticmethod
+    def _stable_bit(*parts: str) -> bool:
+        digest = hashlib.sha256("\x1f".join(parts).encode("utf-8")).digest()
+        return digest[0] % 2 == 0
+    
+    def verdicts(self, prompt: str) -> Dict[str, bool]:
+        """
+        Deterministic survival verdicts for the players listed in a prompt
+        
+        Args:
+            prompt: Prompt built by BaseAIService
+        
+        Returns:
+            Dict[str, bool]: Player name -> survived; the same prompt always gives the same verdicts
+        """
+        players = [(match.group("name").strip(), match.group("action").strip()) for match in PLAYER_PATTERN.finditer(prompt)]
+        
+        if COOPERATIVE_MARKER in prompt:
+            survived = self._stable_bit(*(f"{name}:{action}" for name, action in players))
+            return {name: survived for name, _ in players}
+        
+        return {name: self._stable_bit(name, action) for name, action in players}
+    
+    def render(self, prompt: str, max_output_tokens: int = 4096) -> str:
+        """
+        Builds a narrative in the format the real prompts ask for
+        
+        Args:
+            prompt: Prompt built by BaseAIService
+            max_output_tokens: Output limit; the story is shortened to fit, the verdict line is kept
+        
+        Returns:
+            str: Narrative ending with the survivors line, or a short setting for enrichment prompts
+        """
+        if ENRICHMENT_MARKER in prompt:
+            return "Тестовая завязка (mock): обстоятельства осложняются."
+        
+        verdicts = self.verdicts(prompt)
+        lines = [
+            f"{name} {'чудом выбирается из передряги' if survived else 'не переживает этот день'}."
+            for name, survived in verdicts.items()
+        ]
+        survivors = [name for name, survived in verdicts.items() if survived]
+        
+        if COOPERATIVE_MARKER in prompt:
+            ending = "ВЫЖИЛИ ВСЕ" if survivors else "ПОГИБЛИ ВСЕ"
+        else:
+            ending = f"ВЫЖИЛИ: {', '.join(survivors)}" if survivors else "ПОГИБЛИ ВСЕ"
+        
+        story = "Тестовая история (mock).\n\n" + "\n".join(lines)
+        limit = max(0, max_output_tokens * 4 - len(ending) - 2)
+        return f"{story[:limit]}\n\n{ending}"
+    
+    def should_fail(self) -> bool:
+        """Decides whether the next request gets an injected error"""
+        return self.error_rate > 0 and self.rng.random() < self.error_rate
+    
+    async def stream(self, prompt: str, max_output_tokens: int = 4096) -> AsyncIterator[str]:
+        """
+        Streams the narrative after the sampled time to first token
+        
+        Args:
+            prompt: Prompt text
+            max_output_tokens: Output limit
+        
+        Yields:
+            str: Narrative chunks of chunk_size characters at chunks_per_second
+        
+        Raises:
+            MockBackendError: When an error is injected
+        """
+        fail = self.should_fail()
+        await asyncio.sleep(self.latency_distribution.sample())
+        if fail:
+            raise MockBackendError(self.error_status)
+        
+        text = self.render(prompt, max_output_tokens)
+        interval = 1 / self.chunks_per_second if self.chunks_per_second > 0 else 0.0
+        
+        for offset in range(0, len(text), max(1, self.chunk_size)):
+            if offset and interval:
+                await asyncio.sleep(interval)
+            yield text[offset:offset + max(1, self.chunk_size)]
+
+
+class MockAIService(BaseAIService):
+    """Offline AI service with configurable latency, streaming, error injection and deterministic verdicts"""
+    
+    streams_output = True
+    
+    def __init__(self, behavior: Optional[MockBehavior] = None):
+        super().__init__()
+        
+        self.behavior = behavior or MockBehavior()
+        self.retry_policy = RetryPolicy()
+        self.circuit_breaker = CircuitBreaker("mock")
+        
+        self.logger.info(f"Using mock AI service: {self.behavior}")
+    
+    async def evaluate_survival(self, scenario: str, players: Dict[int, Player], game_mode: GameMode, deadline: Optional[Deadline] = None, setting: Optional[str] = None) -> SurvivalResult:
+        """
+        Evaluates player survival chances and generates a story
+        
+        Args:
+            scenario: Game scenario
+            players: Dictionary of players
+            game_mode: Current game mode
+            deadline: Round deadline
+            setting: Enriched scenario built in advance
+        
+        Returns:
+            SurvivalResult: Story, survivors, whether the model generated it and the tokens it consumed
+        """
+        return await self._evaluate_with_generation(scenario, players, game_mode, deadline, setting)
+    
+    async def stream_text(self, prompt: str, generation_config: Dict[str, Any]) -> AsyncIterator[str]:
+        """
+        Streams the mock narrative chunk by chunk
+        
+        Args:
+            prompt: Prompt text
+            generation_config: Generation parameters
+        
+        Yields:
+            str: Narrative chunks
+        """
+        started = time.perf_counter()
+        first = True
+        async for chunk in self.behavior.stream(prompt, generation_config["max_output_tokens"]):
+            if first:
+                AI_TIME_TO_FIRST_TOKEN.labels(type(self).__name__).observe(time.perf_counter() - started)
+                first = False
+            yield chunk
+    
+    async def generate_text(self, prompt: str, generation_config: Dict[str, Any], path: GenerationPath, deadline: Optional[Deadline] = None) -> str:
+        """
+        Collects the streamed mock narrative with retries and the circuit breaker
+        
+        Args:
+            prompt: Prompt text
+            generation_config: Generation parameters
+            path: Generation path chosen for the remaining budget
+            deadline: Round deadline
+        
+        Returns:
+            str: Response text
+        """
+        async def attempt() -> str:
+            return "".join([chunk async for chunk in self.stream_text(prompt, generation_config)])
+        
+        return await call_with_retry(attempt, self.retry_policy, self.circuit_breaker, self.logger, deadline)
@@ -0,0 +1,97 @@
+import asyncio
+from typing import Any, Dict, Optional
+
+import httpx
+
+from config import OPENAI_BASE_URL, OPENAI_API_KEY, OPENAI_MODEL, OPENAI_FAST_MODEL, OPENAI_TIMEOUT
+from models import Player, GameMode
+from services.ai.base_service import BaseAIService, GenerationPath, SurvivalResult
+from services.ai.resilience import CircuitBreaker, RetryPolicy, call_with_retry
+from utils.deadline import Deadline
+from utils.transport import ai_http_client
+
+
+class OpenAICompatibleService(BaseAIService):
+    """Service for any server implementing the OpenAI chat completions API (vLLM, llama.cpp, Ollama, ...)"""
+    
+    def __init__(self, base_url: str = OPENAI_BASE_URL, api_key: str = OPENAI_API_KEY, model_name: str = OPENAI_MODEL, fast_model_name: str = OPENAI_FAST_MODEL, timeout: float = OPENAI_TIMEOUT):
+        super().__init__()
+        
+        self.base_url = base_url.rstrip("/")
+        self.api_key = api_key
+        self.model_name = model_name
+        self.fast_model_name = fast_model_name
+        self.timeout = timeout
+        self.retry_policy = RetryPolicy()
+        self.circuit_breaker = CircuitBreaker(f"openai:{self.base_url}")
+        self._client: Optional[httpx.AsyncClient] = None
+        self._client_loop: Optional[asyncio.AbstractEventLoop] = None
+        
+        self.logger.info(f"Using OpenAI-compatible backend {self.base_url}, model: {self.model_name}")
+    
+    def _get_client(self) -> httpx.AsyncClient:
+        """Returns an HTTP client bound to the running event loop"""
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._client_loop is not loop:
+            headers = {"Authorization": f"Bearer {self.api_key}"} if self.api_key else {}
+            self._client = ai_http_client("openai", self.base_url, headers, self.timeout)
+            self._client_loop = loop
+        return self._client
+    
+    async def warm_up_connections(self):
+        """Opens a connection to the server with a cheap GET /models"""
+        try:
+            await self._get_client().get("/models")
+        except httpx.HTTPError as e:
+            self.logger.warning(f"Connection warm-up to {self.base_url} failed: {e!r}")
+    
+    async def evaluate_survival(self, scenario: str, players: Dict[int, Player], game_mode: GameMode, deadline: Optional[Deadline] = None, setting: Optional[str] = None) -> SurvivalResult:
+        """
+        Evaluates player survival chances and generates a story
+        
+        Args:
+            scenario: Game scenario
+            players: Dictionary of players
+            game_mode: Current game mode
+            deadline: Round deadline
+            setting: Enriched scenario built in advance
+        
+        Returns:
+            SurvivalResult: Story, survivors, whether the model generated it and the tokens it consumed
+        """
+        return await self._evaluate_with_generation(scenario, players, game_mode, deadline, setting)
+    
+    async def generate_text(self, prompt: str, generation_config: Dict[str, Any], path: GenerationPath, deadline: Optional[Deadline] = None) -> str:
+        """
+        Calls /chat/completions with retries and the circuit breaker
+        
+        Args:
+            prompt: Prompt text
+            generation_config: Generation parameters
+            path: Generation path chosen for the remaining budget
+            deadline: Round deadline
+        
+        Returns:
+            str: Response text
+        """
+        model_name = self.model_name
+        if path == GenerationPath.REDUCED and self.fast_model_name:
+            model_name = self.fast_model_name
+        
+        payload = {
+            "model": model_name,
+            "messages": [{"role": "user", "content": prompt}],
+            "temperature": generation_config["temperature"],
+            "top_p": generation_config["top_p"],
+            "max_tokens": generation_config["max_output_tokens"],
+        }
+        
+        async def attempt() -> str:
+            response = await self._get_client().post("/chat/completions", json=payload)
+            response.raise_for_status()
+            text = response.json()["choices"][0]["message"]["content"]
+            if not text:
+                raise ValueError("API returned empty response")
+            return text
+        
+        return await call_with_retry(attempt, self.retry_policy, self.circuit_breaker, self.logger, deadline)
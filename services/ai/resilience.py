@@ -0,0 +1,280 @@
+import asyncio
+import logging
+import random
+import time
+from dataclasses import dataclass
+from enum import Enum
+from typing import Awaitable, Callable, List, Optional, TypeVar
+
+from config import (
+    AI_RETRY_MAX_ATTEMPTS, AI_RETRY_BASE_DELAY, AI_RETRY_MAX_DELAY,
+    AI_BREAKER_FAILURE_THRESHOLD, AI_BREAKER_RESET_TIMEOUT
+)
+from utils.deadline import Deadline, remaining_budget
+
+
+T = TypeVar("T")
+
+TRANSIENT_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+TRANSIENT_ERROR_NAMES = {
+    "ServiceUnavailable", "InternalServerError", "DeadlineExceeded",
+    "TooManyRequests", "ResourceExhausted", "GatewayTimeout", "BadGateway",
+    "TransportError", "TimeoutException", "RemoteProtocolError",
+}
+
+TRANSIENT_GRPC_CODES = {"UNAVAILABLE", "DEADLINE_EXCEEDED", "RESOURCE_EXHAUSTED", "INTERNAL", "ABORTED"}
+
+
+class ErrorClass(Enum):
+    """Classification of a failed generation attempt"""
+    TRANSIENT = "transient"
+    PERMANENT = "permanent"
+
+
+class CircuitState(Enum):
+    """Circuit breaker states"""
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Raised when a call is rejected because the circuit breaker is open"""
+
+
+class RetryElsewhereError(Exception):
+    """Transient failure of one key or replica: retried at once, but not counted by the circuit breaker"""
+
+
+def error_status_code(error: BaseException) -> Optional[int]:
+    """Extracts an HTTP status code from SDK and HTTP client exceptions"""
+    code = getattr(error, "code", None)
+    if isinstance(code, int):
+        return code
+    
+    response = getattr(error, "response", None)
+    status = getattr(response, "status_code", None)
+    if isinstance(status, int):
+        return status
+    
+    return None
+
+
+def classify_error(error: BaseException) -> ErrorClass:
+    """
+    Decides whether a failed call is worth retrying
+    
+    Args:
+        error: Exception raised by the generation call
+    
+    Returns:
+        ErrorClass: TRANSIENT for timeouts, throttling and 5xx errors, PERMANENT otherwise
+    """
+    if isinstance(error, (asyncio.TimeoutError, TimeoutError, ConnectionError, RetryElsewhereError)):
+        return ErrorClass.TRANSIENT
+    
+    status = error_status_code(error)
+    if status is not None:
+        return ErrorClass.TRANSIENT if status in TRANSIENT_STATUS_CODES else ErrorClass.PERMANENT
+    
+    code = getattr(error, "code", None)
+    if callable(code):
+        try:
+            grpc_code = code()
+        except Exception:
+            grpc_code = None
+        if getattr(grpc_code, "name", None) in TRANSIENT_GRPC_CODES:
+            return ErrorClass.TRANSIENT
+    
+    if any(cls.__name__ in TRANSIENT_ERROR_NAMES for cls in type(error).__mro__):
+        return ErrorClass.TRANSIENT
+    
+    return ErrorClass.PERMANENT
+
+
+@dataclass
+class RetryPolicy:
+    """Exponential backoff with full jitter for transient errors"""
+    max_attempts: int = AI_RETRY_MAX_ATTEMPTS
+    base_delay: float = AI_RETRY_BASE_DELAY
+    max_delay: float = AI_RETRY_MAX_DELAY
+    multiplier: float = 2.0
+    
+    def compute_delay(self, attempt: int) -> float:
+        """
+        Returns the pause before the next attempt
+        
+        Args:
+            attempt: Number of the attempt that just failed, starting from 1
+        
+        Returns:
+            float: Delay in seconds, uniformly drawn from [0, capped exponential delay]
+        """
+        ceiling = min(self.max_delay, self.base_delay * (self.multiplier ** (attempt - 1)))
+        return random.uniform(0, ceiling)
+
+
+class CircuitBreaker:
+    """Circuit breaker that short-circuits calls after consecutive transient failures"""
+    
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = AI_BREAKER_FAILURE_THRESHOLD,
+        reset_timeout: float = AI_BREAKER_RESET_TIMEOUT,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._state = CircuitState.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._listeners: List[Callable[[str, CircuitState, CircuitState], None]] = []
+        self.logger = logging.getLogger(__name__)
+    
+    @property
+    def state(self) -> CircuitState:
+        """Current state; an open breaker becomes half-open once the reset timeout elapses"""
+        if self._state == CircuitState.OPEN and self._clock() - self._opened_at >= self.reset_timeout:
+            self._transition(CircuitState.HALF_OPEN)
+        return self._state
+    
+    @property
+    def is_open(self) -> bool:
+        """Whether calls are currently rejected; read-only, safe to call from other threads"""
+        return self._state == CircuitState.OPEN and self._clock() - self._opened_at < self.reset_timeout
+    
+    def add_listener(self, listener: Callable[[str, CircuitState, CircuitState], None]):
+        """
+        Subscribes to state transitions
+        
+        Args:
+            listener: Callable receiving (breaker name, old state, new state)
+        """
+        self._listeners.append(listener)
+    
+    def allow_request(self) -> bool:
+        """Checks whether a call may proceed; only one probe is let through while half-open"""
+        state = self.state
+        if state == CircuitState.CLOSED:
+            return True
+        if state == CircuitState.HALF_OPEN and not self._probe_in_flight:
+            self._probe_in_flight = True
+            return True
+        return False
+    
+    def record_success(self):
+        """Registers a call that reached the backend"""
+        self._failures = 0
+        self._probe_in_flight = False
+        if self._state != CircuitState.CLOSED:
+            self._transition(CircuitState.CLOSED)
+    
+    def record_failure(self):
+        """Registers a transient failure"""
+        self._failures += 1
+        self._probe_in_flight = False
+        if self._state == CircuitState.HALF_OPEN or self._failures >= self.failure_threshold:
+            self._opened_at = self._clock()
+            if self._state != CircuitState.OPEN:
+                self._transition(CircuitState.OPEN)
+    
+    def release_probe(self):
+        """Lets the next half-open probe through without recording an outcome (cancelled call or client error)"""
+        self._probe_in_flight = False
+    
+    def _transition(self, new_state: CircuitState):
+        old_state = self._state
+        self._state = new_state
+        self.logger.warning(f"Circuit breaker '{self.name}': {old_state.value} -> {new_state.value}")
+        for listener in self._listeners:
+            try:
+                listener(self.name, old_state, new_state)
+            except Exception as e:
+                self.logger.error(f"Circuit breaker listener failed: {e}", exc_info=True)
+
+
+async def call_with_retry(
+    operation: Callable[[], Awaitable[T]],
+    policy: RetryPolicy,
+    breaker: Optional[CircuitBreaker] = None,
+    logger: Optional[logging.Logger] = None,
+    deadline: Optional[Deadline] = None,
+) -> T:
+    """
+    Runs an async operation with classified retries and an optional circuit breaker
+    
+    Args:
+        operation: Zero-argument coroutine factory performing one attempt
+        policy: Retry policy
+        breaker: Circuit breaker guarding the backend
+        logger: Logger for retry decisions
+        deadline: Round deadline; each attempt is cut off when it expires and
+            no retry is scheduled that would not fit into the remaining budget
+    
+    Returns:
+        T: Result of the first successful attempt
+    
+    Raises:
+        CircuitOpenError: If the breaker rejects the call
+        asyncio.TimeoutError: If the deadline expires before an attempt can start
+        Exception: The last error when it is permanent or attempts are exhausted
+    """
+    logger = logger or logging.getLogger(__name__)
+    
+    for attempt in range(1, policy.max_attempts + 1):
+        if breaker and not breaker.allow_request():
+            raise CircuitOpenError(f"Circuit breaker '{breaker.name}' is open")
+        
+        if deadline and deadline.expired():
+            raise asyncio.TimeoutError(f"Deadline expired before attempt {attempt}")
+        
+        try:
+            if deadline:
+                result = await asyncio.wait_for(operation(), timeout=deadline.remaining())
+            else:
+                result = await operation()
+        except Exception as e:
+            error_class = classify_error(e)
+            if error_class == ErrorClass.PERMANENT:
+                # A rejected request says nothing about the backend's health
+                if breaker:
+                    breaker.release_probe()
+                logger.error(f"Permanent error on attempt {attempt}: {e!r}")
+                raise
+            
+            elsewhere = isinstance(e, RetryElsewhereError)
+            if breaker:
+                # Another key may still serve the call, so the backend as a whole is not failing
+                if elsewhere:
+                    breaker.release_probe()
+                else:
+                    breaker.record_failure()
+            if attempt >= policy.max_attempts:
+                logger.error(f"Transient error on attempt {attempt}, giving up: {e!r}")
+                raise
+            
+            delay = 0.0 if elsewhere else policy.compute_delay(attempt)
+            budget = remaining_budget(deadline)
+            if delay >= budget:
+                logger.error(f"Transient error on attempt {attempt}, no budget left for a retry ({budget:.2f}s): {e!r}")
+                raise
+            
+            logger.warning(f"Transient error on attempt {attempt}: {e!r}. Retrying in {delay:.2f}s (budget {budget:.2f}s)")
+            await asyncio.sleep(delay)
+            continue
+        except BaseException:
+            # Cancellation: without this a half-open breaker would keep its probe forever
+            if breaker:
+                breaker.release_probe()
+            raise
+        
+        if breaker:
+            breaker.record_success()
+        return result
+    
+    raise RuntimeError("Retry policy allows no attempts")
@@ -0,0 +1,173 @@
+import asyncio
+import random
+import statistics
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from config import ROUTER_BACKENDS, ROUTER_STATS_WINDOW, ROUTER_ERROR_PENALTY, ROUTER_EXPLORATION
+from models import Player, GameMode
+from services.ai.base_service import BaseAIService, GenerationPath, SurvivalResult
+from services.ai.resilience import CircuitOpenError
+from utils.deadline import Deadline
+
+
+class BackendStats:
+    """Rolling latency and error statistics of one backend"""
+    
+    def __init__(self, window: int = ROUTER_STATS_WINDOW):
+        self.samples: Deque[Tuple[float, bool]] = deque(maxlen=window)
+    
+    def record(self, latency: float, ok: bool):
+        """Adds the outcome of one request"""
+        self.samples.append((latency, ok))
+    
+    @property
+    def error_rate(self) -> float:
+        """Share of failed requests in the window"""
+        if not self.samples:
+            return 0.0
+        return sum(1 for _, ok in self.samples if not ok) / len(self.samples)
+    
+    @property
+    def latency(self) -> Optional[float]:
+        """Median latency of successful requests in the window"""
+        latencies = [latency for latency, ok in self.samples if ok]
+        return statistics.median(latencies) if latencies else None
+    
+    def score(self, error_penalty: float = ROUTER_ERROR_PENALTY) -> float:
+        """
+        Routing score, lower is better
+        
+        Backends without samples score 0 so they get explored first; backends
+        that only failed score infinity and are used only for failover.
+        """
+        if not self.samples:
+            return 0.0
+        latency = self.latency
+        if latency is None:
+            return float("inf")
+        return latency * (1 + error_penalty * self.error_rate)
+    
+    def snapshot(self) -> Dict[str, Any]:
+        """Returns the statistics as a dictionary"""
+        return {
+            "requests": len(self.samples),
+            "error_rate": round(self.error_rate, 3),
+            "median_latency": round(self.latency, 3) if self.latency is not None else None,
+        }
+
+
+class RouterService(BaseAIService):
+    """Routes each request to the backend with the best rolling latency and error rate, failing over on errors"""
+    
+    def __init__(self, backends: Optional[Dict[str, BaseAIService]] = None, exploration: float = ROUTER_EXPLORATION):
+        super().__init__()
+        
+        self.exploration = exploration
+        
+        if backends is None:
+            from services.ai_service_factory import SERVICE_CLASSES
+            
+            backends = {}
+            for name in ROUTER_BACKENDS:
+                if name == "router" or name not in SERVICE_CLASSES:
+                    self.logger.warning(f"Skipping unsupported router backend: {name}")
+                    continue
+                backends[name] = SERVICE_CLASSES[name]()
+        
+        self.backends = backends
+        self.stats = {name: BackendStats() for name in self.backends}
+        self.logger.info(f"Router created with backends: {list(self.backends)}")
+    
+    def _is_available(self) -> bool:
+        """Checks whether at least one backend can be called"""
+        return any(backend._is_available() for backend in self.backends.values())
+    
+    def is_ready(self) -> bool:
+        """Checks whether at least one backend would take a round right now"""
+        return any(backend.is_ready() for backend in self.backends.values())
+    
+    async def warm_up_connections(self):
+        """Warms up every backend concurrently"""
+        await asyncio.gather(*(backend.warm_up_connections() for backend in self.backends.values()))
+    
+    def ranked_backends(self) -> List[Tuple[str, BaseAIService]]:
+        """
+        Orders available backends by routing score
+        
+        Returns:
+            List[Tuple[str, BaseAIService]]: Backends to try, best first
+        """
+        available = [(name, backend) for name, backend in self.backends.items() if backend._is_available()]
+        ranked = sorted(available, key=lambda item: self.stats[item[0]].score())
+        
+        if len(ranked) > 1 and random.random() < self.exploration:
+            explored = ranked.pop(random.randrange(1, len(ranked)))
+            ranked.insert(0, explored)
+        
+        return ranked
+    
+    async def evaluate_survival(self, scenario: str, players: Dict[int, Player], game_mode: GameMode, deadline: Optional[Deadline] = None, setting: Optional[str] = None) -> SurvivalResult:
+        """
+        Evaluates player survival chances and generates a story
+        
+        Args:
+            scenario: Game scenario
+            players: Dictionary of players
+            game_mode: Current game mode
+            deadline: Round deadline
+            setting: Enriched scenario built in advance
+        
+        Returns:
+            SurvivalResult: Story, survivors, whether the model generated it and the tokens it consumed
+        """
+        return await self._evaluate_with_generation(scenario, players, game_mode, deadline, setting)
+    
+    async def generate_text(self, prompt: str, generation_config: Dict[str, Any], path: GenerationPath, deadline: Optional[Deadline] = None) -> str:
+        """
+        Tries backends in routing order until one succeeds
+        
+        Args:
+            prompt: Prompt text
+            generation_config: Generation parameters
+            path: Generation path chosen for the remaining budget
+            deadline: Round deadline
+        
+        Returns:
+            str: Response text of the first successful backend
+        """
+        last_error: Optional[Exception] = None
+        
+        for name, backend in self.ranked_backends():
+            if deadline and deadline.expired():
+                raise asyncio.TimeoutError("Deadline expired during backend failover")
+            
+            started = time.monotonic()
+            try:
+                text = await backend.generate_text(prompt, generation_config, path, deadline)
+            except CircuitOpenError as e:
+                self.logger.warning(f"Backend {name} skipped: {e}")
+                last_error = e
+                continue
+            except Exception as e:
+                self.stats[name].record(time.monotonic() - started, False)
+                self.logger.warning(f"Backend {name} failed, failing over: {e!r}")
+                last_error = e
+                continue
+            
+            latency = time.monotonic() - started
+            self.stats[name].record(latency, True)
+            self.logger.info(f"Request served by backend {name} in {latency:.2f}s")
+            return text
+        
+        raise last_error or RuntimeError("No AI backends available")
+    
+    def backend_stats(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Reports rolling statistics per backend
+        
+        Returns:
+            Dict[str, Dict[str, Any]]: Statistics keyed by backend name
+        """
+        return {name: stats.snapshot() for name, stats in self.stats.items()}
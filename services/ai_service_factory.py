@@ -1,18 +1,55 @@
+import asyncio
+import importlib
 import logging
-from typing import Dict, Type
+import threading
+from typing import Dict, Iterator, Mapping, Optional, Type
 
 from config import AI_SERVICE_TYPE
 from services.ai.base_service import BaseAIService
-from services.ai.gemini_service import GeminiService
 
 
-SERVICE_CLASSES: Dict[str, Type[BaseAIService]] = {
-    "gemini": GeminiService,
-}
+class LazyServiceClasses(Mapping):
+    """Service registry that imports a backend module only when its class is requested"""
+    
+    # Backend SDKs (google.generativeai and its gRPC stack in particular) dominate
+    # process start time, so nothing is imported for backends that are not used
+    
+    def __init__(self, paths: Dict[str, str]):
+        """
+        Args:
+            paths: Service type mapped to "module:ClassName"
+        """
+        self.paths = paths
+        self._loaded: Dict[str, Type[BaseAIService]] = {}
+    
+    def __getitem__(self, name: str) -> Type[BaseAIService]:
+        if name not in self._loaded:
+            module_name, class_name = self.paths[name].split(":")
+            self._loaded[name] = getattr(importlib.import_module(module_name), class_name)
+        return self._loaded[name]
+    
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.paths)
+    
+    def __len__(self) -> int:
+        return len(self.paths)
+
+
+SERVICE_CLASSES = LazyServiceClasses({
+    "gemini": "services.ai.gemini_service:GeminiService",
+    "gemini_pool": "services.ai.gemini_pool_service:GeminiPoolService",
+    "gemini_rest": "services.ai.gemini_rest_service:GeminiRESTService",
+    "openai": "services.ai.openai_compatible_service:OpenAICompatibleService",
+    "router": "services.ai.router_service:RouterService",
+    "mock": "services.ai.mock_service:MockAIService",
+})
 
 class AIServiceFactory:
     """Factory for creating AI service instances"""
     
+    _instance: Optional[BaseAIService] = None
+    _lock = threading.Lock()
+    
     @staticmethod
     def create_service() -> BaseAIService:
         """
@@ -35,3 +72,40 @@ class AIServiceFactory:
         logger.info(f"Creating AI service of type: {service_type}")
         service_class = SERVICE_CLASSES[service_type]
         return service_class()
+    
+    @classmethod
+    def get_service(cls) -> BaseAIService:
+        """
+        Returns the shared AI service instance, creating it on first use
+        
+        Resilience state such as the circuit breaker lives on the instance,
+        so every round has to go through the same object.
+        
+        Returns:
+            BaseAIService: Shared AI service instance
+        """
+        if cls._instance is None:
+            with cls._lock:
+                if cls._instance is None:
+                    cls._instance = cls.create_service()
+        return cls._instance
+    
+    @classmethod
+    async def warm_up(cls) -> BaseAIService:
+        """
+        Creates the shared instance in a worker thread and opens its connections
+        
+        Backend constructors may block on network calls (GeminiService lists
+        models), so this keeps them off the event loop at startup.
+        
+        Returns:
+            BaseAIService: Shared AI service instance
+        """
+        service = await asyncio.to_thread(cls.get_service)
+        await service.warm_up_connections()
+        return service
+    
+    @classmethod
+    def is_ready(cls) -> bool:
+        """Checks whether the shared instance exists and can reach its model (see BaseAIService.is_ready)"""
+        return cls._instance is not None and cls._instance.is_ready()
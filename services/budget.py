@@ -0,0 +1,152 @@
+import logging
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, Hashable, List, Optional, Tuple
+
+from config import (
+    AI_LOBBY_ROUNDS_PER_MINUTE, AI_LOBBY_TOKENS_PER_HOUR,
+    AI_USER_ROUNDS_PER_MINUTE, AI_USER_TOKENS_PER_HOUR,
+)
+from utils.metrics import ROUND_BUDGET_REJECTIONS
+from utils.rate_limit import SlidingWindowCounter
+
+
+MINUTE = 60.0
+HOUR = 3600.0
+
+
+@dataclass(frozen=True)
+class BudgetRejection:
+    """Why a round may not start yet"""
+    scope: str
+    kind: str
+    limit: float
+    retry_after: float
+
+
+class _Budget:
+    """One limit tracked per key with a sliding-window counter"""
+    
+    def __init__(self, scope: str, kind: str, limit: float, window: float, clock: Callable[[], float]):
+        self.scope = scope
+        self.kind = kind
+        self.limit = limit
+        self.window = window
+        self._clock = clock
+        self.counters: Dict[Hashable, SlidingWindowCounter] = {}
+    
+    def check(self, key: Hashable, amount: float) -> Optional[BudgetRejection]:
+        counter = self.counters.get(key)
+        if self.limit <= 0 or counter is None:
+            return None
+        retry_after = counter.time_until(self.limit, amount)
+        if retry_after <= 0:
+            return None
+        return BudgetRejection(self.scope, self.kind, self.limit, retry_after)
+    
+    def add(self, key: Hashable, amount: float):
+        if self.limit <= 0:
+            return
+        counter = self.counters.get(key)
+        if counter is None:
+            counter = self.counters[key] = SlidingWindowCounter(self.window, self._clock)
+        counter.add(amount)
+    
+    def prune(self):
+        for key in [key for key, counter in self.counters.items() if counter.is_idle()]:
+            del self.counters[key]
+
+
+class RoundBudgets:
+    """Per-lobby and per-user limits on started rounds and generated tokens"""
+    
+    # Rounds are charged when the captain picks a scenario and tokens after the
+    # story is generated, so one round may overshoot the token budget slightly;
+    # the next one is then refused until the window slides past the spend.
+    
+    def __init__(
+        self,
+        lobby_rounds_per_minute: float = AI_LOBBY_ROUNDS_PER_MINUTE,
+        lobby_tokens_per_hour: float = AI_LOBBY_TOKENS_PER_HOUR,
+        user_rounds_per_minute: float = AI_USER_ROUNDS_PER_MINUTE,
+        user_tokens_per_hour: float = AI_USER_TOKENS_PER_HOUR,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self._clock = clock
+        self.lobby_rounds = _Budget("lobby", "rounds", lobby_rounds_per_minute, MINUTE, clock)
+        self.lobby_tokens = _Budget("lobby", "tokens", lobby_tokens_per_hour, HOUR, clock)
+        self.user_rounds = _Budget("user", "rounds", user_rounds_per_minute, MINUTE, clock)
+        self.user_tokens = _Budget("user", "tokens", user_tokens_per_hour, HOUR, clock)
+        self._last_pruned = clock()
+        self.logger = logging.getLogger(__name__)
+    
+    def _checks(self, lobby_id: str, user_id: int) -> List[Tuple[_Budget, Hashable, float]]:
+        return [
+            (self.lobby_rounds, lobby_id, 1),
+            (self.user_rounds, user_id, 1),
+            (self.lobby_tokens, lobby_id, 1),
+            (self.user_tokens, user_id, 1),
+        ]
+    
+    def check(self, lobby_id: str, user_id: int) -> Optional[BudgetRejection]:
+        """
+        Checks whether a captain may start a round without charging it
+        
+        Args:
+            lobby_id: Lobby ID
+            user_id: Captain starting the round
+        
+        Returns:
+            Optional[BudgetRejection]: The budget that would be exceeded with the longest wait, or None
+        """
+        rejections = [rejection for budget, key, amount in self._checks(lobby_id, user_id) if (rejection := budget.check(key, amount))]
+        if not rejections:
+            return None
+        return max(rejections, key=lambda rejection: rejection.retry_after)
+    
+    def try_start_round(self, lobby_id: str, user_id: int) -> Optional[BudgetRejection]:
+        """
+        Charges a round to the lobby and its captain if every budget allows it
+        
+        Args:
+            lobby_id: Lobby ID
+            user_id: Captain starting the round
+        
+        Returns:
+            Optional[BudgetRejection]: None if the round was charged, otherwise why it was refused
+        """
+        self._maybe_prune()
+        rejection = self.check(lobby_id, user_id)
+        if rejection is not None:
+            ROUND_BUDGET_REJECTIONS.labels(rejection.scope, rejection.kind).inc()
+            self.logger.info(f"Round refused for lobby {lobby_id}: {rejection.scope} {rejection.kind} budget, retry in {rejection.retry_after:.0f}s")
+            return rejection
+        
+        self.lobby_rounds.add(lobby_id, 1)
+        self.user_rounds.add(user_id, 1)
+        return None
+    
+    def record_tokens(self, lobby_id: str, user_id: Optional[int], tokens: int):
+        """
+        Charges generated tokens to the lobby and its captain
+        
+        Args:
+            lobby_id: Lobby ID
+            user_id: Captain of the lobby, None if the lobby has none
+            tokens: Estimated prompt and response tokens of the round
+        """
+        self.lobby_tokens.add(lobby_id, tokens)
+        if user_id is not None:
+            self.user_tokens.add(user_id, tokens)
+    
+    def _maybe_prune(self):
+        """Drops counters of lobbies and users that have been quiet for a whole window, at most once a minute"""
+        now = self._clock()
+        if now - self._last_pruned < MINUTE:
+            return
+        self._last_pruned = now
+        for budget in (self.lobby_rounds, self.lobby_tokens, self.user_rounds, self.user_tokens):
+            budget.prune()
+
+
+round_budgets = RoundBudgets()
@@ -0,0 +1,140 @@
+import asyncio
+import logging
+from typing import Callable, Dict, Optional
+
+from config import AI_SCENARIO_ENRICHMENT, AI_ENRICHMENT_MAX_WAIT
+from models import Lobby, lobbies
+from services.admission import AdmissionController, admission_controller
+from services.ai.base_service import BaseAIService
+from services.ai.generation_profile import GenerationProfiler, LoadLevel, generation_profiler
+from services.budget import round_budgets
+from utils.metrics import AI_ENRICHMENTS
+
+
+def _default_service() -> BaseAIService:
+    from services.ai_service_factory import AIServiceFactory
+    return AIServiceFactory.get_service()
+
+
+class ScenarioEnricher:
+    """Builds the opening of a lobby's story in the background while players type their actions"""
+    
+    # The round call then only continues the prepared setting and judges the
+    # actions, which shortens the work left after the last submission. The
+    # enrichment is speculative: it is skipped under load and dropped when the
+    # scenario changes or the round starts before it is ready. It takes an
+    # admission slot like a round, but never queues for one: rounds come first.
+    
+    def __init__(
+        self,
+        service_factory: Callable[[], BaseAIService] = _default_service,
+        max_wait: float = AI_ENRICHMENT_MAX_WAIT,
+        enabled: bool = AI_SCENARIO_ENRICHMENT,
+        profiler: GenerationProfiler = generation_profiler,
+        admission: AdmissionController = admission_controller,
+    ):
+        self.service_factory = service_factory
+        self.max_wait = max_wait
+        self.enabled = enabled
+        self.profiler = profiler
+        self.admission = admission
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self.logger = logging.getLogger(__name__)
+    
+    def start(self, lobby: Lobby) -> bool:
+        """
+        Starts enriching the lobby's current scenario, replacing any earlier enrichment
+        
+        Args:
+            lobby: Lobby whose captain has just picked a scenario
+        
+        Returns:
+            bool: Whether an enrichment was started
+        """
+        self.cancel(lobby.id)
+        lobby.setting = None
+        if not self.enabled or not lobby.scenario:
+            return False
+        
+        if self.profiler.load_level() != LoadLevel.NORMAL or self.admission.saturated:
+            AI_ENRICHMENTS.labels("shed").inc()
+            return False
+        
+        task = asyncio.get_running_loop().create_task(self._enrich(lobby.id, lobby.scenario, lobby.game_mode))
+        self._tasks[lobby.id] = task
+        task.add_done_callback(lambda done, lobby_id=lobby.id: self._forget(lobby_id, done))
+        return True
+    
+    async def _enrich(self, lobby_id: str, scenario: str, game_mode):
+        service = self.service_factory()
+        async with self.admission.try_admit() as admitted:
+            if not admitted:
+                # A round took the last slot after start()
+                AI_ENRICHMENTS.labels("shed").inc()
+                return
+            setting = await service.enrich_scenario(scenario, game_mode)
+        if setting is None:
+            return
+        
+        # The lobby may have been demoted to the cold tier, so look it up again
+        lobby = lobbies.get(lobby_id)
+        if lobby is None or lobby.scenario != scenario:
+            AI_ENRICHMENTS.labels("stale").inc()
+            return
+        lobby.setting = setting
+        
+        captain = lobby.get_captain()
+        round_budgets.record_tokens(lobby_id, captain.user_id if captain else None, service.enrichment_tokens(scenario, game_mode, setting))
+    
+    def _forget(self, lobby_id: str, task: asyncio.Task):
+        if self._tasks.get(lobby_id) is task:
+            del self._tasks[lobby_id]
+        if not task.cancelled() and task.exception() is not None:
+            self.logger.error(f"Scenario enrichment for lobby {lobby_id} crashed: {task.exception()!r}")
+    
+    async def setting_for_round(self, lobby: Lobby, timeout: Optional[float] = None) -> Optional[str]:
+        """
+        Returns the prepared setting, waiting briefly if the enrichment is still running
+        
+        Args:
+            lobby: Lobby whose round is starting
+            timeout: Upper bound for the wait, e.g. the remaining round budget
+        
+        Returns:
+            Optional[str]: Enriched scenario, or None to build the story in a single call
+        """
+        task = self._tasks.get(lobby.id)
+        if task is not None and not task.done():
+            wait = self.max_wait if timeout is None else min(self.max_wait, timeout)
+            try:
+                await asyncio.wait_for(asyncio.shield(task), wait)
+            except asyncio.TimeoutError:
+                self.cancel(lobby.id)
+            except Exception:
+                pass
+        
+        setting = lobby.setting
+        if self.enabled and lobby.scenario:
+            AI_ENRICHMENTS.labels("used" if setting else "missed").inc()
+        return setting
+    
+    def cancel(self, lobby_id: str):
+        """Drops a running enrichment of a lobby"""
+        task = self._tasks.pop(lobby_id, None)
+        if task is not None and not task.done():
+            task.cancel()
+    
+    async def shutdown(self):
+        """Cancels all running enrichments"""
+        tasks = list(self._tasks.values())
+        self._tasks.clear()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+    
+    def __len__(self) -> int:
+        """Number of running enrichments"""
+        return len(self._tasks)
+
+
+scenario_enricher = ScenarioEnricher()
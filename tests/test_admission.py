@@ -0,0 +1,186 @@
+import unittest
+import asyncio
+
+from services.admission import AdmissionController
+
+
+class TestAdmissionController(unittest.TestCase):
+    """Тесты глобальной очереди допуска к AI"""
+    
+    def test_concurrency_cap(self):
+        """Одновременно выполняется не больше заданного числа оценок"""
+        async def scenario():
+            controller = AdmissionController(max_concurrent=2, initial_service_time=1)
+            running = []
+            peak = []
+            
+            async def evaluate(lobby_id):
+                async with controller.admit(lobby_id):
+                    running.append(lobby_id)
+                    peak.append(len(running))
+                    await asyncio.sleep(0.01)
+                    running.remove(lobby_id)
+            
+            await asyncio.gather(*(evaluate(f"lobby{index}") for index in range(6)))
+            return max(peak), controller.active
+        
+        max_running, active = asyncio.run(scenario())
+        self.assertEqual(max_running, 2)
+        self.assertEqual(active, 0)
+    
+    def test_round_robin_between_lobbies(self):
+        """Лобби обслуживаются по очереди, и одно лобби не может занять всю очередь"""
+        async def scenario():
+            controller = AdmissionController(max_concurrent=1, initial_service_time=1)
+            order = []
+            release = asyncio.Event()
+            
+            async def holder():
+                async with controller.admit("busy"):
+                    await release.wait()
+            
+            async def evaluate(lobby_id, tag):
+                async with controller.admit(lobby_id):
+                    order.append(tag)
+            
+            holder_task = asyncio.create_task(holder())
+            await asyncio.sleep(0)
+            tasks = [
+                asyncio.create_task(evaluate("a", "a1")),
+                asyncio.create_task(evaluate("a", "a2")),
+                asyncio.create_task(evaluate("a", "a3")),
+                asyncio.create_task(evaluate("b", "b1")),
+            ]
+            await asyncio.sleep(0)
+            self.assertEqual(controller.queue_depth, 4)
+            release.set()
+            await asyncio.gather(holder_task, *tasks)
+            return order
+        
+        self.assertEqual(asyncio.run(scenario()), ["a1", "b1", "a2", "a3"])
+    
+    def test_position_updates(self):
+        """Ожидающие лобби получают свою позицию и оценку времени"""
+        async def scenario():
+            controller = AdmissionController(max_concurrent=1, initial_service_time=5)
+            updates = []
+            release = asyncio.Event()
+            
+            async def holder():
+                async with controller.admit("busy"):
+                    await release.wait()
+            
+            async def on_update(position, eta):
+                updates.append((position, eta))
+            
+            async def evaluate(lobby_id, callback=None):
+                async with controller.admit(lobby_id, callback):
+                    pass
+            
+            holder_task = asyncio.create_task(holder())
+            await asyncio.sleep(0)
+            first = asyncio.create_task(evaluate("first"))
+            await asyncio.sleep(0)
+            watched = asyncio.create_task(evaluate("watched", on_update))
+            await asyncio.sleep(0.01)
+            release.set()
+            await asyncio.gather(holder_task, first, watched)
+            return updates
+        
+        updates = asyncio.run(scenario())
+        self.assertEqual(updates[0], (2, 10))
+        self.assertEqual(updates[1][0], 1)
+    
+    def test_pending_position_update_is_cancelled_on_admission(self):
+        """Запоздавшее сообщение о позиции не приходит после допуска"""
+        async def scenario():
+            controller = AdmissionController(max_concurrent=1, initial_service_time=5)
+            release = asyncio.Event()
+            events = []
+            
+            async def holder():
+                async with controller.admit("busy"):
+                    await release.wait()
+            
+            async def slow_update(position, eta):
+                await asyncio.sleep(0.05)
+                events.append(f"position {position}")
+            
+            async def evaluate():
+                async with controller.admit("watched", slow_update):
+                    events.append("admitted")
+                await asyncio.sleep(0.1)
+            
+            holder_task = asyncio.create_task(holder())
+            await asyncio.sleep(0)
+            watched = asyncio.create_task(evaluate())
+            await asyncio.sleep(0.01)
+            release.set()
+            await asyncio.gather(holder_task, watched)
+            return events
+        
+        self.assertEqual(asyncio.run(scenario()), ["admitted"])
+    
+    def test_try_admit_never_queues(self):
+        """try_admit занимает только свободный слот и не меняет позиции ожидающих"""
+        async def scenario():
+            controller = AdmissionController(max_concurrent=1)
+            updates = []
+            release = asyncio.Event()
+            
+            async with controller.try_admit() as admitted:
+                free_slot = (admitted, controller.active)
+            
+            async def holder():
+                async with controller.admit("busy"):
+                    await release.wait()
+            
+            async def on_update(position, eta):
+                updates.append(position)
+            
+            async def evaluate():
+                async with controller.admit("waiting", on_update):
+                    pass
+            
+            holder_task = asyncio.create_task(holder())
+            await asyncio.sleep(0)
+            waiting = asyncio.create_task(evaluate())
+            await asyncio.sleep(0.01)
+            async with controller.try_admit() as admitted:
+                busy_slot = (admitted, controller.queue_depth)
+            await asyncio.sleep(0.01)
+            release.set()
+            await asyncio.gather(holder_task, waiting)
+            return free_slot, busy_slot, updates, controller.active
+        
+        free_slot, busy_slot, updates, active = asyncio.run(scenario())
+        self.assertEqual(free_slot, (True, 1))
+        self.assertEqual(busy_slot, (False, 1))
+        self.assertEqual(updates, [1])
+        self.assertEqual(active, 0)
+    
+    def test_timeout_leaves_queue(self):
+        """Ожидание с таймаутом удаляет запрос из очереди"""
+        async def scenario():
+            controller = AdmissionController(max_concurrent=1)
+            release = asyncio.Event()
+            
+            async def holder():
+                async with controller.admit("busy"):
+                    await release.wait()
+            
+            holder_task = asyncio.create_task(holder())
+            await asyncio.sleep(0)
+            with self.assertRaises(asyncio.TimeoutError):
+                async with controller.admit("late", timeout=0.01):
+                    pass
+            depth = controller.queue_depth
+            release.set()
+            await holder_task
+            return depth, controller.active
+        
+        self.assertEqual(asyncio.run(scenario()), (0, 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+import unittest
+
+from benchmarks.runner import Benchmark, compare, measure, measure_relative, merge_runs
+from benchmarks.suite import build_suite, make_lobby
+from handlers.command_handlers import render_lobby_status
+from models import GameState
+
+
+def run_result(min_ns, calibration_ns=100.0):
+    return {"name": "x", "median_ns": min_ns, "min_ns": min_ns, "loops": 1, "repeats": 1, "calibration_ns": calibration_ns, "ratio": min_ns / calibration_ns}
+
+
+class TestBenchmarks(unittest.TestCase):
+    """Тесты набора микро-бенчмарков"""
+    
+    def test_suite_functions_run(self):
+        """Каждый бенчмарк выполняется без ошибок, имена уникальны"""
+        suite = build_suite()
+        names = [benchmark.name for benchmark in suite]
+        self.assertEqual(len(names), len(set(names)))
+        for benchmark in suite:
+            benchmark.func()
+    
+    def test_measure(self):
+        """Измерение возвращает положительное время одного вызова"""
+        result = measure(Benchmark("noop", lambda: None), repeat=2, min_time=0.001)
+        self.assertGreater(result.min_ns, 0)
+        self.assertLessEqual(result.min_ns, result.median_ns)
+    
+    def test_measure_relative(self):
+        """Отношение к калибровке — медиана по раундам"""
+        result = measure_relative(Benchmark("noop", lambda: None), rounds=3, repeat=2, min_time=0.001)
+        self.assertEqual(result.repeats, 3)
+        self.assertGreater(result.calibration_ns, 0)
+        self.assertGreater(result.ratio, 0)
+        self.assertEqual(result.relative, result.ratio)
+    
+    def test_merge_runs(self):
+        """Прогоны в разных процессах объединяются медианой, минимум берется по всем"""
+        runs = [{"meta": {"commit": "abc"}, "results": {"x": run_result(min_ns)}} for min_ns in (100, 300, 140)]
+        merged = merge_runs(runs)
+        self.assertEqual(merged["meta"], {"commit": "abc", "runs": 3})
+        self.assertEqual(merged["results"]["x"]["ratio"], 1.4)
+        self.assertEqual(merged["results"]["x"]["min_ns"], 100)
+        self.assertEqual(merged["results"]["x"]["repeats"], 3)
+    
+    def test_compare_uses_calibration(self):
+        """Замедление сравнивается с учетом калибровки и порогов"""
+        baseline = {"results": {
+            "fast": run_result(2000),
+            "slow": run_result(2000),
+            "strict": run_result(2000),
+            "micro": run_result(300),
+            "micro_slow": run_result(300),
+        }}
+        current = {"results": {
+            # Машина вдвое медленнее: время и калибровка выросли одинаково
+            "fast": run_result(4000, calibration_ns=200),
+            "slow": run_result(3000),
+            "strict": run_result(2300),
+            # Бенчмарки быстрее микросекунды сравниваются с более широким допуском
+            "micro": run_result(420),
+            "micro_slow": run_result(480),
+            "new": run_result(1000),
+        }}
+        benchmarks = [Benchmark("strict", lambda: None, threshold=0.1)]
+        regressions = compare(current, baseline, benchmarks, default_threshold=0.25)
+        self.assertEqual(sorted(regression.name for regression in regressions), ["micro_slow", "slow", "strict"])
+    
+    def test_compare_old_baseline_without_ratio(self):
+        """Базовая линия без медианного отношения сравнивается по минимальному времени и калибровке"""
+        old = run_result(2000)
+        del old["ratio"]
+        regressions = compare({"results": {"x": run_result(3000)}}, {"results": {"x": old}}, [])
+        self.assertEqual([regression.name for regression in regressions], ["x"])
+
+
+class TestRenderLobbyStatus(unittest.TestCase):
+    """Тесты текста с информацией о лобби"""
+    
+    def test_waiting_for_actions(self):
+        """В фазе действий показываются сценарий и списки отправивших и ожидаемых игроков"""
+        lobby = make_lobby(3, with_actions=1)
+        text = render_lobby_status(lobby)
+        self.assertIn("Статус: Ожидание действий игроков", text)
+        self.assertIn("Игроки (3):\n👑 Игрок Номер000", text)
+        self.assertIn("Отправили действия (1/3):\nИгрок Номер000", text)
+        self.assertIn("Ожидаем действия от:\nИгрок Номер001\nИгрок Номер002", text)
+    
+    def test_waiting_for_players(self):
+        """До начала игры сценарий и действия не показываются"""
+        text = render_lobby_status(make_lobby(2, state=GameState.WAITING_FOR_PLAYERS))
+        self.assertIn("Статус: Ожидание игроков", text)
+        self.assertNotIn("Сценарий", text)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,207 @@
+import unittest
+import asyncio
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, Mock, patch
+
+from handlers.command_handlers import IN_LOBBY, process_game_results, random_scenario_callback
+from models import Lobby, Player, GameState, lobbies, user_to_lobby
+from services.ai.mock_service import MockAIService, MockBehavior
+from services.budget import RoundBudgets
+from utils.rate_limit import SlidingWindowCounter
+
+
+class FakeClock:
+    """Управляемые часы"""
+    
+    def __init__(self):
+        self.now = 1000.0
+    
+    def __call__(self):
+        return self.now
+
+
+class TestSlidingWindowCounter(unittest.TestCase):
+    """Тесты счетчика скользящего окна"""
+    
+    def setUp(self):
+        self.clock = FakeClock()
+        self.counter = SlidingWindowCounter(60, self.clock)
+    
+    def test_previous_window_decays(self):
+        """Вклад предыдущего окна убывает пропорционально прошедшему времени"""
+        for _ in range(4):
+            self.counter.add()
+        self.assertEqual(self.counter.count(), 4)
+        
+        self.clock.now += 90
+        self.assertAlmostEqual(self.counter.count(), 2)
+        
+        self.clock.now += 60
+        self.assertEqual(self.counter.count(), 0)
+        self.assertTrue(self.counter.is_idle())
+    
+    def test_time_until_matches_count(self):
+        """После ожидания time_until событие помещается в лимит"""
+        for _ in range(3):
+            self.counter.add()
+        wait = self.counter.time_until(3)
+        self.assertGreater(wait, 0)
+        
+        self.clock.now += wait - 1
+        self.assertGreater(self.counter.count() + 1, 3)
+        self.clock.now += 1.001
+        self.assertLessEqual(self.counter.count() + 1, 3)
+        self.assertEqual(self.counter.time_until(3), 0)
+        self.assertEqual(self.counter.time_until(3, amount=5), float("inf"))
+
+
+class TestRoundBudgets(unittest.TestCase):
+    """Тесты бюджетов лобби и пользователей"""
+    
+    def setUp(self):
+        self.clock = FakeClock()
+        self.budgets = RoundBudgets(
+            lobby_rounds_per_minute=2, lobby_tokens_per_hour=1000,
+            user_rounds_per_minute=3, user_tokens_per_hour=5000, clock=self.clock,
+        )
+    
+    def test_lobby_rounds_are_limited(self):
+        """Лобби не может запускать раунды чаще лимита, другие лобби не страдают"""
+        self.assertIsNone(self.budgets.try_start_round("A", 1))
+        self.assertIsNone(self.budgets.try_start_round("A", 1))
+        rejection = self.budgets.try_start_round("A", 1)
+        self.assertEqual((rejection.scope, rejection.kind), ("lobby", "rounds"))
+        self.assertGreater(rejection.retry_after, 0)
+        
+        self.assertIsNone(self.budgets.try_start_round("B", 2))
+        
+        self.clock.now += rejection.retry_after + 0.001
+        self.assertIsNone(self.budgets.try_start_round("A", 1))
+    
+    def test_user_budget_follows_captain_across_lobbies(self):
+        """Капитан не обходит лимит, создавая новые лобби"""
+        for lobby_id in ("A", "B", "C"):
+            self.assertIsNone(self.budgets.try_start_round(lobby_id, 1))
+        rejection = self.budgets.try_start_round("D", 1)
+        self.assertEqual((rejection.scope, rejection.kind), ("user", "rounds"))
+    
+    def test_token_budget_blocks_next_round(self):
+        """После исчерпания токенов новый раунд начнется, когда окно сдвинется"""
+        self.assertIsNone(self.budgets.try_start_round("A", 1))
+        self.budgets.record_tokens("A", 1, 1200)
+        self.clock.now += 60
+        rejection = self.budgets.check("A", 1)
+        self.assertEqual((rejection.scope, rejection.kind), ("lobby", "tokens"))
+        self.assertGreater(rejection.retry_after, 60)
+    
+    def test_zero_limit_disables_budget(self):
+        """Нулевой лимит отключает проверку"""
+        budgets = RoundBudgets(0, 0, 0, 0, clock=self.clock)
+        for _ in range(10):
+            self.assertIsNone(budgets.try_start_round("A", 1))
+    
+    def test_idle_counters_are_pruned(self):
+        """Счетчики неактивных лобби удаляются"""
+        self.budgets.try_start_round("A", 1)
+        self.clock.now += 3 * 3600
+        self.budgets.try_start_round("B", 2)
+        self.assertNotIn("A", self.budgets.lobby_rounds.counters)
+        self.assertIn("B", self.budgets.lobby_rounds.counters)
+
+
+class TestRoundBudgetFeedback(unittest.TestCase):
+    """Тесты сообщения капитану при исчерпании бюджета"""
+    
+    def setUp(self):
+        self.lobby = Lobby(id="BUDGET")
+        self.lobby.add_player(Player(user_id=1, first_name="Иван", last_name="Иванов", is_captain=True))
+        self.lobby.game_state = GameState.WAITING_FOR_SCENARIO
+        lobbies[self.lobby.id] = self.lobby
+        user_to_lobby[1] = self.lobby.id
+    
+    def tearDown(self):
+        lobbies.pop(self.lobby.id, None)
+        user_to_lobby.pop(1, None)
+    
+    def test_captain_is_told_when_to_retry(self):
+        """Капитан получает объяснение, а сценарий не выбирается"""
+        budgets = RoundBudgets(lobby_rounds_per_minute=1, clock=FakeClock())
+        budgets.try_start_round(self.lobby.id, 1)
+        
+        message = SimpleNamespace(reply_text=AsyncMock())
+        query = SimpleNamespace(answer=AsyncMock(), from_user=SimpleNamespace(id=1), message=message)
+        context = SimpleNamespace(bot=SimpleNamespace(send_message=AsyncMock()))
+        
+        with patch("handlers.command_handlers.round_budgets", budgets):
+            state = asyncio.run(random_scenario_callback(SimpleNamespace(callback_query=query), context))
+        
+        self.assertEqual(state, IN_LOBBY)
+        self.assertEqual(self.lobby.game_state, GameState.WAITING_FOR_SCENARIO)
+        text = message.reply_text.call_args.args[0]
+        self.assertIn("не больше 1 в минуту", text)
+        self.assertIn("через 2 мин", text)
+
+
+
+class TestRoundTokenCharging(unittest.TestCase):
+    """Тесты учета токенов раунда"""
+    
+    def setUp(self):
+        self.lobby = Lobby(id="TOKENS")
+        self.lobby.add_player(Player(user_id=1, first_name="Иван", last_name="Иванов", is_captain=True, action="Бежать"))
+        self.lobby.scenario = "Вы оказались в горящем здании."
+        self.lobby.game_state = GameState.PROCESSING_RESULTS
+        lobbies[self.lobby.id] = self.lobby
+        user_to_lobby[1] = self.lobby.id
+    
+    def tearDown(self):
+        lobbies.pop(self.lobby.id, None)
+        user_to_lobby.pop(1, None)
+    
+    def play_round(self, service):
+        """Возвращает число токенов, записанных в бюджет за раунд"""
+        budgets = RoundBudgets(0, 0, 0, 0, clock=FakeClock())
+        budgets.record_tokens = Mock()
+        context = SimpleNamespace(bot=SimpleNamespace(send_message=AsyncMock()))
+        with patch("handlers.command_handlers.round_budgets", budgets), \
+                patch("services.ai_service_factory.AIServiceFactory.get_service", return_value=service):
+            asyncio.run(process_game_results(context, self.lobby))
+        return budgets.record_tokens.call_args_list
+    
+    def test_generated_round_is_charged(self):
+        """Токены сгенерированного раунда записываются в бюджет капитана"""
+        calls = self.play_round(MockAIService(MockBehavior(latency="fixed:0", chunks_per_second=0, seed=1)))
+        self.assertEqual(len(calls), 1)
+        lobby_id, user_id, tokens = calls[0].args
+        self.assertEqual((lobby_id, user_id), (self.lobby.id, 1))
+        self.assertGreater(tokens, 0)
+    
+    def test_fallback_round_is_free(self):
+        """Резервный ответ строится локально и не расходует бюджет токенов"""
+        service = MockAIService(MockBehavior(latency="fixed:0", chunks_per_second=0, seed=1))
+        service._is_available = lambda: False
+        self.assertEqual(self.play_round(service), [])
+    
+    def test_tokens_cover_sent_prompt_and_response_only(self):
+        """Учитываются отправленный промпт с подсказкой о длине и ответ модели; завязка перед ответом уже оплачена при подготовке"""
+        service = MockAIService(MockBehavior(latency="fixed:0", chunks_per_second=0, seed=1))
+        sent = []
+        
+        async def generate_text(prompt, generation_config, path, deadline=None):
+            sent.append(prompt)
+            return "Продолжение"
+        
+        service.generate_text = generate_text
+        setting = "Завязка" * 100
+        result = asyncio.run(service.evaluate_survival(self.lobby.scenario, self.lobby.players, self.lobby.game_mode, setting=setting))
+        self.assertTrue(result.generated)
+        self.assertEqual(result.narrative, f"{setting}\n\nПродолжение")
+        self.assertIn(service.profiler.select(1, self.lobby.game_mode).length_hint(), sent[0])
+        self.assertEqual(result.tokens_used, service.estimate_tokens(sent[0]) + service.estimate_tokens("Продолжение"))
+        
+        fallback = service.fallback_response(self.lobby.scenario, self.lobby.players, self.lobby.game_mode)
+        self.assertEqual((fallback.generated, fallback.tokens_used), (False, 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,124 @@
+import unittest
+import asyncio
+import time
+from types import SimpleNamespace
+
+from services.ai.base_service import GenerationPath
+from services.ai.gemini_service import GeminiService
+from services.ai.resilience import RetryPolicy, call_with_retry
+from utils.deadline import Deadline
+from models import Player, GameMode
+
+
+class SlowModel:
+    """Заглушка модели с настраиваемой задержкой ответа"""
+    
+    def __init__(self, delay: float = 0.0, text: str = "История"):
+        self.delay = delay
+        self.text = text
+        self.configs = []
+    
+    async def generate_content_async(self, prompt, generation_config=None):
+        self.configs.append(dict(generation_config))
+        await asyncio.sleep(self.delay)
+        return SimpleNamespace(text=self.text)
+
+
+class FakeClock:
+    """Управляемые часы"""
+    
+    def __init__(self):
+        self.now = 100.0
+    
+    def __call__(self):
+        return self.now
+
+
+class TestDeadline(unittest.TestCase):
+    """Тесты крайнего срока раунда"""
+    
+    def test_remaining_and_expired(self):
+        """Оставшееся время уменьшается и не уходит в минус"""
+        clock = FakeClock()
+        deadline = Deadline(10, clock=clock)
+        self.assertEqual(deadline.remaining(), 10)
+        
+        clock.now += 4
+        self.assertEqual(deadline.remaining(), 6)
+        self.assertEqual(deadline.elapsed(), 4)
+        self.assertFalse(deadline.expired())
+        
+        clock.now += 20
+        self.assertEqual(deadline.remaining(), 0)
+        self.assertTrue(deadline.expired())
+        self.assertEqual(deadline.timeout(minimum=5), 5)
+
+
+class TestDeadlineAwareGeneration(unittest.TestCase):
+    """Тесты выбора пути генерации по оставшемуся бюджету"""
+    
+    def setUp(self):
+        self.players = {
+            123: Player(user_id=123, first_name="Иван", last_name="Иванов", action="Бежать из здания"),
+        }
+        self.scenario = "Вы оказались в горящем здании."
+        self.mode = GameMode.EVERY_MAN_FOR_HIMSELF
+    
+    def make_service(self, model, fast_model=None):
+        service = GeminiService(model=model)
+        service.fast_model = fast_model
+        service.retry_policy = RetryPolicy(max_attempts=3, base_delay=0, max_delay=0)
+        return service
+    
+    def test_path_selection(self):
+        """Путь генерации зависит от оставшегося бюджета"""
+        service = self.make_service(SlowModel())
+        self.assertEqual(service._select_generation_path(None), GenerationPath.FULL)
+        self.assertEqual(service._select_generation_path(Deadline(60)), GenerationPath.FULL)
+        self.assertEqual(service._select_generation_path(Deadline(10)), GenerationPath.REDUCED)
+        self.assertEqual(service._select_generation_path(Deadline(1)), GenerationPath.FALLBACK)
+    
+    def test_tiny_budget_skips_api(self):
+        """При почти исчерпанном бюджете модель не вызывается"""
+        model = SlowModel()
+        service = self.make_service(model)
+        narrative = asyncio.run(service.evaluate_survival(self.scenario, self.players, self.mode, deadline=Deadline(0.5))).narrative
+        self.assertIn("AI сервис недоступен", narrative)
+        self.assertEqual(model.configs, [])
+    
+    def test_reduced_budget_uses_fast_model_and_short_output(self):
+        """При малом бюджете используется быстрая модель и короткий ответ"""
+        model = SlowModel(text="Полная")
+        fast_model = SlowModel(text="Короткая")
+        service = self.make_service(model, fast_model)
+        result = asyncio.run(service.evaluate_survival(self.scenario, self.players, self.mode, deadline=Deadline(10)))
+        self.assertEqual(result.narrative, "Короткая")
+        self.assertEqual(model.configs, [])
+        self.assertLess(fast_model.configs[0]["max_output_tokens"], 4096)
+    
+    def test_slow_model_is_cut_off(self):
+        """Медленный ответ обрывается по крайнему сроку"""
+        service = self.make_service(SlowModel(delay=10))
+        deadline = Deadline(4)
+        started = time.monotonic()
+        narrative = asyncio.run(service.evaluate_survival(self.scenario, self.players, self.mode, deadline=deadline)).narrative
+        self.assertLess(time.monotonic() - started, 5)
+        self.assertIn("AI сервис недоступен", narrative)
+    
+    def test_no_retry_past_deadline(self):
+        """Повтор не планируется, если задержка не помещается в бюджет"""
+        calls = []
+        
+        async def failing():
+            calls.append(1)
+            raise ConnectionError("reset")
+        
+        policy = RetryPolicy(max_attempts=5, base_delay=10, max_delay=10)
+        policy.compute_delay = lambda attempt: 10
+        with self.assertRaises(ConnectionError):
+            asyncio.run(call_with_retry(failing, policy, deadline=Deadline(2)))
+        self.assertEqual(len(calls), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
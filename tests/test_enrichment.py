@@ -0,0 +1,178 @@
+import unittest
+import asyncio
+from types import SimpleNamespace
+
+from services.admission import AdmissionController
+from services.ai.gemini_service import GeminiService
+from services.ai.generation_profile import GenerationProfiler
+from services.ai.mock_service import MockAIService, MockBehavior
+from services.ai.resilience import CircuitState
+from services.enrichment import ScenarioEnricher
+from models import Lobby, Player, GameMode, GameState, lobbies
+
+
+class RecordingModel:
+    """Заглушка модели, запоминающая промпты"""
+    
+    def __init__(self, text: str = "История"):
+        self.text = text
+        self.prompts = []
+    
+    async def generate_content_async(self, prompt, generation_config=None):
+        self.prompts.append(prompt)
+        return SimpleNamespace(text=self.text)
+
+
+class TestEnrichedPrompts(unittest.TestCase):
+    """Тесты промптов с подготовленной завязкой"""
+    
+    def setUp(self):
+        self.players = {
+            123: Player(user_id=123, first_name="Иван", last_name="Иванов", action="Бежать из здания"),
+        }
+        self.scenario = "Вы оказались в горящем здании."
+        self.model = RecordingModel()
+        self.service = GeminiService(model=self.model)
+    
+    def test_round_prompt_continues_setting(self):
+        """С завязкой модель только продолжает сюжет и оценивает действия"""
+        for mode in GameMode:
+            prompt = self.service._build_prompt(self.scenario, self.players, mode, "Лифты заблокированы.")
+            self.assertIn("ПОДГОТОВЛЕННЫЙ СЮЖЕТ: Лифты заблокированы.", prompt)
+            self.assertNotIn("Преобразуй базовый сценарий", prompt)
+            self.assertNotIn("перескажи", prompt)
+            self.assertIn("Преобразуй базовый сценарий", self.service._build_prompt(self.scenario, self.players, mode))
+    
+    def test_evaluate_survival_passes_setting(self):
+        """evaluate_survival строит промпт с переданной завязкой"""
+        result = asyncio.run(self.service.evaluate_survival(self.scenario, self.players, GameMode.EVERY_MAN_FOR_HIMSELF, setting="Лифты заблокированы."))
+        self.assertIn("ПОДГОТОВЛЕННЫЙ СЮЖЕТ", self.model.prompts[0])
+        # Модель не пересказывает завязку, поэтому игроки получают ее перед продолжением
+        self.assertEqual(result.narrative, "Лифты заблокированы.\n\nИстория")
+    
+    def test_enrich_scenario(self):
+        """Завязка генерируется отдельным коротким запросом, ошибки не пробрасываются"""
+        self.model.text = "  Лифты заблокированы.  "
+        setting = asyncio.run(self.service.enrich_scenario(self.scenario, GameMode.BROTHERHOOD))
+        self.assertEqual(setting, "Лифты заблокированы.")
+        self.assertIn(self.scenario, self.model.prompts[0])
+        self.assertNotIn("Name:", self.model.prompts[0])
+        
+        self.service.model = None
+        self.assertIsNone(asyncio.run(self.service.enrich_scenario(self.scenario, GameMode.BROTHERHOOD)))
+
+
+class TestScenarioEnricher(unittest.TestCase):
+    """Тесты фоновой подготовки завязки"""
+    
+    def setUp(self):
+        self.lobby = Lobby(id="ENRICH")
+        self.lobby.add_player(Player(user_id=1, first_name="Иван", last_name="Иванов"))
+        self.lobby.scenario = "Вы оказались в горящем здании."
+        self.lobby.game_state = GameState.WAITING_FOR_ACTIONS
+        lobbies[self.lobby.id] = self.lobby
+        self.depth = 0
+        self.admission = AdmissionController(max_concurrent=2)
+    
+    def tearDown(self):
+        lobbies.pop(self.lobby.id, None)
+    
+    def make_enricher(self, latency="fixed:0", max_wait=5):
+        self.service = MockAIService(MockBehavior(latency=latency, chunks_per_second=0, seed=1))
+        profiler = GenerationProfiler(lambda: self.depth, busy_queue_depth=2, overload_queue_depth=8)
+        return ScenarioEnricher(lambda: self.service, max_wait=max_wait, enabled=True, profiler=profiler, admission=self.admission)
+    
+    def test_setting_is_ready_for_round(self):
+        """Завязка готовится в фоне и достается раунду"""
+        enricher = self.make_enricher(latency="fixed:0.05")
+        
+        async def scenario():
+            self.assertTrue(enricher.start(self.lobby))
+            return await enricher.setting_for_round(self.lobby)
+        
+        setting = asyncio.run(scenario())
+        self.assertIn("Тестовая завязка", setting)
+        self.assertEqual(self.lobby.setting, setting)
+        self.assertEqual(len(enricher), 0)
+    
+    def test_changed_scenario_discards_setting(self):
+        """Завязка для устаревшего сценария не сохраняется"""
+        enricher = self.make_enricher(latency="fixed:0.05")
+        
+        async def scenario():
+            enricher.start(self.lobby)
+            self.lobby.scenario = "Другой сценарий"
+            await asyncio.sleep(0.2)
+        
+        asyncio.run(scenario())
+        self.assertIsNone(self.lobby.setting)
+    
+    def test_slow_enrichment_is_dropped(self):
+        """Если завязка не успела, раунд идет одним запросом, а фоновая задача отменяется"""
+        enricher = self.make_enricher(latency="fixed:5", max_wait=0.05)
+        
+        async def scenario():
+            enricher.start(self.lobby)
+            return await enricher.setting_for_round(self.lobby)
+        
+        self.assertIsNone(asyncio.run(scenario()))
+        self.assertEqual(len(enricher), 0)
+    
+    def test_skipped_under_load(self):
+        """При очереди раундов спекулятивная работа не запускается"""
+        enricher = self.make_enricher()
+        self.depth = 5
+        self.lobby.setting = "Старая завязка"
+        
+        async def scenario():
+            return enricher.start(self.lobby)
+        
+        self.assertFalse(asyncio.run(scenario()))
+        self.assertIsNone(self.lobby.setting)
+    
+    def test_takes_admission_slot_without_queueing(self):
+        """Завязка занимает слот AI-сервиса, а без свободного слота не запускается"""
+        enricher = self.make_enricher(latency="fixed:0.05")
+        
+        async def scenario():
+            enricher.start(self.lobby)
+            await asyncio.sleep(0.01)
+            active = self.admission.active
+            await enricher.setting_for_round(self.lobby)
+            
+            self.admission.active = self.admission.max_concurrent
+            started = enricher.start(self.lobby)
+            self.admission.active = 0
+            return active, started
+        
+        active, started = asyncio.run(scenario())
+        self.assertEqual(active, 1)
+        self.assertFalse(started)
+        self.assertEqual(self.admission.active, 0)
+        self.assertEqual(self.admission.queue_depth, 0)
+    
+    def test_cancel_releases_half_open_probe_and_slot(self):
+        """Отмена завязки на пробном запросе не оставляет разрыватель цепи и слот занятыми"""
+        enricher = self.make_enricher(latency="fixed:5")
+        breaker = self.service.circuit_breaker
+        breaker.reset_timeout = 0
+        for _ in range(breaker.failure_threshold):
+            breaker.record_failure()
+        
+        async def scenario():
+            enricher.start(self.lobby)
+            await asyncio.sleep(0.05)
+            probing = not breaker.allow_request()
+            enricher.cancel(self.lobby.id)
+            await asyncio.sleep(0)
+            await asyncio.sleep(0)
+            return probing
+        
+        self.assertTrue(asyncio.run(scenario()))
+        self.assertEqual(breaker.state, CircuitState.HALF_OPEN)
+        self.assertTrue(breaker.allow_request())
+        self.assertEqual(self.admission.active, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
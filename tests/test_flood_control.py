@@ -0,0 +1,128 @@
+import unittest
+import asyncio
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+from telegram import Update
+
+from utils.flood_control import FloodControl, update_kind
+from utils.update_processing import PerUserUpdateProcessor
+
+
+class FakeClock:
+    """Управляемые часы"""
+    
+    def __init__(self):
+        self.now = 0.0
+    
+    def __call__(self):
+        return self.now
+
+
+def make_update(user_id, text="привет", callback=False):
+    user = SimpleNamespace(id=user_id) if user_id is not None else None
+    if callback:
+        return SimpleNamespace(effective_user=user, callback_query=SimpleNamespace(), message=None)
+    return SimpleNamespace(effective_user=user, callback_query=None, message=SimpleNamespace(text=text))
+
+
+class TestFloodControl(unittest.TestCase):
+    """Тесты входного лимита обновлений"""
+    
+    def setUp(self):
+        self.clock = FakeClock()
+        self.flood_control = FloodControl(burst=3, rate_per_second=1, clock=self.clock)
+    
+    def deliver(self, update):
+        """Возвращает True, если обновление пропущено дальше"""
+        return self.flood_control.admit(update)
+    
+    def test_flood_is_dropped_and_recovers(self):
+        """Поток сообщений отбрасывается после всплеска и снова пропускается после паузы"""
+        results = [self.deliver(make_update(1)) for _ in range(10)]
+        self.assertEqual(results, [True] * 3 + [False] * 7)
+        self.assertEqual(self.flood_control.dropped, 7)
+        
+        self.clock.now += 1
+        self.assertTrue(self.deliver(make_update(1)))
+        self.assertFalse(self.deliver(make_update(1)))
+    
+    def test_users_are_independent(self):
+        """Флуд одного пользователя не задевает других"""
+        for _ in range(10):
+            self.deliver(make_update(1))
+        self.assertTrue(self.deliver(make_update(2)))
+        self.assertTrue(self.deliver(make_update(None)))
+    
+    def test_full_buckets_are_pruned(self):
+        """Корзины неактивных пользователей удаляются"""
+        self.deliver(make_update(1))
+        self.clock.now += 120
+        self.deliver(make_update(2))
+        self.assertEqual(len(self.flood_control), 1)
+    
+    def test_update_kind(self):
+        """Тип обновления для метрик"""
+        self.assertEqual(update_kind(make_update(1)), "message")
+        self.assertEqual(update_kind(make_update(1, text="/start")), "command")
+        self.assertEqual(update_kind(make_update(1, callback=True)), "callback_query")
+    
+    def test_rejected_callback_query_is_answered(self):
+        """На отброшенный callback-запрос отвечается, чтобы кнопка не зависла"""
+        update = make_update(1, callback=True)
+        update.callback_query.answer = AsyncMock()
+        asyncio.run(self.flood_control.reject(update))
+        update.callback_query.answer.assert_awaited_once()
+
+
+class TestProcessorFloodControl(unittest.TestCase):
+    """Тесты входного лимита в процессоре обновлений"""
+    
+    def make_update(self, user_id, update_id, callback=False, bot=None):
+        data = {"update_id": update_id}
+        user = {"id": user_id, "is_bot": False, "first_name": "u"}
+        if callback:
+            data["callback_query"] = {"id": str(update_id), "from": user, "chat_instance": "1", "data": "x"}
+        else:
+            data["message"] = {"message_id": update_id, "date": 0, "chat": {"id": user_id, "type": "private"}, "from": user, "text": "привет"}
+        return Update.de_json(data, bot)
+    
+    def test_flood_is_dropped_before_user_queue_and_semaphore(self):
+        """Лишние обновления отбрасываются сразу, не дожидаясь очереди пользователя и слота"""
+        processor = PerUserUpdateProcessor(1, FloodControl(burst=2, rate_per_second=0.001))
+        handled = []
+        bot = SimpleNamespace(answer_callback_query=AsyncMock())
+        
+        async def work(name, delay=0.0):
+            await asyncio.sleep(delay)
+            handled.append(name)
+        
+        async def scenario():
+            loop = asyncio.get_running_loop()
+            # Первое обновление держит и очередь пользователя, и единственный слот
+            busy = [
+                asyncio.create_task(processor.process_update(self.make_update(1, 1), work("first", 0.2))),
+                asyncio.create_task(processor.process_update(self.make_update(1, 2), work("second"))),
+            ]
+            await asyncio.sleep(0)
+            
+            started = loop.time()
+            await processor.process_update(self.make_update(1, 3, callback=True, bot=bot), work("dropped"))
+            elapsed = loop.time() - started
+            await asyncio.gather(*busy)
+            return elapsed
+        
+        elapsed = asyncio.run(scenario())
+        self.assertLess(elapsed, 0.05)
+        bot.answer_callback_query.assert_awaited_once()
+        self.assertEqual(handled, ["first", "second"])
+        self.assertEqual(processor.flood_control.dropped, 1)
+    
+    def test_disabled_limit_is_not_installed(self):
+        """Отключенный лимит не проверяется"""
+        self.assertIsNone(PerUserUpdateProcessor(4, FloodControl(rate_per_second=0)).flood_control)
+        self.assertIsNone(PerUserUpdateProcessor(4).flood_control)
+
+
+if __name__ == '__main__':
+    unittest.main()
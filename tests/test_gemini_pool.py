@@ -0,0 +1,190 @@
+import unittest
+import asyncio
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import httpx
+
+from services.ai.base_service import GenerationPath
+from services.ai.gemini_pool_service import GeminiPoolService, PoolEntry, PoolExhaustedError, mask_key
+from services.ai.gemini_rest_service import GeminiRESTModel
+from services.ai.resilience import CircuitBreaker, CircuitState, RetryPolicy
+from utils.rate_limit import TokenBucket
+from models import Player, GameMode
+
+
+class FakeClock:
+    """Управляемые часы"""
+    
+    def __init__(self):
+        self.now = 0.0
+    
+    def __call__(self):
+        return self.now
+
+
+class QuotaError(Exception):
+    """Ошибка 429 от API"""
+    
+    code = 429
+
+
+class StubModel:
+    """Заглушка модели, привязанной к ключу"""
+    
+    def __init__(self, name, throttled=False):
+        self.name = name
+        self.throttled = throttled
+        self.calls = 0
+    
+    async def generate_content_async(self, prompt, generation_config=None):
+        self.calls += 1
+        if self.throttled:
+            raise QuotaError("quota exceeded")
+        return SimpleNamespace(text=f"История от {self.name}")
+
+
+class TestTokenBucket(unittest.TestCase):
+    """Тесты корзины токенов"""
+    
+    def test_consume_and_refill(self):
+        """Токены списываются и восстанавливаются со временем"""
+        clock = FakeClock()
+        bucket = TokenBucket.per_minute(60, clock)
+        self.assertTrue(bucket.try_consume(60))
+        self.assertFalse(bucket.try_consume(1))
+        self.assertAlmostEqual(bucket.utilization(), 1.0)
+        
+        clock.now = 1
+        self.assertTrue(bucket.try_consume(1))
+        self.assertAlmostEqual(bucket.time_until(1), 1.0)
+
+
+class TestGeminiPool(unittest.TestCase):
+    """Тесты пула ключей и моделей"""
+    
+    def setUp(self):
+        self.clock = FakeClock()
+        self.players = {
+            123: Player(user_id=123, first_name="Иван", last_name="Иванов", action="Бежать из здания"),
+        }
+        self.scenario = "Вы оказались в горящем здании."
+    
+    def make_entries(self, models, rpm=10, model_name="gemini-2.0-flash-lite"):
+        return [
+            PoolEntry(key_id=mask_key(f"key-{index}-abcd"), model_name=model_name, model=model, rpm_limit=rpm, clock=self.clock)
+            for index, model in enumerate(models)
+        ]
+    
+    def make_pool(self, models, rpm=10, fast_models=(), fast_rpm=10):
+        fast_entries = self.make_entries(fast_models, fast_rpm, "gemini-fast")
+        pool = GeminiPoolService(entries=self.make_entries(models, rpm), cooldown=30, fast_entries=fast_entries)
+        pool.retry_policy = RetryPolicy(max_attempts=3, base_delay=0, max_delay=0)
+        return pool
+    
+    def evaluate(self, pool):
+        return asyncio.run(pool.evaluate_survival(self.scenario, self.players, GameMode.EVERY_MAN_FOR_HIMSELF)).narrative
+    
+    def test_requests_are_balanced(self):
+        """Запросы распределяются по наименее загруженным ключам"""
+        models = [StubModel("a"), StubModel("b")]
+        pool = self.make_pool(models)
+        for _ in range(4):
+            self.evaluate(pool)
+        self.assertEqual([model.calls for model in models], [2, 2])
+    
+    def test_throttled_key_is_cooled_down(self):
+        """Ключ с ошибкой 429 пропускается до конца охлаждения"""
+        throttled, healthy = StubModel("a", throttled=True), StubModel("b")
+        pool = self.make_pool([throttled, healthy])
+        
+        self.assertEqual(self.evaluate(pool), "История от b")
+        self.assertEqual(throttled.calls, 1)
+        
+        self.evaluate(pool)
+        self.assertEqual(throttled.calls, 1)
+        self.assertTrue(pool.utilization()[0]["cooling_down"])
+        self.assertEqual(pool.utilization()[0]["throttled"], 1)
+        
+        self.clock.now = 31
+        self.assertFalse(pool.entries[0].is_cooling_down())
+    
+    def test_exhausted_pool_falls_back(self):
+        """Если квоты всех ключей исчерпаны, используется резервный ответ"""
+        pool = self.make_pool([StubModel("a")], rpm=1)
+        self.evaluate(pool)
+        with self.assertRaises(PoolExhaustedError):
+            pool._acquire(10)
+        narrative = self.evaluate(pool)
+        self.assertIn("AI сервис недоступен", narrative)
+    
+    def test_throttling_does_not_open_the_breaker(self):
+        """429 на отдельных ключах и исчерпанные квоты не размыкают выключатель всего пула"""
+        models = [StubModel("a", throttled=True), StubModel("b", throttled=True), StubModel("c")]
+        pool = self.make_pool(models, rpm=1)
+        pool.circuit_breaker = CircuitBreaker("gemini_pool", failure_threshold=1)
+        
+        self.assertEqual(self.evaluate(pool), "История от c")
+        self.assertIn("AI сервис недоступен", self.evaluate(pool))
+        self.assertEqual(pool.circuit_breaker.state, CircuitState.CLOSED)
+    
+    def test_utilization_report(self):
+        """Отчет содержит данные по каждому ключу без раскрытия ключа"""
+        pool = self.make_pool([StubModel("a"), StubModel("b")])
+        self.evaluate(pool)
+        report = pool.utilization()
+        self.assertEqual(len(report), 2)
+        self.assertEqual(sum(entry["requests"] for entry in report), 1)
+        self.assertTrue(all(entry["key"].startswith("...") for entry in report))
+    
+    def test_fast_entries_serve_only_reduced_path(self):
+        """Записи быстрой модели не расходуются полными раундами, а укороченный путь переходит на основные, когда их квота кончилась"""
+        main, fast = StubModel("main"), StubModel("fast")
+        pool = self.make_pool([main], fast_models=[fast], fast_rpm=1)
+        config = {"max_output_tokens": 100}
+        
+        async def scenario():
+            full = await pool._call_entry("промпт", config, GenerationPath.FULL)
+            reduced = await pool._call_entry("промпт", config, GenerationPath.REDUCED)
+            overflow = await pool._call_entry("промпт", config, GenerationPath.REDUCED)
+            return full.text, reduced.text, overflow.text
+        
+        self.assertEqual(asyncio.run(scenario()), ("История от main", "История от fast", "История от main"))
+        self.assertEqual(len(pool.utilization()), 2)
+    
+    def test_entries_from_config(self):
+        """Каждый ключ получает запись на каждую модель, быстрая модель — отдельным списком"""
+        with patch("services.ai.gemini_pool_service.GEMINI_API_KEYS", ["key-one-1111", "key-two-2222"]), \
+                patch("services.ai.gemini_pool_service.GEMINI_POOL_MODELS", ["models/gemini-main"]), \
+                patch("services.ai.gemini_pool_service.GEMINI_FAST_MODEL", "models/gemini-fast"):
+            pool = GeminiPoolService()
+        self.assertEqual([(entry.key_id, entry.model_name) for entry in pool.entries], [("...1111", "gemini-main"), ("...2222", "gemini-main")])
+        self.assertEqual([entry.model_name for entry in pool.fast_entries], ["gemini-fast", "gemini-fast"])
+    
+    def test_rest_model_sends_own_key_and_reports_throttling(self):
+        """Запись обращается к REST API со своим ключом, а 429 охлаждает именно ее"""
+        requests = []
+        
+        def handler(request):
+            requests.append((request.url.path, request.headers["x-goog-api-key"]))
+            if request.headers["x-goog-api-key"] == "throttled-key":
+                return httpx.Response(429, json={"error": {"message": "quota"}})
+            return httpx.Response(200, json={"candidates": [{"content": {"parts": [{"text": "История"}]}}]})
+        
+        async def scenario():
+            async with httpx.AsyncClient(base_url="http://gemini.local", transport=httpx.MockTransport(handler)) as client:
+                models = [GeminiRESTModel(key, "models/gemini-main", lambda: client) for key in ("throttled-key", "healthy-key")]
+                pool = self.make_pool(models)
+                return (await pool.evaluate_survival(self.scenario, self.players, GameMode.EVERY_MAN_FOR_HIMSELF)).narrative, pool
+        
+        narrative, pool = asyncio.run(scenario())
+        self.assertEqual(narrative, "История")
+        self.assertEqual(requests, [
+            ("/v1beta/models/gemini-main:generateContent", "throttled-key"),
+            ("/v1beta/models/gemini-main:generateContent", "healthy-key"),
+        ])
+        self.assertTrue(pool.entries[0].is_cooling_down())
+
+
+if __name__ == '__main__':
+    unittest.main()
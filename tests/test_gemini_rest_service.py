@@ -0,0 +1,81 @@
+import unittest
+import asyncio
+
+from benchmarks.startup import HEAVY_MODULES, loaded_modules
+from services.ai.gemini_rest_service import GeminiRESTService
+from services.ai.mock_server import MockAIServer
+from services.ai.mock_service import MockAIService, MockBehavior
+from services.ai.resilience import RetryPolicy
+from models import Player, GameMode
+
+
+def fast_behavior(**kwargs):
+    """Поведение без задержек для быстрых тестов"""
+    options = dict(latency="fixed:0", chunks_per_second=0, chunk_size=16, error_rate=0, seed=1)
+    options.update(kwargs)
+    return MockBehavior(**options)
+
+
+class TestGeminiRESTService(unittest.TestCase):
+    """Тесты REST-бэкенда Gemini на HTTP-заглушке"""
+    
+    def setUp(self):
+        self.players = {
+            1: Player(user_id=1, first_name="Иван", last_name="Иванов", action="Бежать из здания"),
+            2: Player(user_id=2, first_name="Анна", last_name="Петрова", action="Спрятаться в подвале"),
+        }
+        self.scenario = "Вы оказались в горящем здании."
+    
+    def evaluate(self, behavior, **options):
+        async def scenario():
+            server = MockAIServer(behavior)
+            await server.start()
+            try:
+                service = GeminiRESTService(api_key="test-key", endpoint=server.url, **options)
+                service.retry_policy = RetryPolicy(max_attempts=3, base_delay=0, max_delay=0)
+                await service.warm_up_connections()
+                result = await service.evaluate_survival(self.scenario, self.players, GameMode.EVERY_MAN_FOR_HIMSELF)
+                return result.narrative, server.requests
+            finally:
+                await server.stop()
+        
+        return asyncio.run(scenario())
+    
+    def expected(self, behavior):
+        prompt = MockAIService(behavior)._build_prompt(self.scenario, self.players, GameMode.EVERY_MAN_FOR_HIMSELF)
+        return behavior.render(prompt)
+    
+    def test_streaming_matches_mock(self):
+        """Потоковый ответ собирается в тот же текст, что у заглушки"""
+        behavior = fast_behavior()
+        result, requests = self.evaluate(behavior, stream=True)
+        self.assertEqual(result, self.expected(behavior))
+        self.assertEqual(requests, 1)
+    
+    def test_generate_content_matches_mock(self):
+        """Ответ generateContent без потока совпадает с потоковым"""
+        behavior = fast_behavior()
+        result, _ = self.evaluate(behavior, stream=False)
+        self.assertEqual(result, self.expected(behavior))
+    
+    def test_transient_errors_are_retried(self):
+        """Ответы 503 повторяются, после исчерпания попыток — резервная история"""
+        narrative, requests = self.evaluate(fast_behavior(error_rate=1, error_status=503))
+        self.assertIn("AI сервис недоступен", narrative)
+        self.assertEqual(requests, 3)
+    
+    def test_unknown_model_is_not_retried(self):
+        """Неизвестная модель — постоянная ошибка"""
+        narrative, requests = self.evaluate(fast_behavior(), model_name="models/missing")
+        self.assertIn("AI сервис недоступен", narrative)
+        self.assertEqual(requests, 0)
+    
+    def test_no_sdk_import(self):
+        """Модуль не загружает SDK Gemini"""
+        modules = loaded_modules("import services.ai.gemini_rest_service")
+        for heavy in HEAVY_MODULES:
+            self.assertNotIn(heavy, modules)
+
+
+if __name__ == '__main__':
+    unittest.main()
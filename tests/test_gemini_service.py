@@ -84,9 +84,9 @@ class TestGeminiService(unittest.TestCase):
         loop = asyncio.new_event_loop()
         asyncio.set_event_loop(loop)
         try:
-            narrative, survivors = loop.run_until_complete(
+            narrative = loop.run_until_complete(
                 self.service.evaluate_survival(self.scenario, self.players, self.game_mode)
-            )
+            ).narrative
             
             # Проверяем результаты с учетом нового формата ответа
             self.assertIn("In the scenario", narrative)
@@ -0,0 +1,107 @@
+import unittest
+import asyncio
+from types import SimpleNamespace
+
+from services.ai.base_service import GenerationPath
+from services.ai.gemini_service import GeminiService
+from services.ai.generation_profile import GenerationProfiler, LoadLevel
+from models import Player, GameMode
+
+
+class RecordingModel:
+    """Заглушка модели, запоминающая промпты и параметры генерации"""
+    
+    def __init__(self, text: str = "История"):
+        self.text = text
+        self.calls = []
+    
+    async def generate_content_async(self, prompt, generation_config=None):
+        self.calls.append((prompt, dict(generation_config)))
+        return SimpleNamespace(text=self.text)
+
+
+class TestGenerationProfiler(unittest.TestCase):
+    """Тесты выбора профиля генерации"""
+    
+    def setUp(self):
+        self.depth = 0
+        self.profiler = GenerationProfiler(lambda: self.depth, busy_queue_depth=2, overload_queue_depth=8)
+    
+    def test_output_grows_with_players_and_is_capped(self):
+        """Объем ответа растет с числом игроков, но не превышает максимум"""
+        one = self.profiler.select(1, GameMode.EVERY_MAN_FOR_HIMSELF)
+        five = self.profiler.select(5, GameMode.EVERY_MAN_FOR_HIMSELF)
+        many = self.profiler.select(50, GameMode.EVERY_MAN_FOR_HIMSELF)
+        self.assertLess(one.max_output_tokens, five.max_output_tokens)
+        self.assertEqual(many.max_output_tokens, 4096)
+        self.assertEqual(one.load, LoadLevel.NORMAL)
+    
+    def test_cooperative_mode_is_shorter(self):
+        """В кооперативном режиме история общая и короче"""
+        competitive = self.profiler.select(6, GameMode.EVERY_MAN_FOR_HIMSELF)
+        cooperative = self.profiler.select(6, GameMode.BROTHERHOOD)
+        self.assertLess(cooperative.max_output_tokens, competitive.max_output_tokens)
+    
+    def test_queue_depth_shrinks_output(self):
+        """С ростом очереди ответы становятся короче, а при перегрузке включается быстрая модель"""
+        normal = self.profiler.select(5, GameMode.EVERY_MAN_FOR_HIMSELF)
+        self.depth = 3
+        busy = self.profiler.select(5, GameMode.EVERY_MAN_FOR_HIMSELF)
+        self.depth = 20
+        overloaded = self.profiler.select(5, GameMode.EVERY_MAN_FOR_HIMSELF)
+        
+        self.assertEqual(busy.load, LoadLevel.BUSY)
+        self.assertEqual(overloaded.load, LoadLevel.OVERLOADED)
+        self.assertGreater(normal.max_output_tokens, busy.max_output_tokens)
+        self.assertGreater(busy.max_output_tokens, overloaded.max_output_tokens)
+        self.assertGreaterEqual(overloaded.max_output_tokens, 384)
+        self.assertFalse(busy.fast_model)
+        self.assertTrue(overloaded.fast_model)
+
+
+class TestProfiledGeneration(unittest.TestCase):
+    """Тесты применения профиля в evaluate_survival"""
+    
+    def setUp(self):
+        self.players = {
+            123: Player(user_id=123, first_name="Иван", last_name="Иванов", action="Бежать из здания"),
+        }
+        self.scenario = "Вы оказались в горящем здании."
+        self.depth = 0
+        self.model = RecordingModel("Полная")
+        self.fast_model = RecordingModel("Короткая")
+        self.service = GeminiService(model=self.model)
+        self.service.fast_model = self.fast_model
+        self.service.profiler = GenerationProfiler(lambda: self.depth, busy_queue_depth=2, overload_queue_depth=8)
+    
+    def evaluate(self):
+        return asyncio.run(self.service.evaluate_survival(self.scenario, self.players, GameMode.EVERY_MAN_FOR_HIMSELF)).narrative
+    
+    def test_profile_sets_limit_and_length_hint(self):
+        """Лимит токенов и подсказка о длине попадают в запрос"""
+        self.assertEqual(self.evaluate(), "Полная")
+        prompt, config = self.model.calls[0]
+        self.assertEqual(config["max_output_tokens"], 1408)
+        self.assertIn("ОГРАНИЧЕНИЕ ДЛИНЫ", prompt)
+    
+    def test_overload_switches_to_fast_model(self):
+        """При перегрузке раунд уходит на быструю модель с коротким ответом"""
+        self.depth = 10
+        self.assertEqual(self.evaluate(), "Короткая")
+        self.assertEqual(self.model.calls, [])
+        _, config = self.fast_model.calls[0]
+        self.assertLess(config["max_output_tokens"], 1408)
+    
+    def test_reduced_path_keeps_the_smaller_limit(self):
+        """Лимит пути REDUCED не увеличивает маленький профиль"""
+        profile = self.service.profiler.select(1, GameMode.EVERY_MAN_FOR_HIMSELF)
+        config = self.service._generation_config(GenerationPath.REDUCED, profile)
+        self.assertEqual(config["max_output_tokens"], 1024)
+        self.depth = 10
+        profile = self.service.profiler.select(1, GameMode.EVERY_MAN_FOR_HIMSELF)
+        config = self.service._generation_config(GenerationPath.REDUCED, profile)
+        self.assertEqual(config["max_output_tokens"], profile.max_output_tokens)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+import unittest
+import asyncio
+import time
+
+import httpx
+
+from utils.health import HealthServer
+
+
+class TestHealthServer(unittest.TestCase):
+    """Тесты эндпоинтов /livez и /readyz"""
+    
+    def run_scenario(self, body, checks=None):
+        async def scenario():
+            server = HealthServer(asyncio.get_running_loop(), "127.0.0.1", 0, checks or {}, liveness_timeout=0.2)
+            server.start()
+            try:
+                async with httpx.AsyncClient(base_url=server.url, timeout=5) as client:
+                    return await body(client)
+            finally:
+                server.stop()
+        
+        return asyncio.run(scenario())
+    
+    def test_liveness_reports_loop_latency(self):
+        """Отзывчивый цикл событий дает 200 и задержку"""
+        async def body(client):
+            return await client.get("/livez")
+        
+        response = self.run_scenario(body)
+        self.assertEqual(response.status_code, 200)
+        self.assertLess(response.json()["loop_latency_ms"], 200)
+    
+    def test_blocked_loop_is_not_live(self):
+        """Заблокированный цикл событий дает 503, а не зависший запрос"""
+        async def body(client):
+            # Запрос уходит из отдельного потока, пока цикл событий занят синхронной работой
+            request = asyncio.get_running_loop().run_in_executor(None, httpx.get, f"{client.base_url}/livez")
+            time.sleep(0.5)
+            return await request
+        
+        response = self.run_scenario(body)
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.json()["status"], "unresponsive")
+    
+    def test_readiness_checks(self):
+        """Готовность требует всех проверок; ошибка проверки считается неготовностью"""
+        state = {"ai_backend": False}
+        
+        def broken():
+            raise RuntimeError("boom")
+        
+        async def body(client):
+            first = await client.get("/readyz")
+            state["ai_backend"] = True
+            second = await client.get("/readyz")
+            return first, second
+        
+        first, second = self.run_scenario(body, {"telegram": lambda: True, "ai_backend": lambda: state["ai_backend"]})
+        self.assertEqual(first.status_code, 503)
+        self.assertEqual(first.json()["checks"], {"telegram": True, "ai_backend": False})
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second.json()["status"], "ready")
+        
+        response = self.run_scenario(lambda client: client.get("/readyz"), {"broken": broken})
+        self.assertEqual(response.status_code, 503)
+
+
+if __name__ == '__main__':
+    unittest.main()
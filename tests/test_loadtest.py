@@ -0,0 +1,76 @@
+import unittest
+import asyncio
+
+import httpx
+
+from loadtest.fake_bot_api import FakeBotAPI
+from loadtest.harness import LoadTestConfig, percentile, run_load_test
+from models import lobbies, user_to_lobby, user_states
+
+
+class TestFakeBotAPI(unittest.TestCase):
+    """Тесты заглушки Telegram Bot API"""
+    
+    def test_long_polling_and_inbox(self):
+        """getUpdates ждет новых обновлений, а sendMessage попадает в ящик чата"""
+        async def scenario():
+            api = FakeBotAPI()
+            await api.start()
+            try:
+                async with httpx.AsyncClient(base_url=f"{api.base_url}{api.token}") as client:
+                    poll = asyncio.create_task(client.post("/getUpdates", data={"timeout": "5"}))
+                    await asyncio.sleep(0.05)
+                    api.push_message(42, "Иван", "/start")
+                    updates = (await poll).json()["result"]
+                    
+                    await client.post("/sendMessage", data={
+                        "chat_id": "42",
+                        "text": "Привет",
+                        "reply_markup": '{"inline_keyboard": [[{"text": "Да", "callback_data": "yes"}]]}',
+                    })
+                    _, message = await api.wait_for(42, lambda sent: "yes" in sent.callback_data(), timeout=1)
+                    return updates, message
+            finally:
+                await api.stop()
+        
+        updates, message = asyncio.run(scenario())
+        self.assertEqual(len(updates), 1)
+        self.assertEqual(updates[0]["message"]["entities"][0]["type"], "bot_command")
+        self.assertEqual(message.text, "Привет")
+
+
+class TestLoadHarness(unittest.TestCase):
+    """Тесты нагрузочного прогона"""
+    
+    def setUp(self):
+        lobbies.clear()
+        user_to_lobby.clear()
+        user_states.clear()
+    
+    tearDown = setUp
+    
+    def test_percentile(self):
+        """Перцентиль по ближайшему рангу"""
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 99), 99)
+        self.assertEqual(percentile([3.0], 95), 3.0)
+    
+    def test_small_run(self):
+        """Бот проходит полный цикл лобби и раундов через заглушку API"""
+        config = LoadTestConfig(
+            users=6, lobby_size=3, lobby_rate=0, rounds=2,
+            think_time="fixed:0", ai_latency="fixed:0.1", step_timeout=20, seed=1,
+        )
+        report = asyncio.run(run_load_test(config))
+        
+        self.assertEqual(report.lobbies_failed, 0)
+        self.assertEqual(report.rounds_completed, 4)
+        self.assertEqual(len(report.delivery_latencies), 12)
+        self.assertTrue(all(latency >= 0.1 for latency in report.round_latencies))
+        self.assertGreater(report.method_counts["sendMessage"], 0)
+        self.assertIn("p99", report.summary())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+import unittest
+import asyncio
+import time
+from unittest.mock import patch
+
+from utils.loop_watchdog import LoopWatchdog, describe_stack
+from utils.metrics import LOOP_BLOCKS, LOOP_LAG
+
+
+def blocking_scenario_read(seconds):
+    """Синхронная работа в цикле событий, как чтение файла или вызов SDK"""
+    time.sleep(seconds)
+
+
+class TestLoopWatchdog(unittest.TestCase):
+    """Тесты наблюдения за циклом событий"""
+    
+    def run_with_watchdog(self, body, threshold=0.1):
+        watchdog = LoopWatchdog(threshold=threshold, interval=0.02)
+        
+        async def scenario():
+            watchdog.start()
+            await asyncio.sleep(0.05)
+            await body()
+            await asyncio.sleep(0.05)
+            await watchdog.stop()
+        
+        asyncio.run(scenario())
+        return watchdog
+    
+    def test_blocking_call_is_reported(self):
+        """Блокирующий вызов обнаруживается, виновник берется из кода проекта, а не из time.sleep"""
+        blocks = LOOP_BLOCKS.labels("test_loop_watchdog.py:blocking_scenario_read")
+        before = blocks.value
+        
+        async def body():
+            blocking_scenario_read(0.4)
+        
+        watchdog = self.run_with_watchdog(body)
+        self.assertEqual(len(watchdog.reports), 1)
+        report = watchdog.reports[0]
+        self.assertEqual(report.function, "test_loop_watchdog.py:blocking_scenario_read")
+        self.assertIn("in body", report.stack[-2])
+        self.assertGreaterEqual(report.lag, 0.3)
+        self.assertEqual(blocks.value, before + 1)
+    
+    def test_async_waits_are_not_reported(self):
+        """Ожидание через await не считается блокировкой, задержка попадает в гистограмму"""
+        lag = LOOP_LAG.labels()
+        before = lag.count
+        
+        async def body():
+            await asyncio.sleep(0.3)
+        
+        watchdog = self.run_with_watchdog(body)
+        self.assertEqual(watchdog.reports, [])
+        self.assertGreater(lag.count, before + 5)
+    
+    def test_stop_does_not_block_event_loop(self):
+        """Остановка ждет занятый поток наблюдения, не блокируя цикл событий"""
+        def slow_describe_stack(frame):
+            time.sleep(0.4)
+            return describe_stack(frame)
+        
+        async def scenario():
+            watchdog = LoopWatchdog(threshold=0.05, interval=0.02)
+            watchdog.start()
+            await asyncio.sleep(0.05)
+            blocking_scenario_read(0.15)
+            
+            longest = 0.0
+            
+            async def tick():
+                nonlocal longest
+                while True:
+                    started = time.perf_counter()
+                    await asyncio.sleep(0.01)
+                    longest = max(longest, time.perf_counter() - started)
+            
+            ticker = asyncio.create_task(tick())
+            await asyncio.sleep(0.02)
+            await watchdog.stop()
+            await asyncio.sleep(0.05)
+            ticker.cancel()
+            return watchdog, longest
+        
+        with patch("utils.loop_watchdog.describe_stack", slow_describe_stack):
+            watchdog, longest = asyncio.run(scenario())
+        self.assertEqual(len(watchdog.reports), 1)
+        self.assertLess(longest, 0.15)
+
+
+if __name__ == '__main__':
+    unittest.main()
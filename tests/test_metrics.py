@@ -0,0 +1,122 @@
+import unittest
+import asyncio
+
+import httpx
+
+from models import Lobby, Player, GameState, GameMode
+from services.ai.mock_service import MockAIService, MockBehavior
+from services.ai.resilience import RetryPolicy
+from utils.metrics import (
+    AI_FALLBACKS,
+    AI_TIME_TO_FIRST_TOKEN,
+    HANDLER_ERRORS,
+    HANDLER_LATENCY,
+    MetricsRegistry,
+    register_game_gauges,
+    start_metrics_server,
+    track_handler,
+)
+
+
+class TestMetricsFormat(unittest.TestCase):
+    """Тесты текстового формата Prometheus"""
+    
+    def setUp(self):
+        self.registry = MetricsRegistry()
+    
+    def test_counter_and_gauge(self):
+        """Счетчики и датчики с метками и экранированием значений"""
+        counter = self.registry.counter("sends_total", "Sends", ["error_type"])
+        counter.labels("TimedOut").inc()
+        counter.labels(error_type="TimedOut").inc(2)
+        counter.labels('Bad "quote"').inc()
+        gauge = self.registry.gauge("players", "Players")
+        gauge.set(5)
+        
+        text = self.registry.render()
+        self.assertIn("# TYPE sends_total counter", text)
+        self.assertIn('sends_total{error_type="TimedOut"} 3', text)
+        self.assertIn('sends_total{error_type="Bad \\"quote\\""} 1', text)
+        self.assertIn("players 5", text)
+    
+    def test_histogram_buckets_are_cumulative(self):
+        """Корзины гистограммы накопительные, есть _sum и _count"""
+        histogram = self.registry.histogram("latency_seconds", "Latency", ["handler"], buckets=[0.1, 1])
+        child = histogram.labels("start")
+        for value in (0.05, 0.5, 0.7, 5):
+            child.observe(value)
+        
+        text = self.registry.render()
+        self.assertIn('latency_seconds_bucket{handler="start",le="0.1"} 1', text)
+        self.assertIn('latency_seconds_bucket{handler="start",le="1"} 3', text)
+        self.assertIn('latency_seconds_bucket{handler="start",le="+Inf"} 4', text)
+        self.assertIn('latency_seconds_count{handler="start"} 4', text)
+        self.assertIn('latency_seconds_sum{handler="start"} 6.25', text)
+    
+    def test_game_gauges(self):
+        """Лобби считаются по состояниям при каждом чтении"""
+        lobbies = {"a": Lobby(id="a"), "b": Lobby(id="b", game_state=GameState.WAITING_FOR_ACTIONS)}
+        lobbies["a"].add_player(Player(user_id=1, first_name="Иван", last_name="Иванов"))
+        register_game_gauges(lobbies, list(GameState))
+        
+        from utils.metrics import registry
+        text = registry.render()
+        self.assertIn('bot_lobbies{state="WAITING_FOR_PLAYERS"} 1', text)
+        self.assertIn('bot_lobbies{state="WAITING_FOR_ACTIONS"} 1', text)
+        self.assertIn('bot_lobbies{state="PROCESSING_RESULTS"} 0', text)
+        self.assertIn("bot_players 1", text)
+
+
+class TestInstrumentation(unittest.TestCase):
+    """Тесты сбора метрик в обработчиках и AI-сервисе"""
+    
+    def test_track_handler(self):
+        """Обертка измеряет длительность и считает исключения"""
+        async def sample_handler(update, context):
+            if update == "fail":
+                raise RuntimeError("boom")
+            return 1
+        
+        wrapped = track_handler(sample_handler)
+        self.assertEqual(wrapped.__name__, "sample_handler")
+        self.assertEqual(asyncio.run(wrapped("ok", None)), 1)
+        with self.assertRaises(RuntimeError):
+            asyncio.run(wrapped("fail", None))
+        
+        self.assertEqual(HANDLER_LATENCY.labels("sample_handler").count, 2)
+        self.assertEqual(HANDLER_ERRORS.labels("sample_handler", "RuntimeError").value, 1)
+    
+    def test_ai_metrics(self):
+        """Потоковый бэкенд записывает время до первого токена, ошибки учитываются как резервные ответы"""
+        players = {1: Player(user_id=1, first_name="Иван", last_name="Иванов", action="Бежать")}
+        ttft = AI_TIME_TO_FIRST_TOKEN.labels("MockAIService")
+        errors = AI_FALLBACKS.labels("error")
+        ttft_before, errors_before = ttft.count, errors.value
+        
+        service = MockAIService(MockBehavior(latency="fixed:0", chunks_per_second=0))
+        asyncio.run(service.evaluate_survival("Пожар", players, GameMode.EVERY_MAN_FOR_HIMSELF))
+        self.assertEqual(ttft.count, ttft_before + 1)
+        
+        failing = MockAIService(MockBehavior(latency="fixed:0", error_rate=1.0, error_status=400))
+        failing.retry_policy = RetryPolicy(max_attempts=1, base_delay=0, max_delay=0)
+        asyncio.run(failing.evaluate_survival("Пожар", players, GameMode.EVERY_MAN_FOR_HIMSELF))
+        self.assertEqual(errors.value, errors_before + 1)
+    
+    def test_metrics_endpoint(self):
+        """Эндпоинт /metrics отдает текстовый формат"""
+        async def scenario():
+            server = await start_metrics_server("127.0.0.1", 0)
+            try:
+                async with httpx.AsyncClient() as client:
+                    return await client.get(f"{server.url}/metrics")
+            finally:
+                await server.stop()
+        
+        response = asyncio.run(scenario())
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.headers["content-type"].startswith("text/plain; version=0.0.4"))
+        self.assertIn("# TYPE bot_handler_duration_seconds histogram", response.text)
+
+
+if __name__ == '__main__':
+    unittest.main()
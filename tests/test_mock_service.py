@@ -0,0 +1,239 @@
+import unittest
+import asyncio
+import json
+import threading
+import time
+from unittest.mock import patch
+
+import google.generativeai as genai
+import httpx
+
+from config import GEMINI_API_KEY
+from services.ai.base_service import GenerationPath
+from services.ai.gemini_service import GeminiService
+from services.ai.mock_server import MockAIServer
+from services.ai.mock_service import LatencyDistribution, MockAIService, MockBackendError, MockBehavior
+from services.ai.openai_compatible_service import OpenAICompatibleService
+from services.ai.resilience import RetryPolicy, classify_error, ErrorClass
+from services.ai_service_factory import SERVICE_CLASSES
+from models import Player, GameMode
+
+
+def fast_behavior(**kwargs):
+    """Поведение без задержек для быстрых тестов"""
+    options = dict(latency="fixed:0", chunks_per_second=0, chunk_size=16, error_rate=0, seed=1)
+    options.update(kwargs)
+    return MockBehavior(**options)
+
+
+class ThreadedMockServer:
+    """Заглушка в отдельном потоке: синхронный REST-клиент SDK блокирует свой цикл событий"""
+    
+    def __init__(self, behavior):
+        self.server = MockAIServer(behavior)
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+    
+    def __enter__(self):
+        self.thread.start()
+        asyncio.run_coroutine_threadsafe(self.server.start(), self.loop).result(5)
+        return self.server
+    
+    def __exit__(self, *args):
+        asyncio.run_coroutine_threadsafe(self.server.stop(), self.loop).result(5)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(5)
+
+
+class TestMockBehavior(unittest.TestCase):
+    """Тесты поведения заглушки AI"""
+    
+    def setUp(self):
+        self.players = {
+            1: Player(user_id=1, first_name="Иван", last_name="Иванов", action="Бежать из здания"),
+            2: Player(user_id=2, first_name="Анна", last_name="Петрова", action="Спрятаться в подвале"),
+            3: Player(user_id=3, first_name="Олег", last_name="Сидоров", action="Позвать на помощь"),
+        }
+        self.scenario = "Вы оказались в горящем здании."
+        self.prompt = MockAIService(fast_behavior())._build_prompt(self.scenario, self.players, GameMode.EVERY_MAN_FOR_HIMSELF)
+    
+    def test_latency_specs(self):
+        """Спецификации распределений разбираются, значения неотрицательны"""
+        import random
+        rng = random.Random(1)
+        self.assertEqual(LatencyDistribution("fixed:0.25", rng).sample(), 0.25)
+        for spec in ("uniform:0.1:0.2", "normal:0.1:1", "lognormal:-2:0.5", "exponential:0.1"):
+            value = LatencyDistribution(spec, rng).sample()
+            self.assertGreaterEqual(value, 0)
+        with self.assertRaises(ValueError):
+            LatencyDistribution("gamma:1", rng)
+    
+    def test_verdicts_are_deterministic(self):
+        """Одинаковый промпт всегда дает одинаковых выживших"""
+        first = fast_behavior(seed=1).verdicts(self.prompt)
+        second = fast_behavior(seed=2).verdicts(self.prompt)
+        self.assertEqual(first, second)
+        self.assertEqual(set(first), {"Иван Иванов", "Анна Петрова", "Олег Сидоров"})
+    
+    def test_cooperative_verdict(self):
+        """В кооперативном режиме все выживают или погибают вместе"""
+        behavior = fast_behavior()
+        prompt = MockAIService(behavior)._build_prompt(self.scenario, self.players, GameMode.BROTHERHOOD)
+        self.assertEqual(len(set(behavior.verdicts(prompt).values())), 1)
+        self.assertTrue(behavior.render(prompt).endswith(("ВЫЖИЛИ ВСЕ", "ПОГИБЛИ ВСЕ")))
+    
+    def test_render_keeps_verdict_when_truncated(self):
+        """Короткий лимит сокращает историю, но не строку с итогом"""
+        behavior = fast_behavior()
+        text = behavior.render(self.prompt, max_output_tokens=10)
+        self.assertLess(len(text), len(behavior.render(self.prompt)))
+        self.assertTrue(text.split("\n")[-1].startswith(("ВЫЖИЛИ:", "ПОГИБЛИ ВСЕ")))
+    
+    def test_stream_rate(self):
+        """Фрагменты выдаются с заданной скоростью после задержки первого токена"""
+        behavior = fast_behavior(latency="fixed:0.05", chunks_per_second=100, chunk_size=32)
+        
+        async def collect():
+            started = time.monotonic()
+            chunks = [chunk async for chunk in behavior.stream(self.prompt)]
+            return chunks, time.monotonic() - started
+        
+        chunks, elapsed = asyncio.run(collect())
+        self.assertEqual("".join(chunks), behavior.render(self.prompt))
+        self.assertTrue(all(len(chunk) <= 32 for chunk in chunks))
+        self.assertGreaterEqual(elapsed, 0.05 + (len(chunks) - 1) * 0.01 * 0.9)
+    
+    def test_error_injection(self):
+        """Внедренная ошибка несет HTTP-код и считается временной"""
+        behavior = fast_behavior(error_rate=1.0, error_status=503)
+        
+        async def consume():
+            return [chunk async for chunk in behavior.stream(self.prompt)]
+        
+        with self.assertRaises(MockBackendError) as context:
+            asyncio.run(consume())
+        self.assertEqual(context.exception.code, 503)
+        self.assertEqual(classify_error(context.exception), ErrorClass.TRANSIENT)
+
+
+class TestMockAIService(unittest.TestCase):
+    """Тесты сервиса-заглушки"""
+    
+    def setUp(self):
+        self.players = {
+            1: Player(user_id=1, first_name="Иван", last_name="Иванов", action="Бежать из здания"),
+            2: Player(user_id=2, first_name="Анна", last_name="Петрова", action="Спрятаться в подвале"),
+        }
+        self.scenario = "Вы оказались в горящем здании."
+    
+    def test_registered_in_factory(self):
+        """Заглушка доступна как AI_SERVICE_TYPE=mock"""
+        self.assertIs(SERVICE_CLASSES["mock"], MockAIService)
+    
+    def test_evaluate_survival(self):
+        """Сервис возвращает историю с итоговой строкой"""
+        service = MockAIService(fast_behavior())
+        result = asyncio.run(service.evaluate_survival(self.scenario, self.players, GameMode.EVERY_MAN_FOR_HIMSELF))
+        self.assertTrue(result.generated)
+        self.assertIn("Иван", result.narrative)
+        self.assertTrue(result.narrative.split("\n")[-1].startswith(("ВЫЖИЛИ:", "ПОГИБЛИ ВСЕ")))
+    
+    def test_errors_lead_to_fallback(self):
+        """При постоянных ошибках используется резервный ответ"""
+        service = MockAIService(fast_behavior(error_rate=1.0))
+        service.retry_policy = RetryPolicy(max_attempts=2, base_delay=0, max_delay=0)
+        narrative = asyncio.run(service.evaluate_survival(self.scenario, self.players, GameMode.EVERY_MAN_FOR_HIMSELF)).narrative
+        self.assertIn("AI сервис недоступен", narrative)
+
+
+class TestMockAIServer(unittest.TestCase):
+    """Тесты HTTP-заглушки с API Gemini и OpenAI"""
+    
+    def setUp(self):
+        self.players = {
+            1: Player(user_id=1, first_name="Иван", last_name="Иванов", action="Бежать из здания"),
+            2: Player(user_id=2, first_name="Анна", last_name="Петрова", action="Спрятаться в подвале"),
+        }
+        self.scenario = "Вы оказались в горящем здании."
+        self.behavior = fast_behavior()
+        self.prompt = MockAIService(self.behavior)._build_prompt(self.scenario, self.players, GameMode.EVERY_MAN_FOR_HIMSELF)
+    
+    def test_openai_backend(self):
+        """OpenAI-совместимый бэкенд работает через заглушку"""
+        async def scenario():
+            server = MockAIServer(self.behavior)
+            await server.start()
+            try:
+                backend = OpenAICompatibleService(base_url=f"{server.url}/v1", model_name="mock")
+                return await backend.evaluate_survival(self.scenario, self.players, GameMode.EVERY_MAN_FOR_HIMSELF)
+            finally:
+                await server.stop()
+        
+        self.assertEqual(asyncio.run(scenario()).narrative, self.behavior.render(self.prompt))
+    
+    def test_streaming_endpoints(self):
+        """SSE-потоки Gemini и OpenAI собираются в тот же текст"""
+        async def scenario():
+            server = MockAIServer(self.behavior)
+            await server.start()
+            try:
+                async with httpx.AsyncClient(base_url=server.url) as client:
+                    gemini = await client.post(
+                        "/v1beta/models/gemini-2.0-flash-lite:streamGenerateContent",
+                        params={"alt": "sse"},
+                        json={"contents": [{"role": "user", "parts": [{"text": self.prompt}]}]},
+                    )
+                    openai = await client.post(
+                        "/v1/chat/completions",
+                        json={"model": "mock", "stream": True, "messages": [{"role": "user", "content": self.prompt}]},
+                    )
+                return gemini.text, openai.text
+            finally:
+                await server.stop()
+        
+        gemini, openai = asyncio.run(scenario())
+        
+        gemini_events = [json.loads(line[6:]) for line in gemini.splitlines() if line.startswith("data: ")]
+        gemini_text = "".join(event["candidates"][0]["content"]["parts"][0]["text"] for event in gemini_events)
+        self.assertEqual(gemini_text, self.behavior.render(self.prompt))
+        self.assertGreater(len(gemini_events), 2)
+        
+        openai_events = [line[6:] for line in openai.splitlines() if line.startswith("data: ")]
+        self.assertEqual(openai_events[-1], "[DONE]")
+        openai_text = "".join(json.loads(event)["choices"][0]["delta"].get("content", "") for event in openai_events[:-1])
+        self.assertEqual(openai_text, self.behavior.render(self.prompt))
+    
+    def test_injected_error_status(self):
+        """Внедренная ошибка возвращается HTTP-статусом в формате API"""
+        async def scenario():
+            server = MockAIServer(fast_behavior(error_rate=1.0, error_status=429))
+            await server.start()
+            try:
+                async with httpx.AsyncClient(base_url=server.url) as client:
+                    return await client.post("/v1beta/models/gemini-2.0-flash-lite:generateContent", json={"contents": []})
+            finally:
+                await server.stop()
+        
+        response = asyncio.run(scenario())
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response.json()["error"]["status"], "RESOURCE_EXHAUSTED")
+    
+    def test_gemini_sdk_rest_path(self):
+        """Настоящий код SDK и GeminiService работает через заглушку без доступа к сети"""
+        try:
+            with ThreadedMockServer(self.behavior) as server, \
+                    patch("services.ai.gemini_service.GEMINI_API_KEY", "test-key"), \
+                    patch("services.ai.gemini_service.GEMINI_TRANSPORT", "rest"), \
+                    patch("services.ai.gemini_service.GEMINI_API_ENDPOINT", server.url):
+                service = GeminiService()
+                self.assertIsNotNone(service.model)
+                service.retry_policy = RetryPolicy(max_attempts=1, base_delay=0, max_delay=0)
+                result = asyncio.run(service.generate_text(self.prompt, service._generation_config(GenerationPath.FULL), GenerationPath.FULL))
+        finally:
+            genai.configure(api_key=GEMINI_API_KEY)
+        
+        self.assertEqual(result, self.behavior.render(self.prompt))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,5 +1,5 @@
 import unittest
-from models import Player, Lobby, GameState, GameMode
+from models import Player, Lobby, GameState, GameMode, LobbyRegistry
 
 
 class TestModels(unittest.TestCase):
@@ -124,5 +124,67 @@ class TestModels(unittest.TestCase):
         self.assertTrue(lobby.players[456].is_alive)
 
 
+class FakeClock:
+    """Управляемые часы"""
+    
+    def __init__(self):
+        self.now = 0.0
+    
+    def __call__(self):
+        return self.now
+
+
+class TestLobbyRegistry(unittest.TestCase):
+    """Тесты реестра лобби с холодным уровнем"""
+    
+    def setUp(self):
+        self.clock = FakeClock()
+        self.registry = LobbyRegistry(clock=self.clock)
+        self.events = []
+        self.registry.subscribe(lambda key, value: self.events.append((key, value is not None)))
+        lobby = Lobby(id="idle", scenario="Пожар", game_mode=GameMode.BROTHERHOOD)
+        lobby.add_player(Player(user_id=1, first_name="Иван", last_name="Иванов", action="Бежать"))
+        self.registry["idle"] = lobby
+        self.registry["busy"] = Lobby(id="busy", game_state=GameState.PROCESSING_RESULTS)
+        self.registry["active"] = Lobby(id="active")
+        self.events.clear()
+    
+    def test_demote_and_rehydrate(self):
+        """Неактивное лобби уходит в холодный уровень и восстанавливается при обращении"""
+        self.clock.now = 100
+        self.registry["active"]
+        self.clock.now = 150
+        rehydrated = []
+        self.registry.on_rehydrate = lambda key, seconds: rehydrated.append(key)
+        
+        self.assertEqual(self.registry.demote_idle(60), 1)
+        self.assertEqual(self.registry.hot_count(), 2)
+        self.assertEqual(len(self.registry), 3)
+        self.assertIn("idle", self.registry)
+        self.assertEqual(sorted(self.registry), ["active", "busy", "idle"])
+        self.assertEqual([cold.players for cold in self.registry.cold_values()], [1])
+        self.assertNotIn("idle", dict(self.registry.items()))
+        
+        lobby = self.registry["idle"]
+        self.assertEqual(rehydrated, ["idle"])
+        self.assertEqual(lobby.players[1].action, "Бежать")
+        self.assertEqual(lobby.captain_id, 1)
+        self.assertEqual(lobby.game_mode, GameMode.BROTHERHOOD)
+        self.assertIs(self.registry.get("idle"), lobby)
+        self.assertEqual(self.registry.hot_count(), 3)
+        # Перенос между уровнями не виден подписчикам
+        self.assertEqual(self.events, [])
+    
+    def test_delete_cold(self):
+        """Удаление холодного лобби уведомляет подписчиков"""
+        self.clock.now = 100
+        self.registry.demote_idle(60)
+        self.assertIsNone(self.registry.get("missing"))
+        del self.registry["active"]
+        self.assertEqual(self.registry.pop("idle").id, "idle")
+        self.assertEqual(self.events, [("active", False), ("idle", False)])
+        self.assertEqual(sorted(self.registry), ["busy"])
+
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,136 @@
+import unittest
+import asyncio
+import os
+import sqlite3
+import tempfile
+
+from telegram.ext import Application
+
+from benchmarks.persistence import measure_cycle
+from handlers.setup import setup_handlers
+from loadtest.fake_bot_api import FakeBotAPI
+from models import lobbies, user_states, user_to_lobby
+from utils.persistence import SQLitePersistence
+
+
+def rows(path, sql):
+    connection = sqlite3.connect(path)
+    try:
+        return connection.execute(sql).fetchall()
+    finally:
+        connection.close()
+
+
+class TestSQLitePersistence(unittest.TestCase):
+    """Тесты хранилища состояния в SQLite"""
+    
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "state.sqlite3")
+    
+    def tearDown(self):
+        self.directory.cleanup()
+    
+    def test_cycle_is_one_transaction(self):
+        """Изменения одного цикла пишутся одной транзакцией, повторы и пустые данные не пишутся"""
+        async def scenario():
+            persistence = SQLitePersistence(self.path)
+            await asyncio.gather(*(
+                persistence.update_user_data(user_id, {"first_name": f"Игрок{user_id}"})
+                for user_id in range(100)
+            ), persistence.update_conversation("main", (1, 1), 2), persistence.update_user_data(500, {}))
+            await persistence._writer
+            first = persistence.transactions
+            
+            await persistence.update_user_data(1, {"first_name": "Игрок1"})
+            await persistence.update_conversation("main", (1, 1), 2)
+            unchanged = persistence.pending()
+            
+            await persistence.update_user_data(1, {"first_name": "Иван"})
+            await persistence.drop_user_data(2)
+            await persistence.update_conversation("main", (1, 1), None)
+            await persistence.flush()
+            return first, unchanged, persistence.transactions
+        
+        first, unchanged, total = asyncio.run(scenario())
+        self.assertEqual(first, 1)
+        self.assertEqual(unchanged, 0)
+        self.assertEqual(total, 2)
+        self.assertEqual(rows(self.path, "SELECT COUNT(*) FROM user_data"), [(99,)])
+        self.assertEqual(rows(self.path, "SELECT data FROM user_data WHERE user_id = 1"), [('{"first_name":"Иван"}',)])
+        self.assertEqual(rows(self.path, "SELECT COUNT(*) FROM conversations"), [(0,)])
+    
+    def test_load(self):
+        """Сохраненные данные и состояния диалогов читаются обратно"""
+        async def scenario():
+            persistence = SQLitePersistence(self.path)
+            await persistence.update_user_data(7, {"first_name": "Иван", "last_name": "Иванов"})
+            await persistence.update_conversation("main", (7, 7), 1)
+            await persistence.flush()
+            
+            restored = SQLitePersistence(self.path)
+            data = await restored.get_user_data(), await restored.get_conversations("main")
+            # Уже записанное значение после перезапуска не пишется повторно
+            await restored.update_conversation("main", (7, 7), 1)
+            pending = restored.pending()
+            await restored.flush()
+            return data, pending
+        
+        (user_data, conversations), pending = asyncio.run(scenario())
+        self.assertEqual(user_data, {7: {"first_name": "Иван", "last_name": "Иванов"}})
+        self.assertEqual(conversations, {(7, 7): 1})
+        self.assertEqual(pending, 0)
+    
+    def test_conversation_survives_restart(self):
+        """После перезапуска бот продолжает диалог с того же шага и помнит имя игрока"""
+        async def run_bot(api, path, actions):
+            application = Application.builder().token(api.token).base_url(api.base_url).persistence(SQLitePersistence(path, update_interval=0.05)).build()
+            setup_handlers(application)
+            async with application:
+                user_states.update(application.user_data)
+                await application.updater.start_polling(poll_interval=0, timeout=1)
+                await application.start()
+                result = await actions()
+                await application.updater.stop()
+                await application.stop()
+            return result
+        
+        async def scenario():
+            api = FakeBotAPI()
+            await api.start()
+            try:
+                async def register():
+                    api.push_message(42, "Иван", "/start")
+                    index, _ = await api.wait_for(42, lambda message: "имя" in message.text, timeout=10)
+                    api.push_message(42, "Иван", "Иван Иванов")
+                    return await api.wait_for(42, lambda message: message.reply_markup is not None, start=index + 1, timeout=10)
+                
+                index, menu = await run_bot(api, self.path, register)
+                user_states.clear()
+                
+                async def create_lobby():
+                    api.push_callback(42, "Иван", menu, "create_new_lobby")
+                    return await api.wait_for(42, lambda message: "Лобби создано" in message.text, start=index + 1, timeout=10)
+                
+                _, created = await run_bot(api, self.path, create_lobby)
+                return created
+            finally:
+                await api.stop()
+        
+        try:
+            created = asyncio.run(scenario())
+        finally:
+            user_states.clear()
+            lobbies.clear()
+            user_to_lobby.clear()
+        self.assertIn("Иван Иванов", created.text)
+    
+    def test_benchmark_cycle(self):
+        """Цикл сохранения пишет только изменения и быстрее полной перезаписи"""
+        result = asyncio.run(measure_cycle(users=2000, changed=20))
+        self.assertEqual(result["sqlite_rows"], 40)
+        self.assertLess(result["sqlite"], result["pickle"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,125 @@
+import unittest
+import asyncio
+import os
+import tempfile
+import threading
+import time
+import tracemalloc
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, patch
+
+from handlers.command_handlers import profile_command
+from models import Lobby, Player
+from utils.profiling import Profiler, SamplingProfiler, deep_sizeof, lobby_memory
+
+
+def busy_loop(seconds):
+    finish = time.monotonic() + seconds
+    total = 0
+    while time.monotonic() < finish:
+        total += sum(range(100))
+    return total
+
+
+def make_lobby(lobby_id, players, action_length=10):
+    lobby = Lobby(id=lobby_id)
+    for user_id in range(players):
+        lobby.add_player(Player(user_id=user_id, first_name="Иван", last_name="Иванов", action="д" * action_length))
+    return lobby
+
+
+class TestSamplingProfiler(unittest.TestCase):
+    """Тесты выборочного CPU-профилировщика"""
+    
+    def test_samples_target_thread(self):
+        """Профилировщик видит функцию, занимающую поток"""
+        profiler = SamplingProfiler(interval=0.001)
+        profiler.start()
+        busy_loop(0.2)
+        profiler.stop()
+        
+        self.assertGreater(profiler.samples, 10)
+        labels = [label for label, _, _ in profiler.top_functions(5)]
+        self.assertIn("test_profiling.py:busy_loop", labels)
+        self.assertTrue(profiler.collapsed().splitlines()[0].rsplit(" ", 1)[1].isdigit())
+
+
+class TestMemoryAccounting(unittest.TestCase):
+    """Тесты учета памяти лобби"""
+    
+    def test_deep_sizeof_counts_nested_text(self):
+        """Размер лобби растет вместе с текстом игроков"""
+        self.assertGreater(deep_sizeof(make_lobby("a", 2, 10_000)), deep_sizeof(make_lobby("a", 2, 10)) + 20_000)
+    
+    def test_lobbies_sorted_by_size(self):
+        """Самые большие лобби идут первыми"""
+        lobbies = {"small": make_lobby("small", 1), "big": make_lobby("big", 10, 1000)}
+        report = lobby_memory(lobbies)
+        self.assertEqual([item[0] for item in report], ["big", "small"])
+        self.assertEqual(report[0][2], 10)
+        self.assertEqual(report[0][3], "WAITING_FOR_PLAYERS")
+
+
+class TestProfiler(unittest.TestCase):
+    """Тесты профилирования по запросу"""
+    
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.profiler = Profiler(self.directory.name, {"a": make_lobby("a", 3)}, top_n=5, interval=0.001)
+    
+    def tearDown(self):
+        asyncio.run(self.profiler.stop_memory())
+        self.directory.cleanup()
+    
+    def test_artifacts_are_written(self):
+        """CPU-профиль, снимки памяти и отчет по лобби сохраняются в каталог"""
+        self.assertEqual(asyncio.run(self.profiler.toggle_cpu()), "CPU-профилирование запущено")
+        busy_loop(0.05)
+        self.assertIn("CPU-профиль", asyncio.run(self.profiler.toggle_cpu()))
+        
+        self.assertIn("база для следующего сравнения", asyncio.run(self.profiler.memory_snapshot()))
+        allocated = [bytearray(1024) for _ in range(100)]
+        self.assertIn("Изменение памяти", asyncio.run(self.profiler.memory_snapshot()))
+        self.assertIn("Лобби: 1", asyncio.run(self.profiler.lobby_report()))
+        del allocated
+        
+        prefixes = sorted(name.split("-")[0] for name in os.listdir(self.directory.name))
+        self.assertEqual(prefixes, ["cpu", "lobbies", "memory", "memory"])
+    
+    def test_heavy_work_runs_off_event_loop(self):
+        """Снимок tracemalloc и запись отчетов выполняются не в потоке цикла событий"""
+        threads = []
+        take_snapshot = tracemalloc.take_snapshot
+        real_open = open
+        
+        def recording(function):
+            def wrapper(*args, **kwargs):
+                threads.append(threading.get_ident())
+                return function(*args, **kwargs)
+            return wrapper
+        
+        async def scenario():
+            with patch("tracemalloc.take_snapshot", recording(take_snapshot)), patch("builtins.open", recording(real_open)):
+                await self.profiler.memory_snapshot()
+                await self.profiler.lobby_report()
+            return threading.get_ident()
+        
+        loop_thread = asyncio.run(scenario())
+        self.assertEqual(len(threads), 3)
+        self.assertNotIn(loop_thread, threads)
+    
+    def test_command_is_admin_only(self):
+        """Команда /profile отвечает только администраторам"""
+        message = SimpleNamespace(reply_text=AsyncMock())
+        context = SimpleNamespace(bot_data={"profiler": self.profiler}, args=["lobbies"])
+        
+        with patch("config.ADMIN_IDS", {1}):
+            asyncio.run(profile_command(SimpleNamespace(effective_user=SimpleNamespace(id=2), message=message), context))
+            message.reply_text.assert_not_called()
+            
+            asyncio.run(profile_command(SimpleNamespace(effective_user=SimpleNamespace(id=1), message=message), context))
+            self.assertIn("Лобби: 1", message.reply_text.call_args.args[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,235 @@
+import unittest
+import asyncio
+from types import SimpleNamespace
+
+from google.api_core import exceptions as google_exceptions
+
+from services.ai.gemini_service import GeminiService
+from services.ai.resilience import (
+    CircuitBreaker,
+    CircuitOpenError,
+    CircuitState,
+    ErrorClass,
+    RetryPolicy,
+    call_with_retry,
+    classify_error,
+)
+from models import Player, GameMode
+
+
+class FakeHTTPError(Exception):
+    """Ошибка с HTTP-кодом, как у клиентов API"""
+    
+    def __init__(self, code: int):
+        super().__init__(f"HTTP {code}")
+        self.code = code
+
+
+class FaultInjectingModel:
+    """Локальная заглушка модели, которая выполняет заранее заданный сценарий сбоев"""
+    
+    def __init__(self, faults):
+        self.faults = list(faults)
+        self.calls = 0
+    
+    async def generate_content_async(self, prompt, generation_config=None):
+        self.calls += 1
+        fault = self.faults.pop(0) if self.faults else "OK"
+        if isinstance(fault, BaseException):
+            raise fault
+        return SimpleNamespace(text=fault)
+
+
+class FakeClock:
+    """Управляемые часы для проверки таймаутов"""
+    
+    def __init__(self):
+        self.now = 0.0
+    
+    def __call__(self):
+        return self.now
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+class TestErrorClassification(unittest.TestCase):
+    """Тесты классификации ошибок"""
+    
+    def test_transient_errors(self):
+        """Таймауты, 429 и 5xx считаются временными"""
+        self.assertEqual(classify_error(asyncio.TimeoutError()), ErrorClass.TRANSIENT)
+        self.assertEqual(classify_error(FakeHTTPError(503)), ErrorClass.TRANSIENT)
+        self.assertEqual(classify_error(FakeHTTPError(429)), ErrorClass.TRANSIENT)
+        self.assertEqual(classify_error(google_exceptions.ServiceUnavailable("down")), ErrorClass.TRANSIENT)
+        self.assertEqual(classify_error(google_exceptions.ResourceExhausted("quota")), ErrorClass.TRANSIENT)
+    
+    def test_permanent_errors(self):
+        """Ошибки клиента не повторяются"""
+        self.assertEqual(classify_error(FakeHTTPError(400)), ErrorClass.PERMANENT)
+        self.assertEqual(classify_error(google_exceptions.InvalidArgument("bad")), ErrorClass.PERMANENT)
+        self.assertEqual(classify_error(ValueError("bug")), ErrorClass.PERMANENT)
+    
+    def test_backoff_is_capped(self):
+        """Задержка не превышает максимум"""
+        policy = RetryPolicy(max_attempts=10, base_delay=1.0, max_delay=4.0)
+        for attempt in range(1, 10):
+            self.assertLessEqual(policy.compute_delay(attempt), 4.0)
+
+
+class TestCircuitBreaker(unittest.TestCase):
+    """Тесты автоматического выключателя"""
+    
+    def setUp(self):
+        self.clock = FakeClock()
+        self.breaker = CircuitBreaker("test", failure_threshold=2, reset_timeout=10, clock=self.clock)
+        self.transitions = []
+        self.breaker.add_listener(lambda name, old, new: self.transitions.append((old, new)))
+    
+    def test_full_cycle(self):
+        """CLOSED -> OPEN -> HALF_OPEN -> CLOSED"""
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, CircuitState.CLOSED)
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, CircuitState.OPEN)
+        self.assertFalse(self.breaker.allow_request())
+        
+        self.clock.now = 10
+        self.assertTrue(self.breaker.allow_request())
+        # Во время пробного запроса остальные отклоняются
+        self.assertFalse(self.breaker.allow_request())
+        self.breaker.record_success()
+        
+        self.assertEqual(self.breaker.state, CircuitState.CLOSED)
+        self.assertEqual(self.transitions, [
+            (CircuitState.CLOSED, CircuitState.OPEN),
+            (CircuitState.OPEN, CircuitState.HALF_OPEN),
+            (CircuitState.HALF_OPEN, CircuitState.CLOSED),
+        ])
+    
+    def test_failed_probe_reopens(self):
+        """Неудачный пробный запрос снова размыкает цепь"""
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.clock.now = 10
+        self.assertTrue(self.breaker.allow_request())
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, CircuitState.OPEN)
+
+
+class TestRetries(unittest.TestCase):
+    """Тесты повторных попыток"""
+    
+    def setUp(self):
+        self.policy = RetryPolicy(max_attempts=3, base_delay=0, max_delay=0)
+    
+    def test_retries_transient_then_succeeds(self):
+        """Временные ошибки повторяются"""
+        model = FaultInjectingModel([FakeHTTPError(503), FakeHTTPError(502), "story"])
+        result = run(call_with_retry(lambda: model.generate_content_async("p"), self.policy))
+        self.assertEqual(result.text, "story")
+        self.assertEqual(model.calls, 3)
+    
+    def test_permanent_error_is_not_retried(self):
+        """Постоянная ошибка пробрасывается сразу"""
+        model = FaultInjectingModel([FakeHTTPError(400), "story"])
+        with self.assertRaises(FakeHTTPError):
+            run(call_with_retry(lambda: model.generate_content_async("p"), self.policy))
+        self.assertEqual(model.calls, 1)
+    
+    def test_cancelled_probe_is_released(self):
+        """Отмененный пробный запрос не оставляет выключатель закрытым для всех вызовов"""
+        clock = FakeClock()
+        breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=10, clock=clock)
+        breaker.record_failure()
+        clock.now = 10
+        
+        async def scenario():
+            task = asyncio.ensure_future(call_with_retry(lambda: asyncio.sleep(10), self.policy, breaker))
+            await asyncio.sleep(0.01)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+        
+        run(scenario())
+        self.assertEqual(breaker.state, CircuitState.HALF_OPEN)
+        self.assertTrue(breaker.allow_request())
+    
+    def test_permanent_error_does_not_close_half_open_breaker(self):
+        """Ошибка клиента во время пробы не считается успехом бэкенда"""
+        clock = FakeClock()
+        breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=10, clock=clock)
+        breaker.record_failure()
+        clock.now = 10
+        model = FaultInjectingModel([FakeHTTPError(400)])
+        with self.assertRaises(FakeHTTPError):
+            run(call_with_retry(lambda: model.generate_content_async("p"), self.policy, breaker))
+        self.assertEqual(breaker.state, CircuitState.HALF_OPEN)
+        self.assertTrue(breaker.allow_request())
+    
+    def test_open_breaker_short_circuits(self):
+        """Открытый выключатель не пропускает вызов"""
+        breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=60)
+        breaker.record_failure()
+        model = FaultInjectingModel(["story"])
+        with self.assertRaises(CircuitOpenError):
+            run(call_with_retry(lambda: model.generate_content_async("p"), self.policy, breaker))
+        self.assertEqual(model.calls, 0)
+
+
+class TestGeminiServiceResilience(unittest.TestCase):
+    """Тесты устойчивости GeminiService с заглушкой модели"""
+    
+    def setUp(self):
+        self.players = {
+            123: Player(user_id=123, first_name="Иван", last_name="Иванов", action="Бежать из здания"),
+        }
+        self.scenario = "Вы оказались в горящем здании."
+    
+    def make_service(self, faults):
+        model = FaultInjectingModel(faults)
+        service = GeminiService(model=model)
+        service.retry_policy = RetryPolicy(max_attempts=3, base_delay=0, max_delay=0)
+        service.circuit_breaker = CircuitBreaker("gemini", failure_threshold=3, reset_timeout=60)
+        return service, model
+    
+    def test_transient_error_does_not_produce_fallback(self):
+        """Временный сбой 5xx не приводит к резервной истории"""
+        service, model = self.make_service([google_exceptions.ServiceUnavailable("down"), "Настоящая история"])
+        result = run(service.evaluate_survival(self.scenario, self.players, GameMode.EVERY_MAN_FOR_HIMSELF))
+        self.assertEqual(result.narrative, "Настоящая история")
+        self.assertEqual(model.calls, 2)
+    
+    def test_outage_opens_breaker_and_skips_calls(self):
+        """Во время сбоя выключатель размыкается, и следующие раунды сразу получают резервный ответ"""
+        service, model = self.make_service([FakeHTTPError(503)] * 10)
+        
+        narrative = run(service.evaluate_survival(self.scenario, self.players, GameMode.EVERY_MAN_FOR_HIMSELF)).narrative
+        self.assertIn("AI сервис недоступен", narrative)
+        self.assertEqual(service.circuit_breaker.state, CircuitState.OPEN)
+        
+        calls_before = model.calls
+        narrative = run(service.evaluate_survival(self.scenario, self.players, GameMode.EVERY_MAN_FOR_HIMSELF)).narrative
+        self.assertIn("AI сервис недоступен", narrative)
+        self.assertEqual(model.calls, calls_before)
+    
+    def test_readiness_follows_model_and_breaker(self):
+        """Сервис готов, только если модель создана и выключатель не разомкнут"""
+        service, _ = self.make_service([FakeHTTPError(503)] * 10)
+        self.assertTrue(service.is_ready())
+        
+        run(service.evaluate_survival(self.scenario, self.players, GameMode.EVERY_MAN_FOR_HIMSELF))
+        self.assertFalse(service.is_ready())
+        # Проверка только читает состояние и не переводит выключатель в полуоткрытый режим
+        self.assertEqual(service.circuit_breaker._state, CircuitState.OPEN)
+        
+        service.circuit_breaker.reset_timeout = 0
+        self.assertTrue(service.is_ready())
+        
+        service.model = None
+        self.assertFalse(service.is_ready())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,127 @@
+import unittest
+import asyncio
+
+from services.ai.base_service import GenerationPath
+from services.ai.openai_compatible_service import OpenAICompatibleService
+from services.ai.resilience import RetryPolicy
+from services.ai.router_service import RouterService
+from services.ai_service_factory import SERVICE_CLASSES
+from utils.http_server import HTTPServer, Response
+from models import Player, GameMode
+
+
+class MockOpenAIServer:
+    """Локальный сервер с API chat completions для тестов"""
+    
+    def __init__(self, text="История", delay=0.0, status=200):
+        self.text = text
+        self.delay = delay
+        self.status = status
+        self.requests = []
+        self.server = HTTPServer()
+        self.server.route("POST", "/v1/chat/completions", self.chat_completions)
+    
+    async def chat_completions(self, request):
+        self.requests.append(request.json())
+        await asyncio.sleep(self.delay)
+        if self.status != 200:
+            return Response.json({"error": {"message": "unavailable"}}, status=self.status)
+        return Response.json({"choices": [{"index": 0, "message": {"role": "assistant", "content": self.text}}]})
+    
+    async def __aenter__(self):
+        await self.server.start()
+        return self
+    
+    async def __aexit__(self, *args):
+        await self.server.stop()
+    
+    @property
+    def base_url(self):
+        return f"{self.server.url}/v1"
+
+
+def make_backend(server):
+    backend = OpenAICompatibleService(base_url=server.base_url, model_name="local-model")
+    backend.retry_policy = RetryPolicy(max_attempts=1, base_delay=0, max_delay=0)
+    return backend
+
+
+class TestRouterService(unittest.TestCase):
+    """Тесты маршрутизации между несколькими AI-бэкендами"""
+    
+    def setUp(self):
+        self.players = {
+            123: Player(user_id=123, first_name="Иван", last_name="Иванов", action="Бежать из здания"),
+        }
+        self.scenario = "Вы оказались в горящем здании."
+    
+    def test_openai_backend(self):
+        """OpenAI-совместимый бэкенд отправляет промпт и параметры генерации"""
+        async def scenario():
+            async with MockOpenAIServer(text="Локальная история") as server:
+                backend = make_backend(server)
+                result = await backend.evaluate_survival(self.scenario, self.players, GameMode.EVERY_MAN_FOR_HIMSELF)
+                return result, server.requests[0]
+        
+        result, request = asyncio.run(scenario())
+        self.assertEqual(result.narrative, "Локальная история")
+        self.assertEqual(request["model"], "local-model")
+        # Один игрок при пустой очереди: базовый объем плюс одна доля на игрока
+        self.assertEqual(request["max_tokens"], 1408)
+        self.assertIn(self.scenario, request["messages"][0]["content"])
+    
+    def test_failover(self):
+        """При ошибке бэкенда запрос уходит на следующий"""
+        async def scenario():
+            async with MockOpenAIServer(status=503) as broken, MockOpenAIServer(text="Резервный бэкенд") as healthy:
+                router = RouterService({"broken": make_backend(broken), "healthy": make_backend(healthy)}, exploration=0)
+                result = await router.evaluate_survival(self.scenario, self.players, GameMode.BROTHERHOOD)
+                return result, router.backend_stats(), len(broken.requests)
+        
+        result, stats, broken_calls = asyncio.run(scenario())
+        self.assertEqual(result.narrative, "Резервный бэкенд")
+        self.assertEqual(broken_calls, 1)
+        self.assertEqual(stats["broken"]["error_rate"], 1.0)
+        self.assertEqual(stats["healthy"]["error_rate"], 0.0)
+    
+    def test_prefers_faster_backend(self):
+        """После накопления статистики выбирается более быстрый бэкенд"""
+        async def scenario():
+            async with MockOpenAIServer(text="slow", delay=0.1) as slow, MockOpenAIServer(text="fast") as fast:
+                router = RouterService({"slow": make_backend(slow), "fast": make_backend(fast)}, exploration=0)
+                config = router._generation_config(GenerationPath.FULL)
+                results = [await router.generate_text("prompt", config, GenerationPath.FULL) for _ in range(5)]
+                return results
+        
+        results = asyncio.run(scenario())
+        self.assertEqual(results[2:], ["fast", "fast", "fast"])
+    
+    def test_all_backends_down_falls_back(self):
+        """Если все бэкенды недоступны, используется резервный ответ"""
+        async def scenario():
+            async with MockOpenAIServer(status=500) as broken:
+                router = RouterService({"broken": make_backend(broken)}, exploration=0)
+                return await router.evaluate_survival(self.scenario, self.players, GameMode.EVERY_MAN_FOR_HIMSELF)
+        
+        narrative = asyncio.run(scenario()).narrative
+        self.assertIn("AI сервис недоступен", narrative)
+    
+    def test_every_backend_generates_text(self):
+        """Маршрутизатор может выбрать любой бэкенд: у каждого есть generate_text"""
+        for name in SERVICE_CLASSES:
+            self.assertEqual(SERVICE_CLASSES[name].__abstractmethods__, frozenset(), name)
+    
+    def test_ready_while_any_backend_is_ready(self):
+        """Маршрутизатор готов, пока хотя бы у одного бэкенда не разомкнут выключатель"""
+        first, second = OpenAICompatibleService(base_url="http://127.0.0.1:1"), OpenAICompatibleService(base_url="http://127.0.0.1:2")
+        router = RouterService({"first": first, "second": second}, exploration=0)
+        for _ in range(first.circuit_breaker.failure_threshold):
+            first.circuit_breaker.record_failure()
+        self.assertTrue(router.is_ready())
+        for _ in range(second.circuit_breaker.failure_threshold):
+            second.circuit_breaker.record_failure()
+        self.assertFalse(router.is_ready())
+
+
+if __name__ == '__main__':
+    unittest.main()
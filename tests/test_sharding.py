@@ -0,0 +1,440 @@
+import unittest
+import asyncio
+import json
+import os
+import re
+import sqlite3
+import tempfile
+import time
+import zlib
+
+import httpx
+from telegram.ext import Application
+
+from loadtest.fake_bot_api import FakeBotAPI
+from loadtest.harness import LoadTestConfig, LoadTestReport, VirtualUser, run_load_test, sharded_bot
+from models import GameMode, GameState, Lobby, ObservedDict, Player, lobbies, user_states, user_to_lobby
+from utils.http_server import HTTPServer, Response
+from utils.shard_router import ShardRouter, mentioned_lobby, user_of
+from utils.sharding import OwnershipStore, ShardWorker, shard_for
+from utils.update_processing import PerUserUpdateProcessor
+from utils.webhook import SECRET_HEADER, WebhookServer
+
+
+def message_update(user_id, text, update_id=1):
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": 1700000000,
+            "chat": {"id": user_id, "type": "private"},
+            "from": {"id": user_id, "is_bot": False, "first_name": "Игрок"},
+            "text": text,
+        },
+    }
+
+
+def user_on(worker, workers=2, start=1000):
+    """Первый ID пользователя, который по хешу попадает на процесс worker"""
+    return next(user_id for user_id in range(start, start + 1000) if shard_for(user_id, workers) == worker)
+
+
+class FakeWorker:
+    """Заглушка рабочего процесса: записывает обновления и отдает состояние при переносе"""
+    
+    def __init__(self, secret):
+        self.secret = secret
+        self.updates = []
+        self.users = {}
+        self.lobbies = {}
+        self.refuse = False
+        self.export_delay = 0.0
+        self.server = HTTPServer()
+        self.server.route("POST", "/telegram", self.webhook)
+        self.server.route("POST", "/shard/users/{user_id}/export", self.export_user)
+        self.server.route("POST", "/shard/users/{user_id}/import", self.import_user)
+        self.server.route("POST", "/shard/lobbies/{lobby_id}/export", self.export_lobby)
+        self.server.route("POST", "/shard/lobbies/{lobby_id}/import", self.import_lobby)
+    
+    async def webhook(self, request):
+        assert request.headers[SECRET_HEADER] == self.secret
+        self.updates.append(request.json())
+        return Response.text("ok")
+    
+    async def export_user(self, request):
+        return Response.json({"state": self.users.pop(int(request.params["user_id"]), None)})
+    
+    async def import_user(self, request):
+        self.users[int(request.params["user_id"])] = request.json()["state"]
+        return Response.json({"ok": True})
+    
+    async def export_lobby(self, request):
+        await asyncio.sleep(self.export_delay)
+        if self.refuse:
+            return Response.json({"error": "round in progress"}, status=409)
+        return Response.json({"lobby": self.lobbies.pop(request.params["lobby_id"]), "users": []})
+    
+    async def import_lobby(self, request):
+        self.lobbies[request.params["lobby_id"]] = request.json()["lobby"]
+        return Response.json({"ok": True})
+    
+    def texts(self):
+        return [update["message"]["text"] for update in self.updates]
+
+
+class TestShardingPrimitives(unittest.TestCase):
+    """Тесты хеширования, хранилища владения и сериализации лобби"""
+    
+    def test_shard_for_is_stable_and_even(self):
+        """Номер процесса не зависит от процесса Python и распределяет ключи равномерно"""
+        self.assertEqual(shard_for(123456, 4), zlib.crc32(b"123456") % 4)
+        self.assertEqual(shard_for("abc12345", 4), shard_for("abc12345", 4))
+        counts = [0] * 4
+        for user_id in range(10_000):
+            counts[shard_for(user_id, 4)] += 1
+        self.assertLess(max(counts) - min(counts), 500)
+    
+    def test_ownership_store(self):
+        """Лобби и пользователи переходят к другому процессу одной операцией"""
+        store = OwnershipStore(":memory:")
+        store.claim_lobby("abc", 0)
+        store.bind_user(1, 0, "abc")
+        store.bind_user(2, 0, "abc")
+        store.pin_user(3, 1)
+        
+        self.assertEqual(store.lobby_owner("abc"), 0)
+        self.assertIsNone(store.lobby_owner("missing"))
+        self.assertEqual(store.user_route(3), (1, None))
+        self.assertEqual(sorted(store.lobby_members("abc")), [1, 2])
+        
+        store.move_lobby("abc", 1)
+        self.assertEqual(store.lobby_owner("abc"), 1)
+        self.assertEqual(store.user_route(1), (1, "abc"))
+        
+        store.unbind_user(2)
+        self.assertEqual(store.user_route(2), (1, None))
+        self.assertEqual(store.lobby_counts(), {1: 1})
+        
+        store.reset_worker(1)
+        self.assertIsNone(store.lobby_owner("abc"))
+        self.assertEqual(store.user_route(1), (1, None))
+    
+    def test_lobby_round_trip(self):
+        """Лобби переживает сериализацию в JSON"""
+        lobby = Lobby(id="abc", game_mode=GameMode.BROTHERHOOD, scenario="Пожар")
+        lobby.add_player(Player(user_id=1, first_name="Иван", last_name="Иванов", action="Бежать"))
+        lobby.add_player(Player(user_id=2, first_name="Петр", last_name="Петров"))
+        lobby.game_state = GameState.WAITING_FOR_ACTIONS
+        
+        restored = Lobby.from_dict(json.loads(json.dumps(lobby.to_dict())))
+        self.assertEqual(restored, lobby)
+        self.assertEqual(restored.get_captain().first_name, "Иван")
+    
+    def test_observed_dict(self):
+        """Подписчики получают запись и удаление, но не detach/attach"""
+        changes = []
+        observed = ObservedDict()
+        observed.subscribe(lambda key, value: changes.append((key, value)))
+        observed["a"] = 1
+        del observed["a"]
+        observed["b"] = 2
+        observed.pop("b")
+        observed.pop("missing", None)
+        observed.attach("c", 3)
+        observed.detach("c")
+        self.assertEqual(changes, [("a", 1), ("a", None), ("b", 2), ("b", None)])
+
+
+class TestShardRouter(unittest.TestCase):
+    """Тесты маршрутизации обновлений по процессам"""
+    
+    def test_mentioned_lobby_matches_lobby_ids_only(self):
+        """За ID лобби принимаются только строки в формате generate_lobby_id"""
+        self.assertEqual(mentioned_lobby(message_update(1, "0b1ec7a1")), "0b1ec7a1")
+        self.assertEqual(mentioned_lobby(message_update(1, "/join 0b1ec7a1")), "0b1ec7a1")
+        self.assertEqual(mentioned_lobby(message_update(1, "/join@bot 0b1ec7a1")), "0b1ec7a1")
+        for text in ["Бегу", "привет", "0B1EC7A1", "0b1ec7a1x", "/join abc", "/start", ""]:
+            self.assertIsNone(mentioned_lobby(message_update(1, text)), text)
+    
+    def test_store_access_does_not_block_event_loop(self):
+        """Пока файл хранилища заблокирован другим процессом, маршрутизатор продолжает обслуживать цикл событий"""
+        async def scenario(path):
+            workers = [FakeWorker("inner"), FakeWorker("inner")]
+            for worker in workers:
+                await worker.server.start()
+            store = OwnershipStore(path)
+            router = ShardRouter(store, [worker.server.url for worker in workers], "inner")
+            await router.start()
+            alice = user_on(0)
+            store.claim_lobby("0b1ec7a1", 1)
+            blocker = sqlite3.connect(path, isolation_level=None)
+            try:
+                async with httpx.AsyncClient() as client:
+                    blocker.execute("BEGIN IMMEDIATE")
+                    join = asyncio.create_task(client.post(router.url, json=message_update(alice, "/join 0b1ec7a1")))
+                    longest = 0.0
+                    for _ in range(20):
+                        started = time.perf_counter()
+                        await asyncio.sleep(0.01)
+                        longest = max(longest, time.perf_counter() - started)
+                    blocker.execute("COMMIT")
+                    response = await join
+                    return longest, response.status_code, workers[1].texts(), store.user_route(alice)
+            finally:
+                blocker.close()
+                await router.stop()
+                for worker in workers:
+                    await worker.server.stop()
+                store.close()
+        
+        with tempfile.TemporaryDirectory() as directory:
+            longest, status, texts, route = asyncio.run(scenario(os.path.join(directory, "shards.sqlite3")))
+        self.assertLess(longest, 0.1)
+        self.assertEqual(status, 200)
+        self.assertEqual(texts, ["/join 0b1ec7a1"])
+        self.assertEqual(route, (1, None))
+    
+    def test_routing_rules_and_lobby_move(self):
+        """Пользователь без лобби идет на свой процесс, игрок — к владельцу лобби, а вход в чужое лобби переносит профиль"""
+        async def scenario():
+            workers = [FakeWorker("inner"), FakeWorker("inner")]
+            for worker in workers:
+                await worker.server.start()
+            store = OwnershipStore(":memory:")
+            router = ShardRouter(store, [worker.server.url for worker in workers], "inner", secret_token="outer")
+            await router.start()
+            alice, bob = user_on(0), user_on(1)
+            
+            async def send(user_id, text):
+                response = await client.post(router.url, json=message_update(user_id, text), headers={SECRET_HEADER: "outer"})
+                return response.status_code
+            
+            try:
+                async with httpx.AsyncClient() as client:
+                    forbidden = (await client.post(router.url, json=message_update(alice, "/start"))).status_code
+                    await send(alice, "/start")
+                    await send(bob, "/start")
+                    
+                    store.claim_lobby("0b1ec7a1", 1)
+                    workers[0].users[alice] = {"first_name": "Алиса", "last_name": "Иванова"}
+                    await send(alice, "/join 0b1ec7a1")
+                    joined_route = store.user_route(alice)
+                    
+                    store.bind_user(alice, 1, "0b1ec7a1")
+                    workers[1].lobbies["0b1ec7a1"] = {"id": "0b1ec7a1"}
+                    workers[1].export_delay = 0.2
+                    move = asyncio.create_task(router.move_lobby("0b1ec7a1", 0))
+                    await asyncio.sleep(0.05)
+                    # Сообщение игрока придерживается до конца переноса и уходит новому владельцу
+                    await send(alice, "Бегу к выходу")
+                    moved = await move
+                    
+                    workers[0].refuse = True
+                    refused = await router.move_lobby("0b1ec7a1", 1)
+                    return workers, store, forbidden, joined_route, moved, refused, alice, bob
+            finally:
+                await router.stop()
+                for worker in workers:
+                    await worker.server.stop()
+        
+        workers, store, forbidden, joined_route, moved, refused, alice, bob = asyncio.run(scenario())
+        self.assertEqual(forbidden, 403)
+        self.assertEqual(workers[0].texts(), ["/start", "Бегу к выходу"])
+        self.assertEqual(workers[1].texts(), ["/start", "/join 0b1ec7a1"])
+        self.assertEqual(joined_route, (1, None))
+        self.assertEqual(workers[1].users[alice], {"first_name": "Алиса", "last_name": "Иванова"})
+        self.assertNotIn(alice, workers[0].users)
+        
+        self.assertTrue(moved)
+        self.assertEqual(workers[0].lobbies, {"0b1ec7a1": {"id": "0b1ec7a1"}})
+        self.assertEqual(store.user_route(alice), (0, "0b1ec7a1"))
+        
+        self.assertFalse(refused)
+        self.assertEqual(store.lobby_owner("0b1ec7a1"), 0)
+
+
+class TestShardWorker(unittest.TestCase):
+    """Тесты рабочего процесса: зеркалирование владения и выдача состояния"""
+    
+    def setUp(self):
+        lobbies.clear()
+        user_to_lobby.clear()
+        user_states.clear()
+    
+    tearDown = setUp
+    
+    def test_mirroring_and_lobby_export(self):
+        """Создание лобби попадает в хранилище, а экспорт и импорт переносят лобби с профилями игроков"""
+        async def scenario():
+            api = FakeBotAPI()
+            await api.start()
+            application = (
+                Application.builder()
+                .token(api.token)
+                .base_url(api.base_url)
+                .concurrent_updates(PerUserUpdateProcessor(4))
+                .build()
+            )
+            store = OwnershipStore(":memory:")
+            worker = ShardWorker(application, store, 3)
+            worker.start()
+            server = WebhookServer(application, "127.0.0.1", 0, "telegram", "inner")
+            worker.attach(server)
+            try:
+                async with application:
+                    await application.start()
+                    await server.start()
+                    
+                    lobby = Lobby(id="abc")
+                    lobby.add_player(Player(user_id=7, first_name="Иван", last_name="Иванов"))
+                    lobbies["abc"] = lobby
+                    user_to_lobby[7] = "abc"
+                    user_states[7] = {"first_name": "Иван", "last_name": "Иванов"}
+                    # Запись идет в фоне: до flush хранилище еще не видит изменений
+                    queued = store.lobby_owner("abc")
+                    await worker.flush()
+                    mirrored = (store.lobby_owner("abc"), store.user_route(7))
+                    
+                    async with httpx.AsyncClient(base_url=server.server.url, headers={SECRET_HEADER: "inner"}) as client:
+                        forbidden = (await client.post("/shard/lobbies/abc/export", headers={SECRET_HEADER: "wrong"})).status_code
+                        member_export = (await client.post("/shard/users/7/export")).status_code
+                        
+                        lobby.game_state = GameState.PROCESSING_RESULTS
+                        busy = (await client.post("/shard/lobbies/abc/export")).status_code
+                        lobby.game_state = GameState.WAITING_FOR_ACTIONS
+                        
+                        exported = (await client.post("/shard/lobbies/abc/export")).json()
+                        local_after_export = ("abc" in lobbies, 7 in user_to_lobby, 7 in user_states)
+                        imported = (await client.post("/shard/lobbies/abc/import", json=json.loads(json.dumps(exported)))).status_code
+                    
+                    await server.stop()
+                    await application.stop()
+                return queued, mirrored, forbidden, member_export, busy, exported, local_after_export, imported, store.lobby_owner("abc")
+            finally:
+                worker.stop()
+                await api.stop()
+        
+        queued, mirrored, forbidden, member_export, busy, exported, local_after_export, imported, owner = asyncio.run(scenario())
+        self.assertIsNone(queued)
+        self.assertEqual(mirrored, (3, (3, "abc")))
+        self.assertEqual(forbidden, 403)
+        self.assertEqual(member_export, 409)
+        self.assertEqual(busy, 409)
+        self.assertEqual(exported["users"], [{"user_id": 7, "state": {"first_name": "Иван", "last_name": "Иванов"}}])
+        self.assertEqual(local_after_export, (False, False, False))
+        # Экспорт не трогает хранилище: владельца меняет маршрутизатор после импорта
+        self.assertEqual(owner, 3)
+        self.assertEqual(imported, 200)
+        self.assertEqual(lobbies["abc"].players[7].first_name, "Иван")
+        self.assertEqual(user_to_lobby[7], "abc")
+        self.assertEqual(user_states[7]["first_name"], "Иван")
+    
+    def test_store_writes_do_not_block_event_loop(self):
+        """Пока файл хранилища заблокирован другим процессом, обработчики не ждут SQLite"""
+        async def scenario(path):
+            store = OwnershipStore(path)
+            worker = ShardWorker(Application.builder().token("123:TEST").build(), store, 1)
+            worker.start()
+            blocker = sqlite3.connect(path, isolation_level=None)
+            blocker.execute("BEGIN IMMEDIATE")
+            try:
+                started = time.perf_counter()
+                lobbies["abc"] = Lobby(id="abc")
+                user_to_lobby[7] = "abc"
+                blocked_for = time.perf_counter() - started
+                
+                await asyncio.sleep(0.2)
+                blocker.execute("COMMIT")
+                written = await worker.flush()
+                return blocked_for, written, store.lobby_owner("abc"), store.user_route(7)
+            finally:
+                worker.stop()
+                blocker.close()
+                store.close()
+        
+        with tempfile.TemporaryDirectory() as directory:
+            blocked_for, written, owner, route = asyncio.run(scenario(os.path.join(directory, "shards.sqlite3")))
+        self.assertLess(blocked_for, 0.05)
+        self.assertTrue(written)
+        self.assertEqual(owner, 1)
+        self.assertEqual(route, (1, "abc"))
+
+
+class TestShardedBot(unittest.TestCase):
+    """Многопроцессные тесты: маршрутизатор и рабочие процессы main.py против заглушки Bot API"""
+    
+    def test_lobbies_across_workers(self):
+        """Полный цикл лобби и раундов проходит, когда игроки и лобби распределены по двум процессам"""
+        config = LoadTestConfig(users=8, lobby_size=4, workers=2, think_time="fixed:0", ai_latency="fixed:0.05", step_timeout=20, seed=3)
+        report = asyncio.run(run_load_test(config))
+        self.assertEqual(report.lobbies_failed, 0)
+        self.assertEqual(report.rounds_completed, 2)
+        self.assertEqual(sum(report.lobbies_per_worker.values()), 2)
+    
+    def test_join_by_id_after_registration_on_other_worker(self):
+        """Пользователь, зарегистрированный на другом процессе, входит в лобби по ID без повторного ввода имени"""
+        captain_id = user_on(0, start=20_000_000)
+        guest_id = user_on(1, start=21_000_000)
+        
+        async def scenario():
+            api = FakeBotAPI()
+            await api.start()
+            try:
+                config = LoadTestConfig(workers=2, step_timeout=20)
+                async with sharded_bot(api, config, LoadTestReport()):
+                    captain = VirtualUser(api, captain_id, 20)
+                    guest = VirtualUser(api, guest_id, 20)
+                    
+                    captain.send("/start")
+                    await captain.expect_text("введите своё имя")
+                    captain.send(captain.full_name)
+                    message = await captain.expect_button("create_new_lobby")
+                    captain.press(message, "create_new_lobby")
+                    message = await captain.expect_text("ID лобби:")
+                    lobby_id = re.search(r"ID лобби: `([^`]+)`", message.text).group(1)
+                    
+                    guest.send("/start")
+                    await guest.expect_text("введите своё имя")
+                    guest.send(guest.full_name)
+                    await guest.expect_button("create_new_lobby")
+                    guest.send(lobby_id)
+                    joined = await guest.expect_text("Вы присоединились к лобби")
+                    
+                    guest.send("/lobby")
+                    info = await guest.expect(lambda sent: "Игроки (2)" in sent.text)
+                    return joined, info
+            finally:
+                await api.stop()
+        
+        joined, info = asyncio.run(scenario())
+        self.assertIn("Вы присоединились", joined.text)
+        self.assertIn("Игроки (2)", info.text)
+    
+    @unittest.skipIf((os.cpu_count() or 1) < 4, "Для проверки масштабирования нужно не меньше 4 ядер")
+    def test_throughput_scales_with_workers(self):
+        """Пропускная способность растет почти линейно с числом процессов"""
+        def throughput(workers):
+            config = LoadTestConfig(users=400, lobby_size=4, lobby_rate=0, workers=workers, think_time="fixed:0", ai_latency="fixed:0", step_timeout=60, seed=1)
+            report = asyncio.run(run_load_test(config))
+            self.assertEqual(report.lobbies_failed, 0)
+            return report.updates_per_second
+        
+        single, double = throughput(1), throughput(2)
+        self.assertGreater(double / single, 1.6, f"1 процесс: {single:.0f}/с, 2 процесса: {double:.0f}/с")
+    
+    def test_cpu_work_splits_across_workers(self):
+        """Работа делится между процессами: самый загруженный из двух тратит заметно меньше процессорного времени, чем один"""
+        # Проверка по процессорному времени, а не по пропускной способности, поэтому не зависит от числа ядер
+        def cpu_seconds(workers):
+            config = LoadTestConfig(users=80, lobby_size=4, lobby_rate=0, workers=workers, think_time="fixed:0", ai_latency="fixed:0", step_timeout=60, seed=1)
+            report = asyncio.run(run_load_test(config))
+            self.assertEqual(report.lobbies_failed, 0)
+            self.assertEqual(len(report.cpu_seconds_per_worker), workers)
+            return report.cpu_seconds_per_worker
+        
+        single, double = cpu_seconds(1), cpu_seconds(2)
+        self.assertLess(max(double.values()) / single[0], 0.75, f"1 процесс: {single}, 2 процесса: {double}")
+
+
+if __name__ == '__main__':
+    unittest.main()
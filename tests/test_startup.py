@@ -0,0 +1,33 @@
+import unittest
+import asyncio
+
+from benchmarks.startup import HEAVY_MODULES, IMPORT_TIME_BUDGET, import_times, loaded_modules, measure_startup
+
+
+class TestStartup(unittest.TestCase):
+    """Тесты времени старта бота"""
+    
+    def test_import_time_budget(self):
+        """Импорт main укладывается в бюджет"""
+        seconds = import_times()["main"]
+        self.assertLess(seconds, IMPORT_TIME_BUDGET, f"Импорт main занял {seconds:.2f}с")
+    
+    def test_backend_sdks_are_imported_lazily(self):
+        """SDK бэкендов не загружаются, пока бэкенд не выбран"""
+        modules = loaded_modules(
+            "import main\n"
+            "from services.ai_service_factory import SERVICE_CLASSES\n"
+            "SERVICE_CLASSES['mock']"
+        )
+        for heavy in HEAVY_MODULES:
+            self.assertNotIn(heavy, modules)
+        self.assertIn("services.ai.mock_service", modules)
+        self.assertNotIn("services.ai.gemini_service", modules)
+    
+    def test_bot_reaches_get_updates(self):
+        """Процесс бота доходит до первого getUpdates на заглушке Bot API"""
+        self.assertLess(asyncio.run(measure_startup()), 15)
+
+
+if __name__ == '__main__':
+    unittest.main()
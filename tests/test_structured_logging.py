@@ -0,0 +1,152 @@
+import unittest
+import io
+import json
+import logging
+import queue
+import random
+
+from utils.metrics import LOG_BYTES, LOG_RECORDS
+from utils.structured_logging import (
+    BoundedQueueHandler,
+    JsonFormatter,
+    SamplingFilter,
+    configure_logging,
+    PlayerTextFormatter,
+    parse_sampling,
+    player_text,
+)
+from utils.tracing import SimpleSpanProcessor, SpanExporter, Tracer
+
+
+class TestLogRecords(unittest.TestCase):
+    """Тесты форматирования и фильтрации записей"""
+    
+    def make_record(self, name="bot", level=logging.INFO, msg="Сообщение %s", args=("1",), exc_info=None):
+        return logging.LogRecord(name, level, __file__, 1, msg, args, exc_info)
+    
+    def test_json_formatter(self):
+        """Запись превращается в одну строку JSON с полями extra и трассировкой исключения"""
+        try:
+            raise ValueError("bad")
+        except ValueError:
+            import sys
+            record = self.make_record(level=logging.ERROR, exc_info=sys.exc_info())
+        record.lobby_id = "ABC"
+        
+        entry = json.loads(JsonFormatter().format(record))
+        self.assertEqual(entry["level"], "ERROR")
+        self.assertEqual(entry["logger"], "bot")
+        self.assertEqual(entry["message"], "Сообщение 1")
+        self.assertEqual(entry["lobby_id"], "ABC")
+        self.assertIn("ValueError: bad", entry["exc_info"])
+    
+    def test_sampling_filter(self):
+        """Выборка действует на логгер и его потомков, предупреждения не отбрасываются"""
+        sampler = SamplingFilter(parse_sampling("httpx=0, telegram=0.5"), random.Random(1))
+        self.assertEqual(sampler.rate_for("httpx._client"), 0)
+        self.assertEqual(sampler.rate_for("telegram.ext.Application"), 0.5)
+        self.assertEqual(sampler.rate_for("handlers"), 1.0)
+        
+        sampled_out = LOG_RECORDS.labels("INFO", "sampled_out")
+        before = sampled_out.value
+        self.assertFalse(sampler.filter(self.make_record(name="httpx._client")))
+        self.assertTrue(sampler.filter(self.make_record(name="httpx._client", level=logging.WARNING)))
+        self.assertTrue(sampler.filter(self.make_record(name="handlers")))
+        self.assertEqual(sampled_out.value, before + 1)
+    
+    def test_full_queue_drops_records(self):
+        """Переполненная очередь отбрасывает записи, а не блокирует вызывающий код"""
+        handler = BoundedQueueHandler(queue.Queue(1))
+        dropped = LOG_RECORDS.labels("INFO", "dropped")
+        before = dropped.value
+        handler.handle(self.make_record())
+        handler.handle(self.make_record())
+        self.assertEqual(dropped.value, before + 1)
+        self.assertEqual(handler.queue.get_nowait().msg, "Сообщение 1")
+    
+    def test_trace_ids_are_attached(self):
+        """Запись внутри спана получает идентификаторы трассировки"""
+        tracer = Tracer(SimpleSpanProcessor(SpanExporter()))
+        tracer.processor.exporter.export = lambda spans: None
+        handler = BoundedQueueHandler(queue.Queue())
+        with tracer.start_span("round") as span:
+            handler.handle(self.make_record())
+        record = handler.queue.get_nowait()
+        self.assertEqual(record.trace_id, span.trace_id)
+        self.assertEqual(record.span_id, span.span_id)
+    
+    def test_player_text_redaction(self):
+        """Текст игроков скрывается при любом преобразовании в строку, открывает его только форматтер"""
+        self.assertEqual(f"{player_text('Бежать')}", "<скрыто: 6 симв.>")
+        self.assertEqual(str(player_text(None)), "None")
+        
+        record = self.make_record(msg="Действие %s", args=(player_text("Бежать"),))
+        record.scenario = player_text("Пожар")
+        self.assertEqual(PlayerTextFormatter().format(record), "Действие <скрыто: 6 симв.>")
+        self.assertEqual(record.scenario, "<скрыто: 5 симв.>")
+        
+        record = self.make_record(msg="Действие %s", args=(player_text("Бежать"),))
+        record.scenario = player_text("Пожар")
+        self.assertEqual(PlayerTextFormatter(redact=False).format(record), "Действие Бежать")
+        self.assertEqual(record.scenario, "Пожар")
+
+
+class TestConfigureLogging(unittest.TestCase):
+    """Тесты настройки корневого логгера"""
+    
+    def setUp(self):
+        root = logging.getLogger()
+        self.saved = (list(root.handlers), root.level)
+    
+    def tearDown(self):
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        for handler in self.saved[0]:
+            root.addHandler(handler)
+        root.setLevel(self.saved[1])
+    
+    def test_background_json_output(self):
+        """Записи пишутся фоновым слушателем, объем вывода учитывается"""
+        stream = io.StringIO()
+        bytes_before = LOG_BYTES.labels().value
+        listener = configure_logging("INFO", json_format=True, sampling={"noisy": 0}, stream=stream)
+        logging.getLogger("handlers").info("Раунд %s", "ABC", extra={"lobby_id": "ABC"})
+        logging.getLogger("noisy").info("не попадет в лог")
+        logging.getLogger("handlers").debug("ниже уровня")
+        listener.stop()
+        
+        lines = [json.loads(line) for line in stream.getvalue().splitlines()]
+        self.assertEqual(len(lines), 1)
+        self.assertEqual(lines[0]["message"], "Раунд ABC")
+        self.assertEqual(lines[0]["lobby_id"], "ABC")
+        self.assertEqual(LOG_BYTES.labels().value - bytes_before, len(stream.getvalue().encode("utf-8")))
+    
+    def test_text_output_redacts_player_text(self):
+        """Текстовый формат по умолчанию скрывает текст игроков в сообщении и в полях extra"""
+        stream = io.StringIO()
+        listener = configure_logging("INFO", stream=stream)
+        logger = logging.getLogger("handlers")
+        logger.info("Сценарий: %s", player_text("Пожар в школе"))
+        logger.info("Ход игрока", extra={"action": player_text("Бежать")})
+        listener.stop()
+        
+        output = stream.getvalue()
+        self.assertNotIn("Пожар", output)
+        self.assertIn(" - handlers - INFO - Сценарий: <скрыто: 13 симв.>", output)
+        self.assertEqual(len(output.splitlines()), 2)
+    
+    def test_json_output_reveals_player_text_when_allowed(self):
+        """Без скрытия текст игроков попадает и в сообщение, и в поля extra"""
+        stream = io.StringIO()
+        listener = configure_logging("INFO", json_format=True, redact_player_text=False, stream=stream)
+        logging.getLogger("handlers").info("Сценарий: %s", player_text("Пожар"), extra={"action": player_text("Бежать")})
+        listener.stop()
+        
+        entry = json.loads(stream.getvalue())
+        self.assertEqual(entry["message"], "Сценарий: Пожар")
+        self.assertEqual(entry["action"], "Бежать")
+
+
+if __name__ == '__main__':
+    unittest.main()
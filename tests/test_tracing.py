@@ -0,0 +1,167 @@
+import unittest
+import asyncio
+import json
+import os
+import tempfile
+
+import httpx
+
+from models import Player, GameMode
+from services.ai.mock_service import MockAIService, MockBehavior
+from utils import tracing
+from utils.tracing import (
+    BatchSpanProcessor,
+    JsonlExporter,
+    OTLPHttpExporter,
+    SimpleSpanProcessor,
+    SpanExporter,
+    Tracer,
+    current_span,
+    start_span,
+)
+
+
+class MemoryExporter(SpanExporter):
+    """Собирает спаны в список"""
+    
+    def __init__(self):
+        self.spans = []
+    
+    def export(self, spans):
+        self.spans.extend(spans)
+    
+    def by_name(self, name):
+        return next(span for span in self.spans if span.name == name)
+
+
+class TestTracer(unittest.TestCase):
+    """Тесты создания и экспорта спанов"""
+    
+    def setUp(self):
+        self.exporter = MemoryExporter()
+        self.tracer = Tracer(SimpleSpanProcessor(self.exporter))
+    
+    def test_nesting_survives_await_and_tasks(self):
+        """Дочерние спаны наследуют трассировку через await и asyncio.wait_for"""
+        async def child():
+            await asyncio.sleep(0)
+            with self.tracer.start_span("child", {"x": 1}):
+                await asyncio.sleep(0)
+        
+        async def scenario():
+            with self.tracer.start_span("root") as root:
+                await asyncio.wait_for(child(), timeout=1)
+                return root
+        
+        root = asyncio.run(scenario())
+        child_span = self.exporter.by_name("child")
+        self.assertEqual(child_span.trace_id, root.trace_id)
+        self.assertEqual(child_span.parent_id, root.span_id)
+        self.assertEqual(child_span.attributes, {"x": 1})
+        self.assertLessEqual(root.start_ns, child_span.start_ns)
+        self.assertGreaterEqual(root.end_ns, child_span.end_ns)
+        self.assertIsNone(current_span().parent_id)
+    
+    def test_error_status(self):
+        """Исключение помечает спан ошибкой и пробрасывается"""
+        with self.assertRaises(ValueError):
+            with self.tracer.start_span("failing"):
+                raise ValueError("bad")
+        self.assertEqual(self.exporter.spans[0].status, "error")
+        self.assertIn("ValueError", self.exporter.spans[0].status_message)
+    
+    def test_sampling_is_decided_at_root(self):
+        """Непопавшая в выборку трассировка не записывает и дочерние спаны"""
+        self.tracer.sample_rate = 0.0
+        with self.tracer.start_span("root"):
+            with self.tracer.start_span("child") as child:
+                child.set_attribute("ignored", True)
+        self.assertEqual(self.exporter.spans, [])
+    
+    def test_disabled_tracer(self):
+        """Без процессора спаны не создаются"""
+        tracer = Tracer()
+        with tracer.start_span("root") as span:
+            span.set_attribute("key", "value")
+        self.assertFalse(span.sampled)
+        self.assertEqual(span.attributes, {})
+
+
+class TestExporters(unittest.TestCase):
+    """Тесты экспортеров"""
+    
+    def test_jsonl_batch_export(self):
+        """Пакетный процессор дописывает спаны в JSONL при остановке"""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "traces", "spans.jsonl")
+            tracer = Tracer(BatchSpanProcessor(JsonlExporter(path), flush_interval=60))
+            with tracer.start_span("root", {"lobby.id": "ABC"}):
+                with tracer.start_span("child"):
+                    pass
+            tracer.shutdown()
+            
+            with open(path, encoding="utf-8") as file:
+                records = [json.loads(line) for line in file]
+        
+        self.assertEqual([record["name"] for record in records], ["child", "root"])
+        self.assertEqual(records[1]["attributes"], {"lobby.id": "ABC"})
+        self.assertEqual(records[0]["parent_id"], records[1]["span_id"])
+    
+    def test_otlp_payload(self):
+        """OTLP-экспортер отправляет ExportTraceServiceRequest в формате JSON"""
+        requests = []
+        
+        def handler(request):
+            requests.append(json.loads(request.content))
+            return httpx.Response(200, json={})
+        
+        exporter = OTLPHttpExporter("http://collector/v1/traces", "bot", client=httpx.Client(transport=httpx.MockTransport(handler)))
+        tracer = Tracer(SimpleSpanProcessor(exporter))
+        with tracer.start_span("round", {"lobby.players": 3, "game.mode": "BROTHERHOOD", "ratio": 0.5, "ok": True}):
+            pass
+        
+        resource_spans = requests[0]["resourceSpans"][0]
+        self.assertEqual(resource_spans["resource"]["attributes"][0]["value"], {"stringValue": "bot"})
+        span = resource_spans["scopeSpans"][0]["spans"][0]
+        self.assertEqual(span["name"], "round")
+        self.assertEqual(len(span["traceId"]), 32)
+        self.assertEqual(len(span["spanId"]), 16)
+        self.assertEqual(span["status"], {"code": 1})
+        values = {attribute["key"]: attribute["value"] for attribute in span["attributes"]}
+        self.assertEqual(values["lobby.players"], {"intValue": "3"})
+        self.assertEqual(values["ratio"], {"doubleValue": 0.5})
+        self.assertEqual(values["ok"], {"boolValue": True})
+
+
+class TestEvaluateSpans(unittest.TestCase):
+    """Тесты спанов вызова AI-сервиса"""
+    
+    def setUp(self):
+        self.exporter = MemoryExporter()
+        self.previous = tracing.tracer.processor
+        tracing.tracer.processor = SimpleSpanProcessor(self.exporter)
+    
+    def tearDown(self):
+        tracing.tracer.processor = self.previous
+    
+    def test_evaluate_span_attributes(self):
+        """Спан evaluate_survival вложен в раунд и содержит размер промпта"""
+        players = {1: Player(user_id=1, first_name="Иван", last_name="Иванов", action="Бежать")}
+        service = MockAIService(MockBehavior(latency="fixed:0", chunks_per_second=0))
+        
+        async def scenario():
+            with start_span("round", {"lobby.id": "ABC"}):
+                await service.evaluate_survival("Пожар", players, GameMode.BROTHERHOOD)
+        
+        asyncio.run(scenario())
+        evaluate = self.exporter.by_name("ai.evaluate_survival")
+        self.assertEqual(evaluate.parent_id, self.exporter.by_name("round").span_id)
+        self.assertEqual(evaluate.attributes["ai.backend"], "MockAIService")
+        self.assertEqual(evaluate.attributes["lobby.players"], 1)
+        self.assertEqual(evaluate.attributes["game.mode"], "BROTHERHOOD")
+        self.assertEqual(evaluate.attributes["ai.path"], "full")
+        self.assertGreater(evaluate.attributes["ai.prompt_size"], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
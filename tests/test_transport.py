@@ -0,0 +1,88 @@
+import unittest
+import asyncio
+from unittest.mock import patch
+
+import httpx
+from telegram import Bot
+
+from loadtest.fake_bot_api import FakeBotAPI
+from utils.metrics import HTTP_POOL_SATURATED, registry
+from utils.transport import PooledTransport, TelegramRequest, check_http_versions, pools, warm_up_telegram
+
+
+class TestPooledTransport(unittest.TestCase):
+    """Тесты учета занятости пула соединений"""
+    
+    def test_in_use_until_body_is_read(self):
+        """Соединение занято до конца чтения тела, запрос сверх размера пула считается насыщением"""
+        release = asyncio.Event()
+        
+        async def body():
+            yield b"ok"
+        
+        async def handler(request):
+            await release.wait()
+            # Потоковое тело, как у настоящего транспорта
+            return httpx.Response(200, content=body())
+        
+        async def scenario():
+            transport = PooledTransport("test_pool", 1, transport=httpx.MockTransport(handler))
+            saturated = HTTP_POOL_SATURATED.labels("test_pool").value
+            async with httpx.AsyncClient(transport=transport, base_url="http://ai.local") as client:
+                first = asyncio.create_task(client.get("/a"))
+                second = asyncio.create_task(client.get("/b"))
+                await asyncio.sleep(0.01)
+                busy = transport.in_use
+                release.set()
+                responses = await asyncio.gather(first, second)
+                
+                async with client.stream("GET", "/c") as response:
+                    streaming = transport.in_use
+                    await response.aread()
+            return busy, streaming, transport.in_use, HTTP_POOL_SATURATED.labels("test_pool").value - saturated, responses
+        
+        busy, streaming, idle, saturated, responses = asyncio.run(scenario())
+        self.assertEqual(busy, 2)
+        self.assertEqual(streaming, 1)
+        self.assertEqual(idle, 0)
+        self.assertEqual(saturated, 1)
+        self.assertEqual([response.text for response in responses], ["ok", "ok"])
+        self.assertIn('bot_http_pool_size{pool="test_pool"} 1', registry.render())
+    
+    def test_http2_without_h2_fails_early(self):
+        """Без пакета h2 HTTP/2 отклоняется при старте с понятной ошибкой"""
+        with patch("utils.transport.http2_available", return_value=False):
+            with self.assertRaisesRegex(RuntimeError, "h2"):
+                PooledTransport("test_http2", 1, http2=True)
+            with patch("utils.transport.AI_HTTP_VERSION", "2"), self.assertRaisesRegex(RuntimeError, "AI_HTTP_VERSION=2"):
+                check_http_versions()
+            check_http_versions()
+        with patch("utils.transport.TELEGRAM_HTTP_VERSION", "3"), self.assertRaisesRegex(RuntimeError, "TELEGRAM_HTTP_VERSION=3"):
+            check_http_versions()
+
+
+class TestTelegramRequest(unittest.TestCase):
+    """Тесты запросов к Bot API через пул"""
+    
+    def test_warm_up(self):
+        """Прогрев выполняет запросы через пул отправки и освобождает соединения"""
+        async def scenario():
+            api = FakeBotAPI()
+            await api.start()
+            bot = Bot(api.token, base_url=api.base_url, request=TelegramRequest("test_telegram", 4))
+            try:
+                async with bot:
+                    succeeded = await warm_up_telegram(bot, 3)
+                return succeeded, api.method_counts["getMe"], pools["test_telegram"].in_use
+            finally:
+                await api.stop()
+        
+        succeeded, get_me, in_use = asyncio.run(scenario())
+        self.assertEqual(succeeded, 3)
+        # Еще один getMe выполняет Bot.initialize
+        self.assertEqual(get_me, 4)
+        self.assertEqual(in_use, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
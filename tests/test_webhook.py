@@ -0,0 +1,232 @@
+import unittest
+import asyncio
+
+import httpx
+from telegram import Update
+from telegram.ext import Application
+
+from handlers.setup import setup_handlers
+from loadtest.fake_bot_api import FakeBotAPI
+from models import user_states
+from utils.http_server import HTTPServer, Response
+from utils.update_processing import PerUserUpdateProcessor
+from utils.webhook import SECRET_HEADER, WebhookServer, require_secret, run_webhook
+
+
+# Обновление в том виде, в каком его присылает Telegram
+RECORDED_START = {
+    "update_id": 100,
+    "message": {
+        "message_id": 1,
+        "date": 1700000000,
+        "chat": {"id": 777, "type": "private", "first_name": "Иван"},
+        "from": {"id": 777, "is_bot": False, "first_name": "Иван", "language_code": "ru"},
+        "text": "/start",
+        "entities": [{"type": "bot_command", "offset": 0, "length": 6}],
+    },
+}
+
+
+def make_update(user_id, update_id=1):
+    data = {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": 1700000000,
+            "chat": {"id": user_id, "type": "private"},
+            "from": {"id": user_id, "is_bot": False, "first_name": "Игрок"},
+            "text": "текст",
+        },
+    }
+    return Update.de_json(data, None)
+
+
+class TestPerUserUpdateProcessor(unittest.TestCase):
+    """Тесты параллельной обработки обновлений"""
+    
+    def test_serial_per_user_parallel_across_users(self):
+        """Обновления одного пользователя идут по порядку, разных — одновременно"""
+        processor = PerUserUpdateProcessor(16)
+        events = []
+        
+        async def work(name):
+            events.append(f"{name}:start")
+            await asyncio.sleep(0.05)
+            events.append(f"{name}:end")
+        
+        async def scenario():
+            started = asyncio.get_running_loop().time()
+            await asyncio.gather(
+                processor.process_update(make_update(1, 1), work("a1")),
+                processor.process_update(make_update(1, 2), work("a2")),
+                processor.process_update(make_update(2, 3), work("b1")),
+            )
+            return asyncio.get_running_loop().time() - started
+        
+        elapsed = asyncio.run(scenario())
+        self.assertLess(events.index("a1:end"), events.index("a2:start"))
+        self.assertLess(events.index("b1:start"), events.index("a1:end"))
+        self.assertLess(elapsed, 0.14)
+        self.assertEqual(processor.active_keys, 0)
+    
+    def test_backlog_of_one_user_does_not_hold_slots(self):
+        """Очередь одного пользователя не занимает слоты, нужные другим"""
+        processor = PerUserUpdateProcessor(4)
+        finished = {}
+        
+        async def work(name, delay):
+            await asyncio.sleep(delay)
+            finished[name] = asyncio.get_running_loop().time()
+        
+        async def scenario():
+            started = asyncio.get_running_loop().time()
+            backlog = [processor.process_update(make_update(1, index), work(f"a{index}", 0.1)) for index in range(8)]
+            other = processor.process_update(make_update(2, 100), work("b", 0))
+            await asyncio.gather(*backlog, other)
+            return finished["b"] - started
+        
+        self.assertLess(asyncio.run(scenario()), 0.05)
+
+
+class TestWebhookServer(unittest.TestCase):
+    """Тесты приема обновлений по вебхуку"""
+    
+    def test_secret_token_and_payload_validation(self):
+        """Запросы без секрета отклоняются, корректное обновление попадает в очередь"""
+        application = Application.builder().token("123456:webhook").build()
+        
+        async def scenario():
+            server = WebhookServer(application, "127.0.0.1", 0, "/telegram", "s3cret")
+            await server.start()
+            try:
+                async with httpx.AsyncClient() as client:
+                    forbidden = await client.post(server.url, json=RECORDED_START)
+                    invalid = [
+                        await client.post(server.url, content=body, headers={SECRET_HEADER: "s3cret"})
+                        for body in (b"{not json", b"[1, 2]", b'"update"', b"null", b"\xff")
+                    ]
+                    accepted = await client.post(server.url, json=RECORDED_START, headers={SECRET_HEADER: "s3cret"})
+                return forbidden, invalid, accepted, application.update_queue.get_nowait()
+            finally:
+                await server.stop()
+        
+        forbidden, invalid, accepted, update = asyncio.run(scenario())
+        self.assertEqual(forbidden.status_code, 403)
+        self.assertEqual([response.status_code for response in invalid], [400] * 5)
+        self.assertEqual(accepted.status_code, 200)
+        self.assertEqual(update.effective_user.id, 777)
+        self.assertEqual(update.message.text, "/start")
+    
+    def test_recorded_update_end_to_end(self):
+        """Записанное обновление, отправленное на вебхук, обрабатывается ботом"""
+        user_states.pop(777, None)
+        
+        async def scenario():
+            api = FakeBotAPI()
+            await api.start()
+            application = (
+                Application.builder()
+                .token(api.token)
+                .base_url(api.base_url)
+                .concurrent_updates(PerUserUpdateProcessor(8))
+                .build()
+            )
+            setup_handlers(application)
+            stop = asyncio.Event()
+            runner = asyncio.create_task(run_webhook(application, "127.0.0.1", 0, "telegram", "https://bot.example/telegram", "s3cret", stop))
+            try:
+                while "webhook_server" not in application.bot_data:
+                    await asyncio.sleep(0.01)
+                server = application.bot_data["webhook_server"]
+                async with httpx.AsyncClient() as client:
+                    response = await client.post(server.url, json=RECORDED_START, headers={SECRET_HEADER: "s3cret"})
+                _, reply = await api.wait_for(777, lambda sent: True, timeout=5)
+                return response, reply, api.method_counts
+            finally:
+                stop.set()
+                await runner
+                await api.stop()
+        
+        try:
+            response, reply, method_counts = asyncio.run(scenario())
+        finally:
+            user_states.pop(777, None)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("имя", reply.text)
+        self.assertEqual(method_counts["setWebhook"], 1)
+        self.assertEqual(method_counts["getUpdates"], 0)
+    
+    def test_secret_is_required_for_public_modes(self):
+        """Без секрета бот не запускается в режимах, принимающих обновления по HTTP"""
+        for mode in ("webhook", "worker", "sharded"):
+            with self.assertRaises(RuntimeError):
+                require_secret(mode, "")
+            require_secret(mode, "s3cret")
+        require_secret("polling", "")
+
+
+class TestHTTPServerHardening(unittest.TestCase):
+    """Тесты устойчивости HTTP-сервера к некорректным и медленным клиентам"""
+    
+    async def exchange(self, server, payload, wait=5.0):
+        reader, writer = await asyncio.open_connection(server.host, server.port)
+        try:
+            writer.write(payload)
+            await writer.drain()
+            return await asyncio.wait_for(reader.read(), wait)
+        finally:
+            writer.close()
+    
+    def run_server(self, scenario, **options):
+        async def run():
+            server = HTTPServer(**options)
+            
+            async def ok(request):
+                return Response.text("ok")
+            
+            server.route("POST", "/hook", ok)
+            await server.start()
+            try:
+                return await scenario(server)
+            finally:
+                await server.stop()
+        
+        return asyncio.run(run())
+    
+    def test_malformed_requests_get_400(self):
+        """Сломанная строка запроса и Content-Length получают ответ 400 без записи ошибки в лог"""
+        async def scenario(server):
+            return [
+                await self.exchange(server, payload)
+                for payload in (
+                    b"GARBAGE\r\n\r\n",
+                    b"POST /hook HTTP/1.1\r\nContent-Length: abc\r\n\r\n",
+                    b"POST /hook HTTP/1.1\r\nContent-Length: -5\r\n\r\n",
+                    b"POST /hook HTTP/1.1\r\nContent-Length: 99999999\r\n\r\n",
+                )
+            ]
+        
+        with self.assertNoLogs("utils.http_server", level="ERROR"):
+            replies = self.run_server(scenario)
+        self.assertEqual([reply.split(b"\r\n")[0] for reply in replies], [
+            b"HTTP/1.1 400 Bad Request",
+            b"HTTP/1.1 400 Bad Request",
+            b"HTTP/1.1 400 Bad Request",
+            b"HTTP/1.1 413 Request Entity Too Large",
+        ])
+    
+    def test_slow_and_idle_clients_are_disconnected(self):
+        """Незаконченные заголовки и простаивающее соединение keep-alive закрываются по таймауту"""
+        async def scenario(server):
+            slow = await self.exchange(server, b"POST /hook HTTP/1.1\r\nContent-Length: 2\r\n")
+            idle = await self.exchange(server, b"POST /hook HTTP/1.1\r\n\r\n")
+            return slow, idle, len(server._connections)
+        
+        slow, idle, open_connections = self.run_server(scenario, request_timeout=0.2, idle_timeout=0.2)
+        self.assertEqual(slow, b"")
+        self.assertTrue(idle.startswith(b"HTTP/1.1 200 OK"))
+        self.assertEqual(open_connections, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
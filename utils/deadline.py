@@ -0,0 +1,48 @@
+import time
+from typing import Callable, Optional
+
+
+class Deadline:
+    """Крайний срок раунда, который передается через все этапы обработки"""
+    
+    def __init__(self, budget: float, clock: Callable[[], float] = time.monotonic):
+        """
+        Args:
+            budget: Бюджет времени в секундах, начиная с текущего момента
+            clock: Монотонные часы
+        """
+        self.budget = budget
+        self._clock = clock
+        self._expires_at = clock() + budget
+    
+    def remaining(self) -> float:
+        """Оставшееся время в секундах (не меньше нуля)"""
+        return max(0.0, self._expires_at - self._clock())
+    
+    def elapsed(self) -> float:
+        """Время, прошедшее с начала раунда"""
+        return self.budget - (self._expires_at - self._clock())
+    
+    def expired(self) -> bool:
+        """Истек ли бюджет"""
+        return self.remaining() <= 0
+    
+    def timeout(self, minimum: float = 0.0) -> float:
+        """
+        Таймаут для очередной операции
+        
+        Args:
+            minimum: Нижняя граница таймаута, например для доставки уже готового результата
+        
+        Returns:
+            float: Оставшееся время, но не меньше minimum
+        """
+        return max(minimum, self.remaining())
+    
+    def __repr__(self) -> str:
+        return f"Deadline(remaining={self.remaining():.2f}s, budget={self.budget:.2f}s)"
+
+
+def remaining_budget(deadline: Optional[Deadline]) -> float:
+    """Оставшийся бюджет или бесконечность, если срок не задан"""
+    return deadline.remaining() if deadline else float("inf")
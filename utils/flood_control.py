@@ -0,0 +1,115 @@
+import logging
+import time
+from typing import Callable, Dict, Set
+
+from telegram import Update
+from telegram.error import TelegramError
+
+from config import INBOUND_BURST, INBOUND_RATE_PER_SECOND
+from utils.metrics import INBOUND_DROPPED
+from utils.rate_limit import TokenBucket
+
+
+PRUNE_INTERVAL = 60.0
+
+
+def update_kind(update: Update) -> str:
+    """Тип обновления для метрик"""
+    if update.callback_query is not None:
+        return "callback_query"
+    if update.message is not None:
+        return "command" if update.message.text and update.message.text.startswith("/") else "message"
+    return "other"
+
+
+class FloodControl:
+    """Входной лимит частоты обновлений на пользователя"""
+    
+    # Проверка выполняется в PerUserUpdateProcessor до очереди пользователя и
+    # семафора, поэтому поток сообщений не занимает слотов обработки, не
+    # доходит до логики лобби и не порождает рассылок broadcast_lobby_update
+    
+    def __init__(self, burst: float = INBOUND_BURST, rate_per_second: float = INBOUND_RATE_PER_SECOND, clock: Callable[[], float] = time.monotonic):
+        """
+        Args:
+            burst: Сколько обновлений подряд пропускается без пауз
+            rate_per_second: Устойчивая частота обновлений; 0 отключает ограничение
+            clock: Монотонные часы
+        """
+        self.burst = burst
+        self.rate_per_second = rate_per_second
+        self._clock = clock
+        self._buckets: Dict[int, TokenBucket] = {}
+        self._throttled: Set[int] = set()
+        self._last_pruned = clock()
+        self.dropped = 0
+        self.logger = logging.getLogger(__name__)
+    
+    @property
+    def enabled(self) -> bool:
+        """Включено ли ограничение"""
+        return self.rate_per_second > 0 and self.burst > 0
+    
+    def allow(self, user_id: int) -> bool:
+        """
+        Списывает токен пользователя
+        
+        Args:
+            user_id: ID пользователя Telegram
+        
+        Returns:
+            bool: False, если обновление нужно отбросить
+        """
+        self._maybe_prune()
+        bucket = self._buckets.get(user_id)
+        if bucket is None:
+            bucket = self._buckets[user_id] = TokenBucket(self.burst, self.rate_per_second, self._clock)
+        
+        if bucket.try_consume():
+            self._throttled.discard(user_id)
+            return True
+        
+        if user_id not in self._throttled:
+            self._throttled.add(user_id)
+            self.logger.warning(f"Пользователь {user_id} превысил частоту обновлений, лишние обновления отбрасываются")
+        return False
+    
+    def admit(self, update: Update) -> bool:
+        """
+        Решает, пропустить ли обновление к обработчикам
+        
+        Args:
+            update: Входящее обновление
+        
+        Returns:
+            bool: False, если обновление отброшено
+        """
+        user = update.effective_user
+        if user is None or self.allow(user.id):
+            return True
+        
+        self.dropped += 1
+        INBOUND_DROPPED.labels(update_kind(update)).inc()
+        return False
+    
+    async def reject(self, update: Update):
+        """Отвечает на отброшенный callback-запрос, чтобы у кнопки не висел индикатор загрузки"""
+        if update.callback_query is None:
+            return
+        try:
+            await update.callback_query.answer()
+        except TelegramError as e:
+            self.logger.debug(f"Не удалось ответить на отброшенный callback-запрос: {e}")
+    
+    def _maybe_prune(self):
+        """Раз в минуту удаляет полные корзины: они ничем не отличаются от новых"""
+        now = self._clock()
+        if now - self._last_pruned < PRUNE_INTERVAL:
+            return
+        self._last_pruned = now
+        for user_id in [user_id for user_id, bucket in self._buckets.items() if bucket.tokens >= bucket.capacity]:
+            del self._buckets[user_id]
+    
+    def __len__(self) -> int:
+        """Число отслеживаемых пользователей"""
+        return len(self._buckets)
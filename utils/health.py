@@ -0,0 +1,89 @@
+import asyncio
+import logging
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+from utils.http_server import HTTPServer, Request, Response
+
+
+async def _noop():
+    return None
+
+
+class HealthServer:
+    """Эндпоинты /livez и /readyz в отдельном потоке со своим циклом событий"""
+    
+    # Отдельный поток нужен, чтобы заблокированный цикл событий бота давал ответ 503, а не зависший запрос
+    
+    def __init__(self, loop: asyncio.AbstractEventLoop, host: str, port: int, checks: Dict[str, Callable[[], bool]], liveness_timeout: float = 5.0):
+        """
+        Args:
+            loop: Цикл событий бота, отзывчивость которого проверяет /livez
+            host: Адрес для прослушивания
+            port: Порт, 0 означает любой свободный
+            checks: Проверки готовности по имени; вызываются из потока сервера и должны только читать состояние
+            liveness_timeout: Сколько ждать выполнения пустой задачи в цикле бота
+        """
+        self.bot_loop = loop
+        self.checks = checks
+        self.liveness_timeout = liveness_timeout
+        self.server = HTTPServer(host, port)
+        self.server.route("GET", "/livez", self._livez)
+        self.server.route("GET", "/readyz", self._readyz)
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="health-server", daemon=True)
+        self.logger = logging.getLogger(__name__)
+    
+    @property
+    def url(self) -> str:
+        return self.server.url
+    
+    def start(self):
+        """Запускает сервер и ждет, пока он начнет принимать соединения"""
+        self._thread.start()
+        asyncio.run_coroutine_threadsafe(self.server.start(), self._loop).result(10)
+    
+    def stop(self):
+        """Останавливает сервер и его поток"""
+        asyncio.run_coroutine_threadsafe(self.server.stop(), self._loop).result(10)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(10)
+        self._loop.close()
+    
+    async def probe_loop(self) -> Optional[float]:
+        """
+        Выполняет пустую задачу в цикле событий бота
+        
+        Returns:
+            Optional[float]: Время до ее выполнения в секундах или None, если цикл не ответил вовремя
+        """
+        started = time.perf_counter()
+        try:
+            future = asyncio.run_coroutine_threadsafe(_noop(), self.bot_loop)
+        except RuntimeError:
+            return None
+        try:
+            await asyncio.wait_for(asyncio.wrap_future(future), self.liveness_timeout)
+        except asyncio.TimeoutError:
+            future.cancel()
+            return None
+        return time.perf_counter() - started
+    
+    async def _livez(self, request: Request) -> Response:
+        latency = await self.probe_loop()
+        if latency is None:
+            self.logger.warning(f"Цикл событий не ответил за {self.liveness_timeout} с")
+            return Response.json({"status": "unresponsive", "timeout_s": self.liveness_timeout}, status=503)
+        return Response.json({"status": "ok", "loop_latency_ms": round(latency * 1000, 3)})
+    
+    async def _readyz(self, request: Request) -> Response:
+        results = {}
+        for name, check in self.checks.items():
+            try:
+                results[name] = bool(check())
+            except Exception as e:
+                self.logger.warning(f"Проверка готовности {name} завершилась ошибкой: {e!r}")
+                results[name] = False
+        ready = all(results.values())
+        return Response.json({"status": "ready" if ready else "not_ready", "checks": results}, status=200 if ready else 503)
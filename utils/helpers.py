@@ -1,3 +1,4 @@
+import logging
 import random
 import re
 import string
@@ -11,6 +12,8 @@ from config import (
     MAX_ACTION_LENGTH
 )
 
+logger = logging.getLogger(__name__)
+
 
 def generate_lobby_id() -> str:
     """Генерирует уникальный ID для лобби"""
@@ -36,7 +39,7 @@ def get_random_scenario() -> str:
         
         return random.choice(scenarios)
     except Exception as e:
-        print(f"Ошибка при чтении файла сценариев: {e}")
+        logger.error(f"Ошибка при чтении файла сценариев: {e}")
         return "Вы оказались в опасной ситуации. Что вы будете делать?"
 
 
@@ -0,0 +1,259 @@
+import asyncio
+import contextlib
+import json
+import logging
+from dataclasses import dataclass, field
+from http import HTTPStatus
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple, Union
+from urllib.parse import parse_qsl, urlsplit
+
+
+MAX_HEADER_LINES = 100
+# Обновление Telegram занимает единицы килобайт; запас оставлен для переноса лобби между процессами
+MAX_BODY_SIZE = 256 * 1024
+# Время на заголовки и тело запроса после строки запроса
+REQUEST_TIMEOUT = 10.0
+# Время ожидания следующего запроса в соединении keep-alive
+IDLE_TIMEOUT = 75.0
+
+
+class BadRequest(Exception):
+    """Запрос не удалось разобрать; соединение закрывается после ответа с кодом status"""
+    
+    def __init__(self, message: str, status: int = HTTPStatus.BAD_REQUEST):
+        super().__init__(message)
+        self.status = status
+
+
+@dataclass
+class Request:
+    """Входящий HTTP-запрос"""
+    method: str
+    path: str
+    query: Dict[str, str]
+    headers: Dict[str, str]
+    body: bytes = b""
+    params: Dict[str, str] = field(default_factory=dict)
+    
+    def json(self) -> Any:
+        """Разбирает тело запроса как JSON"""
+        return json.loads(self.body or b"null")
+
+
+@dataclass
+class Response:
+    """HTTP-ответ с телом целиком"""
+    status: int = 200
+    body: bytes = b""
+    content_type: str = "text/plain; charset=utf-8"
+    headers: Dict[str, str] = field(default_factory=dict)
+    
+    @classmethod
+    def json(cls, data: Any, status: int = 200) -> "Response":
+        """Ответ с JSON-телом"""
+        return cls(status, json.dumps(data, ensure_ascii=False).encode("utf-8"), "application/json")
+    
+    @classmethod
+    def text(cls, text: str, status: int = 200, content_type: str = "text/plain; charset=utf-8") -> "Response":
+        """Ответ с текстовым телом"""
+        return cls(status, text.encode("utf-8"), content_type)
+
+
+@dataclass
+class StreamingResponse:
+    """HTTP-ответ, тело которого отправляется частями (chunked)"""
+    chunks: AsyncIterator[bytes]
+    status: int = 200
+    content_type: str = "text/event-stream"
+    headers: Dict[str, str] = field(default_factory=dict)
+
+
+Handler = Callable[[Request], Awaitable[Union[Response, StreamingResponse]]]
+
+
+class HTTPServer:
+    """Минимальный асинхронный HTTP/1.1 сервер с keep-alive для служебных эндпоинтов и тестовых заглушек"""
+    
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, request_timeout: float = REQUEST_TIMEOUT, idle_timeout: float = IDLE_TIMEOUT):
+        """
+        Args:
+            host: Адрес для прослушивания
+            port: Порт, 0 означает любой свободный
+            request_timeout: Время на заголовки и тело запроса; медленный клиент отключается
+            idle_timeout: Время ожидания строки следующего запроса; простаивающее соединение закрывается
+        """
+        self.host = host
+        self.port = port
+        self.request_timeout = request_timeout
+        self.idle_timeout = idle_timeout
+        self._routes: List[Tuple[str, List[str], Handler]] = []
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._connections: set = set()
+        self._tasks: set = set()
+        self.logger = logging.getLogger(__name__)
+    
+    @property
+    def url(self) -> str:
+        """Базовый URL сервера"""
+        return f"http://{self.host}:{self.port}"
+    
+    def route(self, method: str, path: str, handler: Handler):
+        """
+        Регистрирует обработчик
+        
+        Args:
+            method: HTTP-метод или "*" для любого
+            path: Путь; сегменты вида {name} попадают в request.params, а сегмент {name:path} захватывает остаток пути
+            handler: Корутина, принимающая Request и возвращающая Response
+        """
+        self._routes.append((method.upper(), path.strip("/").split("/"), handler))
+    
+    def _match(self, method: str, path: str) -> Tuple[Optional[Handler], Dict[str, str], bool]:
+        segments = path.strip("/").split("/")
+        path_found = False
+        for route_method, pattern, handler in self._routes:
+            params = self._match_path(pattern, segments)
+            if params is None:
+                continue
+            path_found = True
+            if route_method in ("*", method):
+                return handler, params, True
+        return None, {}, path_found
+    
+    @staticmethod
+    def _match_path(pattern: List[str], segments: List[str]) -> Optional[Dict[str, str]]:
+        params = {}
+        for index, part in enumerate(pattern):
+            if part.startswith("{") and part.endswith(":path}"):
+                params[part[1:-6]] = "/".join(segments[index:])
+                return params
+            if index >= len(segments):
+                return None
+            if part.startswith("{") and part.endswith("}"):
+                params[part[1:-1]] = segments[index]
+            elif part != segments[index]:
+                return None
+        return params if len(pattern) == len(segments) else None
+    
+    async def start(self):
+        """Запускает сервер; при port=0 фактический порт сохраняется в self.port"""
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        self.logger.info(f"HTTP server listening on {self.url}")
+    
+    async def stop(self):
+        """Останавливает сервер и закрывает открытые соединения"""
+        if self._server is None:
+            return
+        self._server.close()
+        for writer in list(self._connections):
+            writer.close()
+        # Long-polling handlers would otherwise outlive the server and be cancelled with the loop
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        await self._server.wait_closed()
+        self._server = None
+    
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self._connections.add(writer)
+        task = asyncio.current_task()
+        self._tasks.add(task)
+        try:
+            while True:
+                request = await self._read_request(reader)
+                if request is None:
+                    break
+                keep_alive = request.headers.get("connection", "").lower() != "close"
+                response = await self._dispatch(request)
+                await self._write_response(writer, response, keep_alive)
+                if not keep_alive:
+                    break
+        except BadRequest as e:
+            self.logger.debug(f"Malformed HTTP request: {e}")
+            with contextlib.suppress(ConnectionError):
+                await self._write_response(writer, Response.text(HTTPStatus(e.status).phrase, status=e.status), keep_alive=False)
+        except asyncio.TimeoutError:
+            self.logger.debug("HTTP connection timed out")
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.CancelledError):
+            pass
+        except Exception as e:
+            self.logger.error(f"HTTP connection error: {e}", exc_info=True)
+        finally:
+            self._connections.discard(writer)
+            self._tasks.discard(task)
+            writer.close()
+    
+    async def _read_request(self, reader: asyncio.StreamReader) -> Optional[Request]:
+        request_line = await asyncio.wait_for(self._readline(reader), self.idle_timeout)
+        if not request_line.strip():
+            return None
+        parts = request_line.decode("latin-1").split()
+        if len(parts) != 3:
+            raise BadRequest(f"invalid request line {request_line[:100]!r}")
+        method, target, _ = parts
+        return await asyncio.wait_for(self._read_rest(reader, method, target), self.request_timeout)
+    
+    async def _read_rest(self, reader: asyncio.StreamReader, method: str, target: str) -> Request:
+        headers = {}
+        for _ in range(MAX_HEADER_LINES):
+            line = await self._readline(reader)
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        else:
+            raise BadRequest("too many headers", HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE)
+        
+        length = headers.get("content-length", "0") or "0"
+        if not length.isdigit():
+            raise BadRequest(f"invalid Content-Length {length[:20]!r}")
+        if int(length) > MAX_BODY_SIZE:
+            raise BadRequest(f"body of {length} bytes", HTTPStatus.REQUEST_ENTITY_TOO_LARGE)
+        body = await reader.readexactly(int(length)) if int(length) else b""
+        
+        url = urlsplit(target)
+        return Request(method.upper(), url.path, dict(parse_qsl(url.query)), headers, body)
+    
+    @staticmethod
+    async def _readline(reader: asyncio.StreamReader) -> bytes:
+        try:
+            return await reader.readline()
+        except ValueError:
+            # StreamReader signals a line longer than its buffer limit with ValueError
+            raise BadRequest("line too long", HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE)
+    
+    async def _dispatch(self, request: Request) -> Union[Response, StreamingResponse]:
+        handler, params, path_found = self._match(request.method, request.path)
+        if handler is None:
+            status = HTTPStatus.METHOD_NOT_ALLOWED if path_found else HTTPStatus.NOT_FOUND
+            return Response.text(status.phrase, status=status)
+        request.params = params
+        try:
+            return await handler(request)
+        except Exception as e:
+            self.logger.error(f"Error handling {request.method} {request.path}: {e}", exc_info=True)
+            return Response.text("Internal Server Error", status=500)
+    
+    async def _write_response(self, writer: asyncio.StreamWriter, response: Union[Response, StreamingResponse], keep_alive: bool):
+        reason = HTTPStatus(response.status).phrase
+        headers = {"Content-Type": response.content_type, "Connection": "keep-alive" if keep_alive else "close"}
+        headers.update(response.headers)
+        
+        if isinstance(response, StreamingResponse):
+            headers["Transfer-Encoding"] = "chunked"
+            writer.write(self._head(response.status, reason, headers))
+            async for chunk in response.chunks:
+                if chunk:
+                    writer.write(f"{len(chunk):X}\r\n".encode("ascii") + chunk + b"\r\n")
+                    await writer.drain()
+            writer.write(b"0\r\n\r\n")
+        else:
+            headers["Content-Length"] = str(len(response.body))
+            writer.write(self._head(response.status, reason, headers) + response.body)
+        await writer.drain()
+    
+    @staticmethod
+    def _head(status: int, reason: str, headers: Dict[str, str]) -> bytes:
+        lines = [f"HTTP/1.1 {status} {reason}"] + [f"{name}: {value}" for name, value in headers.items()]
+        return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
@@ -0,0 +1,138 @@
+import asyncio
+import logging
+import os
+import sys
+import sysconfig
+import threading
+import time
+import traceback
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+from utils.metrics import LOOP_BLOCKS, LOOP_LAG
+
+
+_LIBRARY_PATHS = tuple(
+    os.path.abspath(path) + os.sep
+    for key in ("stdlib", "platstdlib", "purelib", "platlib")
+    if (path := sysconfig.get_paths().get(key))
+)
+
+# Сколько ждать поток наблюдения при остановке; он фоновый и не мешает выходу процесса
+STOP_TIMEOUT = 1.0
+
+
+def _is_library(filename: str) -> bool:
+    return filename.startswith("<") or os.path.abspath(filename).startswith(_LIBRARY_PATHS)
+
+
+@dataclass
+class BlockReport:
+    """Зафиксированная блокировка цикла событий"""
+    function: str
+    stack: List[str] = field(default_factory=list)
+    lag: float = 0.0
+    beat: float = 0.0
+
+
+def describe_stack(frame) -> BlockReport:
+    """
+    Разбирает стек заблокированного потока
+    
+    Виновником считается самая глубокая функция кода проекта: библиотечные
+    вызовы вроде time.sleep или SDK обычно лишь место, где поток ждет.
+    
+    Args:
+        frame: Верхний кадр стека
+    
+    Returns:
+        BlockReport: Функция-виновник и стек от внешнего вызова к внутреннему
+    """
+    summary = traceback.extract_stack(frame)
+    culprit = next((entry for entry in reversed(summary) if not _is_library(entry.filename)), summary[-1])
+    function = f"{os.path.basename(culprit.filename)}:{culprit.name}"
+    stack = [f"{entry.filename}:{entry.lineno} in {entry.name}" for entry in summary]
+    return BlockReport(function, stack)
+
+
+class LoopWatchdog:
+    """Измеряет задержку цикла событий и ловит блокирующие вызовы"""
+    
+    def __init__(self, threshold: float = 0.25, interval: float = 0.05, max_reports: int = 100):
+        """
+        Args:
+            threshold: Задержка, после которой снимается стек потока цикла событий
+            interval: Период таймера, по опозданию которого измеряется задержка
+            max_reports: Сколько последних отчетов хранить
+        """
+        self.threshold = threshold
+        self.interval = interval
+        self.max_reports = max_reports
+        self.reports: List[BlockReport] = []
+        self._last_beat = 0.0
+        self._loop_thread: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+        self.logger = logging.getLogger(__name__)
+    
+    def start(self):
+        """Запускает наблюдение за текущим циклом событий"""
+        self._loop_thread = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._stopped.clear()
+        self._task = asyncio.get_running_loop().create_task(self._heartbeat())
+        self._thread = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._thread.start()
+    
+    async def stop(self):
+        """Останавливает наблюдение"""
+        self._stopped.set()
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._thread:
+            # Поток может как раз снимать стек, поэтому его ждут вне цикла событий
+            await asyncio.to_thread(self._thread.join, STOP_TIMEOUT)
+            if self._thread.is_alive():
+                self.logger.warning(f"Поток наблюдения за циклом событий не остановился за {STOP_TIMEOUT:.0f}с")
+            self._thread = None
+    
+    async def _heartbeat(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - expected)
+            LOOP_LAG.observe(lag)
+            
+            previous_beat, self._last_beat = self._last_beat, time.monotonic()
+            if self.reports and self.reports[-1].beat == previous_beat:
+                report = self.reports[-1]
+                report.lag = lag
+                self.logger.warning(
+                    f"Цикл событий был заблокирован на {lag:.2f}с в {report.function}\n" + "\n".join(report.stack)
+                )
+    
+    def _watch(self):
+        while not self._stopped.wait(self.interval / 2):
+            beat = self._last_beat
+            stalled = time.monotonic() - beat - self.interval
+            if stalled < self.threshold or (self.reports and self.reports[-1].beat == beat):
+                continue
+            
+            frame = sys._current_frames().get(self._loop_thread)
+            if frame is None:
+                continue
+            report = describe_stack(frame)
+            report.lag = stalled
+            report.beat = beat
+            del frame
+            
+            self.reports.append(report)
+            del self.reports[:-self.max_reports]
+            LOOP_BLOCKS.labels(report.function).inc()
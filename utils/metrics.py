@@ -0,0 +1,382 @@
+import functools
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from utils.http_server import HTTPServer, Request, Response
+
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+SIZE_BUCKETS = (250, 500, 1000, 2000, 4000, 8000, 16000, 32000)
+TOKEN_BUCKETS = (256, 512, 1024, 1536, 2048, 3072, 4096, 8192)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if value == int(value):
+        return str(int(value))
+    return repr(value)
+
+
+class Metric:
+    """Базовый класс метрики с набором меток"""
+    
+    kind = "untyped"
+    
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        """
+        Args:
+            name: Имя метрики в формате Prometheus
+            documentation: Описание для строки HELP
+            labelnames: Имена меток
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[LabelValues, Any] = {}
+        self._lock = threading.Lock()
+    
+    def _new_child(self) -> Any:
+        raise NotImplementedError
+    
+    def labels(self, *values: Any, **kwargs: Any) -> Any:
+        """
+        Возвращает дочернюю метрику для конкретных значений меток
+        
+        Args:
+            values: Значения меток по порядку
+            kwargs: Значения меток по именам
+        """
+        if kwargs:
+            values = tuple(kwargs[name] for name in self.labelnames)
+        key = tuple(str(value) for value in values)
+        if len(key) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {key}")
+        
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+    
+    def _default(self) -> Any:
+        if self.labelnames:
+            raise ValueError(f"{self.name} requires labels {self.labelnames}")
+        return self.labels()
+    
+    def samples(self) -> Iterator[Tuple[str, str, float]]:
+        """Строки выборки: (суффикс имени, метки, значение)"""
+        raise NotImplementedError
+    
+    def render(self) -> str:
+        """Метрика в текстовом формате Prometheus"""
+        lines = [f"# HELP {self.name} {_escape(self.documentation)}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, labels, value in self.samples():
+            lines.append(f"{self.name}{suffix}{labels} {_format_value(value)}")
+        return "\n".join(lines)
+
+
+class _CounterChild:
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+    
+    def inc(self, amount: float = 1.0):
+        if amount < 0:
+            raise ValueError("Counter can only increase")
+        with self._lock:
+            self.value += amount
+
+
+class Counter(Metric):
+    """Монотонно растущий счетчик"""
+    
+    kind = "counter"
+    
+    def _new_child(self) -> _CounterChild:
+        return _CounterChild()
+    
+    def inc(self, amount: float = 1.0):
+        """Увеличивает счетчик без меток"""
+        self._default().inc(amount)
+    
+    def samples(self) -> Iterator[Tuple[str, str, float]]:
+        for key, child in list(self._children.items()):
+            yield "_total" if not self.name.endswith("_total") else "", _format_labels(self.labelnames, key), child.value
+
+
+class _GaugeChild:
+    def __init__(self):
+        self.value = 0.0
+    
+    def set(self, value: float):
+        self.value = float(value)
+    
+    def inc(self, amount: float = 1.0):
+        self.value += amount
+    
+    def dec(self, amount: float = 1.0):
+        self.value -= amount
+
+
+class Gauge(Metric):
+    """Значение, которое может расти и убывать"""
+    
+    kind = "gauge"
+    
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._function: Optional[Callable[[], Any]] = None
+    
+    def _new_child(self) -> _GaugeChild:
+        return _GaugeChild()
+    
+    def set(self, value: float):
+        """Устанавливает значение без меток"""
+        self._default().set(value)
+    
+    def inc(self, amount: float = 1.0):
+        self._default().inc(amount)
+    
+    def dec(self, amount: float = 1.0):
+        self._default().dec(amount)
+    
+    def set_function(self, function: Callable[[], Any]):
+        """
+        Вычисляет значение при каждом чтении метрик
+        
+        Args:
+            function: Возвращает число для метрики без меток или словарь
+                {значение метки или кортеж значений: число} для метрики с метками
+        """
+        self._function = function
+    
+    def samples(self) -> Iterator[Tuple[str, str, float]]:
+        if self._function is not None:
+            values = self._function()
+            if not isinstance(values, dict):
+                values = {(): values}
+            for key, value in values.items():
+                key = key if isinstance(key, tuple) else (key,)
+                yield "", _format_labels(self.labelnames, key), float(value)
+            return
+        for key, child in list(self._children.items()):
+            yield "", _format_labels(self.labelnames, key), child.value
+
+
+class _HistogramChild:
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+    
+    def observe(self, value: float):
+        with self._lock:
+            self.sum += value
+            self.count += 1
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    self.counts[index] += 1
+                    break
+    
+    @contextmanager
+    def time(self) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started)
+
+
+class Histogram(Metric):
+    """Распределение значений по корзинам"""
+    
+    kind = "histogram"
+    
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+    
+    def _new_child(self) -> _HistogramChild:
+        return _HistogramChild(self.buckets)
+    
+    def observe(self, value: float):
+        """Добавляет наблюдение без меток"""
+        self._default().observe(value)
+    
+    def time(self):
+        """Контекстный менеджер, измеряющий длительность блока"""
+        return self._default().time()
+    
+    def samples(self) -> Iterator[Tuple[str, str, float]]:
+        for key, child in list(self._children.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, child.counts):
+                cumulative += count
+                yield "_bucket", _format_labels(self.labelnames, key, ("le", _format_value(bound))), cumulative
+            yield "_sum", _format_labels(self.labelnames, key), child.sum
+            yield "_count", _format_labels(self.labelnames, key), child.count
+
+
+class MetricsRegistry:
+    """Набор метрик процесса"""
+    
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+    
+    def register(self, metric: Metric) -> Metric:
+        """Регистрирует метрику; повторная регистрация того же имени возвращает существующую"""
+        return self._metrics.setdefault(metric.name, metric)
+    
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+    
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+    
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+    
+    def get(self, name: str) -> Optional[Metric]:
+        return self._metrics.get(name)
+    
+    def render(self) -> str:
+        """Все метрики в текстовом формате Prometheus"""
+        return "\n".join(metric.render() for metric in self._metrics.values()) + "\n"
+
+
+registry = MetricsRegistry()
+
+
+HANDLER_LATENCY = registry.histogram("bot_handler_duration_seconds", "Handler execution time", ["handler"])
+HANDLER_ERRORS = registry.counter("bot_handler_errors_total", "Handlers that raised an exception", ["handler", "error_type"])
+AI_EVALUATE_LATENCY = registry.histogram("ai_evaluate_survival_duration_seconds", "evaluate_survival time per backend and generation path", ["backend", "path"])
+AI_TIME_TO_FIRST_TOKEN = registry.histogram("ai_time_to_first_token_seconds", "Time from the start of a generation attempt to the first response text", ["backend"])
+AI_PROMPT_SIZE = registry.histogram("ai_prompt_size_chars", "Prompt size in characters", ["backend"], SIZE_BUCKETS)
+AI_RESPONSE_SIZE = registry.histogram("ai_response_size_chars", "Generated narrative size in characters", ["backend"], SIZE_BUCKETS)
+AI_GENERATION_PROFILES = registry.counter("ai_generation_profile_total", "Rounds generated per load level of the AI admission queue", ["load"])
+AI_MAX_OUTPUT_TOKENS_USED = registry.histogram("ai_max_output_tokens", "Output token limit chosen for a round", (), TOKEN_BUCKETS)
+ROUND_BUDGET_REJECTIONS = registry.counter("bot_round_budget_rejections_total", "Rounds refused because a lobby or user budget was exhausted", ["scope", "kind"])
+AI_ENRICHMENTS = registry.counter("ai_scenario_enrichment_total", "Scenario enrichment outcomes: shed when skipped under load; generated, failed, stale when the background call ends; used, missed when the round starts", ["outcome"])
+AI_ENRICHMENT_LATENCY = registry.histogram("ai_scenario_enrichment_duration_seconds", "Background scenario enrichment time per backend", ["backend"])
+AI_FALLBACKS = registry.counter("ai_fallback_total", "Rounds answered with the local fallback narrative", ["reason"])
+INBOUND_DROPPED = registry.counter("bot_inbound_dropped_total", "Updates dropped by per-user flood control before handler dispatch", ["update_type"])
+SEND_FAILURES = registry.counter("bot_send_failures_total", "Outbound Telegram requests that failed", ["error_type"])
+LOBBIES = registry.gauge("bot_lobbies", "Active lobbies by game state", ["state"])
+PLAYERS = registry.gauge("bot_players", "Players in active lobbies")
+LOBBY_TIERS = registry.gauge("bot_lobby_tier", "Lobbies kept as objects (hot) and as compressed snapshots (cold)", ["tier"])
+LOBBY_REHYDRATE_LATENCY = registry.histogram("bot_lobby_rehydrate_seconds", "Time to restore a cold lobby on access")
+WEBHOOK_UPDATES = registry.counter("bot_webhook_requests_total", "Webhook requests by outcome (accepted, forbidden, invalid)", ["outcome"])
+SHARD_ROUTED = registry.counter("bot_shard_routed_total", "Updates forwarded by the shard router per worker and routing rule", ["worker", "rule"])
+SHARD_HANDOFFS = registry.counter("bot_shard_handoffs_total", "State moved between worker processes (user, lobby) by outcome", ["kind", "outcome"])
+SHARD_STORE_WRITE_LATENCY = registry.histogram("bot_shard_store_write_seconds", "Duration of one batched ownership store transaction on a worker")
+PERSISTENCE_WRITE_LATENCY = registry.histogram("bot_persistence_write_seconds", "Duration of one batched persistence transaction")
+PERSISTENCE_ROWS = registry.counter("bot_persistence_rows_total", "Persisted rows written or deleted per table", ["table"])
+HTTP_POOL_IN_USE = registry.gauge("bot_http_pool_in_use", "Requests currently holding a connection of the pool", ["pool"])
+HTTP_POOL_SIZE = registry.gauge("bot_http_pool_size", "Maximum connections of the pool", ["pool"])
+HTTP_POOL_SATURATED = registry.counter("bot_http_pool_saturated_total", "Requests that started while every connection of the pool was busy", ["pool"])
+LOOP_LAG = registry.histogram("bot_event_loop_lag_seconds", "How late the event loop ran a periodic timer")
+LOOP_BLOCKS = registry.counter("bot_event_loop_blocks_total", "Event loop stalls past the threshold by the function that was running", ["function"])
+LOG_RECORDS = registry.counter("bot_log_records_total", "Log records by level and outcome (written, sampled_out, dropped)", ["level", "outcome"])
+LOG_BYTES = registry.counter("bot_log_bytes_total", "Bytes of formatted log output written by the background listener")
+
+
+def track_handler(callback: Callable[..., Awaitable[Any]]) -> Callable[..., Awaitable[Any]]:
+    """
+    Оборачивает обработчик PTB, измеряя длительность и исключения
+    
+    Args:
+        callback: Корутина-обработчик
+    
+    Returns:
+        Callable: Обработчик с тем же именем и результатом
+    """
+    name = callback.__name__
+    latency = HANDLER_LATENCY.labels(name)
+    
+    @functools.wraps(callback)
+    async def wrapper(*args: Any, **kwargs: Any) -> Any:
+        started = time.perf_counter()
+        try:
+            return await callback(*args, **kwargs)
+        except Exception as e:
+            HANDLER_ERRORS.labels(name, type(e).__name__).inc()
+            raise
+        finally:
+            latency.observe(time.perf_counter() - started)
+    
+    return wrapper
+
+
+def record_send_failure(error: BaseException):
+    """Учитывает неудачную отправку сообщения по типу ошибки"""
+    SEND_FAILURES.labels(type(error).__name__).inc()
+
+
+def register_game_gauges(lobbies: Dict[str, Any], states: List[Any]):
+    """
+    Подключает вычисляемые метрики лобби и игроков
+    
+    Args:
+        lobbies: Реестр лобби; у LobbyRegistry учитываются и холодные лобби
+        states: Все значения GameState, чтобы пустые состояния тоже попадали в выборку
+    """
+    cold_values = getattr(lobbies, "cold_values", list)
+    
+    def lobbies_by_state() -> Dict[str, int]:
+        counts = {state.name: 0 for state in states}
+        for lobby in list(lobbies.values()):
+            counts[lobby.game_state.name] += 1
+        for cold in cold_values():
+            counts[cold.game_state.name] += 1
+        return counts
+    
+    def players() -> int:
+        return sum(len(lobby.players) for lobby in list(lobbies.values())) + sum(cold.players for cold in cold_values())
+    
+    LOBBIES.set_function(lobbies_by_state)
+    PLAYERS.set_function(players)
+    if hasattr(lobbies, "hot_count"):
+        LOBBY_TIERS.set_function(lambda: {"hot": lobbies.hot_count(), "cold": len(lobbies) - lobbies.hot_count()})
+        lobbies.on_rehydrate = lambda lobby_id, seconds: LOBBY_REHYDRATE_LATENCY.observe(seconds)
+
+
+async def start_metrics_server(host: str, port: int, metrics: MetricsRegistry = registry) -> HTTPServer:
+    """
+    Запускает HTTP-эндпоинт /metrics
+    
+    Args:
+        host: Адрес для прослушивания
+        port: Порт
+        metrics: Реестр метрик
+    
+    Returns:
+        HTTPServer: Запущенный сервер
+    """
+    async def handle(request: Request) -> Response:
+        return Response(200, metrics.render().encode("utf-8"), CONTENT_TYPE)
+    
+    server = HTTPServer(host, port)
+    server.route("GET", "/metrics", handle)
+    await server.start()
+    return server
@@ -0,0 +1,215 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+from telegram.ext import BasePersistence, PersistenceInput
+
+from utils.metrics import PERSISTENCE_ROWS, PERSISTENCE_WRITE_LATENCY
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS conversations (
+    name TEXT NOT NULL,
+    key TEXT NOT NULL,
+    state TEXT NOT NULL,
+    PRIMARY KEY (name, key)
+);
+CREATE TABLE IF NOT EXISTS user_data (
+    user_id INTEGER PRIMARY KEY,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS chat_data (
+    chat_id INTEGER PRIMARY KEY,
+    data TEXT NOT NULL
+);
+"""
+
+TABLES = ("conversations", "user_data", "chat_data")
+
+# Значение в кеше записанных строк после неудачной транзакции: не совпадает ни с одним новым значением
+UNKNOWN = object()
+
+
+def _dumps(value: Any) -> str:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"), sort_keys=True)
+
+
+class SQLitePersistence(BasePersistence):
+    """Persistence PTB в SQLite, которая пишет только изменившиеся состояния диалогов и данные пользователей"""
+    # PicklePersistence перезаписывает файл целиком. Здесь PTB раз в update_interval передает
+    # ключи, затронутые обновлениями; совпадающие с уже записанными отбрасываются, а остальные
+    # пишутся одной транзакцией в отдельном потоке. bot_data не сохраняется: там объекты процесса.
+    
+    def __init__(self, path: str, update_interval: float = 5.0):
+        """
+        Args:
+            path: Путь к файлу базы; ":memory:" — для тестов
+            update_interval: Период сохранения изменений, секунды
+        """
+        super().__init__(PersistenceInput(bot_data=False, callback_data=False), update_interval)
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._connection = sqlite3.connect(path, timeout=5, isolation_level=None, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("PRAGMA synchronous=NORMAL")
+            self._connection.executescript(SCHEMA)
+        
+        self._written: Dict[str, Dict[Hashable, Any]] = {table: {} for table in TABLES}
+        self._pending: Dict[str, Dict[Hashable, Optional[str]]] = {table: {} for table in TABLES}
+        self._writer: Optional[asyncio.Task] = None
+        self.transactions = 0
+        self.rows_written = 0
+        self.logger = logging.getLogger(__name__)
+    
+    def pending(self) -> int:
+        """Число изменений, еще не записанных в базу"""
+        return sum(len(changes) for changes in self._pending.values())
+    
+    def _select(self, sql: str, parameters: Tuple = ()) -> List[Tuple]:
+        with self._lock:
+            return self._connection.execute(sql, parameters).fetchall()
+    
+    async def _load(self, table: str, sql: str, parameters: Tuple = ()) -> List[Tuple]:
+        rows = await asyncio.to_thread(self._select, sql, parameters)
+        written = self._written[table]
+        for *key, value in rows:
+            written[tuple(key) if len(key) > 1 else key[0]] = value
+        return rows
+    
+    async def get_conversations(self, name: str) -> Dict[Tuple, object]:
+        rows = await self._load("conversations", "SELECT name, key, state FROM conversations WHERE name = ?", (name,))
+        return {tuple(json.loads(key)): json.loads(state) for _, key, state in rows}
+    
+    async def get_user_data(self) -> Dict[int, Dict]:
+        rows = await self._load("user_data", "SELECT user_id, data FROM user_data")
+        return {user_id: json.loads(data) for user_id, data in rows}
+    
+    async def get_chat_data(self) -> Dict[int, Dict]:
+        rows = await self._load("chat_data", "SELECT chat_id, data FROM chat_data")
+        return {chat_id: json.loads(data) for chat_id, data in rows}
+    
+    async def get_bot_data(self) -> Dict:
+        return {}
+    
+    async def get_callback_data(self) -> None:
+        return None
+    
+    async def update_conversation(self, name: str, key: Tuple, new_state: Optional[object]):
+        state = None if new_state is None else _dumps(new_state)
+        self._stage("conversations", (name, _dumps(list(key))), state)
+    
+    async def update_user_data(self, user_id: int, data: Dict):
+        self._stage("user_data", user_id, _dumps(data) if data else None)
+    
+    async def update_chat_data(self, chat_id: int, data: Dict):
+        self._stage("chat_data", chat_id, _dumps(data) if data else None)
+    
+    async def drop_user_data(self, user_id: int):
+        self._stage("user_data", user_id, None)
+    
+    async def drop_chat_data(self, chat_id: int):
+        self._stage("chat_data", chat_id, None)
+    
+    async def update_bot_data(self, data: Dict):
+        pass
+    
+    async def update_callback_data(self, data: Any):
+        pass
+    
+    async def refresh_user_data(self, user_id: int, user_data: Dict):
+        pass
+    
+    async def refresh_chat_data(self, chat_id: int, chat_data: Dict):
+        pass
+    
+    async def refresh_bot_data(self, bot_data: Dict):
+        pass
+    
+    async def flush(self):
+        """Дописывает оставшиеся изменения и закрывает базу (вызывается PTB при остановке)"""
+        if self._writer:
+            await self._writer
+        await self._write_pending()
+        with self._lock:
+            self._connection.close()
+    
+    def _stage(self, table: str, key: Hashable, value: Optional[str]):
+        """
+        Ставит изменение в очередь записи
+        
+        Args:
+            table: Таблица
+            key: Ключ строки
+            value: Новое значение в JSON; None — удалить строку
+        """
+        pending = self._pending[table]
+        if self._written[table].get(key) == value:
+            pending.pop(key, None)
+            return
+        pending[key] = value
+        # Все изменения одного цикла update_persistence приходят раньше, чем запустится эта задача
+        if self._writer is None or self._writer.done():
+            self._writer = asyncio.create_task(self._write_pending())
+    
+    async def _write_pending(self):
+        while self.pending():
+            batch, self._pending = self._pending, {table: {} for table in TABLES}
+            for table, changes in batch.items():
+                written = self._written[table]
+                for key, value in changes.items():
+                    if value is None:
+                        written.pop(key, None)
+                    else:
+                        written[key] = value
+            try:
+                await asyncio.to_thread(self._write, batch)
+            except Exception as e:
+                self.logger.error(f"Не удалось сохранить состояние: {e}", exc_info=True)
+                for table, changes in batch.items():
+                    for key, value in changes.items():
+                        self._written[table][key] = UNKNOWN
+                        self._pending[table].setdefault(key, value)
+                return
+    
+    def _write(self, batch: Dict[str, Dict[Hashable, Optional[str]]]):
+        """Записывает пачку изменений одной транзакцией"""
+        conversations = batch["conversations"]
+        statements = [
+            ("INSERT OR REPLACE INTO conversations (name, key, state) VALUES (?, ?, ?)",
+             [(name, key, state) for (name, key), state in conversations.items() if state is not None]),
+            ("DELETE FROM conversations WHERE name = ? AND key = ?",
+             [(name, key) for (name, key), state in conversations.items() if state is None]),
+        ]
+        for table, column in (("user_data", "user_id"), ("chat_data", "chat_id")):
+            changes = batch[table]
+            statements.append((f"INSERT OR REPLACE INTO {table} ({column}, data) VALUES (?, ?)",
+                               [(key, data) for key, data in changes.items() if data is not None]))
+            statements.append((f"DELETE FROM {table} WHERE {column} = ?",
+                               [(key,) for key, data in changes.items() if data is None]))
+        
+        started = time.perf_counter()
+        with self._lock:
+            self._connection.execute("BEGIN IMMEDIATE")
+            try:
+                for sql, rows in statements:
+                    if rows:
+                        self._connection.executemany(sql, rows)
+            except Exception:
+                self._connection.execute("ROLLBACK")
+                raise
+            self._connection.execute("COMMIT")
+        self.transactions += 1
+        self.rows_written += sum(len(changes) for changes in batch.values())
+        PERSISTENCE_WRITE_LATENCY.observe(time.perf_counter() - started)
+        for table, changes in batch.items():
+            if changes:
+                PERSISTENCE_ROWS.labels(table).inc(len(changes))
@@ -0,0 +1,302 @@
+import asyncio
+import logging
+import os
+import signal
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from dataclasses import fields, is_dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+
+def _frame_label(frame: Any) -> str:
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+
+class SamplingProfiler:
+    """Периодически снимает стек одного потока из фонового потока"""
+    
+    def __init__(self, interval: float = 0.005, max_depth: int = 64):
+        """
+        Args:
+            interval: Период выборки в секундах
+            max_depth: Максимальная глубина сохраняемого стека
+        """
+        self.interval = interval
+        self.max_depth = max_depth
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.started_at = 0.0
+        self.stopped_at = 0.0
+        self._target: Optional[int] = None
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+    
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+    
+    def start(self, thread_id: Optional[int] = None):
+        """
+        Запускает выборку
+        
+        Args:
+            thread_id: Поток, стек которого снимается; по умолчанию вызывающий (поток цикла событий)
+        """
+        if self.running:
+            return
+        self._target = thread_id or threading.get_ident()
+        self.stacks.clear()
+        self.samples = 0
+        self.started_at = time.monotonic()
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name="cpu-profiler", daemon=True)
+        self._thread.start()
+    
+    def stop(self):
+        """Останавливает выборку"""
+        if not self.running:
+            return
+        self._stopped.set()
+        self._thread.join()
+        self._thread = None
+        self.stopped_at = time.monotonic()
+    
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self._target)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None and len(stack) < self.max_depth:
+                stack.append(_frame_label(frame))
+                frame = frame.f_back
+            self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+    
+    def collapsed(self) -> str:
+        """Стеки в свернутом формате (flamegraph.pl, speedscope)"""
+        return "\n".join(f"{stack} {count}" for stack, count in self.stacks.most_common()) + "\n"
+    
+    def top_functions(self, limit: int) -> List[Tuple[str, int, int]]:
+        """
+        Функции, в которых поток чаще всего находился сам (а не в вызываемых ими функциях)
+        
+        Args:
+            limit: Количество строк
+        
+        Returns:
+            List[Tuple[str, int, int]]: (функция, собственные выборки, выборки со вложенными вызовами)
+        """
+        own: Counter = Counter()
+        total: Counter = Counter()
+        for stack, count in self.stacks.items():
+            frames = stack.split(";")
+            own[frames[-1]] += count
+            for label in set(frames):
+                total[label] += count
+        return [(label, count, total[label]) for label, count in own.most_common(limit)]
+
+
+def deep_sizeof(obj: Any, seen: Optional[set] = None) -> int:
+    """
+    Приблизительный объем памяти объекта вместе с вложенными контейнерами и dataclass-полями
+    
+    Args:
+        obj: Объект
+        seen: Уже посчитанные объекты (общие объекты считаются один раз)
+    
+    Returns:
+        int: Размер в байтах
+    """
+    seen = set() if seen is None else seen
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deep_sizeof(key, seen) + deep_sizeof(value, seen) for key, value in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(deep_sizeof(item, seen) for item in obj)
+    elif is_dataclass(obj) and not isinstance(obj, type):
+        size += sum(deep_sizeof(getattr(obj, field.name), seen) for field in fields(obj))
+    return size
+
+
+def lobby_memory(lobbies: Dict[str, Any]) -> List[Tuple[str, int, int, str]]:
+    """
+    Объем памяти каждого лобби, от большего к меньшему
+    
+    Args:
+        lobbies: Реестр лобби
+    
+    Returns:
+        List[Tuple[str, int, int, str]]: (ID лобби, байты, число игроков, состояние)
+    """
+    report = []
+    for lobby_id, lobby in list(lobbies.items()):
+        # Перечисления общие для всех лобби, их размер не относится к конкретному лобби
+        seen = {id(lobby.game_mode), id(lobby.game_state)}
+        report.append((lobby_id, deep_sizeof(lobby, seen), len(lobby.players), lobby.game_state.name))
+    report.sort(key=lambda item: item[1], reverse=True)
+    return report
+
+
+class Profiler:
+    """Профилирование по запросу администратора; результаты пишутся в каталог"""
+    
+    # Снимок и сравнение tracemalloc, остановка выборки и запись файлов занимают
+    # сотни миллисекунд на большом процессе, поэтому идут в потоке, а не в цикле событий.
+    # В цикле остается только обход лобби: их меняют обработчики, и читать их из
+    # другого потока небезопасно. _lock не дает двум командам менять состояние одновременно
+    
+    def __init__(self, output_dir: str, lobbies: Dict[str, Any], top_n: int = 15, interval: float = 0.005):
+        """
+        Args:
+            output_dir: Каталог для файлов профилей
+            lobbies: Реестр лобби для отчета о памяти
+            top_n: Число строк в сводках
+            interval: Период выборки CPU-профилировщика
+        """
+        self.output_dir = output_dir
+        self.lobbies = lobbies
+        self.top_n = top_n
+        self.cpu = SamplingProfiler(interval)
+        self._last_snapshot: Optional[tracemalloc.Snapshot] = None
+        self._sequence = 0
+        self._lock = threading.Lock()
+        self.logger = logging.getLogger(__name__)
+    
+    def _path(self, kind: str, extension: str) -> str:
+        os.makedirs(self.output_dir, exist_ok=True)
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        self._sequence += 1
+        return os.path.join(self.output_dir, f"{kind}-{stamp}-{os.getpid()}-{self._sequence}.{extension}")
+    
+    def start_cpu(self) -> str:
+        """Запускает CPU-профилировщик для потока цикла событий (вызывается из этого потока)"""
+        if self.cpu.running:
+            return "CPU-профилирование уже запущено"
+        self.cpu.start()
+        self.logger.info("CPU-профилирование запущено")
+        return "CPU-профилирование запущено"
+    
+    async def stop_cpu(self) -> str:
+        """Останавливает CPU-профилировщик и сохраняет свернутые стеки"""
+        return await asyncio.to_thread(self._stop_cpu)
+    
+    def _stop_cpu(self) -> str:
+        with self._lock:
+            if not self.cpu.running:
+                return "CPU-профилирование не запущено"
+            self.cpu.stop()
+            path = self._path("cpu", "folded")
+            with open(path, "w", encoding="utf-8") as file:
+                file.write(self.cpu.collapsed())
+            
+            duration = self.cpu.stopped_at - self.cpu.started_at
+            lines = [f"CPU-профиль: {self.cpu.samples} выборок за {duration:.1f}с, файл {path}", "собств. / всего, функция:"]
+            for label, own, total in self.cpu.top_functions(self.top_n):
+                lines.append(f"{own} / {total}  {label}")
+        self.logger.info(f"CPU-профиль сохранен: {path}")
+        return "\n".join(lines)
+    
+    async def toggle_cpu(self) -> str:
+        """Запускает или останавливает CPU-профилировщик"""
+        return await self.stop_cpu() if self.cpu.running else self.start_cpu()
+    
+    async def memory_snapshot(self) -> str:
+        """
+        Снимает снимок tracemalloc и сравнивает его с предыдущим
+        
+        Первый вызов включает tracemalloc, поэтому учитываются только выделения после него.
+        """
+        return await asyncio.to_thread(self._memory_snapshot)
+    
+    def _memory_snapshot(self) -> str:
+        with self._lock:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._last_snapshot = None
+            snapshot = tracemalloc.take_snapshot().filter_traces([
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            ])
+            
+            if self._last_snapshot is None:
+                title = "Снимок памяти (база для следующего сравнения)"
+                statistics = [str(stat) for stat in snapshot.statistics("lineno")[:self.top_n]]
+            else:
+                title = "Изменение памяти с предыдущего снимка"
+                statistics = [str(stat) for stat in snapshot.compare_to(self._last_snapshot, "lineno")[:self.top_n]]
+            self._last_snapshot = snapshot
+            
+            current, peak = tracemalloc.get_traced_memory()
+            lines = [f"{title}: отслеживается {current / 1024:.0f} КБ, пик {peak / 1024:.0f} КБ"] + statistics
+            path = self._path("memory", "txt")
+            with open(path, "w", encoding="utf-8") as file:
+                file.write("\n".join(lines) + "\n")
+        self.logger.info(f"Снимок памяти сохранен: {path}")
+        return "\n".join(lines[:1] + [f"файл {path}"] + lines[1:])
+    
+    async def stop_memory(self) -> str:
+        """Выключает tracemalloc"""
+        return await asyncio.to_thread(self._stop_memory)
+    
+    def _stop_memory(self) -> str:
+        with self._lock:
+            tracemalloc.stop()
+            self._last_snapshot = None
+        return "Отслеживание памяти выключено"
+    
+    async def lobby_report(self) -> str:
+        """Сохраняет отчет об объеме памяти каждого лобби"""
+        report = lobby_memory(self.lobbies)
+        return await asyncio.to_thread(self._write_lobby_report, report)
+    
+    def _write_lobby_report(self, report: List[Tuple[str, int, int, str]]) -> str:
+        total = sum(size for _, size, _, _ in report)
+        lines = [f"Лобби: {len(report)}, всего {total / 1024:.1f} КБ", "лобби, байт, игроков, состояние:"]
+        lines += [f"{lobby_id} {size} {players} {state}" for lobby_id, size, players, state in report]
+        with self._lock:
+            path = self._path("lobbies", "txt")
+            with open(path, "w", encoding="utf-8") as file:
+                file.write("\n".join(lines) + "\n")
+        return "\n".join(lines[:2] + [f"файл {path}"] + lines[2:2 + self.top_n])
+
+
+def install_signal_handlers(loop: Any, profiler: Profiler) -> bool:
+    """
+    Подключает сигналы: SIGUSR1 включает и выключает CPU-профилирование,
+    SIGUSR2 снимает память и отчет по лобби
+    
+    Args:
+        loop: Цикл событий бота
+        profiler: Профилировщик
+    
+    Returns:
+        bool: Подключены ли сигналы (на Windows их нет)
+    """
+    if not hasattr(signal, "SIGUSR1"):
+        return False
+    
+    tasks = set()
+    
+    def spawn(action):
+        def handler():
+            # Цикл событий хранит только слабые ссылки на задачи
+            task = loop.create_task(action())
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        return handler
+    
+    async def on_memory_signal():
+        await profiler.memory_snapshot()
+        await profiler.lobby_report()
+    
+    loop.add_signal_handler(signal.SIGUSR1, spawn(profiler.toggle_cpu))
+    loop.add_signal_handler(signal.SIGUSR2, spawn(on_memory_signal))
+    return True
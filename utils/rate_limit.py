@@ -0,0 +1,147 @@
+import time
+from typing import Callable
+
+
+class TokenBucket:
+    """Корзина токенов для ограничения частоты запросов"""
+    
+    def __init__(self, capacity: float, refill_per_second: float, clock: Callable[[], float] = time.monotonic):
+        """
+        Args:
+            capacity: Максимальное число токенов в корзине
+            refill_per_second: Скорость пополнения корзины
+            clock: Монотонные часы
+        """
+        self.capacity = float(capacity)
+        self.refill_per_second = float(refill_per_second)
+        self._clock = clock
+        self._tokens = float(capacity)
+        self._updated_at = clock()
+    
+    @classmethod
+    def per_minute(cls, limit: float, clock: Callable[[], float] = time.monotonic) -> "TokenBucket":
+        """Создает корзину с лимитом на минуту"""
+        return cls(limit, limit / 60.0, clock)
+    
+    def _refill(self):
+        now = self._clock()
+        elapsed = now - self._updated_at
+        if elapsed > 0:
+            self._tokens = min(self.capacity, self._tokens + elapsed * self.refill_per_second)
+            self._updated_at = now
+    
+    @property
+    def tokens(self) -> float:
+        """Доступное сейчас число токенов"""
+        self._refill()
+        return self._tokens
+    
+    def can_consume(self, amount: float = 1.0) -> bool:
+        """Хватает ли токенов без их списания"""
+        return self.tokens >= amount
+    
+    def try_consume(self, amount: float = 1.0) -> bool:
+        """
+        Списывает токены, если их достаточно
+        
+        Args:
+            amount: Количество токенов
+        
+        Returns:
+            bool: Были ли списаны токены
+        """
+        self._refill()
+        if self._tokens >= amount:
+            self._tokens -= amount
+            return True
+        return False
+    
+    def refund(self, amount: float):
+        """Возвращает неиспользованные токены"""
+        self._refill()
+        self._tokens = min(self.capacity, self._tokens + amount)
+    
+    def time_until(self, amount: float = 1.0) -> float:
+        """Через сколько секунд станет доступно amount токенов"""
+        missing = amount - self.tokens
+        if missing <= 0:
+            return 0.0
+        if self.refill_per_second <= 0:
+            return float("inf")
+        return missing / self.refill_per_second
+    
+    def utilization(self) -> float:
+        """Доля израсходованной емкости от 0 до 1"""
+        if self.capacity <= 0:
+            return 1.0
+        return 1.0 - self.tokens / self.capacity
+
+
+class SlidingWindowCounter:
+    """Скользящее окно из двух фиксированных: хранит два числа вместо журнала событий"""
+    
+    __slots__ = ("window", "_clock", "_started_at", "_current", "_previous")
+    
+    def __init__(self, window: float, clock: Callable[[], float] = time.monotonic):
+        """
+        Args:
+            window: Длина окна в секундах
+            clock: Монотонные часы
+        """
+        self.window = float(window)
+        self._clock = clock
+        self._started_at = clock()
+        self._current = 0.0
+        self._previous = 0.0
+    
+    def _roll(self) -> float:
+        now = self._clock()
+        passed = int((now - self._started_at) // self.window)
+        if passed > 0:
+            self._previous = self._current if passed == 1 else 0.0
+            self._current = 0.0
+            self._started_at += passed * self.window
+        return now
+    
+    def count(self) -> float:
+        """Оценка суммы за последнее окно: предыдущее окно учитывается пропорционально перекрытию"""
+        now = self._roll()
+        overlap = 1.0 - (now - self._started_at) / self.window
+        return self._previous * overlap + self._current
+    
+    def add(self, amount: float = 1.0):
+        """Учитывает событие"""
+        self._roll()
+        self._current += amount
+    
+    def time_until(self, limit: float, amount: float = 1.0) -> float:
+        """
+        Через сколько секунд в окне освободится место
+        
+        Args:
+            limit: Лимит на окно
+            amount: Размер события
+        
+        Returns:
+            float: 0, если count() + amount уже не превышает limit
+        """
+        threshold = limit - amount
+        if threshold < 0:
+            return float("inf")
+        
+        now = self._roll()
+        offset = now - self._started_at
+        if self._previous * (1.0 - offset / self.window) + self._current <= threshold:
+            return 0.0
+        
+        if self._current <= threshold:
+            # Хватит части текущего окна: вклад предыдущего убывает линейно
+            needed = self.window * (1.0 - (threshold - self._current) / self._previous)
+            return max(0.0, needed - offset)
+        
+        # Текущее окно станет предыдущим и будет убывать уже в следующем
+        return self.window - offset + self.window * (1.0 - threshold / self._current)
+    
+    def is_idle(self) -> bool:
+        """Пусто ли окно (счетчик можно удалить)"""
+        return self.count() <= 0
@@ -0,0 +1,473 @@
+import asyncio
+import logging
+import os
+import re
+import secrets
+import signal
+import subprocess
+import sys
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+from telegram import Bot, Update
+
+from utils.http_server import HTTPServer, Request, Response
+from utils.metrics import SHARD_HANDOFFS, SHARD_ROUTED, WEBHOOK_UPDATES
+from utils.sharding import OwnershipStore, shard_for
+from utils.update_processing import KeyedLock
+from utils.webhook import SECRET_HEADER, check_secret
+
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# generate_lobby_id: первые 8 символов uuid4
+LOBBY_ID_PATTERN = re.compile(r"[0-9a-f]{8}")
+
+# Маршруты пользователей и владельцы лобби кешируются в памяти маршрутизатора
+ROUTE_CACHE_TTL = 5.0
+ROUTE_CACHE_SIZE = 100_000
+
+
+def user_of(update: Dict[str, Any]) -> Optional[int]:
+    """ID пользователя из сырого обновления Telegram (или ID чата, если пользователя нет)"""
+    for key, value in update.items():
+        if key == "update_id" or not isinstance(value, dict):
+            continue
+        sender = value.get("from") or value.get("user")
+        if sender:
+            return sender["id"]
+        chat = value.get("chat") or value.get("message", {}).get("chat")
+        if chat:
+            return chat["id"]
+    return None
+
+
+def mentioned_lobby(update: Dict[str, Any]) -> Optional[str]:
+    """Лобби, к которому пользователь просит присоединиться: /join ID или ID отдельным сообщением"""
+    text = (update.get("message") or {}).get("text", "").strip()
+    if text.startswith("/"):
+        parts = text.split()
+        if parts[0].split("@")[0] == "/join" and len(parts) == 2 and LOBBY_ID_PATTERN.fullmatch(parts[1]):
+            return parts[1]
+        return None
+    return text if LOBBY_ID_PATTERN.fullmatch(text) else None
+
+
+class ShardRouter:
+    """Принимает вебхук Telegram и пересылает обновления рабочим процессам по лобби или пользователю"""
+    
+    # Правила по порядку: игрок лобби -> процесс-владелец лобби; просьба войти в лобби
+    # другого процесса -> перенос профиля пользователя туда; иначе -> закрепленный за пользователем
+    # процесс или crc32(user_id) % N
+    #
+    # Хранилище — синхронный SQLite, который может ждать блокировку файла до 5 с, поэтому
+    # обращения к нему идут в потоке, а маршруты кешируются на ROUTE_CACHE_TTL. Устаревшая
+    # запись безопасна: пользователь и его лобби живут на одном процессе, а переносы между
+    # процессами выполняет сам маршрутизатор и сразу обновляет кеш. Отсутствие владельца
+    # не кешируется, чтобы вход в только что созданное лобби не ждал истечения записи
+    
+    def __init__(
+        self,
+        store: OwnershipStore,
+        workers: List[str],
+        worker_secret: str,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        path: str = "telegram",
+        secret_token: str = "",
+        timeout: float = 10.0,
+    ):
+        """
+        Args:
+            store: Общее хранилище владения
+            workers: Базовые URL рабочих процессов по номеру
+            worker_secret: Секрет вебхука рабочих процессов
+            host: Адрес для прослушивания
+            port: Порт, 0 означает любой свободный
+            path: Путь вебхука (одинаковый у маршрутизатора и процессов)
+            secret_token: Секрет вебхука Telegram; пустая строка отключает проверку
+            timeout: Таймаут запросов к рабочим процессам
+        """
+        self.store = store
+        self.workers = workers
+        self.worker_secret = worker_secret
+        self.path = "/" + path.strip("/")
+        self.secret_token = secret_token
+        self.server = HTTPServer(host, port)
+        self.server.route("POST", self.path, self._handle)
+        if secret_token:
+            # Служебные маршруты доступны только с секретом вебхука
+            self.server.route("GET", "/shard/status", self._status)
+            self.server.route("POST", "/shard/lobbies/{lobby_id}/move", self._move)
+        self.client = httpx.AsyncClient(timeout=timeout, headers={SECRET_HEADER: worker_secret})
+        self._locks = KeyedLock()
+        self._moving: Dict[str, asyncio.Event] = {}
+        self._routes: Dict[int, Tuple[float, Optional[Tuple[int, Optional[str]]]]] = {}
+        self._owners: Dict[str, Tuple[float, int]] = {}
+        self.logger = logging.getLogger(__name__)
+    
+    @property
+    def url(self) -> str:
+        """Локальный адрес приема обновлений"""
+        return f"{self.server.url}{self.path}"
+    
+    async def start(self):
+        await self.server.start()
+    
+    async def stop(self):
+        await self.server.stop()
+        await self.client.aclose()
+    
+    @staticmethod
+    def _remember(cache: Dict, key: Any, value: Any):
+        now = time.monotonic()
+        if len(cache) >= ROUTE_CACHE_SIZE:
+            for stale in [cached for cached, (expires, _) in cache.items() if expires <= now]:
+                del cache[stale]
+            if len(cache) >= ROUTE_CACHE_SIZE:
+                cache.clear()
+        cache[key] = (now + ROUTE_CACHE_TTL, value)
+    
+    async def _user_route(self, user_id: int) -> Optional[Tuple[int, Optional[str]]]:
+        cached = self._routes.get(user_id)
+        if cached and cached[0] > time.monotonic():
+            return cached[1]
+        route = await asyncio.to_thread(self.store.user_route, user_id)
+        self._remember(self._routes, user_id, route)
+        return route
+    
+    async def _find_owner(self, lobby_id: str) -> Optional[int]:
+        cached = self._owners.get(lobby_id)
+        if cached and cached[0] > time.monotonic():
+            return cached[1]
+        owner = await asyncio.to_thread(self.store.lobby_owner, lobby_id)
+        if owner is not None:
+            self._remember(self._owners, lobby_id, owner)
+        return owner
+    
+    async def _lobby_owner(self, lobby_id: str) -> int:
+        owner = await self._find_owner(lobby_id)
+        return owner if owner is not None else shard_for(lobby_id, len(self.workers))
+    
+    async def route(self, update: Dict[str, Any], user_id: int) -> Tuple[int, str]:
+        """
+        Выбирает процесс для обновления
+        
+        Args:
+            update: Сырое обновление Telegram
+            user_id: Отправитель
+        
+        Returns:
+            Tuple[int, str]: Номер процесса и сработавшее правило (lobby, join, pinned, user)
+        """
+        route = await self._user_route(user_id)
+        if route and route[1]:
+            return await self._lobby_owner(route[1]), "lobby"
+        
+        home = route[0] if route else shard_for(user_id, len(self.workers))
+        lobby_id = mentioned_lobby(update)
+        if lobby_id:
+            if lobby_id in self._moving:
+                await self._moving[lobby_id].wait()
+            owner = await self._find_owner(lobby_id)
+            if owner is not None and owner != home:
+                await self._hand_off_user(user_id, home, owner)
+                return owner, "join"
+        return home, "pinned" if route else "user"
+    
+    async def _hand_off_user(self, user_id: int, source: int, target: int):
+        """Переносит профиль пользователя (имя) на процесс лобби, к которому он присоединяется"""
+        state = None
+        outcome = "ok"
+        try:
+            response = await self.client.post(f"{self.workers[source]}/shard/users/{user_id}/export")
+            response.raise_for_status()
+            state = response.json()["state"]
+            response = await self.client.post(f"{self.workers[target]}/shard/users/{user_id}/import", json={"state": state})
+            response.raise_for_status()
+        except httpx.HTTPError as e:
+            # Без профиля процесс лобби просто спросит имя еще раз
+            outcome = "failed"
+            self.logger.warning(f"Не удалось перенести пользователя {user_id} с процесса {source} на {target}: {e!r}")
+        await asyncio.to_thread(self.store.pin_user, user_id, target)
+        self._remember(self._routes, user_id, (target, None))
+        SHARD_HANDOFFS.labels("user", outcome).inc()
+    
+    async def _handle(self, request: Request) -> Response:
+        if not check_secret(request, self.secret_token):
+            WEBHOOK_UPDATES.labels("forbidden").inc()
+            return Response.text("forbidden", status=403)
+        try:
+            update = request.json()
+        except ValueError:
+            update = None
+        if not isinstance(update, dict):
+            WEBHOOK_UPDATES.labels("invalid").inc()
+            return Response.text("bad request", status=400)
+        
+        user_id = user_of(update)
+        if user_id is None:
+            worker, rule = shard_for(update.get("update_id", 0), len(self.workers)), "other"
+            return await self._forward(worker, rule, request.body)
+        
+        # Проверка переноса и регистрация в KeyedLock идут без await между ними,
+        # поэтому перенос лобби дожидается всех уже начатых пересылок его игроков
+        while True:
+            route = await self._user_route(user_id)
+            event = self._moving.get(route[1]) if route and route[1] else None
+            if event is None:
+                break
+            await event.wait()
+        
+        async with self._locks.hold(user_id):
+            worker, rule = await self.route(update, user_id)
+            return await self._forward(worker, rule, request.body)
+    
+    async def _forward(self, worker: int, rule: str, body: bytes) -> Response:
+        try:
+            response = await self.client.post(
+                f"{self.workers[worker]}{self.path}", content=body, headers={"Content-Type": "application/json"}
+            )
+        except httpx.HTTPError as e:
+            self.logger.error(f"Процесс {worker} недоступен: {e!r}")
+            # Telegram повторит доставку
+            return Response.text("worker unavailable", status=503)
+        SHARD_ROUTED.labels(str(worker), rule).inc()
+        WEBHOOK_UPDATES.labels("accepted").inc()
+        return Response.text(response.text, status=response.status_code)
+    
+    async def _status(self, request: Request) -> Response:
+        if not check_secret(request, self.secret_token):
+            return Response.text("forbidden", status=403)
+        counts = await asyncio.to_thread(self.store.lobby_counts)
+        workers = []
+        for index, url in enumerate(self.workers):
+            status = {"worker": index, "url": url, "lobbies": counts.get(index, 0), "cpu_seconds": None}
+            try:
+                response = await self.client.get(f"{url}/shard/status")
+                response.raise_for_status()
+                status["cpu_seconds"] = response.json()["cpu_seconds"]
+            except httpx.HTTPError as e:
+                self.logger.warning(f"Процесс {index} не ответил на запрос состояния: {e!r}")
+            workers.append(status)
+        return Response.json({"workers": workers})
+    
+    async def _move(self, request: Request) -> Response:
+        if not check_secret(request, self.secret_token):
+            return Response.text("forbidden", status=403)
+        try:
+            target = int(request.query["worker"])
+            if not 0 <= target < len(self.workers):
+                raise ValueError(target)
+            moved = await self.move_lobby(request.params["lobby_id"], target)
+        except (KeyError, ValueError):
+            return Response.json({"error": "unknown lobby or worker"}, status=404)
+        except httpx.HTTPError as e:
+            return Response.json({"error": repr(e)}, status=502)
+        return Response.json({"moved": moved}, status=200 if moved else 409)
+    
+    async def move_lobby(self, lobby_id: str, target: int) -> bool:
+        """
+        Переносит лобби вместе с игроками на другой процесс
+        
+        На время переноса обновления игроков лобби придерживаются маршрутизатором.
+        
+        Args:
+            lobby_id: ID лобби
+            target: Номер процесса назначения
+        
+        Returns:
+            bool: True, если лобби перенесено; False, если процесс-владелец отказал (например, идет раунд)
+        """
+        source = await self._find_owner(lobby_id)
+        if source is None:
+            raise KeyError(lobby_id)
+        if source == target or lobby_id in self._moving:
+            return source == target
+        
+        event = self._moving[lobby_id] = asyncio.Event()
+        try:
+            members = await asyncio.to_thread(self.store.lobby_members, lobby_id)
+            # Игроки, чей маршрут закеширован до входа в лобби, тоже придерживаются
+            for user_id in members:
+                self._remember(self._routes, user_id, (source, lobby_id))
+            while any(self._locks.busy(user_id) for user_id in members):
+                await asyncio.sleep(0.005)
+            
+            response = await self.client.post(f"{self.workers[source]}/shard/lobbies/{lobby_id}/export")
+            if response.status_code != 200:
+                self.logger.warning(f"Процесс {source} отказал в переносе лобби {lobby_id}: {response.text}")
+                SHARD_HANDOFFS.labels("lobby", "refused").inc()
+                return False
+            state = response.json()
+            
+            try:
+                response = await self.client.post(f"{self.workers[target]}/shard/lobbies/{lobby_id}/import", json=state)
+                response.raise_for_status()
+            except httpx.HTTPError as e:
+                # Возвращаем лобби владельцу, чтобы не потерять игру
+                self.logger.error(f"Процесс {target} не принял лобби {lobby_id}: {e!r}")
+                await self.client.post(f"{self.workers[source]}/shard/lobbies/{lobby_id}/import", json=state)
+                SHARD_HANDOFFS.labels("lobby", "failed").inc()
+                return False
+            
+            await asyncio.to_thread(self.store.move_lobby, lobby_id, target)
+            self._remember(self._owners, lobby_id, target)
+            for user_id in members:
+                self._remember(self._routes, user_id, (target, lobby_id))
+            SHARD_HANDOFFS.labels("lobby", "ok").inc()
+            self.logger.info(f"Лобби {lobby_id} перенесено с процесса {source} на {target}")
+            return True
+        finally:
+            del self._moving[lobby_id]
+            event.set()
+
+
+class ShardSupervisor:
+    """Запускает рабочие процессы main.py и перезапускает упавшие"""
+    
+    def __init__(self, count: int, base_port: int, worker_secret: str, env: Optional[Dict[str, str]] = None, restart_delay: float = 1.0):
+        """
+        Args:
+            count: Число рабочих процессов
+            base_port: Порт процесса 0; процесс i слушает base_port + i
+            worker_secret: Секрет вебхука рабочих процессов
+            env: Переменные окружения процессов поверх текущих
+            restart_delay: Пауза перед перезапуском упавшего процесса
+        """
+        self.count = count
+        self.base_port = base_port
+        self.worker_secret = worker_secret
+        self.env = env or {}
+        self.restart_delay = restart_delay
+        self.processes: List[Optional[subprocess.Popen]] = [None] * count
+        self._monitor: Optional[asyncio.Task] = None
+        self.logger = logging.getLogger(__name__)
+    
+    @property
+    def urls(self) -> List[str]:
+        return [f"http://127.0.0.1:{self.base_port + index}" for index in range(self.count)]
+    
+    def _spawn(self, index: int) -> subprocess.Popen:
+        env = dict(os.environ, **self.env)
+        env.update(
+            BOT_MODE="worker",
+            SHARD_INDEX=str(index),
+            WEBHOOK_HOST="127.0.0.1",
+            WEBHOOK_PORT=str(self.base_port + index),
+            WEBHOOK_URL="",
+            WEBHOOK_SECRET_TOKEN=self.worker_secret,
+        )
+        # Служебные эндпоинты процессов сдвигаются, чтобы не конфликтовать с маршрутизатором
+        for name in ("METRICS_PORT", "HEALTH_PORT"):
+            port = int(env.get(name, "0") or 0)
+            env[name] = str(port + 1 + index) if port > 0 else "0"
+        return subprocess.Popen([sys.executable, "main.py"], cwd=PROJECT_ROOT, env=env)
+    
+    def start(self):
+        """Запускает процессы и наблюдение за ними"""
+        for index in range(self.count):
+            self.processes[index] = self._spawn(index)
+        self._monitor = asyncio.create_task(self._watch())
+    
+    def alive(self) -> bool:
+        """Все ли процессы работают"""
+        return all(process is not None and process.poll() is None for process in self.processes)
+    
+    async def _watch(self):
+        while True:
+            await asyncio.sleep(self.restart_delay)
+            for index, process in enumerate(self.processes):
+                if process is not None and process.poll() is not None:
+                    self.logger.error(f"Рабочий процесс {index} завершился с кодом {process.returncode}, перезапуск")
+                    self.processes[index] = self._spawn(index)
+    
+    async def wait_ready(self, timeout: float = 60.0):
+        """Ждет, пока все процессы начнут принимать обновления"""
+        loop = asyncio.get_running_loop()
+        expires_at = loop.time() + timeout
+        async with httpx.AsyncClient(headers={SECRET_HEADER: self.worker_secret}) as client:
+            for url in self.urls:
+                while True:
+                    try:
+                        if (await client.get(f"{url}/shard/status")).status_code == 200:
+                            break
+                    except httpx.HTTPError:
+                        pass
+                    if loop.time() > expires_at:
+                        raise TimeoutError(f"Рабочий процесс {url} не запустился за {timeout} с")
+                    await asyncio.sleep(0.1)
+    
+    async def stop(self, timeout: float = 10.0):
+        """Останавливает процессы (SIGTERM, затем SIGKILL)"""
+        if self._monitor:
+            self._monitor.cancel()
+        for process in self.processes:
+            if process is not None and process.poll() is None:
+                process.terminate()
+        for process in self.processes:
+            if process is None:
+                continue
+            try:
+                await asyncio.to_thread(process.wait, timeout)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+
+async def run_sharded(
+    token: str,
+    base_url: str,
+    workers: int,
+    base_port: int,
+    store_path: str,
+    host: str,
+    port: int,
+    path: str,
+    public_url: str,
+    secret_token: str,
+    stop_event: Optional[asyncio.Event] = None,
+    env: Optional[Dict[str, str]] = None,
+):
+    """
+    Многопроцессный режим: маршрутизатор вебхука в этом процессе и N рабочих процессов бота
+    
+    Args:
+        token: Токен бота
+        base_url: Базовый URL Bot API (пустая строка — api.telegram.org)
+        workers: Число рабочих процессов
+        base_port: Порт первого рабочего процесса
+        store_path: Файл SQLite с владением лобби
+        host: Адрес маршрутизатора
+        port: Порт маршрутизатора
+        path: Путь вебхука
+        public_url: Внешний адрес вебхука для setWebhook; пустая строка — не регистрировать
+        secret_token: Секрет вебхука Telegram
+        stop_event: Событие остановки; по умолчанию SIGINT и SIGTERM
+        env: Дополнительные переменные окружения рабочих процессов
+    """
+    logger = logging.getLogger(__name__)
+    loop = asyncio.get_running_loop()
+    if stop_event is None:
+        stop_event = asyncio.Event()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, stop_event.set)
+    
+    store = OwnershipStore(store_path)
+    worker_secret = secrets.token_urlsafe(24)
+    supervisor = ShardSupervisor(workers, base_port, worker_secret, dict(env or {}, SHARD_STORE=store_path, WEBHOOK_PATH=path))
+    router = ShardRouter(store, supervisor.urls, worker_secret, host, port, path, secret_token)
+    supervisor.start()
+    try:
+        await supervisor.wait_ready()
+        await router.start()
+        if public_url:
+            bot = Bot(token, base_url=base_url) if base_url else Bot(token)
+            async with bot:
+                await bot.set_webhook(url=public_url, secret_token=secret_token or None, allowed_updates=Update.ALL_TYPES)
+        logger.info(f"Маршрутизатор принимает обновления на {router.url} для {workers} процессов")
+        await stop_event.wait()
+    finally:
+        await router.stop()
+        await supervisor.stop()
+        store.close()
@@ -0,0 +1,352 @@
+import asyncio
+import logging
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from telegram.ext import Application
+
+from models import GameState, Lobby, lobbies, user_states, user_to_lobby
+from utils.http_server import Request, Response
+from utils.metrics import SHARD_STORE_WRITE_LATENCY
+from utils.update_processing import DrainMarker
+from utils.webhook import WebhookServer
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS lobbies (
+    lobby_id TEXT PRIMARY KEY,
+    worker INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS users (
+    user_id INTEGER PRIMARY KEY,
+    worker INTEGER NOT NULL,
+    lobby_id TEXT
+);
+CREATE INDEX IF NOT EXISTS users_by_lobby ON users (lobby_id);
+"""
+
+CLAIM_LOBBY = "INSERT INTO lobbies (lobby_id, worker) VALUES (?, ?) ON CONFLICT (lobby_id) DO UPDATE SET worker = excluded.worker"
+RELEASE_LOBBY = "DELETE FROM lobbies WHERE lobby_id = ?"
+BIND_USER = (
+    "INSERT INTO users (user_id, worker, lobby_id) VALUES (?, ?, ?) "
+    "ON CONFLICT (user_id) DO UPDATE SET worker = excluded.worker, lobby_id = excluded.lobby_id"
+)
+UNBIND_USER = "UPDATE users SET lobby_id = NULL WHERE user_id = ?"
+
+
+def shard_for(key: Any, workers: int) -> int:
+    """
+    Номер процесса по ключу
+    
+    Используется crc32, а не hash(): хеш строк в Python зависит от процесса.
+    
+    Args:
+        key: ID пользователя или лобби
+        workers: Число рабочих процессов
+    
+    Returns:
+        int: Номер процесса от 0 до workers - 1
+    """
+    return zlib.crc32(str(key).encode("utf-8")) % workers
+
+
+class OwnershipStore:
+    """Общее для всех процессов хранилище владения лобби и привязки пользователей (SQLite)"""
+    
+    def __init__(self, path: str):
+        """
+        Args:
+            path: Путь к файлу базы; ":memory:" — для тестов в одном процессе
+        """
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._connection = sqlite3.connect(path, timeout=5, isolation_level=None, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("PRAGMA synchronous=NORMAL")
+            self._connection.executescript(SCHEMA)
+    
+    def close(self):
+        self._connection.close()
+    
+    def _execute(self, sql: str, parameters: Tuple = ()) -> List[Tuple]:
+        with self._lock:
+            return self._connection.execute(sql, parameters).fetchall()
+    
+    def _transaction(self, statements: List[Tuple[str, Tuple]]):
+        with self._lock:
+            self._connection.execute("BEGIN IMMEDIATE")
+            try:
+                for sql, parameters in statements:
+                    self._connection.execute(sql, parameters)
+            except Exception:
+                self._connection.execute("ROLLBACK")
+                raise
+            self._connection.execute("COMMIT")
+    
+    def write_worker_changes(self, worker: int, lobby_changes: Dict[str, bool], user_changes: Dict[int, Optional[str]]):
+        """
+        Записывает накопленные изменения процесса одной транзакцией
+        
+        Args:
+            worker: Номер процесса
+            lobby_changes: Лобби -> True (лобби процесса) или False (удалено)
+            user_changes: Пользователь -> лобби или None (вышел из лобби)
+        """
+        statements = []
+        for lobby_id, owned in lobby_changes.items():
+            if owned:
+                statements.append((CLAIM_LOBBY, (lobby_id, worker)))
+            else:
+                statements.append((RELEASE_LOBBY, (lobby_id,)))
+        for user_id, lobby_id in user_changes.items():
+            if lobby_id is None:
+                statements.append((UNBIND_USER, (user_id,)))
+            else:
+                statements.append((BIND_USER, (user_id, worker, lobby_id)))
+        self._transaction(statements)
+    
+    def lobby_owner(self, lobby_id: str) -> Optional[int]:
+        """Процесс, владеющий лобби, или None, если лобби не зарегистрировано"""
+        rows = self._execute("SELECT worker FROM lobbies WHERE lobby_id = ?", (lobby_id,))
+        return rows[0][0] if rows else None
+    
+    def claim_lobby(self, lobby_id: str, worker: int):
+        """Регистрирует лобби за процессом"""
+        self._execute(CLAIM_LOBBY, (lobby_id, worker))
+    
+    def release_lobby(self, lobby_id: str):
+        """Удаляет лобби"""
+        self._execute(RELEASE_LOBBY, (lobby_id,))
+    
+    def user_route(self, user_id: int) -> Optional[Tuple[int, Optional[str]]]:
+        """Процесс, за которым закреплен пользователь, и его лобби"""
+        rows = self._execute("SELECT worker, lobby_id FROM users WHERE user_id = ?", (user_id,))
+        return rows[0] if rows else None
+    
+    def bind_user(self, user_id: int, worker: int, lobby_id: Optional[str]):
+        """Закрепляет пользователя за процессом и лобби"""
+        self._execute(BIND_USER, (user_id, worker, lobby_id))
+    
+    def unbind_user(self, user_id: int):
+        """Отвязывает пользователя от лобби; закрепление за процессом остается"""
+        self._execute(UNBIND_USER, (user_id,))
+    
+    def pin_user(self, user_id: int, worker: int):
+        """Закрепляет пользователя за процессом, не меняя лобби"""
+        self._execute(
+            "INSERT INTO users (user_id, worker) VALUES (?, ?) "
+            "ON CONFLICT (user_id) DO UPDATE SET worker = excluded.worker",
+            (user_id, worker),
+        )
+    
+    def lobby_members(self, lobby_id: str) -> List[int]:
+        """Пользователи, привязанные к лобби"""
+        return [row[0] for row in self._execute("SELECT user_id FROM users WHERE lobby_id = ?", (lobby_id,))]
+    
+    def reset_worker(self, worker: int):
+        """Забывает лобби процесса, например после его перезапуска: состояние лобби хранилось в памяти"""
+        self._transaction([
+            ("DELETE FROM lobbies WHERE worker = ?", (worker,)),
+            ("UPDATE users SET lobby_id = NULL WHERE worker = ?", (worker,)),
+        ])
+    
+    def move_lobby(self, lobby_id: str, worker: int):
+        """Передает лобби и его игроков другому процессу одной транзакцией"""
+        self._transaction([
+            ("UPDATE lobbies SET worker = ? WHERE lobby_id = ?", (worker, lobby_id)),
+            ("UPDATE users SET worker = ? WHERE lobby_id = ?", (worker, lobby_id)),
+        ])
+    
+    def lobby_counts(self) -> Dict[int, int]:
+        """Число лобби у каждого процесса"""
+        return dict(self._execute("SELECT worker, COUNT(*) FROM lobbies GROUP BY worker"))
+
+
+class ShardWorker:
+    """Рабочий процесс многопроцессного режима: зеркалирует владение в хранилище и отдает состояние при переносе"""
+    
+    # Подписчики ObservedDict вызываются синхронно из обработчиков, а запись в SQLite
+    # может ждать блокировку файла до 5 с. Поэтому изменения копятся в памяти (последнее
+    # значение по ключу) и пишутся фоновой задачей в потоке, пачкой в одной транзакции.
+    # Перед выдачей состояния при переносе очередь дописывается, чтобы запись процесса
+    # не легла в хранилище после move_lobby маршрутизатора
+    
+    def __init__(self, application: Application, store: OwnershipStore, index: int, drain_timeout: float = 5.0):
+        """
+        Args:
+            application: Приложение PTB этого процесса
+            store: Общее хранилище владения
+            index: Номер процесса
+            drain_timeout: Сколько ждать обработки уже принятых обновлений перед выдачей состояния
+        """
+        self.application = application
+        self.store = store
+        self.index = index
+        self.drain_timeout = drain_timeout
+        self._pending_lobbies: Dict[str, bool] = {}
+        self._pending_users: Dict[int, Optional[str]] = {}
+        self._writer: Optional[asyncio.Task] = None
+        self.logger = logging.getLogger(__name__)
+    
+    def start(self):
+        """Сбрасывает устаревшие записи процесса и подписывается на изменения лобби и членства"""
+        self.store.reset_worker(self.index)
+        lobbies.subscribe(self._on_lobby)
+        user_to_lobby.subscribe(self._on_membership)
+    
+    def stop(self):
+        lobbies.unsubscribe(self._on_lobby)
+        user_to_lobby.unsubscribe(self._on_membership)
+    
+    def _on_lobby(self, lobby_id: str, lobby: Optional[Lobby]):
+        self._pending_lobbies[lobby_id] = lobby is not None
+        self._schedule_write()
+    
+    def _on_membership(self, user_id: int, lobby_id: Optional[str]):
+        self._pending_users[user_id] = lobby_id
+        self._schedule_write()
+    
+    def _schedule_write(self):
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # Вне цикла событий (запуск, синхронные тесты) блокировать некого
+            self._write(*self._take_pending())
+            return
+        # Все изменения текущего шага цикла попадают в одну пачку
+        if self._writer is None or self._writer.done():
+            self._writer = loop.create_task(self._write_pending())
+    
+    def _take_pending(self) -> Tuple[Dict[str, bool], Dict[int, Optional[str]]]:
+        batch = self._pending_lobbies, self._pending_users
+        self._pending_lobbies, self._pending_users = {}, {}
+        return batch
+    
+    def _write(self, lobby_changes: Dict[str, bool], user_changes: Dict[int, Optional[str]]):
+        started = time.perf_counter()
+        self.store.write_worker_changes(self.index, lobby_changes, user_changes)
+        SHARD_STORE_WRITE_LATENCY.observe(time.perf_counter() - started)
+    
+    async def _write_pending(self):
+        while self._pending_lobbies or self._pending_users:
+            lobby_changes, user_changes = self._take_pending()
+            try:
+                await asyncio.to_thread(self._write, lobby_changes, user_changes)
+            except Exception as e:
+                self.logger.error(f"Не удалось записать владение в хранилище: {e}", exc_info=True)
+                # Более новые изменения тех же ключей важнее неудавшихся
+                self._pending_lobbies = {**lobby_changes, **self._pending_lobbies}
+                self._pending_users = {**user_changes, **self._pending_users}
+                return
+    
+    async def flush(self) -> bool:
+        """
+        Дожидается записи накопленных изменений владения
+        
+        Returns:
+            bool: False, если запись не удалась и изменения остались в очереди
+        """
+        while self._writer is not None and not self._writer.done():
+            await self._writer
+        if self._pending_lobbies or self._pending_users:
+            self._writer = asyncio.get_running_loop().create_task(self._write_pending())
+            await self._writer
+        return not (self._pending_lobbies or self._pending_users)
+    
+    def attach(self, server: WebhookServer):
+        """Добавляет служебные маршруты переноса на сервер вебхука"""
+        self._server = server
+        routes = [
+            ("GET", "/shard/status", self._status),
+            ("POST", "/shard/users/{user_id}/export", self._export_user),
+            ("POST", "/shard/users/{user_id}/import", self._import_user),
+            ("POST", "/shard/lobbies/{lobby_id}/export", self._export_lobby),
+            ("POST", "/shard/lobbies/{lobby_id}/import", self._import_lobby),
+        ]
+        for method, path, handler in routes:
+            server.server.route(method, path, self._guarded(handler))
+    
+    def _guarded(self, handler):
+        async def guarded(request: Request) -> Response:
+            if not self._server.authorized(request):
+                return Response.text("forbidden", status=403)
+            return await handler(request)
+        return guarded
+    
+    async def _drain(self, user_ids: Iterable[int]) -> bool:
+        """
+        Ждет, пока уже принятые обновления пользователей будут обработаны
+        
+        Маршрутизатор придерживает новые обновления на время переноса, поэтому
+        маркер в очереди оказывается после всех обновлений, которые успел получить процесс.
+        """
+        markers = [DrainMarker(user_id) for user_id in user_ids]
+        for marker in markers:
+            await self.application.update_queue.put(marker)
+        try:
+            await asyncio.wait_for(asyncio.gather(*(marker.done.wait() for marker in markers)), self.drain_timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+    
+    async def _status(self, request: Request) -> Response:
+        return Response.json({
+            "worker": self.index,
+            "pid": os.getpid(),
+            "lobbies": len(lobbies),
+            "players": len(user_to_lobby),
+            "cpu_seconds": time.process_time(),
+        })
+    
+    async def _export_user(self, request: Request) -> Response:
+        user_id = int(request.params["user_id"])
+        if user_id in user_to_lobby:
+            return Response.json({"error": "user is in a lobby"}, status=409)
+        if not await self._drain([user_id]):
+            return Response.json({"error": "updates still in flight"}, status=409)
+        return Response.json({"state": user_states.pop(user_id, None)})
+    
+    async def _import_user(self, request: Request) -> Response:
+        state = request.json().get("state")
+        if state is not None:
+            user_states[int(request.params["user_id"])] = state
+        return Response.json({"ok": True})
+    
+    async def _export_lobby(self, request: Request) -> Response:
+        lobby = lobbies.get(request.params["lobby_id"])
+        if lobby is None:
+            return Response.json({"error": "unknown lobby"}, status=404)
+        if lobby.game_state == GameState.PROCESSING_RESULTS:
+            return Response.json({"error": "round in progress"}, status=409)
+        if not await self._drain(lobby.players) or lobby.game_state == GameState.PROCESSING_RESULTS:
+            return Response.json({"error": "updates still in flight"}, status=409)
+        if not await self.flush():
+            return Response.json({"error": "ownership store unavailable"}, status=409)
+        
+        # Запись в хранилище делает маршрутизатор после импорта на новом процессе
+        lobbies.detach(lobby.id)
+        users = []
+        for user_id in lobby.players:
+            user_to_lobby.detach(user_id)
+            users.append({"user_id": user_id, "state": user_states.pop(user_id, None)})
+        self.logger.info(f"Лобби {lobby.id} передано с процесса {self.index}")
+        return Response.json({"lobby": lobby.to_dict(), "users": users})
+    
+    async def _import_lobby(self, request: Request) -> Response:
+        data = request.json()
+        lobby = Lobby.from_dict(data["lobby"])
+        lobbies.attach(lobby.id, lobby)
+        for user in data["users"]:
+            user_to_lobby.attach(user["user_id"], lobby.id)
+            if user["state"] is not None:
+                user_states[user["user_id"]] = user["state"]
+        self.logger.info(f"Лобби {lobby.id} принято процессом {self.index}")
+        return Response.json({"ok": True})
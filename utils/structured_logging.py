@@ -0,0 +1,244 @@
+import json
+import logging
+import queue
+import random
+import sys
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Dict, Mapping, Optional
+
+from utils.metrics import LOG_BYTES, LOG_RECORDS
+from utils.tracing import current_span
+
+
+# Атрибуты LogRecord, которые не считаются пользовательскими полями extra
+_STANDARD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "trace_id", "span_id"}
+
+
+class PlayerText:
+    """Текст, введенный игроком; при любом преобразовании в строку заменяется на длину"""
+    
+    # Открыть текст может только PlayerTextFormatter, и только если скрытие отключено:
+    # f-строки, сторонние обработчики и форматтеры всегда видят длину
+    
+    __slots__ = ("text",)
+    
+    def __init__(self, text: Optional[str]):
+        self.text = text
+    
+    def __str__(self) -> str:
+        if self.text is None:
+            return "None"
+        return f"<скрыто: {len(self.text)} симв.>"
+    
+    def __format__(self, spec: str) -> str:
+        return format(str(self), spec)
+
+
+def player_text(text: Optional[str]) -> PlayerText:
+    """Помечает сценарий или действие игрока для записи в лог аргументом сообщения или полем extra"""
+    return PlayerText(text)
+
+
+class PlayerTextFormatter(logging.Formatter):
+    """Собирает текст сообщения, скрывая или открывая текст игроков"""
+    
+    def __init__(self, redact: bool = True):
+        """
+        Args:
+            redact: Скрывать сценарии и действия игроков
+        """
+        super().__init__()
+        self.redact = redact
+    
+    def resolve(self, value: Any) -> Any:
+        """Значение для записи в лог: текст игрока открывается, только если скрытие отключено"""
+        if isinstance(value, PlayerText) and not self.redact and value.text is not None:
+            return value.text
+        return value
+    
+    def format(self, record: logging.LogRecord) -> str:
+        """
+        Возвращает сообщение записи
+        
+        Текст игроков в аргументах сообщения и в полях extra заменяется на длину
+        или открывается; поля extra переписываются строками прямо в записи.
+        """
+        for key, value in record.__dict__.items():
+            if isinstance(value, PlayerText):
+                record.__dict__[key] = str(self.resolve(value))
+        args = record.args
+        if isinstance(args, tuple):
+            args = tuple(self.resolve(arg) for arg in args)
+        elif isinstance(args, Mapping):
+            args = {key: self.resolve(value) for key, value in args.items()}
+        message = str(self.resolve(record.msg))
+        if args:
+            message = message % args
+        return message
+
+
+def parse_sampling(spec: str) -> Dict[str, float]:
+    """
+    Разбирает правила выборки вида "httpx=0.1,telegram.ext=0.5"
+    
+    Args:
+        spec: Пары логгер=доля через запятую
+    
+    Returns:
+        Dict[str, float]: Доля записываемых сообщений для каждого логгера
+    """
+    rates = {}
+    for item in spec.split(","):
+        if not item.strip():
+            continue
+        name, _, rate = item.partition("=")
+        rates[name.strip()] = float(rate)
+    return rates
+
+
+class SamplingFilter(logging.Filter):
+    """Пропускает только долю сообщений ниже WARNING от шумных логгеров"""
+    
+    def __init__(self, rates: Dict[str, float], rng: Optional[random.Random] = None):
+        """
+        Args:
+            rates: Доля записываемых сообщений для логгера и его потомков; действует самое длинное совпадение
+            rng: Генератор случайных чисел
+        """
+        super().__init__()
+        self.rates = rates
+        self._rng = rng or random.Random()
+        self._cache: Dict[str, float] = {}
+    
+    def rate_for(self, name: str) -> float:
+        """Доля записываемых сообщений для логгера"""
+        rate = self._cache.get(name)
+        if rate is None:
+            rate = 1.0
+            prefix = name
+            while prefix:
+                if prefix in self.rates:
+                    rate = self.rates[prefix]
+                    break
+                prefix = prefix.rpartition(".")[0]
+            self._cache[name] = rate
+        return rate
+    
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self.rate_for(record.name)
+        if rate >= 1.0 or self._rng.random() < rate:
+            return True
+        LOG_RECORDS.labels(record.levelname, "sampled_out").inc()
+        return False
+
+
+class BoundedQueueHandler(QueueHandler):
+    """Кладет записи в ограниченную очередь, не блокируя цикл событий"""
+    
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        """
+        Подготавливает запись к передаче в фоновый поток
+        
+        Сообщение и трассировка исключения форматируются здесь, пока аргументы
+        еще не изменились; текст игроков скрывается форматтером обработчика
+        (PlayerTextFormatter), идентификаторы трассировки берутся из контекста вызова.
+        """
+        record.message = self.format(record)
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        span = current_span()
+        if span.sampled:
+            record.trace_id = span.trace_id
+            record.span_id = span.span_id
+        record.msg = record.message
+        record.args = None
+        record.exc_info = None
+        return record
+    
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_RECORDS.labels(record.levelname, "dropped").inc()
+            return
+        LOG_RECORDS.labels(record.levelname, "written").inc()
+
+
+class JsonFormatter(logging.Formatter):
+    """Форматирует запись как одну строку JSON"""
+    
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key in ("trace_id", "span_id"):
+            if hasattr(record, key):
+                entry[key] = getattr(record, key)
+        for key, value in record.__dict__.items():
+            if key not in _STANDARD_ATTRIBUTES and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exc_info"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class MeasuredStreamHandler(logging.StreamHandler):
+    """Потоковый обработчик, который считает записанные байты"""
+    
+    def format(self, record: logging.LogRecord) -> str:
+        text = super().format(record)
+        LOG_BYTES.inc(len(text.encode("utf-8")) + 1)
+        return text
+
+
+def configure_logging(
+    level: str = "INFO",
+    json_format: bool = False,
+    sampling: Optional[Dict[str, float]] = None,
+    redact_player_text: bool = True,
+    queue_size: int = 10000,
+    stream: Any = None,
+) -> QueueListener:
+    """
+    Настраивает корневой логгер: запись в фоновом потоке через ограниченную очередь
+    
+    Args:
+        level: Уровень корневого логгера
+        json_format: JSON по строке на запись или обычный текстовый формат
+        sampling: Доля записываемых сообщений ниже WARNING по логгерам
+        redact_player_text: Скрывать сценарии и действия игроков
+        queue_size: Размер очереди; при переполнении записи отбрасываются и учитываются в метриках
+        stream: Поток вывода (по умолчанию stderr)
+    
+    Returns:
+        QueueListener: Запущенный слушатель; его нужно остановить при завершении, чтобы дописать очередь
+    """
+    output = MeasuredStreamHandler(stream or sys.stderr)
+    if json_format:
+        output.setFormatter(JsonFormatter())
+    else:
+        output.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+    
+    records: "queue.Queue[logging.LogRecord]" = queue.Queue(queue_size)
+    handler = BoundedQueueHandler(records)
+    handler.setFormatter(PlayerTextFormatter(redact_player_text))
+    if sampling:
+        handler.addFilter(SamplingFilter(sampling))
+    
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(level.upper())
+    
+    listener = QueueListener(records, output, respect_handler_level=True)
+    listener.start()
+    return listener
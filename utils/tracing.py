@@ -0,0 +1,358 @@
+import contextvars
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+import httpx
+
+
+AttributeValue = Any
+
+_current_span: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("current_span", default=None)
+
+
+class Span:
+    """Отрезок времени в трассировке раунда"""
+    
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str] = None, attributes: Optional[Dict[str, AttributeValue]] = None, sampled: bool = True):
+        """
+        Args:
+            name: Имя операции
+            trace_id: Идентификатор трассировки (32 hex-символа)
+            parent_id: Идентификатор родительского спана
+            attributes: Начальные атрибуты
+            sampled: Записывается ли спан
+        """
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent_id
+        self.attributes: Dict[str, AttributeValue] = dict(attributes or {})
+        self.sampled = sampled
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.status = "ok"
+        self.status_message = ""
+    
+    @property
+    def duration(self) -> float:
+        """Длительность в секундах (до текущего момента, если спан не завершен)"""
+        end_ns = self.end_ns if self.end_ns is not None else time.time_ns()
+        return (end_ns - self.start_ns) / 1e9
+    
+    def set_attribute(self, key: str, value: AttributeValue):
+        """Добавляет атрибут"""
+        if self.sampled:
+            self.attributes[key] = value
+    
+    def set_attributes(self, attributes: Dict[str, AttributeValue]):
+        """Добавляет несколько атрибутов"""
+        if self.sampled:
+            self.attributes.update(attributes)
+    
+    def record_error(self, error: BaseException):
+        """Помечает спан как завершившийся ошибкой"""
+        self.status = "error"
+        self.status_message = f"{type(error).__name__}: {error}"
+    
+    def end(self):
+        """Фиксирует время окончания"""
+        if self.end_ns is None:
+            self.end_ns = time.time_ns()
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """Представление спана для JSONL"""
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start_ns": self.start_ns,
+            "end_ns": self.end_ns,
+            "duration_ms": round(self.duration * 1000, 3),
+            "status": self.status,
+            "status_message": self.status_message,
+            "attributes": self.attributes,
+        }
+
+
+class SpanExporter:
+    """Базовый класс экспортера спанов"""
+    
+    def export(self, spans: List[Span]):
+        raise NotImplementedError
+    
+    def shutdown(self):
+        pass
+
+
+class JsonlExporter(SpanExporter):
+    """Пишет спаны в локальный файл, по одному JSON-объекту на строку"""
+    
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+    
+    def export(self, spans: List[Span]):
+        with open(self.path, "a", encoding="utf-8") as file:
+            for span in spans:
+                file.write(json.dumps(span.to_dict(), ensure_ascii=False, default=str) + "\n")
+
+
+def _otlp_value(value: AttributeValue) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _otlp_attributes(attributes: Dict[str, AttributeValue]) -> List[Dict[str, Any]]:
+    return [{"key": key, "value": _otlp_value(value)} for key, value in attributes.items()]
+
+
+class OTLPHttpExporter(SpanExporter):
+    """Отправляет спаны в OTLP-коллектор по HTTP в формате OTLP/JSON"""
+    
+    def __init__(self, endpoint: str, service_name: str, timeout: float = 5.0, client: Optional[httpx.Client] = None):
+        """
+        Args:
+            endpoint: Полный адрес приемника, например http://localhost:4318/v1/traces
+            service_name: Значение атрибута ресурса service.name
+            timeout: Таймаут запроса
+            client: HTTP-клиент (для тестов)
+        """
+        self.endpoint = endpoint
+        self.service_name = service_name
+        self.client = client or httpx.Client(timeout=timeout)
+        self.logger = logging.getLogger(__name__)
+    
+    def payload(self, spans: List[Span]) -> Dict[str, Any]:
+        """Тело запроса ExportTraceServiceRequest"""
+        return {
+            "resourceSpans": [{
+                "resource": {"attributes": _otlp_attributes({"service.name": self.service_name})},
+                "scopeSpans": [{
+                    "scope": {"name": __name__},
+                    "spans": [
+                        {
+                            "traceId": span.trace_id,
+                            "spanId": span.span_id,
+                            "parentSpanId": span.parent_id or "",
+                            "name": span.name,
+                            "kind": 1,
+                            "startTimeUnixNano": str(span.start_ns),
+                            "endTimeUnixNano": str(span.end_ns or span.start_ns),
+                            "attributes": _otlp_attributes(span.attributes),
+                            "status": {"code": 2, "message": span.status_message} if span.status == "error" else {"code": 1},
+                        }
+                        for span in spans
+                    ],
+                }],
+            }],
+        }
+    
+    def export(self, spans: List[Span]):
+        response = self.client.post(self.endpoint, json=self.payload(spans))
+        if response.status_code >= 400:
+            self.logger.warning(f"OTLP collector rejected {len(spans)} spans: HTTP {response.status_code}")
+    
+    def shutdown(self):
+        self.client.close()
+
+
+class SimpleSpanProcessor:
+    """Экспортирует каждый спан сразу при завершении (для тестов и отладки)"""
+    
+    def __init__(self, exporter: SpanExporter):
+        self.exporter = exporter
+    
+    def on_end(self, span: Span):
+        self.exporter.export([span])
+    
+    def shutdown(self):
+        self.exporter.shutdown()
+
+
+class BatchSpanProcessor:
+    """Копит завершенные спаны и экспортирует их пачками в фоновом потоке"""
+    
+    def __init__(self, exporter: SpanExporter, max_queue_size: int = 2048, max_batch_size: int = 256, flush_interval: float = 2.0):
+        """
+        Args:
+            exporter: Экспортер
+            max_queue_size: Размер очереди; лишние спаны отбрасываются, а не блокируют цикл событий
+            max_batch_size: Максимум спанов в одной отправке
+            flush_interval: Интервал отправки в секундах
+        """
+        self.exporter = exporter
+        self.max_batch_size = max_batch_size
+        self.flush_interval = flush_interval
+        self.dropped = 0
+        self._queue: "queue.Queue[Span]" = queue.Queue(max_queue_size)
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="span-exporter", daemon=True)
+        self._thread.start()
+        self.logger = logging.getLogger(__name__)
+    
+    def on_end(self, span: Span):
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            self.dropped += 1
+    
+    def _drain(self) -> List[Span]:
+        batch = []
+        while len(batch) < self.max_batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+    
+    def _export(self, batch: List[Span]):
+        try:
+            self.exporter.export(batch)
+        except Exception as e:
+            self.logger.warning(f"Span export failed, {len(batch)} spans lost: {e!r}")
+    
+    def _run(self):
+        while not self._stopped.wait(self.flush_interval):
+            self.flush()
+        self.flush()
+    
+    def flush(self):
+        """Экспортирует все накопленные спаны"""
+        batch = self._drain()
+        while batch:
+            self._export(batch)
+            batch = self._drain()
+    
+    def shutdown(self):
+        """Останавливает фоновый поток, дописав очередь"""
+        self._stopped.set()
+        self._thread.join(timeout=10)
+        self.exporter.shutdown()
+
+
+class _NoopSpan(Span):
+    """Спан, который ничего не записывает, когда трассировка выключена"""
+    
+    def __init__(self):
+        self.name = ""
+        self.trace_id = ""
+        self.span_id = ""
+        self.parent_id = None
+        self.attributes = {}
+        self.sampled = False
+        self.start_ns = 0
+        self.end_ns = 0
+        self.status = "ok"
+        self.status_message = ""
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class Tracer:
+    """Создает спаны и передает завершенные в процессор"""
+    
+    def __init__(self, processor: Any = None, sample_rate: float = 1.0):
+        """
+        Args:
+            processor: SimpleSpanProcessor или BatchSpanProcessor; без него трассировка выключена
+            sample_rate: Доля записываемых трассировок; решение принимается для корневого спана
+                и наследуется дочерними
+        """
+        self.processor = processor
+        self.sample_rate = sample_rate
+    
+    @contextmanager
+    def start_span(self, name: str, attributes: Optional[Dict[str, AttributeValue]] = None) -> Iterator[Span]:
+        """
+        Открывает спан, дочерний по отношению к текущему в контексте
+        
+        Контекст передается через contextvars, поэтому вложенность сохраняется
+        через await и в задачах, созданных asyncio.wait_for и create_task.
+        
+        Args:
+            name: Имя операции
+            attributes: Начальные атрибуты
+        
+        Yields:
+            Span: Открытый спан
+        """
+        if self.processor is None:
+            yield NOOP_SPAN
+            return
+        
+        parent = _current_span.get()
+        if parent is None:
+            span = Span(name, f"{random.getrandbits(128):032x}", None, attributes, random.random() < self.sample_rate)
+        else:
+            span = Span(name, parent.trace_id, parent.span_id, attributes, parent.sampled)
+        
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.record_error(e)
+            raise
+        finally:
+            _current_span.reset(token)
+            span.end()
+            if span.sampled:
+                self.processor.on_end(span)
+    
+    def shutdown(self):
+        """Дописывает накопленные спаны и отключает экспорт"""
+        processor, self.processor = self.processor, None
+        if processor is not None:
+            processor.shutdown()
+
+
+tracer = Tracer()
+
+
+def start_span(name: str, attributes: Optional[Dict[str, AttributeValue]] = None):
+    """Открывает спан глобального трассировщика"""
+    return tracer.start_span(name, attributes)
+
+
+def current_span() -> Span:
+    """Текущий спан или пустой спан, если трассировка не идет"""
+    return _current_span.get() or NOOP_SPAN
+
+
+def configure_tracing(exporter: str, path: str, endpoint: str, service_name: str, sample_rate: float):
+    """
+    Включает трассировку глобального трассировщика
+    
+    Args:
+        exporter: jsonl, otlp или none
+        path: Файл для экспортера jsonl
+        endpoint: Адрес коллектора для экспортера otlp
+        service_name: Имя сервиса для otlp
+        sample_rate: Доля записываемых раундов
+    """
+    if exporter == "jsonl":
+        span_exporter = JsonlExporter(path)
+    elif exporter == "otlp":
+        span_exporter = OTLPHttpExporter(endpoint, service_name)
+    elif exporter in ("", "none"):
+        return
+    else:
+        raise ValueError(f"Unknown tracing exporter: {exporter}")
+    
+    tracer.processor = BatchSpanProcessor(span_exporter)
+    tracer.sample_rate = sample_rate
@@ -0,0 +1,200 @@
+import asyncio
+import importlib.util
+import logging
+from typing import AsyncIterator, Callable, Dict, Optional, Tuple
+
+import httpx
+from telegram import Bot
+from telegram.request import HTTPXRequest
+
+from config import (
+    TELEGRAM_POOL_SIZE, TELEGRAM_GET_UPDATES_POOL_SIZE, TELEGRAM_HTTP_VERSION,
+    TELEGRAM_CONNECT_TIMEOUT, TELEGRAM_READ_TIMEOUT, TELEGRAM_POOL_TIMEOUT,
+    AI_HTTP_POOL_SIZE, AI_HTTP_VERSION, HTTP_KEEPALIVE_EXPIRY
+)
+from utils.metrics import HTTP_POOL_IN_USE, HTTP_POOL_SATURATED, HTTP_POOL_SIZE
+
+logger = logging.getLogger(__name__)
+
+# Пулы соединений процесса по имени, для метрик
+pools: Dict[str, "PooledTransport"] = {}
+
+HTTP_POOL_IN_USE.set_function(lambda: {name: pool.in_use for name, pool in list(pools.items())})
+HTTP_POOL_SIZE.set_function(lambda: {name: pool.size for name, pool in list(pools.items())})
+
+
+def http2_available() -> bool:
+    """Установлен ли пакет h2, без которого httpx не умеет HTTP/2"""
+    return importlib.util.find_spec("h2") is not None
+
+
+def check_http_versions():
+    """
+    Проверяет TELEGRAM_HTTP_VERSION и AI_HTTP_VERSION при старте, а не при первом запросе
+    
+    Raises:
+        RuntimeError: Если версия неизвестна или для HTTP/2 не установлен пакет h2
+    """
+    for name, version in (("TELEGRAM_HTTP_VERSION", TELEGRAM_HTTP_VERSION), ("AI_HTTP_VERSION", AI_HTTP_VERSION)):
+        if version not in ("1.1", "2", "2.0"):
+            raise RuntimeError(f"{name}={version}: поддерживаются только 1.1 и 2")
+        if version != "1.1" and not http2_available():
+            raise RuntimeError(f'{name}={version} требует пакета h2: pip install "httpx[http2]"')
+
+
+class _TrackedStream(httpx.AsyncByteStream):
+    """Тело ответа, по закрытию которого соединение считается свободным"""
+    
+    def __init__(self, stream: httpx.AsyncByteStream, release: Callable[[], None]):
+        self._stream = stream
+        self._release = release
+    
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        async for chunk in self._stream:
+            yield chunk
+    
+    async def aclose(self):
+        try:
+            await self._stream.aclose()
+        finally:
+            self._release()
+
+
+class PooledTransport(httpx.AsyncBaseTransport):
+    """Транспорт httpx с ограниченным пулом соединений, занятость которого видна в метриках"""
+    
+    def __init__(self, pool: str, size: int, http2: bool = False, keepalive_expiry: float = HTTP_KEEPALIVE_EXPIRY, transport: Optional[httpx.AsyncBaseTransport] = None):
+        """
+        Args:
+            pool: Имя пула в метриках
+            size: Максимум соединений (и запросов одновременно для HTTP/1.1)
+            http2: Использовать HTTP/2; нужен пакет h2
+            keepalive_expiry: Сколько секунд держать простаивающее соединение открытым
+            transport: Готовый транспорт вместо AsyncHTTPTransport (для тестов)
+        """
+        if http2 and transport is None and not http2_available():
+            raise RuntimeError(f'Пулу {pool} нужен HTTP/2, но пакет h2 не установлен: pip install "httpx[http2]"')
+        self.pool = pool
+        self.size = size
+        self.in_use = 0
+        limits = httpx.Limits(max_connections=size, max_keepalive_connections=size, keepalive_expiry=keepalive_expiry)
+        self._transport = transport or httpx.AsyncHTTPTransport(limits=limits, http1=True, http2=http2)
+        pools[pool] = self
+    
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        if self.in_use >= self.size:
+            HTTP_POOL_SATURATED.labels(self.pool).inc()
+        self.in_use += 1
+        released = False
+        
+        def release():
+            nonlocal released
+            if not released:
+                released = True
+                self.in_use -= 1
+        
+        try:
+            response = await self._transport.handle_async_request(request)
+        except BaseException:
+            release()
+            raise
+        # Соединение занято, пока читается тело ответа, в том числе потоковое
+        response.stream = _TrackedStream(response.stream, release)
+        return response
+    
+    async def aclose(self):
+        await self._transport.aclose()
+
+
+class TelegramRequest(HTTPXRequest):
+    """Запросы PTB через PooledTransport"""
+    
+    def __init__(
+        self,
+        pool: str,
+        connection_pool_size: int,
+        http_version: str = "1.1",
+        connect_timeout: float = 5.0,
+        read_timeout: float = 5.0,
+        write_timeout: float = 5.0,
+        pool_timeout: float = 1.0,
+        keepalive_expiry: float = HTTP_KEEPALIVE_EXPIRY,
+    ):
+        """
+        Args:
+            pool: Имя пула в метриках
+            connection_pool_size: Максимум соединений
+            http_version: "1.1" или "2"
+            connect_timeout: Таймаут установки соединения, секунды
+            read_timeout: Таймаут чтения ответа, секунды
+            write_timeout: Таймаут отправки запроса, секунды
+            pool_timeout: Сколько ждать свободного соединения, секунды
+            keepalive_expiry: Сколько секунд держать простаивающее соединение открытым
+        """
+        super().__init__(
+            connection_pool_size=connection_pool_size,
+            connect_timeout=connect_timeout,
+            read_timeout=read_timeout,
+            write_timeout=write_timeout,
+            pool_timeout=pool_timeout,
+            http_version=http_version,
+        )
+        # HTTPXRequest не принимает транспорт и keepalive_expiry, поэтому клиент создается заново
+        self._client_kwargs["transport"] = PooledTransport(pool, connection_pool_size, http2=http_version != "1.1", keepalive_expiry=keepalive_expiry)
+        self._client = self._build_client()
+
+
+def build_telegram_requests() -> Tuple[TelegramRequest, TelegramRequest]:
+    """
+    Запросы к Bot API с настройками из config.py
+    
+    getUpdates держит соединение до таймаута long polling, поэтому у него свой пул:
+    иначе опрос занимал бы соединение, нужное для отправки сообщений.
+    
+    Returns:
+        Tuple[TelegramRequest, TelegramRequest]: Запросы для отправки и для getUpdates
+    """
+    timeouts = dict(
+        connect_timeout=TELEGRAM_CONNECT_TIMEOUT,
+        read_timeout=TELEGRAM_READ_TIMEOUT,
+        write_timeout=TELEGRAM_READ_TIMEOUT,
+        pool_timeout=TELEGRAM_POOL_TIMEOUT,
+    )
+    request = TelegramRequest("telegram", TELEGRAM_POOL_SIZE, TELEGRAM_HTTP_VERSION, **timeouts)
+    get_updates_request = TelegramRequest("telegram_get_updates", TELEGRAM_GET_UPDATES_POOL_SIZE, TELEGRAM_HTTP_VERSION, **timeouts)
+    return request, get_updates_request
+
+
+def ai_http_client(pool: str, base_url: str = "", headers: Optional[Dict[str, str]] = None, timeout: float = 60.0) -> httpx.AsyncClient:
+    """
+    HTTP-клиент AI-бэкенда с пулом соединений из config.py
+    
+    Args:
+        pool: Имя пула в метриках
+        base_url: Базовый адрес API
+        headers: Заголовки всех запросов
+        timeout: Таймаут запроса, секунды
+    
+    Returns:
+        httpx.AsyncClient: Клиент поверх PooledTransport
+    """
+    transport = PooledTransport(pool, AI_HTTP_POOL_SIZE, http2=AI_HTTP_VERSION != "1.1")
+    return httpx.AsyncClient(base_url=base_url, headers=headers or {}, timeout=timeout, transport=transport)
+
+
+async def warm_up_telegram(bot: Bot, connections: int) -> int:
+    """
+    Открывает соединения с Bot API заранее, чтобы первые ответы игрокам не ждали DNS и TLS
+    
+    Args:
+        bot: Бот приложения
+        connections: Сколько соединений открыть; каждое — одним запросом getMe
+    
+    Returns:
+        int: Число успешных запросов
+    """
+    results = await asyncio.gather(*(bot.get_me() for _ in range(connections)), return_exceptions=True)
+    failures = [result for result in results if isinstance(result, Exception)]
+    if failures:
+        logger.warning(f"Прогрев соединений с Bot API: {len(failures)} из {connections} запросов не удались: {failures[0]!r}")
+    return connections - len(failures)
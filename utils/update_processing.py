@@ -0,0 +1,118 @@
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Dict, Hashable, Optional
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+from utils.flood_control import FloodControl
+
+
+class KeyedLock:
+    """Набор блокировок по ключу, которые удаляются, когда по ключу никто не ждет"""
+    
+    def __init__(self):
+        self._locks: Dict[Hashable, asyncio.Lock] = {}
+        self._pending: Dict[Hashable, int] = {}
+    
+    def __len__(self) -> int:
+        """Число ключей с захваченной или ожидаемой блокировкой"""
+        return len(self._pending)
+    
+    def busy(self, key: Hashable) -> bool:
+        """Есть ли по ключу работа"""
+        return key in self._pending
+    
+    @asynccontextmanager
+    async def hold(self, key: Hashable) -> AsyncIterator[None]:
+        """Захватывает блокировку ключа"""
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        self._pending[key] = self._pending.get(key, 0) + 1
+        try:
+            async with lock:
+                yield
+        finally:
+            self._pending[key] -= 1
+            if not self._pending[key]:
+                del self._pending[key]
+                del self._locks[key]
+
+
+class DrainMarker:
+    """Служебный элемент очереди обновлений, который обрабатывается после всех уже принятых обновлений пользователя"""
+    
+    def __init__(self, user_id: int):
+        self.user_id = user_id
+        self.done = asyncio.Event()
+
+
+class PerUserUpdateProcessor(BaseUpdateProcessor):
+    """Обрабатывает обновления разных пользователей параллельно, а одного пользователя — по порядку"""
+    
+    # Состояние диалога (ConversationHandler, user_states) хранится по пользователю,
+    # поэтому его обновления нельзя обрабатывать одновременно. Очередь пользователя
+    # ждет до семафора: обновления, стоящие за другим обновлением того же
+    # пользователя, не занимают общих слотов обработки. Входной лимит проверяется
+    # еще раньше, поэтому отброшенные обновления не ждут ни очереди, ни слота
+    
+    def __init__(self, max_concurrent_updates: int, flood_control: Optional[FloodControl] = None):
+        """
+        Args:
+            max_concurrent_updates: Сколько обновлений обрабатывается одновременно
+            flood_control: Входной лимит частоты обновлений на пользователя; None — без ограничения
+        """
+        super().__init__(max_concurrent_updates)
+        self._locks = KeyedLock()
+        self.flood_control = flood_control if flood_control is not None and flood_control.enabled else None
+    
+    @staticmethod
+    def key_for(update: Any) -> Optional[int]:
+        """Пользователь (или чат), обновления которого упорядочиваются"""
+        if isinstance(update, DrainMarker):
+            return update.user_id
+        if not isinstance(update, Update):
+            return None
+        if update.effective_user:
+            return update.effective_user.id
+        if update.effective_chat:
+            return update.effective_chat.id
+        return None
+    
+    @property
+    def active_keys(self) -> int:
+        """Число пользователей, у которых есть обрабатываемые или ожидающие обновления"""
+        return len(self._locks)
+    
+    async def process_update(self, update: object, coroutine: Awaitable[Any]) -> None:  # type: ignore[misc]
+        """
+        Отбрасывает флуд, затем дожидается очереди пользователя и слота общего семафора
+        
+        Args:
+            update: Обновление
+            coroutine: Обработка обновления приложением
+        """
+        if self.flood_control is not None and isinstance(update, Update) and not self.flood_control.admit(update):
+            coroutine.close()
+            await self.flood_control.reject(update)
+            return
+        
+        key = self.key_for(update)
+        if key is None:
+            await super().process_update(update, coroutine)
+            return
+        
+        async with self._locks.hold(key):
+            await super().process_update(update, coroutine)
+    
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        try:
+            await coroutine
+        finally:
+            if isinstance(update, DrainMarker):
+                update.done.set()
+    
+    async def initialize(self) -> None:
+        pass
+    
+    async def shutdown(self) -> None:
+        pass
@@ -0,0 +1,157 @@
+import asyncio
+import hmac
+import json
+import logging
+import signal
+from typing import Callable, Optional
+
+from telegram import Update
+from telegram.ext import Application
+
+from utils.http_server import HTTPServer, Request, Response
+from utils.metrics import WEBHOOK_UPDATES
+
+
+SECRET_HEADER = "x-telegram-bot-api-secret-token"
+
+
+def check_secret(request: Request, secret_token: str) -> bool:
+    """Проверяет заголовок X-Telegram-Bot-Api-Secret-Token; пустой секрет пропускает любой запрос"""
+    return not secret_token or hmac.compare_digest(
+        request.headers.get(SECRET_HEADER, "").encode(), secret_token.encode()
+    )
+
+
+def require_secret(mode: str, secret_token: str):
+    """
+    Проверяет при старте, что публичный вебхук защищен секретом
+    
+    Без секрета любой, кто знает адрес, может прислать обновление от имени
+    любого пользователя, в том числе администратора. Рабочие процессы получают
+    секрет от супервизора, поэтому его отсутствие означает запуск вручную.
+    
+    Raises:
+        RuntimeError: Если режим принимает обновления по HTTP, а WEBHOOK_SECRET_TOKEN пуст
+    """
+    if mode in ("webhook", "worker", "sharded") and not secret_token:
+        raise RuntimeError(f"BOT_MODE={mode} требует WEBHOOK_SECRET_TOKEN: без него вебхук принимает обновления от кого угодно")
+
+
+class WebhookServer:
+    """Принимает обновления от Telegram по HTTP и кладет их в очередь приложения"""
+    
+    def __init__(self, application: Application, host: str, port: int, path: str, secret_token: str):
+        """
+        Args:
+            application: Приложение PTB
+            host: Адрес для прослушивания
+            port: Порт, 0 означает любой свободный
+            path: Путь, на который Telegram отправляет обновления
+            secret_token: Значение заголовка X-Telegram-Bot-Api-Secret-Token; пустая строка отключает проверку
+        """
+        self.application = application
+        self.path = "/" + path.strip("/")
+        self.secret_token = secret_token
+        self.server = HTTPServer(host, port)
+        self.server.route("POST", self.path, self._handle)
+        self.logger = logging.getLogger(__name__)
+    
+    @property
+    def url(self) -> str:
+        """Локальный адрес приема обновлений"""
+        return f"{self.server.url}{self.path}"
+    
+    async def start(self):
+        await self.server.start()
+    
+    async def stop(self):
+        await self.server.stop()
+    
+    def authorized(self, request: Request) -> bool:
+        """Проверяет секретный токен запроса"""
+        return check_secret(request, self.secret_token)
+    
+    async def _handle(self, request: Request) -> Response:
+        if not self.authorized(request):
+            WEBHOOK_UPDATES.labels("forbidden").inc()
+            return Response.text("forbidden", status=403)
+        
+        try:
+            data = request.json()
+            update = Update.de_json(data, self.application.bot) if isinstance(data, dict) else None
+        except (ValueError, TypeError, KeyError, AttributeError) as e:
+            self.logger.debug(f"Некорректное обновление в вебхуке: {e!r}")
+            update = None
+        if update is None:
+            WEBHOOK_UPDATES.labels("invalid").inc()
+            return Response.text("bad request", status=400)
+        
+        # Ответ не ждет обработки: Telegram повторяет запрос, если ответа долго нет
+        await self.application.update_queue.put(update)
+        WEBHOOK_UPDATES.labels("accepted").inc()
+        return Response.text("ok")
+
+
+async def run_webhook(
+    application: Application,
+    host: str,
+    port: int,
+    path: str,
+    public_url: str,
+    secret_token: str,
+    stop_event: Optional[asyncio.Event] = None,
+    setup_server: Optional[Callable[[WebhookServer], None]] = None,
+):
+    """
+    Запускает приложение в режиме вебхука до сигнала остановки
+    
+    Повторяет жизненный цикл Application.run_polling: post_init, post_stop и
+    post_shutdown вызываются так же, поэтому служебные эндпоинты работают в обоих режимах.
+    
+    Args:
+        application: Приложение PTB
+        host: Адрес HTTP-сервера
+        port: Порт HTTP-сервера
+        path: Путь приема обновлений
+        public_url: Внешний адрес, который регистрируется в Telegram; пустая строка — не вызывать setWebhook
+            (например, когда вебхук настроен на балансировщике для нескольких процессов)
+        secret_token: Секретный токен вебхука
+        stop_event: Событие остановки; по умолчанию SIGINT и SIGTERM
+        setup_server: Дополнительная настройка сервера до запуска, например служебные маршруты
+    """
+    logger = logging.getLogger(__name__)
+    loop = asyncio.get_running_loop()
+    if stop_event is None:
+        stop_event = asyncio.Event()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, stop_event.set)
+    
+    server = WebhookServer(application, host, port, path, secret_token)
+    if setup_server:
+        setup_server(server)
+    await application.initialize()
+    try:
+        if application.post_init:
+            await application.post_init(application)
+        if public_url:
+            await application.bot.set_webhook(
+                url=public_url,
+                secret_token=secret_token or None,
+                allowed_updates=Update.ALL_TYPES,
+            )
+        await application.start()
+        await server.start()
+        application.bot_data["webhook_server"] = server
+        logger.info(f"Вебхук принимает обновления на {server.url}")
+        
+        await stop_event.wait()
+    finally:
+        application.bot_data.pop("webhook_server", None)
+        await server.stop()
+        if application.running:
+            await application.stop()
+            if application.post_stop:
+                await application.post_stop(application)
+        await application.shutdown()
+        if application.post_shutdown:
+            await application.post_shutdown(application)